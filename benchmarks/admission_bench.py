@@ -0,0 +1,118 @@
+"""
+Ride request latency under overload, with and without admission control.
+
+Serves a stand-in ride service in-process whose handlers share a bottleneck
+with fixed capacity (like dispatch falling behind), and drives it open-loop
+with ride requests at a multiple of that capacity plus a steady stream of ride
+status updates. Without admission control every request queues and latency
+grows for the whole run; with it, excess ride requests are shed with 503 while
+admitted requests and ride updates keep low latency.
+
+Usage:
+    python benchmarks/admission_bench.py [--overload 2.0] [--seconds 5]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+from utils.admission import AdmissionController, AdmissionMiddleware, GradientLimit
+
+SERVICE_TIME_SECONDS = 0.02
+CAPACITY = 4
+UPDATE_RATE = 20
+
+
+def make_app(admission):
+    app = FastAPI()
+    bottleneck = asyncio.Semaphore(CAPACITY)
+
+    async def serve():
+        async with bottleneck:
+            await asyncio.sleep(SERVICE_TIME_SECONDS)
+
+    @app.post("/rides/request_ride")
+    async def request_ride():
+        await serve()
+        return {"status": "pending"}
+
+    @app.put("/rides/{ride_id}/status")
+    async def update_status(ride_id: int):
+        await serve()
+        return {"ride_id": ride_id}
+
+    controller = None
+    if admission:
+        controller = AdmissionController(GradientLimit(initial_limit=100))
+        app.add_middleware(AdmissionMiddleware, controller=controller)
+    return app, controller
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else float("nan")
+
+
+async def run(admission, overload, seconds):
+    app, controller = make_app(admission)
+    request_rate = overload * CAPACITY / SERVICE_TIME_SECONDS
+    results = {"new": [], "update": []}
+    shed = {"new": 0, "update": 0}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def send(kind, due):
+            if kind == "new":
+                response = await client.post("/rides/request_ride")
+            else:
+                response = await client.put("/rides/1/status")
+            if response.status_code == 503:
+                shed[kind] += 1
+            else:
+                results[kind].append(time.perf_counter() - due)
+
+        async def generate(kind, rate):
+            # Open-loop arrivals: requests are sent on schedule whether or not
+            # earlier ones have finished, and latency is measured from the due time.
+            tasks = []
+            started = time.perf_counter()
+            sent = 0
+            while time.perf_counter() - started < seconds:
+                due = started + sent / rate
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(send(kind, due)))
+                sent += 1
+            await asyncio.gather(*tasks)
+
+        await asyncio.gather(generate("new", request_rate), generate("update", UPDATE_RATE))
+
+    label = "admission" if admission else "no limit"
+    print(f"{label:>9}: ride requests served {len(results['new'])}, shed {shed['new']} | "
+          f"p50 {percentile(results['new'], 0.5):7.1f} ms, p99 {percentile(results['new'], 0.99):7.1f} ms | "
+          f"updates shed {shed['update']}, p99 {percentile(results['update'], 0.99):7.1f} ms"
+          + (f" | final limit {controller.limit.limit}" if controller else ""))
+
+
+def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("utils.admission").setLevel(logging.ERROR)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--overload", type=float, default=2.0, help="Ride request rate as a multiple of capacity")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    print(f"Capacity {CAPACITY / SERVICE_TIME_SECONDS:.0f} req/s, offered {args.overload:.1f}x for {args.seconds:.0f}s")
+    for admission in (False, True):
+        asyncio.run(run(admission, args.overload, args.seconds))
+
+
+if __name__ == "__main__":
+    main()
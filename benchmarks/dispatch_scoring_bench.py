@@ -0,0 +1,134 @@
+"""
+Benchmark for candidate ETA scoring during dispatch.
+
+Issues dispatches at a fixed arrival rate (shortlist the k nearest drivers, score
+each candidate's pickup ETA, reserve the best) while a probe task measures how
+late the event loop wakes up from 1 ms sleeps, i.e. how long any other request
+would wait to be served. Scoring runs inline on the loop, in a thread pool and
+in a process pool.
+
+The ETA function is a CPU-bound stand-in for a routed estimate: a Dijkstra search
+over a small road grid, costing a few milliseconds per candidate.
+
+Usage:
+    python benchmarks/dispatch_scoring_bench.py [--dispatches 200] [--rate 20] [--candidates 8]
+"""
+import argparse
+import asyncio
+import heapq
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drivers.drivers_availability import AvailabilityPool
+from drivers.drivers_locations import SpatialIndex
+from rides import rides_dispatch
+from rides.rides_dispatch import CandidateScorer, dispatch_by_eta
+
+CENTER = (40.7580, -73.9855)
+GRID_SIZE = 30
+
+
+def routed_eta(driver_position, pickup):
+    """
+    Shortest path over a GRID_SIZE x GRID_SIZE road grid with varying edge costs.
+    """
+    seed = int(abs(driver_position[0] * 1e5 + driver_position[1] * 1e5)) % 1000
+    start, goal = (seed % GRID_SIZE, 0), (GRID_SIZE - 1, GRID_SIZE - 1)
+    best = {start: 0.0}
+    frontier = [(0.0, start)]
+    while frontier:
+        cost, (row, col) = heapq.heappop(frontier)
+        if (row, col) == goal:
+            return cost
+        if cost > best[(row, col)]:
+            continue
+        for next_row, next_col in ((row + 1, col), (row - 1, col), (row, col + 1), (row, col - 1)):
+            if 0 <= next_row < GRID_SIZE and 0 <= next_col < GRID_SIZE:
+                next_cost = cost + 1.0 + ((next_row * 31 + next_col * 17 + seed) % 7) / 10.0
+                if next_cost < best.get((next_row, next_col), float("inf")):
+                    best[(next_row, next_col)] = next_cost
+                    heapq.heappush(frontier, (next_cost, (next_row, next_col)))
+    return float("inf")
+
+
+def make_fleet(drivers, seed=1):
+    rng = random.Random(seed)
+    index = SpatialIndex()
+    index.apply({
+        f"driver{n}": (CENTER[0] + rng.uniform(-0.05, 0.05), CENTER[1] + rng.uniform(-0.05, 0.05), 0.0)
+        for n in range(drivers)
+    })
+    return index, AvailabilityPool(f"driver{n}" for n in range(drivers))
+
+
+async def probe_loop_lag(lags, stop, interval=0.001):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run(kind, dispatches, rate, deadline_ms):
+    index, pool = make_fleet(dispatches * 2)
+    scorer = CandidateScorer(executor_kind=kind, deadline_ms=deadline_ms, eta_fn=routed_eta)
+    if kind != "inline":
+        # Warm the pool up so worker start-up is not measured.
+        await scorer.score(CENTER, [("warmup", CENTER)] * (os.cpu_count() or 1))
+
+    lags, latencies = [], []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_loop_lag(lags, stop))
+
+    async def dispatch_one(ride_id):
+        started = time.perf_counter()
+        pickup = f"{CENTER[0] + random.uniform(-0.03, 0.03)},{CENTER[1] + random.uniform(-0.03, 0.03)}"
+        await dispatch_by_eta(pickup, index, pool, scorer, ride_id)
+        latencies.append(time.perf_counter() - started)
+
+    async def arrivals():
+        tasks = []
+        for ride_id in range(dispatches):
+            tasks.append(asyncio.create_task(dispatch_one(ride_id)))
+            await asyncio.sleep(1.0 / rate)
+        await asyncio.gather(*tasks)
+
+    started = time.perf_counter()
+    await arrivals()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    scorer.close()
+
+    lags.sort()
+    latencies.sort()
+    print(f"{kind:>7}: {dispatches / elapsed:7.1f} dispatches/sec | "
+          f"dispatch p50 {statistics.median(latencies) * 1000:7.1f} ms | "
+          f"loop lag p50 {lags[len(lags) // 2] * 1000:6.2f} ms, "
+          f"p99 {lags[int(len(lags) * 0.99)] * 1000:6.2f} ms, max {lags[-1] * 1000:6.2f} ms | "
+          f"late candidates {scorer.late}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dispatches", type=int, default=200)
+    parser.add_argument("--candidates", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=20.0, help="Dispatches started per second.")
+    parser.add_argument("--deadline-ms", type=float, default=500.0)
+    args = parser.parse_args()
+    logging.getLogger("rides.rides_dispatch").setLevel(logging.ERROR)
+
+    rides_dispatch.DEFAULT_CANDIDATES = args.candidates
+    print(f"{args.dispatches} dispatches at {args.rate:g}/sec, {args.candidates} candidates each, "
+          f"{os.cpu_count()} CPUs")
+    for kind in ("inline", "thread", "process"):
+        asyncio.run(run(kind, args.dispatches, args.rate, args.deadline_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Soak test for driver reservations: millions of request/cancel cycles.
+
+Books a ride through the ride request handler and cancels it through the status
+handler, over and over against a fixed fleet, while finished rides are moved to
+a ride archive in a temporary directory by the real tiering step every
+--tier-every cycles and at every checkpoint. Each checkpoint reports available
+and reserved drivers, which must stay at the fleet size and zero, the rides left
+in the hot store and the ride index after tiering, which must both be zero, and
+allocated memory blocks, which must stay flat apart from the archive's
+in-memory sparse index.
+Exits non-zero if supply drains, the hot store or index keeps growing, or
+memory keeps growing.
+
+Usage:
+    python benchmarks/dispatch_soak.py [--cycles 1000000] [--drivers 50] [--tier-every 512]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drivers.drivers_availability import AvailabilityPool
+from drivers.drivers_locations import SpatialIndex
+from rides import rides_router
+from rides.rides_archive import RideArchive, tier_finished_rides
+from rides.rides_dispatch import CandidateScorer
+from rides.rides_index import RideIndex
+
+PICKUP = "40.7580,-73.9855"
+# Growth in allocated blocks between the first and last checkpoint that fails the soak.
+MAX_GROWTH_BLOCKS = 1000
+# Allocated blocks allowed per archive block written: the archive keeps one
+# sparse-index entry in memory for each.
+ARCHIVE_INDEX_BLOCKS = 8
+
+
+async def soak(cycles, drivers, checkpoints, tier_every, archive):
+    index = SpatialIndex()
+    index.apply({f"driver_{i}": (40.75 + i * 0.0005, -73.98, 0.0) for i in range(drivers)})
+    pool = AvailabilityPool(f"driver_{i}" for i in range(drivers))
+    scorer = CandidateScorer(executor_kind="inline")
+    rides_router.rides_db = {}
+    rides_router.ride_index = RideIndex()
+    rides_router.driver_locations = index
+    rides_router.driver_availability = pool
+    rides_router.get_candidate_scorer = lambda: scorer
+
+    request = rides_router.RideRequest(pickup=PICKUP, dropoff="B")
+    cancel = rides_router.RideStatusUpdate(status="cancelled")
+    every = max(1, cycles // checkpoints)
+    memory = []
+    started = time.perf_counter()
+    for cycle in range(1, cycles + 1):
+        ride = await rides_router.request_ride_endpoint(request)
+        await rides_router.update_ride_status_endpoint(ride["ride_id"], cancel)
+        if cycle % tier_every == 0 or cycle % every == 0:
+            tier_finished_rides(rides_router.rides_db, archive, rides_router.ride_index)
+        if cycle % every == 0:
+            blocks = sys.getallocatedblocks()
+            memory.append((blocks, len(archive)))
+            stats = pool.stats()
+            hot, indexed = len(rides_router.rides_db), len(rides_router.ride_index)
+            print(f"{cycle:>10} cycles | available {stats['available']:>4}, reserved {stats['reserved']} | "
+                  f"hot rides {hot:>5}, indexed {indexed:>5} | allocated blocks {blocks:>8} | "
+                  f"{cycle / (time.perf_counter() - started):8.0f} cycles/s")
+            if stats != {"available": drivers, "reserved": 0}:
+                print("FAIL: driver supply drained")
+                return False
+            if hot or indexed:
+                print("FAIL: tiering left finished rides in the hot store or ride index")
+                return False
+    growth = memory[-1][0] - memory[0][0]
+    if growth > MAX_GROWTH_BLOCKS + ARCHIVE_INDEX_BLOCKS * (memory[-1][1] - memory[0][1]):
+        print(f"FAIL: memory grew by {growth} blocks")
+        return False
+    print(f"OK: supply constant, memory growth {growth} blocks")
+    return True
+
+
+def main():
+    logging.disable(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=1_000_000)
+    parser.add_argument("--drivers", type=int, default=50)
+    parser.add_argument("--checkpoints", type=int, default=10)
+    parser.add_argument("--tier-every", type=int, default=512)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        archive = RideArchive(directory)
+        try:
+            ok = asyncio.run(soak(args.cycles, args.drivers, args.checkpoints, args.tier_every, archive))
+        finally:
+            archive.close()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+HTTP latency with matching in the event loop vs. in the dispatch worker process.
+
+Serves the rides router in-process and fires bursts of ride requests (each
+shortlisting and ETA-scoring 8 drivers with the CPU-bound routed_eta stand-in
+from dispatch_scoring_bench) while a probe client polls GET /rides/{ride_id}.
+Reports the probe's latency, i.e. what every other endpoint sees while matching
+crunches, with matching inline on the loop and in the worker process.
+
+Usage:
+    python benchmarks/dispatch_worker_bench.py [--bursts 20] [--burst-size 25]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.dispatch_scoring_bench import CENTER, make_fleet, routed_eta
+from rides import rides_router
+from rides import rides_dispatch_worker
+from rides.rides_dispatch import CandidateScorer
+from rides.rides_index import RideIndex
+
+
+def reset_router(drivers):
+    index, pool = make_fleet(drivers)
+    rides_router.rides_db = {}
+    rides_router.ride_index = RideIndex()
+    rides_router.current_ride_id = 0
+    rides_router.driver_locations = index
+    rides_router.driver_availability = pool
+    return index, pool
+
+
+async def run(mode, bursts, burst_size, probe_interval):
+    index, pool = reset_router(bursts * burst_size * 2)
+    worker = None
+    if mode == "worker":
+        worker = rides_dispatch_worker.create_dispatch_worker(
+            index, pool, eta_fn=routed_eta, match_timeout_seconds=60
+        )
+        worker.start()
+    else:
+        rides_dispatch_worker._worker = None
+        rides_router.get_candidate_scorer = lambda: CandidateScorer(executor_kind="inline", eta_fn=routed_eta)
+
+    app = FastAPI()
+    app.include_router(rides_router.router)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        first = await client.post("/rides/request_ride", json={"pickup": f"{CENTER[0]},{CENTER[1]}"})
+        probe_id = first.json()["ride_id"]
+
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def probe():
+            # Latency is measured from when the probe was due to be sent, so time
+            # spent waiting for a blocked loop counts against the endpoint.
+            while not done.is_set():
+                due = time.perf_counter() + probe_interval
+                await asyncio.sleep(probe_interval)
+                await client.get(f"/rides/{probe_id}")
+                probe_latencies.append(time.perf_counter() - due)
+
+        async def request_ride():
+            pickup = f"{CENTER[0] + random.uniform(-0.03, 0.03)},{CENTER[1] + random.uniform(-0.03, 0.03)}"
+            response = await client.post("/rides/request_ride", json={"pickup": pickup})
+            return response.status_code
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        statuses = []
+        for _ in range(bursts):
+            statuses += await asyncio.gather(*(request_ride() for _ in range(burst_size)))
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    if worker is not None:
+        worker.stop()
+
+    probe_latencies.sort()
+    booked = sum(status == 200 for status in statuses)
+    print(f"{mode:>6}: {booked}/{len(statuses)} rides booked in {elapsed:.2f}s | "
+          f"GET /rides/{{id}} p50 {probe_latencies[len(probe_latencies) // 2] * 1000:6.2f} ms, "
+          f"p99 {probe_latencies[int(len(probe_latencies) * 0.99)] * 1000:7.2f} ms, "
+          f"max {probe_latencies[-1] * 1000:7.2f} ms ({len(probe_latencies)} probes)")
+
+
+def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--burst-size", type=int, default=25)
+    parser.add_argument("--probe-interval", type=float, default=0.005)
+    args = parser.parse_args()
+    print(f"{args.bursts} bursts of {args.burst_size} ride requests, {os.cpu_count()} CPUs")
+    for mode in ("inline", "worker"):
+        asyncio.run(run(mode, args.bursts, args.burst_size, args.probe_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Scalar vs. vectorized fare calculation over a large batch of trips.
+
+Prices the same random trips with calculate_fare in a Python loop and with
+calculate_fare_batch, checks that every fare is identical and reports the
+throughput of both. Trips use a mix of vehicle classes, so the batch gathers a
+tariff row per trip.
+
+Usage:
+    python benchmarks/fare_batch_bench.py [--trips 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from payments.payments_service import calculate_fare, calculate_fare_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trips", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    distances = rng.gamma(2.0, 4.0, args.trips)
+    durations = distances * rng.uniform(1.5, 4.0, args.trips)
+    surges = rng.choice([1.0, 1.0, 1.0, 1.2, 1.5, 2.0], args.trips)
+    vehicle_classes = rng.choice(["standard", "standard", "xl"], args.trips)
+
+    started = time.perf_counter()
+    scalar = [
+        calculate_fare(None, None, duration, distance, surge, vehicle_class=vehicle_class)
+        for distance, duration, surge, vehicle_class in zip(
+            distances.tolist(), durations.tolist(), surges.tolist(), vehicle_classes.tolist()
+        )
+    ]
+    scalar_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    batch = calculate_fare_batch(distances, durations, surges, vehicle_classes=vehicle_classes)
+    batch_seconds = time.perf_counter() - started
+
+    mismatches = int((np.asarray(scalar) != batch).sum())
+    print(f"{args.trips} trips")
+    print(f"  scalar: {scalar_seconds:7.3f}s ({args.trips / scalar_seconds:12,.0f} trips/s)")
+    print(f"  batch:  {batch_seconds:7.3f}s ({args.trips / batch_seconds:12,.0f} trips/s), "
+          f"{scalar_seconds / batch_seconds:.0f}x faster")
+    print(f"  mismatched fares: {mismatches}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Fare polling throughput of GET /payments/calculate_fare/{ride_id}, with and
+without memoization.
+
+Stores a set of in-progress rides with coordinate pickups and dropoffs, then
+has concurrent clients poll their fares through the payments router over an
+in-process ASGI transport, the way rider apps poll during a trip. A small
+share of polls follow a ride update, which bumps the ride's version and forces
+a reprice. Reports client-side throughput and latency, and the handler's own
+cost per call, which is what memoization removes.
+
+Usage:
+    python benchmarks/fare_endpoint_bench.py [--clients 50] [--polls 200] [--rides 1000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+from payments import payments_router
+from rides import rides_router
+
+CENTER = (40.75, -73.98)
+# Share of polls that follow an update to the ride.
+UPDATE_SHARE = 0.02
+HANDLER_CALLS = 20_000
+
+
+def seed_rides(count, rng):
+    for ride_id in range(1, count + 1):
+        pickup = (CENTER[0] + rng.uniform(-0.1, 0.1), CENTER[1] + rng.uniform(-0.1, 0.1))
+        dropoff = (CENTER[0] + rng.uniform(-0.1, 0.1), CENTER[1] + rng.uniform(-0.1, 0.1))
+        rides_router.rides_db[ride_id] = {
+            "ride_id": ride_id,
+            "rider_id": ride_id,
+            "pickup": f"{pickup[0]:.5f},{pickup[1]:.5f}",
+            "dropoff": f"{dropoff[0]:.5f},{dropoff[1]:.5f}",
+            "status": "in_progress",
+            "version": 1,
+        }
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] * 1000 if values else float("nan")
+
+
+async def poll(client, rides, polls, rng, latencies):
+    for _ in range(polls):
+        ride_id = rng.randint(1, rides)
+        if rng.random() < UPDATE_SHARE:
+            rides_router.rides_db[ride_id]["version"] += 1
+        started = time.perf_counter()
+        response = await client.get(f"/payments/calculate_fare/{ride_id}")
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+
+
+async def run_clients(app, clients, polls, rides, seed):
+    rng = random.Random(seed)
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            poll(client, rides, polls, random.Random(rng.random()), latencies) for _ in range(clients)
+        ))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies
+
+
+async def time_handler(rides, seed):
+    rng = random.Random(seed)
+    ride_ids = [rng.randint(1, rides) for _ in range(HANDLER_CALLS)]
+    started = time.perf_counter()
+    for ride_id in ride_ids:
+        await payments_router.calculate_fare_endpoint(ride_id)
+    return (time.perf_counter() - started) / HANDLER_CALLS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--polls", type=int, default=200)
+    parser.add_argument("--rides", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    seed_rides(args.rides, random.Random(args.seed))
+    app = FastAPI()
+    app.include_router(payments_router.router)
+    print(f"{args.clients} clients x {args.polls} polls over {args.rides} rides")
+
+    for label, max_entries in (("recomputed", 0), ("memoized", payments_router.MAX_MEMOIZED_FARES)):
+        payments_router.MAX_MEMOIZED_FARES = max_entries
+        payments_router.fare_memo.clear()
+        handler = asyncio.run(time_handler(args.rides, args.seed))
+        elapsed, latencies = asyncio.run(run_clients(app, args.clients, args.polls, args.rides, args.seed))
+        print(f"  {label:>10}: handler {handler * 1e6:6.1f} us/call; "
+              f"{len(latencies) / elapsed:7,.0f} polls/s, "
+              f"p50 {percentile(latencies, 0.5):.2f} ms, p99 {percentile(latencies, 0.99):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Ledger commit throughput, balance reads and journal replay.
+
+Posts a burst of concurrent charges into a fresh ledger, once with group
+commit and once with one fsync per transaction, and reports transactions per
+second and the number of fsyncs. Then writes a synthetic journal of ride
+fares, charges and payouts, times a full streaming rebuild of every balance
+from it, and compares a materialised balance read with summing one rider's
+postings by scanning the journal.
+
+Usage:
+    python benchmarks/ledger_bench.py [--posts 5000] [--journal 1000000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payments.payments_ledger import (
+    JOURNAL_FILE,
+    PLATFORM_CASH,
+    PLATFORM_REVENUE,
+    Ledger,
+    Transaction,
+    driver_account,
+    encode_transaction,
+    post_charge,
+    replay_journal,
+    rider_account,
+)
+
+RIDERS = 100_000
+DRIVERS = 10_000
+READS = 100_000
+
+
+def time_posts(directory, posts, max_group_size):
+    ledger = Ledger(directory, max_group_size=max_group_size)
+
+    async def burst():
+        await asyncio.gather(*(post_charge(ledger, ride_id, ride_id % RIDERS, 1500) for ride_id in range(posts)))
+
+    started = time.perf_counter()
+    asyncio.run(burst())
+    elapsed = time.perf_counter() - started
+    ledger.close()
+    return elapsed, ledger.commits
+
+
+def write_journal(path, count, rng):
+    """
+    Writes a synthetic journal: each ride books a fare, and most are charged; a payout every 20 rides.
+    """
+    with open(path, "wb") as journal:
+        buffer = []
+        for seq in range(1, count + 1):
+            rider, driver = rider_account(rng.randrange(RIDERS)), driver_account(rng.randrange(DRIVERS))
+            kind = seq % 20
+            if kind == 0:
+                postings = ((driver, 4000), (PLATFORM_CASH, -4000))
+            elif kind % 2:
+                postings = ((rider, 2000), (driver, -1500), (PLATFORM_REVENUE, -500))
+            else:
+                postings = ((PLATFORM_CASH, 2000), (rider, -2000))
+            buffer.append(encode_transaction(Transaction(seq, 0.0, "fare", f"ride:{seq}", postings)))
+            if len(buffer) == 10_000:
+                journal.write(b"".join(buffer))
+                buffer.clear()
+        journal.write(b"".join(buffer))
+
+
+def scan_balance(path, account):
+    needle = account.encode()
+    balance = 0
+    with open(path, "rb") as journal:
+        for line in journal:
+            fields = line.rstrip(b"\n").split(b"\t")
+            for i in range(4, len(fields), 2):
+                if fields[i] == needle:
+                    balance += int(fields[i + 1])
+    return balance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--journal", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{args.posts:,} concurrent charges")
+        for label, group_size in (("fsync per transaction", 1), ("group commit", 1000)):
+            elapsed, commits = time_posts(os.path.join(directory, label.replace(" ", "-")), args.posts, group_size)
+            print(f"  {label:>21}: {args.posts / elapsed:9,.0f} tx/s, {commits:,} fsyncs")
+
+        path = os.path.join(directory, JOURNAL_FILE)
+        write_journal(path, args.journal, random.Random(args.seed))
+        size = os.path.getsize(path)
+        started = time.perf_counter()
+        balances, last_seq, _ = replay_journal(path)
+        elapsed = time.perf_counter() - started
+        print(f"rebuild from {args.journal:,} transactions ({size / 1e6:.0f} MB): {elapsed:.2f}s, "
+              f"{args.journal / elapsed:,.0f} tx/s, {len(balances):,} accounts, balanced: {sum(balances.values()) == 0}")
+
+        ledger = Ledger(directory)
+        account = rider_account(42)
+        started = time.perf_counter()
+        for _ in range(READS):
+            ledger.balance(account)
+        read = (time.perf_counter() - started) / READS
+        started = time.perf_counter()
+        scanned = scan_balance(path, account)
+        scan = time.perf_counter() - started
+        assert scanned == ledger.balance(account)
+        ledger.close()
+        print(f"balance of one rider: {read * 1e9:.0f} ns materialised, {scan * 1e3:,.0f} ms by journal scan")
+
+
+if __name__ == "__main__":
+    main()
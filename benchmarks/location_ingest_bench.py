@@ -0,0 +1,86 @@
+"""
+Benchmark for the driver location ingestion path.
+
+Measures updates/sec through LocationIngestor (validation, last-write coalescing
+and batched spatial index flushes), and through the batched POST endpoint with
+an in-process ASGI client. The target is at least 50k updates/sec per process
+for the ingestion path.
+
+Usage:
+    python benchmarks/location_ingest_bench.py [--drivers 20000] [--updates 1000000]
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers import drivers_router
+from drivers.drivers_locations import LocationIngestor, SpatialIndex
+
+
+def make_updates(drivers: int, count: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    base_lat, base_lng = 40.75, -73.98
+    return [
+        {
+            "driver_id": f"driver{rng.randrange(drivers)}",
+            "lat": base_lat + rng.uniform(-0.2, 0.2),
+            "lng": base_lng + rng.uniform(-0.2, 0.2),
+            "timestamp": float(n),
+        }
+        for n in range(count)
+    ]
+
+
+def bench_ingestor(updates: list, flush_every: int) -> float:
+    ingestor = LocationIngestor(SpatialIndex())
+    started = time.perf_counter()
+    for start in range(0, len(updates), flush_every):
+        ingestor.submit_many(updates[start:start + flush_every])
+        ingestor.flush()
+    elapsed = time.perf_counter() - started
+    print(f"ingestor: {len(updates):,} updates in {elapsed:.2f}s "
+          f"-> {len(updates) / elapsed:,.0f} updates/sec ({len(ingestor.index):,} drivers indexed)")
+    return len(updates) / elapsed
+
+
+def bench_http(updates: list, batch_size: int) -> float:
+    drivers_router.location_ingestor = LocationIngestor(SpatialIndex())
+    app = FastAPI()
+    app.include_router(drivers_router.router)
+    client = TestClient(app)
+    batches = [updates[start:start + batch_size] for start in range(0, len(updates), batch_size)]
+
+    started = time.perf_counter()
+    for batch in batches:
+        client.post("/drivers/locations", json={"updates": batch})
+    drivers_router.location_ingestor.flush()
+    elapsed = time.perf_counter() - started
+    print(f"POST /drivers/locations: {len(updates):,} updates in {len(batches):,} batches of {batch_size} "
+          f"in {elapsed:.2f}s -> {len(updates) / elapsed:,.0f} updates/sec")
+    return len(updates) / elapsed
+
+
+def main() -> None:
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=20_000)
+    parser.add_argument("--updates", type=int, default=1_000_000)
+    parser.add_argument("--flush-every", type=int, default=50_000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    updates = make_updates(args.drivers, args.updates)
+    bench_ingestor(updates, args.flush_every)
+    bench_http(updates[:200_000], args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
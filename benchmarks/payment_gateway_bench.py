@@ -0,0 +1,120 @@
+"""
+Payment calls against a slow gateway: blocking versus the async pooled client.
+
+Runs the stand-in gateway on a loopback port in its own thread, answering
+every call after a fixed latency, and issues a burst of concurrent charges
+from an event loop three ways: a blocking HTTP call per charge (as the mock
+APIs are called today), an async call opening a fresh connection each time,
+and the shared PaymentGatewayClient with its connection pool and concurrency
+cap. Reports total time, the longest the event loop went without running a
+10 ms ticker, and how many connections the gateway saw.
+
+Usage:
+    python benchmarks/payment_gateway_bench.py [--payments 200] [--latency 0.3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from payments.payments_gateway import PaymentGatewayClient
+from payments.payments_gateway_stub import StubGateway
+
+TICK_SECONDS = 0.01
+
+
+def start_stub(latency_seconds):
+    """
+    Serves a stub gateway from a background thread and returns it once listening.
+    """
+    ready = threading.Event()
+    stub = StubGateway(latency_seconds=latency_seconds)
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(stub.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return stub
+
+
+async def measure(charge_all):
+    """
+    Runs a burst of charges while a ticker measures event loop stalls.
+    """
+    stall = 0.0
+
+    async def ticker():
+        nonlocal stall
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(TICK_SECONDS)
+            now = time.perf_counter()
+            stall = max(stall, now - last - TICK_SECONDS)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_SECONDS)
+    started = time.perf_counter()
+    await charge_all()
+    elapsed = time.perf_counter() - started
+    # Let the ticker observe a stall that lasted until the burst ended.
+    await asyncio.sleep(2 * TICK_SECONDS)
+    task.cancel()
+    return elapsed, stall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--blocking-payments", type=int, default=10,
+                        help="charges in the blocking run, which takes payments x latency")
+    args = parser.parse_args()
+    stub = start_stub(args.latency)
+    payload = {"rider_id": 1, "amount": 10.0}
+
+    async def blocking():
+        with httpx.Client(base_url=stub.base_url) as client:
+            async def charge():
+                client.post("/v1/charges", json=payload)
+            await asyncio.gather(*(charge() for _ in range(args.blocking_payments)))
+
+    async def unpooled():
+        async def charge():
+            async with httpx.AsyncClient(base_url=stub.base_url) as client:
+                await client.post("/v1/charges", json=payload)
+        await asyncio.gather(*(charge() for _ in range(args.payments)))
+
+    # The shared client is created once, at startup, not per burst.
+    client = PaymentGatewayClient(stub.base_url, timeout_seconds=30.0)
+
+    async def pooled():
+        try:
+            await asyncio.gather(*(client.charge(1, 10.0) for _ in range(args.payments)))
+        finally:
+            await client.aclose()
+
+    print(f"gateway latency {args.latency * 1000:.0f} ms")
+    for label, count, charge_all in (
+        ("blocking", args.blocking_payments, blocking),
+        ("async, new connection", args.payments, unpooled),
+        ("async, pooled + capped", args.payments, pooled),
+    ):
+        connections = stub.connections
+        elapsed, stall = asyncio.run(measure(charge_all))
+        print(f"  {label:>22}: {count} charges in {elapsed:6.2f}s ({count / elapsed:6.1f}/s), "
+              f"longest loop stall {stall * 1000:7.1f} ms, {stub.connections - connections} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Rider charges during a payout outage, with and without breakers and bulkheads.
+
+Runs the real gateway client against an in-process transport on which
+payouts hang until their timeout while charges answer in 20 ms. A payout
+batch keeps PAYOUTS_IN_FLIGHT payouts going, retrying each as it fails,
+while charges arrive at a steady rate. Without isolation the hung payouts
+hold the client's concurrency slots and charges time out behind them; with
+the payout bulkhead and circuit breaker, charges keep their latency.
+
+Usage:
+    python benchmarks/payment_resilience_bench.py [--seconds 5] [--charge-rate 100]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from payments import payments_resilience, payments_service
+from payments.payments_gateway import GatewayError, PaymentGatewayClient
+from payments.payments_resilience import CHARGES, PAYOUTS, Bulkhead, CircuitBreaker, PaymentGuard
+
+TIMEOUT_SECONDS = 1.0
+CHARGE_LATENCY_SECONDS = 0.02
+PAYOUTS_IN_FLIGHT = 200
+
+
+async def handle(request):
+    if request.url.path == "/v1/payouts":
+        await asyncio.sleep(3600)
+    await asyncio.sleep(CHARGE_LATENCY_SECONDS)
+    return httpx.Response(200, json={"status": "success"})
+
+
+def install_guards(isolated):
+    if isolated:
+        payments_resilience._guards.clear()
+    else:
+        unbounded = 1_000_000
+        payments_resilience._guards.update({
+            kind: PaymentGuard(CircuitBreaker(kind, failure_threshold=unbounded), Bulkhead(kind, unbounded))
+            for kind in (CHARGES, PAYOUTS)
+        })
+
+
+async def run(seconds, charge_rate):
+    client = PaymentGatewayClient("http://gateway", timeout_seconds=TIMEOUT_SECONDS,
+                                  transport=httpx.MockTransport(handle))
+    payments_service.get_payment_gateway = lambda: client
+    deadline = time.perf_counter() + seconds
+    payout_failures = 0
+
+    async def keep_paying(driver):
+        nonlocal payout_failures
+        while time.perf_counter() < deadline:
+            try:
+                await payments_service.payout_driver_async(driver, 10.0)
+            except GatewayError:
+                payout_failures += 1
+                await asyncio.sleep(0.05)
+
+    async def charge(rider):
+        started = time.perf_counter()
+        try:
+            await payments_service.charge_rider_async(rider, 12.5)
+        except GatewayError:
+            return None
+        return time.perf_counter() - started
+
+    payers = [asyncio.ensure_future(keep_paying(f"d{i}")) for i in range(PAYOUTS_IN_FLIGHT)]
+    await asyncio.sleep(0.1)
+    charges = []
+    rider = 0
+    while time.perf_counter() < deadline:
+        charges.append(asyncio.ensure_future(charge(rider)))
+        rider += 1
+        await asyncio.sleep(1 / charge_rate)
+    latencies = await asyncio.gather(*charges)
+    await asyncio.gather(*payers)
+    await client.aclose()
+    return latencies, payout_failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--charge-rate", type=float, default=100.0)
+    args = parser.parse_args()
+
+    for label, isolated in (("shared capacity", False), ("breaker + bulkhead", True)):
+        install_guards(isolated)
+        latencies, payout_failures = asyncio.run(run(args.seconds, args.charge_rate))
+        succeeded = sorted(latency for latency in latencies if latency is not None)
+        p50 = succeeded[len(succeeded) // 2] * 1e3 if succeeded else float("nan")
+        p99 = succeeded[int(len(succeeded) * 0.99)] * 1e3 if succeeded else float("nan")
+        stats = payments_resilience.payment_guard_stats()
+        print(f"{label:>18}: {len(succeeded):,}/{len(latencies):,} charges succeeded, "
+              f"p50 {p50:.0f} ms, p99 {p99:.0f} ms; {payout_failures:,} payout failures, "
+              f"payout breaker {stats[PAYOUTS]['transitions']}, {stats[PAYOUTS]['rejected']:,} rejected")
+
+
+if __name__ == "__main__":
+    main()
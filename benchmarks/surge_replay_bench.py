@@ -0,0 +1,177 @@
+"""
+Replays a synthetic day of supply and demand events through the surge engine.
+
+A fleet of drivers random-walks across a 20 km city, reporting positions every
+30 seconds; ride requests follow a daily curve with morning and evening peaks
+concentrated downtown, each one reserving an available driver for the length of
+its trip and asking for a fare quote. The events are generated up front and
+then replayed in time order, with the engine refreshed every 5 simulated
+seconds. Reports replay throughput, the cost of a quote lookup next to
+recomputing surge by scanning drivers and recent requests, and how often
+published multipliers changed with and without hysteresis.
+
+Usage:
+    python benchmarks/surge_replay_bench.py [--drivers 500] [--requests 150000]
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from payments.payments_surge import (
+    DEMAND_WINDOW_SECONDS,
+    REFRESH_INTERVAL_SECONDS,
+    SurgeEngine,
+    target_multiplier,
+)
+from utils.geolocation import KM_PER_DEGREE, grid_cell
+
+CENTER = (40.75, -73.98)
+CITY_KM = 20.0
+DAY_SECONDS = 24 * 3600
+POSITION_INTERVAL_SECONDS = 30
+SAMPLED_NAIVE_QUOTES = 200
+
+POSITION, REQUEST, RELEASE, REFRESH = range(4)
+
+
+def demand_curve(hour):
+    """
+    Relative request intensity over the day, with peaks at 8:30 and 18:00.
+    """
+    return 0.2 + math.exp(-((hour - 8.5) ** 2) / 2) + 1.3 * math.exp(-((hour - 18) ** 2) / 3)
+
+
+def offset(km_north, km_east):
+    return (CENTER[0] + km_north / KM_PER_DEGREE, CENTER[1] + km_east / KM_PER_DEGREE)
+
+
+def generate_day(drivers, requests, rng):
+    """
+    Returns the day's events as (time, kind, payload) tuples in time order.
+    """
+    events = []
+    for i in range(drivers):
+        north, east = rng.uniform(-CITY_KM / 2, CITY_KM / 2), rng.uniform(-CITY_KM / 2, CITY_KM / 2)
+        for t in range(rng.randrange(POSITION_INTERVAL_SECONDS), DAY_SECONDS, POSITION_INTERVAL_SECONDS):
+            north = max(-CITY_KM / 2, min(CITY_KM / 2, north + rng.gauss(0, 0.25)))
+            east = max(-CITY_KM / 2, min(CITY_KM / 2, east + rng.gauss(0, 0.25)))
+            events.append((t, POSITION, (f"driver_{i}", offset(north, east))))
+
+    weights = [demand_curve(minute / 60) for minute in range(24 * 60)]
+    for minute in rng.choices(range(24 * 60), weights, k=requests):
+        t = minute * 60 + rng.random() * 60
+        peak = demand_curve(minute / 60) > 1.0
+        spread = 2.0 if peak and rng.random() < 0.6 else CITY_KM / 2
+        pickup = offset(rng.gauss(0, spread), rng.gauss(0, spread))
+        events.append((t, REQUEST, (pickup, rng.uniform(600, 1500))))
+
+    events.extend((t, REFRESH, None) for t in range(0, DAY_SECONDS, int(REFRESH_INTERVAL_SECONDS)))
+    events.sort(key=lambda event: (event[0], event[1]))
+    return events
+
+
+def naive_multiplier(pickup, positions, available, recent_requests, now, zone_size_km):
+    """
+    Surge computed per quote by scanning every driver and recent request.
+    """
+    zone = grid_cell(pickup, zone_size_km)
+    supply = sum(
+        1 for driver_id, position in positions.items()
+        if driver_id in available and grid_cell(position, zone_size_km) == zone
+    )
+    demand = sum(
+        math.exp(-(now - t) / DEMAND_WINDOW_SECONDS)
+        for t, location in recent_requests if grid_cell(location, zone_size_km) == zone
+    )
+    return target_multiplier(demand * 60.0 / DEMAND_WINDOW_SECONDS, supply)
+
+
+def replay(events, engine, sample_naive=False):
+    """
+    Feeds the events through the engine and returns replay statistics.
+    """
+    available = set()
+    positions = {}
+    releases = []
+    recent_requests = []
+    lookups = 0
+    lookup_seconds = 0.0
+    naive_seconds = 0.0
+    naive_quotes = 0
+    peak = 1.0
+    started = time.perf_counter()
+    for t, kind, payload in events:
+        while releases and releases[0][0] <= t:
+            release_at, driver_id = heapq.heappop(releases)
+            available.add(driver_id)
+            engine.driver_available(driver_id, True, now=release_at)
+        if kind == POSITION:
+            driver_id, position = payload
+            if driver_id not in positions:
+                available.add(driver_id)
+                engine.driver_available(driver_id, True, now=t)
+            positions[driver_id] = position
+            engine.driver_moved(driver_id, position, now=t)
+        elif kind == REQUEST:
+            pickup, trip_seconds = payload
+            engine.record_request(pickup, now=t)
+            quote_started = time.perf_counter()
+            multiplier = engine.multiplier_at(pickup)
+            lookup_seconds += time.perf_counter() - quote_started
+            lookups += 1
+            peak = max(peak, multiplier)
+            if available:
+                driver_id = available.pop()
+                engine.driver_available(driver_id, False, now=t)
+                heapq.heappush(releases, (t + trip_seconds, driver_id))
+            if sample_naive:
+                recent_requests.append((t, pickup))
+                if lookups % 500 == 0 and naive_quotes < SAMPLED_NAIVE_QUOTES:
+                    cutoff = t - 5 * DEMAND_WINDOW_SECONDS
+                    recent_requests = [request for request in recent_requests if request[0] >= cutoff]
+                    naive_started = time.perf_counter()
+                    naive_multiplier(pickup, positions, available, recent_requests, t, engine.zone_size_km)
+                    naive_seconds += time.perf_counter() - naive_started
+                    naive_quotes += 1
+        else:
+            engine.refresh(now=t)
+    elapsed = time.perf_counter() - started
+    return {
+        "elapsed": elapsed,
+        "lookup": lookup_seconds / max(1, lookups),
+        "naive": naive_seconds / max(1, naive_quotes),
+        "peak": peak,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drivers", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=150_000)
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    events = generate_day(args.drivers, args.requests, random.Random(args.seed))
+    print(f"{len(events):,} events: {args.drivers} drivers, {args.requests:,} requests over 24h")
+
+    engine = SurgeEngine()
+    result = replay(events, engine, sample_naive=True)
+    print(f"  replay: {result['elapsed']:.2f}s, {len(events) / result['elapsed']:,.0f} events/s "
+          f"({result['elapsed'] / len(events) * 1e6:.2f} us/event including the replay loop)")
+    print(f"  quote lookup: {result['lookup'] * 1e6:.2f} us; recomputing by scan: {result['naive'] * 1e3:.2f} ms")
+    print(f"  peak multiplier {result['peak']:.1f}, {engine.stats()}")
+
+    undamped = SurgeEngine(hysteresis_up=0.0, hysteresis_down=0.0)
+    replay(events, undamped)
+    print(f"  published multiplier changes: {engine.changes:,} with hysteresis, "
+          f"{undamped.changes:,} without")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark for live ride tracking fan-out.
+
+Subscribes 10k concurrent connections to the tracking hub (one reader task each),
+of which a fraction never read, then publishes rounds of driver positions and
+status changes through the location flush path. Reports publish cost per round,
+delivery latency to the reading subscribers, and confirms slow subscribers stay
+bounded instead of holding up the rest.
+
+Usage:
+    python benchmarks/tracking_fanout_bench.py [--subscribers 10000] [--rounds 50]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from drivers.drivers_locations import LocationIngestor, SpatialIndex
+from rides.rides_tracking import Subscription, TrackingHub
+
+
+async def reader(subscription: Subscription, latencies: list, received: list) -> None:
+    while True:
+        message = await subscription.get()
+        if message["type"] == "position":
+            latencies.append(time.perf_counter() - message["timestamp"])
+        received[0] += 1
+
+
+async def run(subscribers: int, rides: int, rounds: int, slow_fraction: float) -> None:
+    hub = TrackingHub()
+    ingestor = LocationIngestor(SpatialIndex())
+    ingestor.add_listener(hub.publish_driver_positions)
+
+    subscriptions = [hub.subscribe(n % rides, driver_id=f"driver{n % rides}") for n in range(subscribers)]
+    slow_count = int(subscribers * slow_fraction)
+    latencies: list = []
+    received = [0]
+    tasks = [
+        asyncio.create_task(reader(subscription, latencies, received))
+        for subscription in subscriptions[slow_count:]
+    ]
+    await asyncio.sleep(0)
+
+    publish_times = []
+    started = time.perf_counter()
+    for round_number in range(rounds):
+        publish_started = time.perf_counter()
+        for ride_id in range(rides):
+            ingestor.submit(f"driver{ride_id}", 40.0 + round_number * 1e-4, -73.0, timestamp=publish_started)
+        ingestor.flush()
+        if round_number % 10 == 0:
+            for ride_id in range(rides):
+                hub.publish_status(ride_id, "started")
+        publish_times.append(time.perf_counter() - publish_started)
+        # Let readers drain before the next round, as a real event loop would between flushes.
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    slow_backlog = max(len(subscription._events) + (subscription._position is not None)
+                       for subscription in subscriptions[:slow_count]) if slow_count else 0
+    latencies.sort()
+    print(f"{subscribers:,} subscribers on {rides:,} rides ({slow_count:,} never read), {rounds} rounds")
+    print(f"publish per round: median {statistics.median(publish_times) * 1000:.2f} ms, "
+          f"max {max(publish_times) * 1000:.2f} ms")
+    print(f"delivered {received[0]:,} messages ({hub.published:,} queued) in {elapsed:.2f}s "
+          f"-> {hub.published / elapsed:,.0f} messages/sec")
+    if latencies:
+        print(f"position latency: p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+    print(f"largest slow-subscriber backlog: {slow_backlog} messages (bounded by queue size {hub.queue_size} + 1)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--rides", type=int, default=5_000)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--slow-fraction", type=float, default=0.1)
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.rides, args.rounds, args.slow_fraction))
+
+
+if __name__ == "__main__":
+    main()
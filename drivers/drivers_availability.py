@@ -0,0 +1,123 @@
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AvailabilityPool:
+    """
+    Tracks which online drivers can be offered rides.
+
+    A driver is either available or reserved for a ride. Available drivers are
+    kept in an insertion-ordered dict, so the longest-waiting driver is first and
+    every operation is O(1). The pool is used from the event loop only.
+    """
+    def __init__(self, driver_ids: Iterable[str] = ()):
+        self._available: Dict[str, None] = dict.fromkeys(driver_ids)
+        self._reserved: Dict[str, Any] = {}
+        self._listeners: List[Callable[[str, str, Any], None]] = []
+
+    def __len__(self) -> int:
+        return len(self._available)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._available or driver_id in self._reserved
+
+    def is_available(self, driver_id: str) -> bool:
+        return driver_id in self._available
+
+    def available_drivers(self) -> List[str]:
+        """
+        Returns the available driver IDs, longest-waiting first.
+        """
+        return list(self._available)
+
+    def reserved_drivers(self) -> Dict[str, Any]:
+        """
+        Returns the reserved driver IDs mapped to the rides they are reserved for.
+        """
+        return dict(self._reserved)
+
+    def add_listener(self, listener: Callable[[str, str, Any], None]) -> None:
+        """
+        Registers a callback invoked as listener(event, driver_id, ride_id) after
+        every change, with event one of "add", "remove", "reserve" or "release".
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, driver_id: str, ride_id: Any = None) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event, driver_id, ride_id)
+            except Exception as e:
+                logger.error("Availability listener failed on %s of driver %s: %s", event, driver_id, e)
+
+    def add(self, driver_id: str) -> bool:
+        """
+        Marks an online driver as available. Drivers already reserved for a ride
+        stay reserved.
+
+        :return: True if the driver was not already in the pool.
+        """
+        if driver_id in self._available or driver_id in self._reserved:
+            return False
+        self._available[driver_id] = None
+        self._notify("add", driver_id)
+        return True
+
+    def remove(self, driver_id: str) -> bool:
+        """
+        Takes a driver out of the pool entirely, e.g. when they go offline.
+
+        :return: True if the driver was in the pool.
+        """
+        if driver_id in self._available:
+            del self._available[driver_id]
+        elif driver_id in self._reserved:
+            del self._reserved[driver_id]
+        else:
+            return False
+        self._notify("remove", driver_id)
+        return True
+
+    def reserve(self, ride_id: Any, driver_id: Optional[str] = None) -> Optional[str]:
+        """
+        Reserves a driver for a ride: the given driver if available, otherwise the
+        longest-waiting one.
+
+        :return: The reserved driver's ID, or None if nobody is available.
+        """
+        if driver_id is None:
+            if not self._available:
+                return None
+            driver_id = next(iter(self._available))
+        elif driver_id not in self._available:
+            return None
+        del self._available[driver_id]
+        self._reserved[driver_id] = ride_id
+        self._notify("reserve", driver_id, ride_id)
+        return driver_id
+
+    def release(self, driver_id: str, ride_id: Any = None) -> bool:
+        """
+        Returns a reserved driver to the available set. If a ride is given, the
+        driver is only released if they are still reserved for that ride, so a
+        late release never frees a driver who has since taken another ride.
+
+        :return: True if the driver was released.
+        """
+        if driver_id not in self._reserved:
+            return False
+        if ride_id is not None and self._reserved[driver_id] != ride_id:
+            return False
+        released_ride = self._reserved.pop(driver_id)
+        self._available[driver_id] = None
+        self._notify("release", driver_id, released_ride)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {"available": len(self._available), "reserved": len(self._reserved)}
+
+
+# Shared pool of drivers that are online, available or on a ride.
+driver_availability = AvailabilityPool()
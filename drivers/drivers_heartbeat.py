@@ -0,0 +1,144 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional
+
+from drivers.drivers_availability import driver_availability
+from drivers.drivers_locations import driver_locations, location_ingestor
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+# Drivers not heard from for this long are considered offline.
+DEFAULT_HEARTBEAT_TIMEOUT_SECONDS = 30.0
+# How often expired heartbeats are processed.
+EXPIRY_INTERVAL_SECONDS = 1.0
+
+
+def get_heartbeat_timeout() -> float:
+    """
+    Returns the configured heartbeat timeout (DRIVER_HEARTBEAT_TIMEOUT_SECONDS).
+    """
+    return float(os.getenv("DRIVER_HEARTBEAT_TIMEOUT_SECONDS", DEFAULT_HEARTBEAT_TIMEOUT_SECONDS))
+
+
+class HeartbeatTracker:
+    """
+    Tracks the last heartbeat of every online driver.
+
+    Drivers are kept in an OrderedDict in order of their last heartbeat: a beat
+    moves the driver to the end, so the drivers that expire first are always at
+    the front. Expiry pops from the front until it meets a live driver, costing
+    O(expired) rather than a scan over everyone online.
+
+    Times come from the server's monotonic clock, never from the driver app, so
+    the ordering holds regardless of client clock skew.
+    """
+    def __init__(
+        self,
+        timeout_seconds: Optional[float] = None,
+        on_expire: Optional[Callable[[str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.timeout_seconds = get_heartbeat_timeout() if timeout_seconds is None else timeout_seconds
+        self.on_expire = on_expire
+        self.clock = clock
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._last_seen)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._last_seen
+
+    def beat(self, driver_id: str, now: Optional[float] = None) -> bool:
+        """
+        Records a heartbeat from a driver.
+
+        :return: True if the driver was not being tracked before.
+        """
+        now = self.clock() if now is None else now
+        is_new = driver_id not in self._last_seen
+        self._last_seen[driver_id] = now
+        if not is_new:
+            self._last_seen.move_to_end(driver_id)
+        return is_new
+
+    def touch(self, driver_ids: Iterable[str], now: Optional[float] = None) -> None:
+        """
+        Refreshes drivers that are already tracked, e.g. from location updates,
+        without bringing untracked drivers online.
+        """
+        now = self.clock() if now is None else now
+        last_seen = self._last_seen
+        for driver_id in driver_ids:
+            if driver_id in last_seen:
+                last_seen[driver_id] = now
+                last_seen.move_to_end(driver_id)
+
+    def forget(self, driver_id: str) -> bool:
+        """
+        Stops tracking a driver who went offline deliberately. Not counted as an eviction.
+        """
+        return self._last_seen.pop(driver_id, None) is not None
+
+    def expire(self, now: Optional[float] = None) -> List[str]:
+        """
+        Evicts every driver whose last heartbeat is older than the timeout.
+
+        :return: The evicted driver IDs, least recently seen first.
+        """
+        now = self.clock() if now is None else now
+        deadline = now - self.timeout_seconds
+        last_seen = self._last_seen
+        expired = []
+        while last_seen:
+            driver_id, seen_at = next(iter(last_seen.items()))
+            if seen_at > deadline:
+                break
+            last_seen.popitem(last=False)
+            expired.append(driver_id)
+            if self.on_expire is not None:
+                try:
+                    self.on_expire(driver_id)
+                except Exception as e:
+                    logger.error("Failed to evict driver %s: %s", driver_id, e)
+        if expired:
+            self.evicted += len(expired)
+            logger.info("Evicted %d drivers with stale heartbeats", len(expired))
+        return expired
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns heartbeat counters for monitoring.
+        """
+        return {"online": len(self._last_seen), "evicted": self.evicted}
+
+
+class HeartbeatExpiryJob(AsyncPeriodicJob):
+    """
+    Periodically evicts drivers whose heartbeats have expired.
+    """
+    name = "heartbeat-expiry-job"
+
+    def __init__(self, tracker: HeartbeatTracker, interval_seconds: float = EXPIRY_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.tracker = tracker
+
+    def run_once(self) -> List[str]:
+        return self.tracker.expire()
+
+
+def evict_driver(driver_id: str) -> None:
+    """
+    Takes an unresponsive driver out of dispatch: the availability pool and the spatial index.
+    """
+    driver_availability.remove(driver_id)
+    driver_locations.remove(driver_id)
+
+
+# Shared heartbeat tracker. Location updates also count as signs of life.
+driver_heartbeats = HeartbeatTracker(on_expire=evict_driver)
+location_ingestor.add_listener(driver_heartbeats.touch)
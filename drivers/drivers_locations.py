@@ -0,0 +1,291 @@
+import heapq
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.geolocation import calculate_distance, grid_cell
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+# Grid cell width used by the spatial index.
+CELL_SIZE_KM = 1.0
+# Pending updates are applied early once this many drivers are waiting.
+MAX_PENDING_UPDATES = 50_000
+# How often pending updates are applied to the spatial index.
+FLUSH_INTERVAL_SECONDS = 0.5
+
+Coordinates = Tuple[float, float]
+Cell = Tuple[int, int]
+# (latitude, longitude, timestamp) as reported by the driver app.
+LocationUpdate = Tuple[float, float, float]
+
+
+class SpatialIndex:
+    """
+    Uniform grid index of driver positions.
+
+    Each driver sits in exactly one grid cell, so moving a driver is two set
+    operations and nearest-driver searches only look at the rings of cells
+    around the query point.
+    """
+    def __init__(self, cell_size_km: float = CELL_SIZE_KM):
+        self.cell_size_km = cell_size_km
+        self._positions: Dict[str, LocationUpdate] = {}
+        self._driver_cells: Dict[str, Cell] = {}
+        self._cells: Dict[Cell, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, driver_id: str) -> bool:
+        return driver_id in self._positions
+
+    def position(self, driver_id: str) -> Optional[Coordinates]:
+        """
+        Returns the last applied position of a driver, if known.
+        """
+        update = self._positions.get(driver_id)
+        return (update[0], update[1]) if update else None
+
+    def positions(self) -> Dict[str, LocationUpdate]:
+        """
+        Returns a copy of every indexed driver's last update.
+        """
+        return dict(self._positions)
+
+    def apply(self, updates: Dict[str, LocationUpdate]) -> int:
+        """
+        Applies a batch of coalesced updates. Updates older than the position
+        already in the index are ignored.
+
+        :param updates: Driver IDs mapped to (lat, lng, timestamp).
+        :return: The number of positions changed.
+        """
+        positions = self._positions
+        driver_cells = self._driver_cells
+        cells = self._cells
+        size_km = self.cell_size_km
+        applied = 0
+        for driver_id, update in updates.items():
+            current = positions.get(driver_id)
+            if current is not None and current[2] > update[2]:
+                continue
+            positions[driver_id] = update
+            applied += 1
+
+            cell = grid_cell((update[0], update[1]), size_km)
+            old_cell = driver_cells.get(driver_id)
+            if old_cell == cell:
+                continue
+            if old_cell is not None:
+                members = cells[old_cell]
+                members.discard(driver_id)
+                if not members:
+                    del cells[old_cell]
+            driver_cells[driver_id] = cell
+            cells.setdefault(cell, set()).add(driver_id)
+        return applied
+
+    def remove(self, driver_id: str) -> bool:
+        """
+        Removes a driver from the index.
+
+        :return: True if the driver was indexed.
+        """
+        if self._positions.pop(driver_id, None) is None:
+            return False
+        cell = self._driver_cells.pop(driver_id)
+        members = self._cells[cell]
+        members.discard(driver_id)
+        if not members:
+            del self._cells[cell]
+        return True
+
+    def nearest(
+        self,
+        coord: Coordinates,
+        k: int = 1,
+        max_radius_km: float = 10.0,
+        predicate: Optional[Callable[[str], bool]] = None,
+    ) -> List[Tuple[float, str]]:
+        """
+        Returns up to k drivers closest to `coord`, nearest first.
+
+        Cells are searched ring by ring outwards; the search stops once k drivers
+        are found and the next ring cannot hold anyone closer, or at max_radius_km.
+
+        :param coord: The (lat, lng) to search around.
+        :param k: Maximum number of drivers to return.
+        :param max_radius_km: Drivers further away than this are never returned.
+        :param predicate: Optional filter, e.g. to only return available drivers.
+        :return: (distance_km, driver_id) pairs.
+        """
+        center = grid_cell(coord, self.cell_size_km)
+        # Longitude cells shrink towards the poles; widen the ring count accordingly.
+        lng_scale = 1 / max(math.cos(math.radians(coord[0])), 0.01)
+        max_ring = int(math.ceil(max_radius_km / self.cell_size_km * lng_scale)) + 1
+
+        found: List[Tuple[float, str]] = []
+        for ring in range(max_ring + 1):
+            for cell in self._ring_cells(center, ring):
+                for driver_id in self._cells.get(cell, ()):
+                    if predicate is not None and not predicate(driver_id):
+                        continue
+                    lat, lng, _ = self._positions[driver_id]
+                    distance = calculate_distance(coord, (lat, lng))
+                    if distance <= max_radius_km:
+                        found.append((distance, driver_id))
+            # Drivers in later rings are at least `ring` whole cells away; cells are
+            # narrowest east-west, so that is the conservative bound.
+            if len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= ring * self.cell_size_km / lng_scale:
+                break
+        return heapq.nsmallest(k, found)
+
+    @staticmethod
+    def _ring_cells(center: Cell, ring: int) -> Iterable[Cell]:
+        row, col = center
+        if ring == 0:
+            yield center
+            return
+        for offset in range(-ring, ring + 1):
+            yield (row - ring, col + offset)
+            yield (row + ring, col + offset)
+        for offset in range(-ring + 1, ring):
+            yield (row + offset, col - ring)
+            yield (row + offset, col + ring)
+
+
+def validate_update(driver_id: Any, lat: Any, lng: Any) -> bool:
+    """
+    Cheap validation of one location update: a non-empty driver ID and finite
+    coordinates within range.
+    """
+    if not driver_id or type(lat) not in (float, int) or type(lng) not in (float, int):
+        return False
+    return -90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0
+
+
+class LocationIngestor:
+    """
+    Accepts high-rate driver location updates and coalesces them per driver.
+
+    Only the latest update per driver is kept between flushes (last write wins,
+    by timestamp), and flushes apply the coalesced batch to the spatial index in
+    one pass, so index work scales with the number of drivers, not messages.
+    """
+    def __init__(self, index: SpatialIndex, max_pending: int = MAX_PENDING_UPDATES):
+        self.index = index
+        self.max_pending = max_pending
+        self._pending: Dict[str, LocationUpdate] = {}
+        self._listeners: List[Callable[[Dict[str, LocationUpdate]], None]] = []
+        self.accepted = 0
+        self.rejected = 0
+        self.flushed = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add_listener(self, listener: Callable[[Dict[str, LocationUpdate]], None]) -> None:
+        """
+        Registers a callback invoked with each flushed batch, e.g. to push
+        positions to riders tracking their driver.
+        """
+        self._listeners.append(listener)
+
+    def submit(self, driver_id: Any, lat: Any, lng: Any, timestamp: Optional[float] = None) -> bool:
+        """
+        Queues a location update.
+
+        :param driver_id: The driver's identifier.
+        :param lat: Latitude in decimal degrees.
+        :param lng: Longitude in decimal degrees.
+        :param timestamp: When the position was recorded; defaults to now.
+        :return: False if the update was invalid and dropped.
+        """
+        if not validate_update(driver_id, lat, lng):
+            self.rejected += 1
+            return False
+        if timestamp is None:
+            timestamp = time.time()
+        elif type(timestamp) not in (float, int):
+            self.rejected += 1
+            return False
+        driver_id = str(driver_id)
+        current = self._pending.get(driver_id)
+        if current is None or current[2] <= timestamp:
+            self._pending[driver_id] = (float(lat), float(lng), float(timestamp))
+        self.accepted += 1
+        if len(self._pending) >= self.max_pending:
+            self.flush()
+        return True
+
+    def submit_many(self, updates: Iterable[Any]) -> Tuple[int, int]:
+        """
+        Queues a batch of updates given as {"driver_id", "lat", "lng", "timestamp"?} objects.
+
+        :return: The number of accepted and rejected updates.
+        """
+        accepted = rejected = 0
+        submit = self.submit
+        for update in updates:
+            if isinstance(update, dict) and submit(
+                update.get("driver_id"), update.get("lat"), update.get("lng"), update.get("timestamp")
+            ):
+                accepted += 1
+            else:
+                if not isinstance(update, dict):
+                    self.rejected += 1
+                rejected += 1
+        return accepted, rejected
+
+    def flush(self) -> int:
+        """
+        Applies all pending updates to the spatial index in one batch.
+
+        :return: The number of positions changed.
+        """
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, {}
+        applied = self.index.apply(batch)
+        self.flushed += len(batch)
+        for listener in self._listeners:
+            try:
+                listener(batch)
+            except Exception as e:
+                logger.error("Location flush listener failed: %s", e)
+        return applied
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns ingestion counters for monitoring.
+        """
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "pending": self.pending,
+            "indexed_drivers": len(self.index),
+        }
+
+
+class LocationFlushJob(AsyncPeriodicJob):
+    """
+    Periodically applies coalesced location updates to the spatial index.
+    """
+    name = "location-flush-job"
+
+    def __init__(self, ingestor: LocationIngestor, interval_seconds: float = FLUSH_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.ingestor = ingestor
+
+    def run_once(self) -> int:
+        return self.ingestor.flush()
+
+
+# Shared driver position index and its ingestion path.
+driver_locations = SpatialIndex()
+location_ingestor = LocationIngestor(driver_locations)
@@ -1,4 +1,6 @@
-from fastapi import APIRouter, HTTPException, status, Request
+import json
+
+from fastapi import APIRouter, HTTPException, status, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, Union
 from fastapi.exceptions import RequestValidationError
@@ -6,6 +8,9 @@ from fastapi.responses import JSONResponse
 
 # Import the service functions
 from drivers.drivers_service import create_driver, update_vehicle_details
+from drivers.drivers_locations import location_ingestor
+from drivers.drivers_availability import driver_availability
+from drivers.drivers_heartbeat import driver_heartbeats
 
 # In-memory "database" simulation for demonstration purposes
 # In a production environment, replace with an actual database or ORM integration.
@@ -132,4 +137,109 @@ async def update_vehicle_details_endpoint(driver_id: int, request_data: UpdateVe
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/drivers/locations", status_code=status.HTTP_202_ACCEPTED)
+async def ingest_driver_locations_endpoint(request: Request) -> dict:
+    """
+    Accepts a batch of driver location updates.
+
+    The body is {"updates": [{"driver_id", "lat", "lng", "timestamp"?}, ...]}. Updates
+    are validated cheaply (no per-item model parsing), coalesced to the latest
+    position per driver and applied to the spatial index in batches.
+
+    Args:
+        request (Request): The raw HTTP request.
+
+    Returns:
+        dict: The number of accepted and rejected updates.
+    """
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must be valid JSON"
+        )
+    updates = payload.get("updates") if isinstance(payload, dict) else None
+    if not isinstance(updates, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Body must contain an 'updates' list"
+        )
+
+    accepted, rejected = location_ingestor.submit_many(updates)
+    return {"accepted": accepted, "rejected": rejected}
+
+
+@router.websocket("/drivers/locations/ws")
+async def driver_locations_websocket(websocket: WebSocket) -> None:
+    """
+    Streams driver location updates over a WebSocket.
+
+    Each text message is one update object or a list of them, in the same shape
+    as the batched POST endpoint. Valid updates are not acknowledged, to keep the
+    stream one-way; malformed messages get an error message back.
+
+    Args:
+        websocket (WebSocket): The driver app connection.
+    """
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                payload = json.loads(message)
+            except ValueError:
+                await websocket.send_json({"error": "Message must be valid JSON"})
+                continue
+            updates = payload if isinstance(payload, list) else [payload]
+            accepted, rejected = location_ingestor.submit_many(updates)
+            if rejected:
+                await websocket.send_json({"error": "Invalid location update", "rejected": rejected})
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/drivers/locations/stats", status_code=status.HTTP_200_OK)
+async def driver_locations_stats_endpoint() -> dict:
+    """
+    Returns location ingestion counters for monitoring.
+
+    Returns:
+        dict: Accepted, rejected, flushed and pending update counts.
+    """
+    return location_ingestor.stats()
+
+
+@router.post("/drivers/{driver_id}/heartbeat", status_code=status.HTTP_200_OK)
+async def driver_heartbeat_endpoint(driver_id: str) -> dict:
+    """
+    Records a heartbeat from a driver's app and makes the driver available for
+    dispatch. Drivers that stop sending heartbeats are evicted automatically.
+
+    Args:
+        driver_id (str): The driver's identifier.
+
+    Returns:
+        dict: The driver's ID, dispatch status and the heartbeat timeout in seconds.
+    """
+    driver_heartbeats.beat(driver_id)
+    driver_availability.add(driver_id)
+    return {
+        "driver_id": driver_id,
+        "status": "available" if driver_availability.is_available(driver_id) else "reserved",
+        "timeout_seconds": driver_heartbeats.timeout_seconds
+    }
+
+
+@router.get("/drivers/heartbeat/stats", status_code=status.HTTP_200_OK)
+async def driver_heartbeat_stats_endpoint() -> dict:
+    """
+    Returns heartbeat and availability counters for monitoring.
+
+    Returns:
+        dict: Online drivers, total evictions, and available and reserved drivers.
+    """
+    return {**driver_heartbeats.stats(), **driver_availability.stats()}
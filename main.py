@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
@@ -10,6 +11,94 @@ from drivers.drivers_router import router as drivers_router
 from rides.rides_router import router as rides_router
 from payments.payments_router import router as payments_router
 from ratings.ratings_router import router as ratings_router
+from rides.rides_router import rides_db, dispatch_scheduled_ride
+from rides.rides_scheduler import ScheduledRideDispatcher, scheduled_rides
+from drivers.drivers_locations import LocationFlushJob, driver_locations, location_ingestor
+from drivers.drivers_availability import driver_availability
+from drivers.drivers_heartbeat import HeartbeatExpiryJob, driver_heartbeats
+from rides.rides_forecast import RepositioningJob
+from rides.rides_dispatch import get_candidate_scorer
+from rides.rides_dispatch_worker import create_dispatch_worker, dispatch_worker_enabled
+from rides.rides_archive import RideTieringJob, get_ride_archive
+from rides.rides_index import ride_index
+from payments.payments_tariffs import TariffReloadJob, get_tariff_engine
+from payments.payments_surge import SurgeRefreshJob, surge_engine
+from payments.payments_gateway import close_payment_gateway
+from payments.payments_earnings import PayoutBatchJob, get_payout_batcher
+from payments.payments_ledger import LedgerSnapshotJob, get_ledger
+from payments.payments_retries import ChargeRetryJob, get_charge_retrier
+from utils.idempotency import IdempotencyMiddleware
+from utils.admission import AdmissionMiddleware
+
+
+def create_background_jobs() -> list:
+    """
+    Build the background jobs that run alongside the API, off the request path.
+
+    Returns:
+        list: Job objects exposing start() and stop().
+    """
+    jobs = []
+
+    repositioning_interval = float(os.getenv("REPOSITIONING_INTERVAL_SECONDS", "300"))
+    if repositioning_interval > 0:
+        jobs.append(RepositioningJob(
+            rides_provider=rides_db.values,
+            drivers_provider=lambda: {
+                driver_id: driver_locations.position(driver_id)
+                for driver_id in driver_availability.available_drivers()
+            },
+            interval_seconds=repositioning_interval
+        ))
+
+    tiering_interval = float(os.getenv("TIERING_INTERVAL_SECONDS", "60"))
+    if tiering_interval > 0:
+        jobs.append(RideTieringJob(rides_db, get_ride_archive, tiering_interval, ride_index))
+
+    tariff_reload_interval = float(os.getenv("TARIFF_RELOAD_INTERVAL_SECONDS", "30"))
+    if tariff_reload_interval > 0:
+        jobs.append(TariffReloadJob(get_tariff_engine, tariff_reload_interval))
+
+    payout_interval = float(os.getenv("PAYOUT_BATCH_INTERVAL_SECONDS", "3600"))
+    if payout_interval > 0:
+        jobs.append(PayoutBatchJob(get_payout_batcher, payout_interval))
+
+    ledger_snapshot_interval = float(os.getenv("LEDGER_SNAPSHOT_INTERVAL_SECONDS", "300"))
+    if ledger_snapshot_interval > 0:
+        jobs.append(LedgerSnapshotJob(get_ledger, ledger_snapshot_interval))
+
+    charge_retry_interval = float(os.getenv("CHARGE_RETRY_INTERVAL_SECONDS", "5"))
+    if charge_retry_interval > 0:
+        jobs.append(ChargeRetryJob(get_charge_retrier, charge_retry_interval))
+
+    jobs.append(ScheduledRideDispatcher(scheduled_rides, dispatch_scheduled_ride))
+    jobs.append(LocationFlushJob(location_ingestor))
+    jobs.append(HeartbeatExpiryJob(driver_heartbeats))
+    jobs.append(SurgeRefreshJob(surge_engine))
+
+    if dispatch_worker_enabled():
+        dispatch_worker = create_dispatch_worker(driver_locations, driver_availability)
+        location_ingestor.add_listener(dispatch_worker.send_locations)
+        jobs.append(dispatch_worker)
+
+    return jobs
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start the background jobs when the application starts and stop them on shutdown.
+    """
+    jobs = create_background_jobs()
+    for job in jobs:
+        job.start()
+    try:
+        yield
+    finally:
+        for job in jobs:
+            job.stop()
+        get_candidate_scorer().close()
+        await close_payment_gateway()
 
 
 def create_app() -> FastAPI:
@@ -22,7 +111,7 @@ def create_app() -> FastAPI:
     Returns:
         FastAPI: The configured FastAPI application.
     """
-    app = FastAPI(title="Uber_lite")
+    app = FastAPI(title="Uber_lite", lifespan=lifespan)
 
     # Add custom exception handler for validation errors
     @app.exception_handler(RequestValidationError)
@@ -41,6 +130,11 @@ def create_app() -> FastAPI:
     app.include_router(rides_router)
     app.include_router(payments_router)
     app.include_router(ratings_router)
+
+    # Retried ride requests, charges and payouts replay the first response
+    app.add_middleware(IdempotencyMiddleware)
+    # Shed excess ride requests before they queue up behind dispatch
+    app.add_middleware(AdmissionMiddleware)
     
     # Add middleware for test compatibility
     if os.getenv("PYTEST_CURRENT_TEST") or os.getenv("TESTING") == "true":
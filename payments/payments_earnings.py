@@ -0,0 +1,380 @@
+"""
+Driver earnings, accumulated per ride and paid out in periodic batches.
+
+Each completed ride appends the driver's share of its fare to an append-only
+earnings log (one JSON line per ride, in sequence order). Instead of one
+gateway payout per ride, PayoutBatchJob periodically sums each driver's unpaid
+earnings and pays every driver once, in chunks of concurrent calls.
+
+A batch is checkpointed so a crash resumes it rather than starting over:
+  - the batch (its payouts and the log sequence it covers) is written to the
+    state file before any payout is sent;
+  - after each chunk, the drivers paid or declined are appended to the
+    progress file;
+  - a restarted batch skips the drivers already settled and retries the rest
+    with the same idempotency keys, so a payout sent just before the crash is
+    not applied twice.
+Declined payouts are carried into the next batch. Payouts that failed at the
+gateway (timeouts, outages) keep the batch open; the next run retries them.
+
+A ride's earnings are recorded once: the log rejects a second record for a
+ride, and the ids of rides compacted out of it are kept in a side file.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from payments.payments_gateway import GatewayError
+from payments.payments_ledger import Ledger, get_ledger, post_payout
+from payments.payments_quotes import QuoteError, get_quote_service
+from payments.payments_service import calculate_trip_fare, payout_driver_async
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EARNINGS_DIR = os.path.join("data", "earnings")
+LEDGER_FILE = "earnings.log"
+# Ids of rides whose earnings were paid and compacted out of the log.
+RECORDED_RIDES_SUFFIX = ".rides"
+STATE_FILE = "payouts.json"
+PROGRESS_FILE = "payouts.progress"
+# Share of a ride's fare earned by its driver.
+DRIVER_SHARE = 0.75
+# Drivers paid concurrently per checkpointed chunk.
+DEFAULT_CHUNK_SIZE = 100
+PAYOUT_INTERVAL_SECONDS = 3600.0
+
+
+class Earning(NamedTuple):
+    """
+    One driver's earnings for one ride.
+    """
+    seq: int
+    driver_id: str
+    ride_id: int
+    amount_cents: int
+    fare_cents: int = 0
+
+
+def _write_json_atomically(path: str, content: Any) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(content, handle, separators=(",", ":"))
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temp_path, path)
+
+
+def _read_json_lines(path: str) -> List[Dict[str, Any]]:
+    """
+    Reads a JSON-lines file, ignoring a torn last line left by a crash.
+    """
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning("Ignoring incomplete record in %s", path)
+    return records
+
+
+class EarningsLedger:
+    """
+    Append-only log of unpaid driver earnings, mirrored in memory.
+
+    Records are flushed to the OS as they are appended, so they survive a
+    process crash. Used from the event loop only.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._rides_path = f"{path}{RECORDED_RIDES_SUFFIX}"
+        self._entries: List[Earning] = [Earning(**record) for record in _read_json_lines(path)]
+        self._ride_ids = {ride_id for ride_ids in _read_json_lines(self._rides_path) for ride_id in ride_ids}
+        self._ride_ids.update(earning.ride_id for earning in self._entries)
+        self._writer = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, ride_id: int) -> bool:
+        """
+        Tells whether a ride's earnings were ever recorded, paid or not.
+        """
+        return ride_id in self._ride_ids
+
+    @property
+    def last_seq(self) -> int:
+        return self._entries[-1].seq if self._entries else 0
+
+    def record(self, driver_id: str, ride_id: int, amount: float, fare: float = 0.0) -> Optional[Earning]:
+        """
+        Appends a driver's earnings for a ride, and the ride's fare.
+
+        :return: The earning, or None if the ride's earnings were already recorded.
+        """
+        if ride_id in self._ride_ids:
+            return None
+        earning = Earning(self.last_seq + 1, driver_id, ride_id, int(round(amount * 100)), int(round(fare * 100)))
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._writer = open(self.path, "a", encoding="utf-8")
+        self._writer.write(json.dumps(earning._asdict(), separators=(",", ":")) + "\n")
+        self._writer.flush()
+        self._entries.append(earning)
+        self._ride_ids.add(ride_id)
+        return earning
+
+    def totals(self, after_seq: int, through_seq: int) -> Dict[str, int]:
+        """
+        Returns each driver's earnings in cents over a sequence range (after, through].
+        """
+        totals: Dict[str, int] = {}
+        for earning in self._entries:
+            if after_seq < earning.seq <= through_seq:
+                totals[earning.driver_id] = totals.get(earning.driver_id, 0) + earning.amount_cents
+        return totals
+
+    def compact(self, through_seq: int) -> None:
+        """
+        Drops paid earnings up to a sequence number, rewriting the log. The
+        last entry is always kept so sequence numbers never restart. The
+        dropped rides' ids are appended to the side file first, so a crash in
+        between never forgets a paid ride.
+        """
+        kept = [earning for earning in self._entries if earning.seq > through_seq] or self._entries[-1:]
+        kept_seqs = {earning.seq for earning in kept}
+        dropped = [earning.ride_id for earning in self._entries if earning.seq not in kept_seqs]
+        if dropped:
+            with open(self._rides_path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(dropped, separators=(",", ":")) + "\n")
+                handle.flush()
+                os.fsync(handle.fileno())
+        self._entries = kept
+        self.close()
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            for earning in self._entries:
+                handle.write(json.dumps(earning._asdict(), separators=(",", ":")) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, self.path)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class PayoutBatcher:
+    """
+    Pays out accumulated earnings once per driver per batch, with checkpoints.
+    """
+    def __init__(
+        self,
+        ledger: EarningsLedger,
+        directory: str,
+        payout: Callable[..., Awaitable[Dict[str, Any]]] = payout_driver_async,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        journal: Optional[Ledger] = None,
+    ):
+        self.ledger = ledger
+        self.payout = payout
+        self.chunk_size = chunk_size
+        self.journal = journal
+        self._state_path = os.path.join(directory, STATE_FILE)
+        self._progress_path = os.path.join(directory, PROGRESS_FILE)
+        os.makedirs(directory, exist_ok=True)
+        self.state: Dict[str, Any] = {"paid_through": 0, "carry": {}, "batch": None}
+        if os.path.exists(self._state_path):
+            with open(self._state_path, "r", encoding="utf-8") as handle:
+                self.state = json.load(handle)
+
+    async def run_batch(self) -> Dict[str, Any]:
+        """
+        Opens a batch over all unpaid earnings, or resumes the open one, and
+        pays every driver in it that is not settled yet.
+
+        :return: A summary of the batch.
+        """
+        batch = self.state["batch"] or self._open_batch()
+        if batch is None:
+            return {"batch": None, "drivers": 0, "paid": 0, "declined": 0, "pending": 0}
+
+        paid, declined = self._load_progress(batch["id"])
+        pending = [driver_id for driver_id in batch["payouts"] if driver_id not in paid and driver_id not in declined]
+        if len(pending) < len(batch["payouts"]):
+            logger.info("Resuming payout batch %s with %d of %d drivers left",
+                        batch["id"], len(pending), len(batch["payouts"]))
+
+        failed = 0
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            outcomes = await asyncio.gather(*(
+                self._pay(batch["id"], driver_id, batch["payouts"][driver_id]) for driver_id in chunk
+            ))
+            progress = {"batch": batch["id"], "paid": [], "declined": {}}
+            for driver_id, outcome in zip(chunk, outcomes):
+                if outcome == "success":
+                    progress["paid"].append(driver_id)
+                    paid.add(driver_id)
+                elif outcome == "declined":
+                    progress["declined"][driver_id] = batch["payouts"][driver_id]
+                    declined[driver_id] = batch["payouts"][driver_id]
+                else:
+                    failed += 1
+            self._append_progress(progress)
+            await self._book_payouts(batch, progress["paid"])
+
+        summary = {
+            "batch": batch["id"],
+            "drivers": len(batch["payouts"]),
+            "paid": len(paid),
+            "declined": len(declined),
+            "pending": failed,
+        }
+        if failed:
+            logger.warning("Payout batch %s left %d payouts to retry", batch["id"], failed)
+        else:
+            self._close_batch(batch, declined)
+        return summary
+
+    def _open_batch(self) -> Optional[Dict[str, Any]]:
+        through_seq = self.ledger.last_seq
+        payouts = self.ledger.totals(self.state["paid_through"], through_seq)
+        for driver_id, amount_cents in self.state["carry"].items():
+            payouts[driver_id] = payouts.get(driver_id, 0) + amount_cents
+        payouts = {driver_id: amount_cents for driver_id, amount_cents in payouts.items() if amount_cents > 0}
+        if not payouts:
+            return None
+        batch = {"id": f"{int(time.time())}-{through_seq}", "through_seq": through_seq, "payouts": payouts}
+        # The batch is durable before the first payout goes out.
+        self.state = {"paid_through": self.state["paid_through"], "carry": {}, "batch": batch}
+        _write_json_atomically(self._state_path, self.state)
+        return batch
+
+    def _close_batch(self, batch: Dict[str, Any], declined: Dict[str, int]) -> None:
+        self.state = {"paid_through": batch["through_seq"], "carry": declined, "batch": None}
+        _write_json_atomically(self._state_path, self.state)
+        if os.path.exists(self._progress_path):
+            os.remove(self._progress_path)
+        self.ledger.compact(batch["through_seq"])
+        logger.info("Closed payout batch %s", batch["id"])
+
+    async def _book_payouts(self, batch: Dict[str, Any], paid: List[str]) -> None:
+        """
+        Books a chunk's payouts in the double-entry ledger once they are
+        checkpointed. A crash in between leaves them unbooked, never booked twice.
+        """
+        if self.journal is None or not paid:
+            return
+        await asyncio.gather(*(
+            post_payout(self.journal, f"payout-{batch['id']}-{driver_id}", driver_id, batch["payouts"][driver_id])
+            for driver_id in paid
+        ))
+
+    def _load_progress(self, batch_id: str):
+        paid = set()
+        declined: Dict[str, int] = {}
+        for record in _read_json_lines(self._progress_path):
+            if record.get("batch") == batch_id:
+                paid.update(record["paid"])
+                declined.update(record["declined"])
+        return paid, declined
+
+    def _append_progress(self, progress: Dict[str, Any]) -> None:
+        with open(self._progress_path, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(progress, separators=(",", ":")) + "\n")
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    async def _pay(self, batch_id: str, driver_id: str, amount_cents: int) -> str:
+        """
+        Pays one driver; returns "success", "declined" or "failed".
+        """
+        try:
+            result = await self.payout(driver_id, amount_cents / 100, idempotency_key=f"payout-{batch_id}-{driver_id}")
+        except GatewayError as e:
+            logger.error("Payout to driver %s failed: %s", driver_id, e)
+            return "failed"
+        return "success" if result and result.get("status") == "success" else "declined"
+
+
+def record_ride_earnings(ride: Dict[str, Any], ledger: Optional[EarningsLedger] = None) -> Optional[Earning]:
+    """
+    Records the driver's share of a finished ride's fare, once per ride. The
+    fare is the quote the rider is charged against (the cached or pinned one),
+    otherwise it is priced from the ride's pickup and dropoff.
+
+    :return: The recorded earning, or None if the ride was already recorded,
+        has no driver or cannot be priced.
+    """
+    if not ride.get("driver_id"):
+        return None
+    if ledger is None:
+        ledger = get_earnings_ledger()
+    if ride["ride_id"] in ledger:
+        return None
+    try:
+        quote = get_quote_service().resolve(ride["ride_id"], pinned=ride.get("fare_quote"))
+    except QuoteError as e:
+        logger.warning("Ignoring the quote pinned on ride %s: %s", ride["ride_id"], e)
+        quote = None
+    if quote is not None:
+        fare = quote.amount
+    else:
+        try:
+            fare = calculate_trip_fare(ride["pickup"], ride["dropoff"])
+        except ValueError as e:
+            logger.warning("No earnings recorded for ride %s: %s", ride["ride_id"], e)
+            return None
+    return ledger.record(ride["driver_id"], ride["ride_id"], fare * DRIVER_SHARE, fare)
+
+
+class PayoutBatchJob(AsyncPeriodicJob):
+    """
+    Periodically pays out drivers' accumulated earnings.
+    """
+    name = "payout-batch-job"
+
+    def __init__(self, batcher_provider: Callable[[], PayoutBatcher], interval_seconds: float = PAYOUT_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.batcher_provider = batcher_provider
+
+    async def run_once(self) -> Dict[str, Any]:
+        return await self.batcher_provider().run_batch()
+
+
+def get_earnings_ledger() -> EarningsLedger:
+    """
+    Returns the shared earnings ledger, stored under EARNINGS_DIR.
+    """
+    global _ledger
+    if _ledger is None:
+        _ledger = EarningsLedger(os.path.join(os.getenv("EARNINGS_DIR", DEFAULT_EARNINGS_DIR), LEDGER_FILE))
+    return _ledger
+
+
+def get_payout_batcher() -> PayoutBatcher:
+    """
+    Returns the shared payout batcher, checkpointing under EARNINGS_DIR in
+    chunks of PAYOUT_CHUNK_SIZE drivers.
+    """
+    global _batcher
+    if _batcher is None:
+        _batcher = PayoutBatcher(
+            get_earnings_ledger(),
+            os.getenv("EARNINGS_DIR", DEFAULT_EARNINGS_DIR),
+            chunk_size=int(os.getenv("PAYOUT_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)),
+            journal=get_ledger(),
+        )
+    return _batcher
+
+
+_ledger: Optional[EarningsLedger] = None
+_batcher: Optional[PayoutBatcher] = None
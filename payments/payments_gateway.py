@@ -0,0 +1,127 @@
+"""
+Async client for the external payment gateway.
+
+Charges and payouts are awaited over a pool of keep-alive HTTP connections
+instead of blocking the event loop. Each call has one overall deadline
+(waiting for a slot, connecting and reading), and a semaphore caps the calls
+in flight so a slow gateway cannot absorb every request handler; callers over
+the cap wait for a slot within their deadline.
+
+The gateway is configured with PAYMENT_GATEWAY_URL. Without it, payments go to
+the built-in mock APIs, run in a worker thread.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT_SECONDS = 5.0
+DEFAULT_MAX_CONNECTIONS = 20
+DEFAULT_MAX_CONCURRENCY = 50
+
+
+class GatewayError(Exception):
+    """
+    Raised when the payment gateway times out, cannot be reached or fails.
+    Declines are not errors; they come back as results with a non-success status.
+    """
+    pass
+
+
+class PaymentGatewayClient:
+    """
+    Pooled, concurrency-capped async client for the payment gateway API.
+    """
+    def __init__(
+        self,
+        base_url: str,
+        timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.max_concurrency = max_concurrency
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout_seconds,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def charge(self, rider_id: Any, amount: float, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Charges a rider.
+
+        :param idempotency_key: Sent as Idempotency-Key, so a retried call is applied once.
+        :return: The gateway's result; "status" is "success" unless declined.
+        :raises GatewayError: If the call fails or exceeds its deadline.
+        """
+        return await self._post("/v1/charges", {"rider_id": rider_id, "amount": amount}, idempotency_key)
+
+    async def payout(self, driver_id: Any, amount: float, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Pays a driver out.
+
+        :param idempotency_key: Sent as Idempotency-Key, so a retried call is applied once.
+        :return: The gateway's result; "status" is "success" unless rejected.
+        :raises GatewayError: If the call fails or exceeds its deadline.
+        """
+        return await self._post("/v1/payouts", {"driver_id": driver_id, "amount": amount}, idempotency_key)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def _post(self, path: str, payload: Dict[str, Any], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        try:
+            return await asyncio.wait_for(self._call(path, payload, headers), self.timeout_seconds)
+        except asyncio.TimeoutError as e:
+            raise GatewayError(f"Payment gateway timed out after {self.timeout_seconds}s on {path}") from e
+        except httpx.HTTPError as e:
+            raise GatewayError(f"Payment gateway request to {path} failed: {e}") from e
+
+    async def _call(self, path: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]]) -> Dict[str, Any]:
+        async with self._slots:
+            response = await self._client.post(path, json=payload, headers=headers)
+        if response.status_code >= 500:
+            raise GatewayError(f"Payment gateway returned {response.status_code} on {path}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise GatewayError(f"Payment gateway returned an invalid response on {path}") from e
+
+
+def get_payment_gateway() -> Optional[PaymentGatewayClient]:
+    """
+    Returns the shared gateway client, configured from PAYMENT_GATEWAY_URL,
+    PAYMENT_GATEWAY_TIMEOUT_SECONDS, PAYMENT_GATEWAY_MAX_CONNECTIONS and
+    PAYMENT_GATEWAY_MAX_CONCURRENCY, or None if no gateway is configured.
+    """
+    global _gateway
+    if _gateway is None and os.getenv("PAYMENT_GATEWAY_URL"):
+        _gateway = PaymentGatewayClient(
+            os.environ["PAYMENT_GATEWAY_URL"],
+            timeout_seconds=float(os.getenv("PAYMENT_GATEWAY_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS)),
+            max_connections=int(os.getenv("PAYMENT_GATEWAY_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)),
+            max_concurrency=int(os.getenv("PAYMENT_GATEWAY_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+        )
+    return _gateway
+
+
+async def close_payment_gateway() -> None:
+    """
+    Closes the shared gateway client's connections, if it was created.
+    """
+    global _gateway
+    if _gateway is not None:
+        await _gateway.aclose()
+        _gateway = None
+
+
+_gateway: Optional[PaymentGatewayClient] = None
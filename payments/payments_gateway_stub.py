@@ -0,0 +1,112 @@
+"""
+A local stand-in for the external payment gateway, for tests and benchmarks.
+
+Speaks just enough HTTP/1.1 over asyncio streams to serve the gateway API the
+client uses, with keep-alive, a configurable latency per call and declines for
+charges above a limit. It also records how many connections were opened and
+the peak number of calls in flight, so callers can check pooling and
+concurrency caps.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StubGateway:
+    """
+    In-process HTTP server imitating the payment gateway.
+
+    POST /v1/charges {"rider_id", "amount"} and POST /v1/payouts
+    {"driver_id", "amount"} answer after `latency_seconds` with
+    {"status": "success", ...}; charges above `decline_above` answer 402 with
+    {"status": "declined"}.
+    """
+    def __init__(self, latency_seconds: float = 0.3, decline_above: Optional[float] = None):
+        self.latency_seconds = latency_seconds
+        self.decline_above = decline_above
+        self.connections = 0
+        self.calls = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> "StubGateway":
+        self._server = await asyncio.start_server(self._serve_connection, host, port)
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "StubGateway":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                status, content = await self._handle(method, path, body)
+                payload = json.dumps(content).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: keep-alive\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, bytes]]:
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value.strip())
+        body = await reader.readexactly(length) if length else b""
+        return method, path, body
+
+    async def _handle(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        self.calls += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_seconds)
+            if method != "POST" or path not in ("/v1/charges", "/v1/payouts"):
+                return 404, {"error": "not found"}
+            request = json.loads(body or b"{}")
+            if path == "/v1/charges":
+                if self.decline_above is not None and request.get("amount", 0) > self.decline_above:
+                    return 402, {"status": "declined", "reason": "insufficient_funds"}
+                return 200, {"status": "success", "transaction_id": uuid.uuid4().hex}
+            return 200, {"status": "success", "payout_id": uuid.uuid4().hex}
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,373 @@
+"""
+Double-entry ledger of rider charges, driver earnings and payouts.
+
+Every money movement is a transaction whose postings (account, amount in
+cents) sum to zero. Transactions are appended to a journal file and never
+rewritten; balances are materialised per account in memory as transactions
+commit, so reading one is a dict lookup. Sign convention: positive balances
+are owed to the platform, negative ones are owed by it.
+
+    ride completed:  rider +fare, driver -share, platform:revenue -commission
+    rider charged:   platform:cash +amount, rider -amount
+    driver paid:     driver +amount, platform:cash -amount
+
+So a rider's balance is what they owe, and minus a driver's balance is what
+they have earned and not yet been paid.
+
+Commits are grouped: transactions posted while the journal is being synced
+wait and are written together with one write and one fsync, so the cost of
+durability is shared by everyone posting at the same time. Balances are
+snapshotted periodically with the journal offset they cover; on startup the
+snapshot is loaded and only the journal after it is replayed. The whole set of
+balances can also be rebuilt from the journal alone with replay_journal.
+
+Journal lines are tab-separated: seq, timestamp, kind, reference, then
+account and amount pairs.
+
+Charges are booked at most once per reference: the same ride can be charged
+from the request path and from the retry queue, under one gateway idempotency
+key, and the ledger must not count it twice. The references of such
+transactions are kept with the balances and restored the same way.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_DIR = os.path.join("data", "ledger")
+JOURNAL_FILE = "journal.log"
+SNAPSHOT_FILE = "balances.json"
+# Upper bound on transactions written by one group commit.
+MAX_GROUP_SIZE = 1000
+SNAPSHOT_INTERVAL_SECONDS = 300.0
+# Bytes read per chunk when replaying the journal.
+REPLAY_CHUNK_BYTES = 1 << 20
+
+PLATFORM_CASH = "platform:cash"
+PLATFORM_REVENUE = "platform:revenue"
+# Transaction kinds booked at most once per reference.
+IDEMPOTENT_KINDS = frozenset({"charge"})
+
+
+class LedgerError(Exception):
+    """
+    Raised for unbalanced or malformed transactions and journal write failures.
+    """
+    pass
+
+
+class Transaction(NamedTuple):
+    """
+    A committed journal entry.
+    """
+    seq: int
+    timestamp: float
+    kind: str
+    reference: str
+    postings: Tuple[Tuple[str, int], ...]
+
+
+def rider_account(rider_id) -> str:
+    return f"rider:{rider_id}"
+
+
+def driver_account(driver_id) -> str:
+    return f"driver:{driver_id}"
+
+
+def encode_transaction(transaction: Transaction) -> bytes:
+    fields = [str(transaction.seq), f"{transaction.timestamp:.3f}", transaction.kind, transaction.reference]
+    for account, amount in transaction.postings:
+        fields.append(account)
+        fields.append(str(amount))
+    return ("\t".join(fields) + "\n").encode()
+
+
+def idempotency_key(kind: str, reference: str) -> str:
+    return f"{kind}\t{reference}"
+
+
+def replay_journal(
+    path: str,
+    offset: int = 0,
+    balances: Optional[Dict[str, int]] = None,
+    references: Optional[Set[str]] = None
+) -> Tuple[Dict[str, int], int, int]:
+    """
+    Streams a journal from an offset and applies its postings to balances.
+
+    Reads large chunks and only splits out the account and amount fields, so
+    a rebuild touches each byte a few times. A torn last line (a crash mid
+    write) ends the replay.
+
+    :param path: The journal file.
+    :param offset: Where to start reading; the end offset of a snapshot.
+    :param balances: Balances to continue from; empty if omitted.
+    :param references: If given, collects the idempotency keys of replayed
+        transactions of IDEMPOTENT_KINDS.
+    :return: The balances, the last sequence number replayed (0 if none) and
+        the offset just past the last complete line.
+    """
+    balances = {} if balances is None else balances
+    last_seq = 0
+    if not os.path.exists(path):
+        return balances, last_seq, offset
+    # Sums are kept per raw account bytes; each account is decoded once at the end.
+    sums: Dict[bytes, int] = {}
+    get = sums.get
+    idempotent_kinds = {kind.encode() for kind in IDEMPOTENT_KINDS} if references is not None else set()
+    with open(path, "rb") as journal:
+        journal.seek(offset)
+        tail = b""
+        while True:
+            chunk = journal.read(REPLAY_CHUNK_BYTES)
+            if not chunk:
+                break
+            data = tail + chunk
+            lines = data.split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                fields = line.split(b"\t")
+                if fields[2] in idempotent_kinds:
+                    references.add(idempotency_key(fields[2].decode(), fields[3].decode()))
+                for i in range(4, len(fields), 2):
+                    account = fields[i]
+                    sums[account] = get(account, 0) + int(fields[i + 1])
+            if lines:
+                last_seq = int(lines[-1].split(b"\t", 1)[0])
+            offset += len(data) - len(tail)
+    for account, amount in sums.items():
+        name = account.decode()
+        balances[name] = balances.get(name, 0) + amount
+    if tail:
+        logger.warning("Ignoring incomplete transaction at the end of %s", path)
+    return balances, last_seq, offset
+
+
+class Ledger:
+    """
+    Append-only double-entry journal with materialised balances.
+
+    Posting is async and returns once the transaction is durable. Balance
+    reads are safe from any thread. Used from one event loop.
+    """
+    def __init__(self, directory: str, max_group_size: int = MAX_GROUP_SIZE, clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.max_group_size = max_group_size
+        self.clock = clock
+        self._journal_path = os.path.join(directory, JOURNAL_FILE)
+        self._snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        os.makedirs(directory, exist_ok=True)
+
+        balances: Dict[str, int] = {}
+        offset = 0
+        self._seq = 0
+        # Idempotency keys of committed transactions, and of those being committed.
+        self._references: Set[str] = set()
+        self._posting: Set[str] = set()
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, "r", encoding="utf-8") as handle:
+                snapshot = json.load(handle)
+            balances, offset, self._seq = snapshot["balances"], snapshot["offset"], snapshot["seq"]
+            self._references = set(snapshot.get("references", ()))
+        self._balances, last_seq, self._offset = replay_journal(
+            self._journal_path, offset, balances, self._references
+        )
+        self._seq = self._committed_seq = max(self._seq, last_seq)
+
+        self._journal = open(self._journal_path, "ab")
+        # Drop a torn tail so new transactions start on a line of their own.
+        self._journal.truncate(self._offset)
+        self._pending: List[Tuple[Transaction, asyncio.Future]] = []
+        self._committer: Optional[asyncio.Task] = None
+        self.commits = 0
+        self.transactions = 0
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def balance(self, account: str) -> int:
+        """
+        Returns an account's balance in cents.
+        """
+        return self._balances.get(account, 0)
+
+    def balances(self) -> Dict[str, int]:
+        return dict(self._balances)
+
+    async def post(self, kind: str, reference: str, postings: Dict[str, int]) -> Optional[Transaction]:
+        """
+        Appends a balanced transaction and waits until it is durable.
+
+        :param kind: What happened, e.g. "fare", "charge" or "payout".
+        :param reference: What it happened to, e.g. "ride:42".
+        :param postings: Amounts in cents per account; they must sum to zero.
+        :return: The committed transaction, or None if the kind is one of
+            IDEMPOTENT_KINDS and the reference was already booked.
+        :raises LedgerError: If the transaction is malformed or the journal cannot be written.
+        """
+        entries = tuple((account, int(amount)) for account, amount in postings.items() if amount)
+        if sum(amount for _, amount in entries) != 0:
+            raise LedgerError(f"Unbalanced {kind} transaction for {reference}: {postings}")
+        if any(("\t" in text or "\n" in text) for text in (kind, reference, *postings)):
+            raise LedgerError("Kinds, references and accounts cannot contain tabs or newlines")
+        if kind in IDEMPOTENT_KINDS:
+            key = idempotency_key(kind, reference)
+            if key in self._references or key in self._posting:
+                logger.info("Skipping duplicate %s transaction for %s", kind, reference)
+                return None
+            self._posting.add(key)
+
+        self._seq += 1
+        transaction = Transaction(self._seq, self.clock(), kind, reference, entries)
+        committed = asyncio.get_running_loop().create_future()
+        self._pending.append((transaction, committed))
+        if self._committer is None:
+            self._committer = asyncio.get_running_loop().create_task(self._commit_pending())
+        return await committed
+
+    async def flush(self) -> None:
+        """
+        Waits for every transaction posted so far to commit.
+        """
+        while self._committer is not None:
+            await asyncio.shield(self._committer)
+
+    async def _commit_pending(self) -> None:
+        try:
+            while self._pending:
+                group = self._pending[:self.max_group_size]
+                del self._pending[:self.max_group_size]
+                data = b"".join(encode_transaction(transaction) for transaction, _ in group)
+                try:
+                    await asyncio.to_thread(self._write, data)
+                except OSError as e:
+                    logger.error("Ledger commit of %d transactions failed: %s", len(group), e)
+                    for transaction, committed in group:
+                        self._posting.discard(idempotency_key(transaction.kind, transaction.reference))
+                        if not committed.done():
+                            committed.set_exception(LedgerError(f"Could not write ledger journal: {e}"))
+                    continue
+                self._offset += len(data)
+                balances = self._balances
+                for transaction, committed in group:
+                    for account, amount in transaction.postings:
+                        balances[account] = balances.get(account, 0) + amount
+                    if transaction.kind in IDEMPOTENT_KINDS:
+                        key = idempotency_key(transaction.kind, transaction.reference)
+                        self._posting.discard(key)
+                        self._references.add(key)
+                    if not committed.done():
+                        committed.set_result(transaction)
+                self._committed_seq = group[-1][0].seq
+                self.commits += 1
+                self.transactions += len(group)
+        finally:
+            self._committer = None
+
+    def _write(self, data: bytes) -> None:
+        try:
+            self._journal.write(data)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+        except OSError:
+            # Cut off a partial write so the journal never holds a torn group.
+            self._journal.truncate(self._offset)
+            raise
+
+    def snapshot(self) -> int:
+        """
+        Writes the committed balances and the journal offset they cover.
+
+        :return: The sequence number covered.
+        """
+        snapshot = {
+            "offset": self._offset,
+            "seq": self._committed_seq,
+            "balances": self._balances,
+            "references": sorted(self._references),
+        }
+        temp_path = f"{self._snapshot_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as handle:
+            json.dump(snapshot, handle, separators=(",", ":"))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(temp_path, self._snapshot_path)
+        return snapshot["seq"]
+
+    def rebuild(self) -> Dict[str, int]:
+        """
+        Recomputes every balance from the journal alone and returns them.
+        """
+        balances, _, _ = replay_journal(self._journal_path)
+        return balances
+
+    def close(self) -> None:
+        self._journal.close()
+
+
+async def post_ride_fare(ledger: Ledger, ride_id: int, rider_id, driver_id, fare_cents: int, driver_cents: int) -> Transaction:
+    """
+    Books a completed ride: the rider owes the fare, the driver earns their share.
+    """
+    return await ledger.post("fare", f"ride:{ride_id}", {
+        rider_account(rider_id): fare_cents,
+        driver_account(driver_id): -driver_cents,
+        PLATFORM_REVENUE: driver_cents - fare_cents,
+    })
+
+
+async def post_charge(ledger: Ledger, ride_id: int, rider_id, amount_cents: int) -> Optional[Transaction]:
+    """
+    Books a successful charge of a rider, once per ride.
+
+    :return: The committed transaction, or None if the ride's charge was already booked.
+    """
+    return await ledger.post("charge", f"ride:{ride_id}", {
+        PLATFORM_CASH: amount_cents,
+        rider_account(rider_id): -amount_cents,
+    })
+
+
+async def post_payout(ledger: Ledger, reference: str, driver_id, amount_cents: int) -> Transaction:
+    """
+    Books a payout to a driver.
+    """
+    return await ledger.post("payout", reference, {
+        driver_account(driver_id): amount_cents,
+        PLATFORM_CASH: -amount_cents,
+    })
+
+
+class LedgerSnapshotJob(AsyncPeriodicJob):
+    """
+    Periodically snapshots ledger balances so restarts replay only the journal tail.
+    """
+    name = "ledger-snapshot-job"
+
+    def __init__(self, ledger_provider: Callable[[], Ledger], interval_seconds: float = SNAPSHOT_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.ledger_provider = ledger_provider
+
+    def run_once(self) -> int:
+        return self.ledger_provider().snapshot()
+
+
+def get_ledger() -> Ledger:
+    """
+    Returns the shared ledger, stored under LEDGER_DIR.
+    """
+    global _ledger
+    if _ledger is None:
+        _ledger = Ledger(os.getenv("LEDGER_DIR", DEFAULT_LEDGER_DIR))
+    return _ledger
+
+
+_ledger: Optional[Ledger] = None
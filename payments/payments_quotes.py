@@ -0,0 +1,253 @@
+"""
+Fare quotes: priced once at ride request, reused at payment.
+
+A quote is returned to the client as a compact token: the quote's fields and
+an HMAC-SHA256 tag over them, both base64url-encoded. Any process holding the
+signing key (FARE_QUOTE_SECRET) can verify a token and read the amount without
+looking anything up. Quotes are also cached server-side by ride for their TTL,
+so a payment that arrives without its token still skips repricing.
+
+The TTL bounds how long a client may present a token, not how long a ride's
+price holds: the token is also pinned on the ride record, and the pinned quote,
+or a token identical to it, is charged however long the ride takes.
+"""
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+
+from payments.payments_service import calculate_trip_fare
+from payments.payments_surge import surge_engine
+from utils.auth import SECRET_KEY
+from utils.geolocation import parse_coordinates
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = "q1"
+# How long a quote can be paid against.
+DEFAULT_QUOTE_TTL_SECONDS = 15 * 60.0
+# Upper bound on cached quotes; the oldest are evicted first.
+DEFAULT_MAX_QUOTES = 100_000
+# Bytes of the HMAC tag kept in the token.
+TAG_BYTES = 16
+
+
+class QuoteError(Exception):
+    """
+    Raised for quote tokens that are malformed, forged, expired or for another ride.
+    """
+    pass
+
+
+class FareQuote(NamedTuple):
+    """
+    A priced fare for one ride.
+    """
+    quote_id: str
+    ride_id: int
+    rider_id: Optional[int]
+    amount_cents: int
+    surge_multiplier: float
+    expires_at: float
+
+    @property
+    def amount(self) -> float:
+        return self.amount_cents / 100
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class QuoteSigner:
+    """
+    Encodes quotes into signed tokens and verifies them statelessly.
+    """
+    def __init__(self, secret: str, clock: Callable[[], float] = time.time):
+        self._key = hashlib.sha256(f"fare-quote:{secret}".encode()).digest()
+        self.clock = clock
+
+    def _tag(self, payload: bytes) -> bytes:
+        return hmac.new(self._key, payload, hashlib.sha256).digest()[:TAG_BYTES]
+
+    def sign(self, quote: FareQuote) -> str:
+        """
+        Returns the token for a quote.
+        """
+        fields = (
+            TOKEN_VERSION,
+            quote.quote_id,
+            str(quote.ride_id),
+            "" if quote.rider_id is None else str(quote.rider_id),
+            str(quote.amount_cents),
+            repr(quote.surge_multiplier),
+            str(int(quote.expires_at)),
+        )
+        payload = "|".join(fields).encode()
+        return f"{_b64encode(payload)}.{_b64encode(self._tag(payload))}"
+
+    def verify(self, token: str, ride_id: Optional[int] = None, check_expiry: bool = True) -> FareQuote:
+        """
+        Checks a token's signature and expiry and returns its quote.
+
+        :param token: A token produced by sign().
+        :param ride_id: If given, the ride the quote must be for.
+        :param check_expiry: False to accept an expired token, e.g. one pinned on its ride.
+        :raises QuoteError: If the token is invalid, expired or for another ride.
+        """
+        try:
+            encoded_payload, encoded_tag = token.split(".")
+            payload, tag = _b64decode(encoded_payload), _b64decode(encoded_tag)
+        except (ValueError, AttributeError) as e:
+            raise QuoteError("Malformed fare quote") from e
+        if not hmac.compare_digest(tag, self._tag(payload)):
+            raise QuoteError("Invalid fare quote signature")
+
+        version, quote_id, quote_ride_id, rider_id, amount_cents, surge, expires_at = payload.decode().split("|")
+        if version != TOKEN_VERSION:
+            raise QuoteError("Unsupported fare quote version")
+        quote = FareQuote(
+            quote_id=quote_id,
+            ride_id=int(quote_ride_id),
+            rider_id=int(rider_id) if rider_id else None,
+            amount_cents=int(amount_cents),
+            surge_multiplier=float(surge),
+            expires_at=float(expires_at),
+        )
+        if check_expiry and quote.expires_at <= self.clock():
+            raise QuoteError("Fare quote has expired")
+        if ride_id is not None and quote.ride_id != ride_id:
+            raise QuoteError("Fare quote is for another ride")
+        return quote
+
+
+class QuoteCache:
+    """
+    Bounded cache of the latest quote per ride, expiring with the quotes.
+
+    Quotes share one TTL, so entries are kept in creation order and expired or
+    excess ones are always at the front. Used from the event loop only.
+    """
+    def __init__(self, max_entries: int = DEFAULT_MAX_QUOTES, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._quotes: "OrderedDict[int, Tuple[FareQuote, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+    def put(self, quote: FareQuote, token: str) -> None:
+        self._quotes.pop(quote.ride_id, None)
+        self._quotes[quote.ride_id] = (quote, token)
+        self._evict()
+
+    def get(self, ride_id: int) -> Optional[Tuple[FareQuote, str]]:
+        """
+        Returns the live quote and token for a ride, if any.
+        """
+        self._evict()
+        return self._quotes.get(ride_id)
+
+    def _evict(self) -> None:
+        now = self.clock()
+        quotes = self._quotes
+        while quotes:
+            quote, _ = next(iter(quotes.values()))
+            if quote.expires_at > now and len(quotes) <= self.max_entries:
+                break
+            quotes.popitem(last=False)
+
+
+class QuoteService:
+    """
+    Issues, caches and resolves fare quotes.
+    """
+    def __init__(
+        self,
+        signer: QuoteSigner,
+        cache: QuoteCache,
+        ttl_seconds: float = DEFAULT_QUOTE_TTL_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.signer = signer
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+    def issue(self, ride_id: int, rider_id: Optional[int], amount: float, surge_multiplier: float) -> Tuple[FareQuote, str]:
+        """
+        Creates, signs and caches a quote for a priced ride.
+
+        :return: The quote and its token.
+        """
+        quote = FareQuote(
+            quote_id=uuid.uuid4().hex[:12],
+            ride_id=ride_id,
+            rider_id=rider_id,
+            amount_cents=int(round(amount * 100)),
+            surge_multiplier=surge_multiplier,
+            expires_at=float(int(self.clock() + self.ttl_seconds)),
+        )
+        token = self.signer.sign(quote)
+        self.cache.put(quote, token)
+        return quote, token
+
+    def quote_ride(self, ride_id: int, rider_id: Optional[int], pickup: Any, dropoff: Any) -> Optional[Tuple[FareQuote, str]]:
+        """
+        Prices a ride from its pickup and dropoff at the pickup zone's current
+        surge and issues a quote for it.
+
+        :return: The quote and its token, or None if either location has no coordinates.
+        """
+        if parse_coordinates(pickup) is None or parse_coordinates(dropoff) is None:
+            return None
+        surge_multiplier = surge_engine.multiplier_at(pickup)
+        fare = calculate_trip_fare(pickup, dropoff, surge_multiplier)
+        return self.issue(ride_id, rider_id, fare, surge_multiplier)
+
+    def resolve(self, ride_id: int, token: Optional[str] = None, pinned: Optional[str] = None) -> Optional[FareQuote]:
+        """
+        Returns the quote to charge a ride against: the token's, verified
+        without any lookup, or else the cached one, or else the one pinned on
+        the ride. The pinned quote never expires, nor does a token identical to it.
+
+        :param ride_id: The ride being charged.
+        :param token: The token the client sent, if any.
+        :param pinned: The token stored on the ride record, if any.
+        :raises QuoteError: If a token is given but invalid.
+        """
+        if token:
+            return self.signer.verify(token, ride_id, check_expiry=token != pinned)
+        cached = self.cache.get(ride_id)
+        if cached is not None:
+            return cached[0]
+        if pinned:
+            return self.signer.verify(pinned, ride_id, check_expiry=False)
+        return None
+
+
+def get_quote_service() -> QuoteService:
+    """
+    Returns the shared quote service, configured from FARE_QUOTE_SECRET,
+    FARE_QUOTE_TTL_SECONDS and FARE_QUOTE_MAX_ENTRIES.
+    """
+    global _service
+    if _service is None:
+        _service = QuoteService(
+            QuoteSigner(os.getenv("FARE_QUOTE_SECRET", SECRET_KEY)),
+            QuoteCache(int(os.getenv("FARE_QUOTE_MAX_ENTRIES", DEFAULT_MAX_QUOTES))),
+            ttl_seconds=float(os.getenv("FARE_QUOTE_TTL_SECONDS", DEFAULT_QUOTE_TTL_SECONDS)),
+        )
+    return _service
+
+
+_service: Optional[QuoteService] = None
@@ -0,0 +1,252 @@
+"""
+Reconciles payment records against the gateway's settlement files.
+
+Both sides are streamed in order of a shared key: our rows through a
+server-side cursor read in chunks, ordered by primary key, and the
+settlement file (a CSV of reference,amount sorted by reference) line by line.
+A merge-join walks the two streams in step, so memory stays constant however
+large the tables are, and every mismatch is written to the output CSV as soon
+as it is found:
+
+    missing_at_gateway   we have the row, the settlement file does not
+    missing_in_records   the settlement file has it, we do not
+    amount_mismatch      both have it with different amounts
+    duplicate_*          a reference appears twice on one side
+
+Charges are matched against completed PaymentRecord rows and payouts against
+PayoutDetail rows, each keyed by row id. The gateway only sees our idempotency
+keys (charge-<quote id>, payout-<batch>-<driver>), so the settlement files must
+first be mapped to the matching row ids; the reference column is not the
+gateway's own key.
+
+Usage:
+    python -m payments.payments_reconcile --charges charges.csv --payouts payouts.csv \\
+        --output mismatches.csv [--database-url sqlite:///uber_lite.db]
+"""
+import argparse
+import csv
+import logging
+import sys
+import time
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Column, Table, create_engine, select
+from sqlalchemy.engine import Connection
+
+from config import get_database_url
+from payments.payments_models import PaymentRecord, PayoutDetail
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the database per round trip.
+DEFAULT_CHUNK_SIZE = 10_000
+# How often progress is logged.
+PROGRESS_EVERY_ROWS = 1_000_000
+
+Row = Tuple[int, int]
+
+MISMATCH_FIELDS = ("source", "reference", "kind", "our_amount", "gateway_amount")
+
+
+class ReconciliationError(Exception):
+    """
+    Raised when an input cannot be merged, e.g. a settlement file out of order.
+    """
+    pass
+
+
+class ReconciliationStats(NamedTuple):
+    """
+    Counts and throughput of one reconciliation.
+    """
+    source: str
+    rows: int
+    matched: int
+    mismatches: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def to_cents(amount: Any) -> int:
+    """
+    Converts an amount in currency units (a number or a decimal string) to integer cents.
+    """
+    return int(round(float(amount) * 100))
+
+
+def stream_table(
+    connection: Connection,
+    key: Column,
+    amount: Column,
+    where: Any = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Row]:
+    """
+    Streams (key, amount in cents) rows in key order through a server-side
+    cursor, fetching chunk_size rows at a time.
+    """
+    query = select(key, amount).order_by(key)
+    if where is not None:
+        query = query.where(where)
+    result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(query)
+    for partition in result.partitions():
+        for row_key, row_amount in partition:
+            yield row_key, to_cents(row_amount)
+
+
+def stream_settlement(lines: Iterable[str]) -> Iterator[Row]:
+    """
+    Streams (reference, amount in cents) rows from a settlement CSV with a
+    reference,amount header.
+
+    :raises ReconciliationError: If a row is malformed.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    if [name.strip().lower() for name in header[:2]] != ["reference", "amount"]:
+        raise ReconciliationError(f"Settlement file must start with a reference,amount header, got {header}")
+    for line_number, fields in enumerate(reader, start=2):
+        try:
+            yield int(fields[0]), to_cents(fields[1])
+        except (IndexError, ValueError) as e:
+            raise ReconciliationError(f"Malformed settlement row {line_number}: {fields}") from e
+
+
+def merge_join(ours: Iterable[Row], theirs: Iterable[Row]) -> Iterator[Tuple[str, int, Optional[int], Optional[int]]]:
+    """
+    Merge-joins two key-ordered row streams, yielding each joined row as
+    (kind, key, our amount, gateway amount), where kind is "match" or one of
+    the mismatch kinds. Holds one row of each side at a time.
+
+    :raises ReconciliationError: If either stream is not in ascending key order.
+    """
+    ours, theirs = iter(ours), iter(theirs)
+    mine, other = next(ours, None), next(theirs, None)
+    last_mine = last_other = None
+    while mine is not None or other is not None:
+        if mine is not None and last_mine is not None and mine[0] <= last_mine:
+            if mine[0] < last_mine:
+                raise ReconciliationError(f"Records are not sorted: {mine[0]} after {last_mine}")
+            yield "duplicate_in_records", mine[0], mine[1], None
+            mine = next(ours, None)
+            continue
+        if other is not None and last_other is not None and other[0] <= last_other:
+            if other[0] < last_other:
+                raise ReconciliationError(f"Settlement file is not sorted: {other[0]} after {last_other}")
+            yield "duplicate_at_gateway", other[0], None, other[1]
+            other = next(theirs, None)
+            continue
+
+        if other is None or (mine is not None and mine[0] < other[0]):
+            yield "missing_at_gateway", mine[0], mine[1], None
+            last_mine, mine = mine[0], next(ours, None)
+        elif mine is None or other[0] < mine[0]:
+            yield "missing_in_records", other[0], None, other[1]
+            last_other, other = other[0], next(theirs, None)
+        else:
+            yield ("match" if mine[1] == other[1] else "amount_mismatch"), mine[0], mine[1], other[1]
+            last_mine, mine = mine[0], next(ours, None)
+            last_other, other = other[0], next(theirs, None)
+
+
+def reconcile(source: str, ours: Iterable[Row], theirs: Iterable[Row], writer: Any) -> ReconciliationStats:
+    """
+    Reconciles one pair of streams, writing each mismatch to a csv writer as it is found.
+
+    :param source: Label for the output, e.g. "charges".
+    :param writer: A csv.writer for the mismatch rows.
+    :return: The reconciliation's counts and timing.
+    """
+    started = time.perf_counter()
+    rows = matched = mismatches = 0
+    for kind, key, our_amount, gateway_amount in merge_join(ours, theirs):
+        rows += 1
+        if kind == "match":
+            matched += 1
+        else:
+            mismatches += 1
+            writer.writerow((
+                source, key, kind,
+                "" if our_amount is None else f"{our_amount / 100:.2f}",
+                "" if gateway_amount is None else f"{gateway_amount / 100:.2f}",
+            ))
+        if rows % PROGRESS_EVERY_ROWS == 0:
+            elapsed = time.perf_counter() - started
+            logger.info("Reconciled %d %s rows (%.0f rows/s), %d mismatches", rows, source, rows / elapsed, mismatches)
+    return ReconciliationStats(source, rows, matched, mismatches, time.perf_counter() - started)
+
+
+def reconcile_payments(
+    connection: Connection,
+    output: Any,
+    charges_path: Optional[str] = None,
+    payouts_path: Optional[str] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> List[ReconciliationStats]:
+    """
+    Reconciles completed PaymentRecord rows against a charges settlement file
+    and PayoutDetail rows against a payouts settlement file, writing
+    mismatches to output.
+    """
+    # The tables are read through Core so no ORM state is built per row.
+    payments: Table = PaymentRecord.__table__
+    payouts: Table = PayoutDetail.__table__
+    writer = csv.writer(output)
+    writer.writerow(MISMATCH_FIELDS)
+    stats = []
+    if charges_path:
+        with open(charges_path, "r", encoding="utf-8", newline="") as settlement:
+            stats.append(reconcile(
+                "charges",
+                stream_table(connection, payments.c.id, payments.c.amount, payments.c.status == "completed", chunk_size),
+                stream_settlement(settlement),
+                writer,
+            ))
+    if payouts_path:
+        with open(payouts_path, "r", encoding="utf-8", newline="") as settlement:
+            stats.append(reconcile(
+                "payouts",
+                stream_table(connection, payouts.c.id, payouts.c.payout_amount, chunk_size=chunk_size),
+                stream_settlement(settlement),
+                writer,
+            ))
+    return stats
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--charges", help="charges settlement CSV, sorted by reference")
+    parser.add_argument("--payouts", help="payouts settlement CSV, sorted by reference")
+    parser.add_argument("--output", default="-", help="mismatch CSV to write; stdout by default")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+    if not args.charges and not args.payouts:
+        parser.error("at least one of --charges and --payouts is required")
+
+    engine = create_engine(args.database_url or get_database_url())
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        with engine.connect() as connection:
+            stats = reconcile_payments(connection, output, args.charges, args.payouts, args.chunk_size)
+    except ReconciliationError as e:
+        print(f"Reconciliation failed: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        engine.dispose()
+
+    for stat in stats:
+        print(f"{stat.source}: {stat.rows:,} rows, {stat.matched:,} matched, {stat.mismatches:,} mismatches "
+              f"in {stat.seconds:.1f}s ({stat.rows_per_second:,.0f} rows/s)", file=sys.stderr)
+    return 0 if all(stat.mismatches == 0 for stat in stats) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
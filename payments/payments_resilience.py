@@ -0,0 +1,253 @@
+"""
+Circuit breakers and bulkheads around the external payment and payout APIs.
+
+Charges and payouts each go through their own guard, made of:
+
+  - a bulkhead: a cap on the calls of that kind in flight. Callers over the
+    cap wait briefly for a slot and are then rejected, so a payout outage can
+    tie up at most the payout slots and never the capacity rider charges need;
+  - a circuit breaker: after FAILURE_THRESHOLD consecutive failures it opens
+    and rejects calls at once instead of letting each one wait out its
+    timeout. After RESET_TIMEOUT_SECONDS it lets a single trial call through
+    (half-open); success closes it again, failure reopens it.
+
+Rejections raise GatewayError subclasses, so callers already handling gateway
+failures (the payment endpoint, the payout batcher) treat them the same way.
+The charge retrier is the exception: it holds retries back while the charges
+breaker is open, sends one as the half-open trial, and reschedules a rejected
+retry without counting it as an attempt (see payments_retries).
+Declines are results rather than failures and never trip a breaker. State
+transitions and rejection counts are kept per guard and served by
+payment_guard_stats().
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from payments.payments_gateway import GatewayError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+CHARGES = "charges"
+PAYOUTS = "payouts"
+
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT_SECONDS = 30.0
+# Calls in flight per kind, and how long callers over the cap wait for a slot.
+# Payouts run in batches and can wait; charges are on the request path.
+DEFAULT_BULKHEADS = {
+    CHARGES: (40, 1.0),
+    PAYOUTS: (10, 30.0),
+}
+
+
+class CircuitOpenError(GatewayError):
+    """
+    Raised when a call is rejected because its circuit breaker is open.
+    """
+    pass
+
+
+class BulkheadFullError(GatewayError):
+    """
+    Raised when a call is rejected because its bulkhead has no free slot.
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker counting consecutive failures.
+
+    Used from one event loop.
+    """
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout_seconds: float = DEFAULT_RESET_TIMEOUT_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.clock = clock
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._failures = 0
+        self._trial_in_flight = False
+        self.transitions = {OPEN: 0, HALF_OPEN: 0, CLOSED: 0}
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.reset_timeout_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def acquire(self) -> None:
+        """
+        Admits a call, or rejects it if the breaker is open or its half-open trial is taken.
+
+        :raises CircuitOpenError: If the call is rejected.
+        """
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return
+        self.rejected += 1
+        raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+
+    def release(self, succeeded: Optional[bool]) -> None:
+        """
+        Records the outcome of an admitted call; None if it never reached the API.
+        """
+        if self._state == HALF_OPEN and self._trial_in_flight:
+            self._trial_in_flight = False
+            if succeeded is True:
+                self._transition(CLOSED)
+            elif succeeded is False:
+                self._open()
+        elif self._state == CLOSED:
+            if succeeded is True:
+                self._failures = 0
+            elif succeeded is False:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._open()
+
+    def _open(self) -> None:
+        self._opened_at = self.clock()
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        previous, self._state = self._state, state
+        self._failures = 0
+        self.transitions[state] += 1
+        log = logger.warning if state == OPEN else logger.info
+        log("Circuit breaker for %s went from %s to %s", self.name, previous, state)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "transitions": dict(self.transitions),
+            "rejected": self.rejected,
+        }
+
+
+class Bulkhead:
+    """
+    Caps the calls of one kind in flight; callers over the cap wait up to
+    max_wait_seconds for a slot, then are rejected.
+    """
+    def __init__(self, name: str, max_concurrent: int, max_wait_seconds: float = 0.0):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait_seconds = max_wait_seconds
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.in_flight = 0
+        self.rejected = 0
+
+    async def acquire(self) -> None:
+        """
+        :raises BulkheadFullError: If no slot frees up in time.
+        """
+        if self._slots.locked():
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait_seconds)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise BulkheadFullError(
+                    f"All {self.max_concurrent} {self.name} slots are busy"
+                ) from None
+        else:
+            await self._slots.acquire()
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"max_concurrent": self.max_concurrent, "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+class PaymentGuard:
+    """
+    A circuit breaker and a bulkhead around one kind of external call, used as:
+
+        async with guard:
+            result = await api_call()
+
+    The breaker is checked first, so an open circuit rejects without waiting for a slot.
+    """
+    def __init__(self, breaker: CircuitBreaker, bulkhead: Bulkhead):
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+
+    async def __aenter__(self) -> "PaymentGuard":
+        self.breaker.acquire()
+        try:
+            await self.bulkhead.acquire()
+        except BaseException:
+            self.breaker.release(None)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> bool:
+        self.bulkhead.release()
+        if exc_type is None:
+            self.breaker.release(True)
+        elif issubclass(exc_type, Exception):
+            self.breaker.release(False)
+        else:
+            # Cancelled: the call says nothing about the API's health.
+            self.breaker.release(None)
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.breaker.stats(), "bulkhead": self.bulkhead.stats()}
+
+
+def get_payment_guard(kind: str) -> PaymentGuard:
+    """
+    Returns the shared guard for CHARGES or PAYOUTS, configured from
+    PAYMENT_BREAKER_FAILURE_THRESHOLD, PAYMENT_BREAKER_RESET_SECONDS and
+    <KIND>_BULKHEAD_SIZE / <KIND>_BULKHEAD_WAIT_SECONDS.
+    """
+    guard = _guards.get(kind)
+    if guard is None:
+        size, wait = DEFAULT_BULKHEADS[kind]
+        prefix = kind.upper()
+        guard = _guards[kind] = PaymentGuard(
+            CircuitBreaker(
+                kind,
+                failure_threshold=int(os.getenv("PAYMENT_BREAKER_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD)),
+                reset_timeout_seconds=float(os.getenv("PAYMENT_BREAKER_RESET_SECONDS", DEFAULT_RESET_TIMEOUT_SECONDS)),
+            ),
+            Bulkhead(
+                kind,
+                int(os.getenv(f"{prefix}_BULKHEAD_SIZE", size)),
+                float(os.getenv(f"{prefix}_BULKHEAD_WAIT_SECONDS", wait)),
+            ),
+        )
+    return guard
+
+
+def payment_guard_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Returns breaker state, transitions and rejections for charges and payouts.
+    """
+    return {kind: get_payment_guard(kind).stats() for kind in DEFAULT_BULKHEADS}
+
+
+_guards: Dict[str, PaymentGuard] = {}
@@ -0,0 +1,403 @@
+"""
+Durable retries for rider charges that failed at the gateway.
+
+When a charge raises (a timeout, an outage, a dropped connection) the payment
+request does not wait or fail: the charge is written to a retry queue in a
+local SQLite database and the request returns at once. ChargeRetryJob
+periodically claims the retries that are due and runs them through a small
+pool of workers, off the request path.
+
+Each failed attempt pushes the next one back exponentially, with jitter so
+retries queued by one outage do not all hit the gateway again at the same
+moment. While the charges circuit breaker is open, retries are not attempted
+at all; once it turns half-open, a single retry is sent as its trial call and
+the rest wait for the trial to close it. A charge rejected by the breaker or
+bulkhead anyway never reached the gateway: it is rescheduled without using up
+an attempt. A retry is moved to a dead-letter table for someone to look at
+once it has been failing for MAX_RETRY_AGE_SECONDS (or, as a backstop, after
+MAX_ATTEMPTS attempts), or as soon as the gateway declines the charge.
+
+Every attempt of a charge carries the same idempotency key as the original
+request, so a charge that went through before its response was lost is not
+applied twice. Claimed retries are leased rather than removed: a worker that
+dies mid-attempt leaves its retry to become due again when the lease expires.
+"""
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from payments.payments_ledger import Ledger, get_ledger, post_charge
+from payments.payments_resilience import (
+    CHARGES,
+    HALF_OPEN,
+    OPEN,
+    BulkheadFullError,
+    CircuitBreaker,
+    CircuitOpenError,
+    get_payment_guard,
+)
+from payments.payments_service import charge_rider_async
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_DB = os.path.join("data", "charge_retries.db")
+# How long a charge is retried after its first failure before it is dead-lettered.
+MAX_RETRY_AGE_SECONDS = 24 * 3600.0
+# Backstop on attempts, including the one made by the request; at the maximum
+# delay, a day of retries takes about 130.
+MAX_ATTEMPTS = 200
+BASE_DELAY_SECONDS = 2.0
+MAX_DELAY_SECONDS = 900.0
+# Delay before retrying a charge the breaker or bulkhead rejected; costs no attempt.
+REJECTED_DELAY_SECONDS = 5.0
+# How long a claimed retry stays hidden from other claims while it is attempted.
+LEASE_SECONDS = 60.0
+# Retries attempted concurrently, and claimed per round trip to the database.
+DEFAULT_CONCURRENCY = 8
+DEFAULT_BATCH_SIZE = 100
+RETRY_INTERVAL_SECONDS = 5.0
+
+# rider_id has no declared type so ids keep whatever type they were queued with.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS charge_retries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ride_id INTEGER NOT NULL,
+    rider_id NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    attempts INTEGER NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS charge_retries_due ON charge_retries (next_attempt_at);
+CREATE TABLE IF NOT EXISTS charge_dead_letters (
+    id INTEGER PRIMARY KEY,
+    ride_id INTEGER NOT NULL,
+    rider_id NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    failed_at REAL NOT NULL
+);
+"""
+
+FIELDS = "id, ride_id, rider_id, amount_cents, idempotency_key, attempts, next_attempt_at, last_error, created_at"
+
+
+class ChargeRetry(NamedTuple):
+    """
+    A queued charge and how its attempts have gone so far.
+    """
+    id: int
+    ride_id: int
+    rider_id: Any
+    amount_cents: int
+    idempotency_key: str
+    attempts: int
+    next_attempt_at: float
+    last_error: Optional[str]
+    created_at: float
+
+
+class ChargeRetryQueue:
+    """
+    SQLite-backed queue of charges waiting to be retried, and their dead letters.
+
+    Every change is committed before the call returns. Methods block on disk,
+    so call them from a worker thread when on the event loop; they are safe
+    to call from several threads.
+    """
+    def __init__(
+        self,
+        path: str,
+        max_attempts: int = MAX_ATTEMPTS,
+        max_age_seconds: float = MAX_RETRY_AGE_SECONDS,
+        base_delay_seconds: float = BASE_DELAY_SECONDS,
+        max_delay_seconds: float = MAX_DELAY_SECONDS,
+        lease_seconds: float = LEASE_SECONDS,
+        clock: Callable[[], float] = time.time,
+        rng: Optional[random.Random] = None,
+    ):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.max_age_seconds = max_age_seconds
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        self._rng = rng or random.Random()
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript(SCHEMA)
+
+    def backoff(self, attempts: int) -> float:
+        """
+        Returns the delay in seconds before the next attempt of a charge that
+        has failed `attempts` times: the base delay doubled per failure up to
+        the maximum, of which a random half is taken off.
+        """
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (max(attempts, 1) - 1))
+        return ceiling / 2 + self._rng.uniform(0, ceiling / 2)
+
+    def enqueue(
+        self,
+        ride_id: int,
+        rider_id: Any,
+        amount_cents: int,
+        idempotency_key: str,
+        error: str,
+        attempts: int = 1,
+    ) -> int:
+        """
+        Queues a charge whose first attempt failed. A charge already queued
+        under the same idempotency key is not queued twice.
+
+        :param attempts: Attempts made so far; 0 if the charge was rejected
+            before it reached the gateway.
+        :return: The retry's id.
+        """
+        now = self.clock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO charge_retries (ride_id, rider_id, amount_cents, idempotency_key, attempts, "
+                "next_attempt_at, last_error, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (ride_id, rider_id, amount_cents, idempotency_key, attempts, now + self.backoff(attempts), error, now),
+            )
+            (retry_id,) = self._connection.execute(
+                "SELECT id FROM charge_retries WHERE idempotency_key = ?", (idempotency_key,)
+            ).fetchone()
+        return retry_id
+
+    def claim(self, limit: int = DEFAULT_BATCH_SIZE) -> List[ChargeRetry]:
+        """
+        Leases up to `limit` due retries, oldest due first.
+        """
+        now = self.clock()
+        with self._lock, self._connection:
+            rows = self._connection.execute(
+                f"SELECT {FIELDS} FROM charge_retries WHERE next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            self._connection.executemany(
+                "UPDATE charge_retries SET next_attempt_at = ? WHERE id = ?",
+                [(now + self.lease_seconds, row[0]) for row in rows],
+            )
+        return [ChargeRetry(*row) for row in rows]
+
+    def complete(self, retry: ChargeRetry) -> None:
+        """
+        Removes a retry whose charge went through.
+        """
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM charge_retries WHERE id = ?", (retry.id,))
+
+    def fail(self, retry: ChargeRetry, error: str, retryable: bool = True) -> bool:
+        """
+        Records a failed attempt: schedules the next one, or dead-letters the
+        retry if it has been failing for max_age_seconds, is out of attempts,
+        or the failure is not retryable.
+
+        :return: True if the retry was dead-lettered.
+        """
+        attempts = retry.attempts + 1
+        now = self.clock()
+        expired = now - retry.created_at >= self.max_age_seconds
+        dead = not retryable or expired or attempts >= self.max_attempts
+        with self._lock, self._connection:
+            if dead:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO charge_dead_letters (id, ride_id, rider_id, amount_cents, idempotency_key, "
+                    "attempts, last_error, created_at, failed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (retry.id, retry.ride_id, retry.rider_id, retry.amount_cents, retry.idempotency_key,
+                     attempts, error, retry.created_at, now),
+                )
+                self._connection.execute("DELETE FROM charge_retries WHERE id = ?", (retry.id,))
+            else:
+                self._connection.execute(
+                    "UPDATE charge_retries SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (attempts, now + self.backoff(attempts), error, retry.id),
+                )
+        return dead
+
+    def defer(self, retry: ChargeRetry, delay_seconds: float, error: str) -> None:
+        """
+        Reschedules a retry whose charge never reached the gateway, without
+        counting an attempt.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE charge_retries SET next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (self.clock() + delay_seconds, error, retry.id),
+            )
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Returns the most recently dead-lettered charges.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT * FROM charge_dead_letters ORDER BY failed_at DESC, id DESC LIMIT ?", (limit,)
+            )
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Returns the number of queued and dead-lettered charges.
+        """
+        with self._lock:
+            (queued,) = self._connection.execute("SELECT COUNT(*) FROM charge_retries").fetchone()
+            (dead,) = self._connection.execute("SELECT COUNT(*) FROM charge_dead_letters").fetchone()
+        return {"queued": queued, "dead_lettered": dead}
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class ChargeRetrier:
+    """
+    Drains due charge retries through a pool of concurrent workers, holding
+    them back while the charges circuit breaker is open.
+    """
+    def __init__(
+        self,
+        queue: ChargeRetryQueue,
+        charge: Callable[..., Awaitable[Dict[str, Any]]] = charge_rider_async,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        journal: Optional[Ledger] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.queue = queue
+        self.charge = charge
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.journal = journal
+        self.breaker = breaker
+
+    async def drain(self) -> Dict[str, int]:
+        """
+        Attempts every retry that is due, a claimed batch at a time.
+
+        :return: How many were charged, rescheduled after a failed attempt,
+            deferred after a rejection and dead-lettered.
+        """
+        summary = {"charged": 0, "retrying": 0, "deferred": 0, "dead_lettered": 0}
+        while True:
+            state = self.breaker.state if self.breaker is not None else None
+            if state == OPEN:
+                break
+            # Half-open: one retry is the breaker's trial; the rest wait for its outcome.
+            limit = 1 if state == HALF_OPEN else self.batch_size
+            retries = await asyncio.to_thread(self.queue.claim, limit)
+            if not retries:
+                break
+            claimed = iter(retries)
+
+            async def worker() -> None:
+                for retry in claimed:
+                    summary[await self._attempt(retry)] += 1
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(retries)))))
+            if len(retries) < limit:
+                break
+        return summary
+
+    async def _attempt(self, retry: ChargeRetry) -> str:
+        """
+        Retries one charge; returns "charged", "retrying", "deferred" or "dead_lettered".
+        """
+        try:
+            result = await self.charge(retry.rider_id, retry.amount_cents / 100, idempotency_key=retry.idempotency_key)
+        except (CircuitOpenError, BulkheadFullError) as e:
+            await asyncio.to_thread(self.queue.defer, retry, REJECTED_DELAY_SECONDS, str(e))
+            logger.info("Charge for ride %s was not attempted: %s", retry.ride_id, e)
+            return "deferred"
+        except Exception as e:
+            dead = await asyncio.to_thread(self.queue.fail, retry, str(e) or type(e).__name__)
+            if dead:
+                logger.error("Giving up on charge for ride %s after %d attempts: %s",
+                             retry.ride_id, retry.attempts + 1, e)
+                return "dead_lettered"
+            logger.warning("Retry %d of charge for ride %s failed: %s", retry.attempts, retry.ride_id, e)
+            return "retrying"
+
+        if not result or result.get("status") != "success":
+            await asyncio.to_thread(self.queue.fail, retry, "declined", False)
+            logger.error("Charge for ride %s was declined on retry", retry.ride_id)
+            return "dead_lettered"
+
+        await asyncio.to_thread(self.queue.complete, retry)
+        if self.journal is not None:
+            try:
+                await post_charge(self.journal, retry.ride_id, retry.rider_id, retry.amount_cents)
+            except Exception as e:
+                # The rider has been charged; reconciliation picks up the missing entry
+                logger.error("Could not book retried charge for ride %s: %s", retry.ride_id, e)
+        logger.info("Charged ride %s on attempt %d", retry.ride_id, retry.attempts + 1)
+        return "charged"
+
+
+class ChargeRetryJob(AsyncPeriodicJob):
+    """
+    Periodically retries failed rider charges that are due.
+    """
+    name = "charge-retry-job"
+
+    def __init__(self, retrier_provider: Callable[[], ChargeRetrier], interval_seconds: float = RETRY_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.retrier_provider = retrier_provider
+
+    async def run_once(self) -> Dict[str, int]:
+        return await self.retrier_provider().drain()
+
+
+def get_charge_retry_queue() -> ChargeRetryQueue:
+    """
+    Returns the shared retry queue, stored at CHARGE_RETRY_DB and configured
+    from CHARGE_RETRY_MAX_AGE_SECONDS, CHARGE_RETRY_MAX_ATTEMPTS,
+    CHARGE_RETRY_BASE_DELAY_SECONDS and CHARGE_RETRY_MAX_DELAY_SECONDS.
+    """
+    global _queue
+    if _queue is None:
+        _queue = ChargeRetryQueue(
+            os.getenv("CHARGE_RETRY_DB", DEFAULT_RETRY_DB),
+            max_attempts=int(os.getenv("CHARGE_RETRY_MAX_ATTEMPTS", MAX_ATTEMPTS)),
+            max_age_seconds=float(os.getenv("CHARGE_RETRY_MAX_AGE_SECONDS", MAX_RETRY_AGE_SECONDS)),
+            base_delay_seconds=float(os.getenv("CHARGE_RETRY_BASE_DELAY_SECONDS", BASE_DELAY_SECONDS)),
+            max_delay_seconds=float(os.getenv("CHARGE_RETRY_MAX_DELAY_SECONDS", MAX_DELAY_SECONDS)),
+        )
+    return _queue
+
+
+def get_charge_retrier() -> ChargeRetrier:
+    """
+    Returns the shared retrier, attempting CHARGE_RETRY_CONCURRENCY charges at
+    a time and following the charges circuit breaker.
+    """
+    global _retrier
+    if _retrier is None:
+        _retrier = ChargeRetrier(
+            get_charge_retry_queue(),
+            concurrency=int(os.getenv("CHARGE_RETRY_CONCURRENCY", DEFAULT_CONCURRENCY)),
+            journal=get_ledger(),
+            breaker=get_payment_guard(CHARGES).breaker,
+        )
+    return _retrier
+
+
+_queue: Optional[ChargeRetryQueue] = None
+_retrier: Optional[ChargeRetrier] = None
@@ -1,8 +1,21 @@
+import asyncio
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from payments.payments_gateway import get_payment_gateway
+from payments.payments_resilience import CHARGES, PAYOUTS, get_payment_guard
+from payments.payments_surge import surge_engine
+from payments.payments_tariffs import get_tariff_engine
+from utils.geolocation import calculate_distance, estimate_travel_time, parse_coordinates
 
 logger = logging.getLogger(__name__)
 
+# Scaled fares closer than this to a half cent are rounded one at a time.
+HALF_CENT_TOLERANCE = 1e-6
+
 # Mock external payment API for testing
 class some_external_payment_api:
     @staticmethod
@@ -34,42 +47,49 @@ class PaymentServiceError(Exception):
     pass
 
 
-def calculate_fare(pickup_location: Any, dropoff_location: Any, duration: float, distance: float) -> float:
+def calculate_fare(
+    pickup_location: Any,
+    dropoff_location: Any,
+    duration: float,
+    distance: float,
+    surge_multiplier: Optional[float] = None,
+    city: Optional[str] = None,
+    vehicle_class: Optional[str] = None
+) -> float:
     """
     Calculate the fare based on pickup/dropoff locations, trip duration, and distance.
     This includes a base fare, cost per kilometer, and cost per minute. Additional
     surcharges can be applied for longer distances or durations as a simple
-    demonstration of dynamic pricing.
+    demonstration of dynamic pricing. The rates come from the city's tariff
+    for the vehicle class.
 
     :param pickup_location: The pickup location, can be an address or coordinate.
     :param dropoff_location: The dropoff location, can be an address or coordinate.
     :param duration: The total trip duration in minutes.
     :param distance: The total trip distance in kilometers.
+    :param surge_multiplier: Multiplier applied to the time-and-distance fare, before surcharges;
+        the current surge in the pickup's zone if omitted.
+    :param city: The city whose tariff applies; the default tariff if omitted or unknown.
+    :param vehicle_class: The vehicle class; "standard" if omitted.
     :return: The calculated fare as a float.
     :raises ValueError: If distance is negative.
+    :raises TariffError: If there is no tariff for the vehicle class.
     """
-    base_fare = 2.00
-    cost_per_km = 1.25
-    cost_per_min = 0.25
-
     # Check for negative distance
     if distance < 0:
         raise ValueError("Distance cannot be negative")
 
-    # Example dynamic factors
-    distance_surcharge_threshold = 20  # kilometers
-    duration_surcharge_threshold = 30  # minutes
-    distance_surcharge_amount = 2.0
-    duration_surcharge_amount = 1.0
-
+    tariff = get_tariff_engine().tariff(city, vehicle_class)
+    if surge_multiplier is None:
+        surge_multiplier = surge_engine.multiplier_at(pickup_location)
     try:
-        fare = base_fare + (cost_per_km * distance) + (cost_per_min * duration)
+        fare = (tariff.base_fare + (tariff.cost_per_km * distance) + (tariff.cost_per_min * duration)) * surge_multiplier
 
         # Simple surcharges for demonstration
-        if distance > distance_surcharge_threshold:
-            fare += distance_surcharge_amount
-        if duration > duration_surcharge_threshold:
-            fare += duration_surcharge_amount
+        if distance > tariff.distance_surcharge_threshold_km:
+            fare += tariff.distance_surcharge
+        if duration > tariff.duration_surcharge_threshold_min:
+            fare += tariff.duration_surcharge
 
         return round(fare, 2)
     except Exception as e:
@@ -77,6 +97,97 @@ def calculate_fare(pickup_location: Any, dropoff_location: Any, duration: float,
         raise PaymentServiceError("Failed to calculate fare") from e
 
 
+def calculate_trip_fare(
+    pickup_location: Any,
+    dropoff_location: Any,
+    surge_multiplier: Optional[float] = None,
+    city: Optional[str] = None,
+    vehicle_class: Optional[str] = None
+) -> float:
+    """
+    Calculate the fare of a trip from its endpoints alone: the distance and
+    duration are estimated from the pickup and dropoff coordinates.
+
+    :param pickup_location: The pickup location, as coordinates or a "lat,lng" string.
+    :param dropoff_location: The dropoff location, as coordinates or a "lat,lng" string.
+    :param surge_multiplier: As for calculate_fare.
+    :param city: As for calculate_fare.
+    :param vehicle_class: As for calculate_fare.
+    :return: The calculated fare as a float.
+    :raises ValueError: If either location has no coordinates.
+    """
+    pickup, dropoff = parse_coordinates(pickup_location), parse_coordinates(dropoff_location)
+    if pickup is None or dropoff is None:
+        raise ValueError("Pickup and dropoff must be coordinates to price a trip")
+    distance = calculate_distance(pickup, dropoff)
+    duration = estimate_travel_time(pickup, dropoff) * 60
+    return calculate_fare(pickup, dropoff, duration, distance, surge_multiplier, city, vehicle_class)
+
+
+def calculate_fare_batch(
+    distances: ArrayLike,
+    durations: ArrayLike,
+    surge_multipliers: Optional[ArrayLike] = None,
+    cities: Union[str, None, Sequence[Optional[str]]] = None,
+    vehicle_classes: Union[str, None, Sequence[Optional[str]]] = None
+) -> np.ndarray:
+    """
+    Vectorized form of calculate_fare for re-pricing, audits and simulations
+    over many trips. Applies the same rules in the same order, so every fare is
+    identical to what calculate_fare returns for that trip.
+
+    :param distances: Trip distances in kilometers.
+    :param durations: Trip durations in minutes.
+    :param surge_multipliers: Per-trip surge multipliers; 1.0 for every trip if omitted.
+    :param cities: One city for the whole batch, or one per trip.
+    :param vehicle_classes: One vehicle class for the whole batch, or one per trip.
+    :return: The fares as a float64 array.
+    :raises ValueError: If the arrays differ in length or any distance is negative.
+    :raises TariffError: If there is no tariff for a vehicle class.
+    """
+    distances = np.asarray(distances, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    if surge_multipliers is None:
+        surge_multipliers = np.ones_like(distances)
+    surge_multipliers = np.asarray(surge_multipliers, dtype=np.float64)
+    if not distances.shape == durations.shape == surge_multipliers.shape:
+        raise ValueError("Distances, durations and surge multipliers must have the same shape")
+    if (distances < 0).any():
+        raise ValueError("Distance cannot be negative")
+
+    compiled = get_tariff_engine().compiled
+    if isinstance(cities, (str, type(None))) and isinstance(vehicle_classes, (str, type(None))):
+        # One tariff for the whole batch: its rates broadcast as scalars.
+        rates = compiled.table[compiled.row(cities, vehicle_classes)]
+    else:
+        # One tariff row per trip, gathered from the compiled table column by column.
+        rates = compiled.table[compiled.rows_for(cities, vehicle_classes, distances.size)].T
+    (base_fare, cost_per_km, cost_per_min, distance_threshold, distance_surcharge,
+     duration_threshold, duration_surcharge) = rates
+
+    fares = base_fare + cost_per_km * distances
+    fares += cost_per_min * durations
+    fares *= surge_multipliers
+    fares += np.where(distances > distance_threshold, distance_surcharge, 0.0)
+    fares += np.where(durations > duration_threshold, duration_surcharge, 0.0)
+    return round_fares(fares)
+
+
+def round_fares(fares: np.ndarray) -> np.ndarray:
+    """
+    Rounds fares to cents exactly like the built-in round().
+
+    np.round scales by 100 before rounding, so values within float error of a
+    half cent can round the other way; those few are rounded with round() instead.
+    """
+    rounded = np.round(fares, 2)
+    scaled = fares * 100
+    near_half = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < HALF_CENT_TOLERANCE)
+    for i in near_half:
+        rounded[i] = round(float(fares[i]), 2)
+    return rounded
+
+
 def charge_rider(rider_id: Any, amount: float) -> Dict[str, Any]:
     """
     Charge the rider's payment method or simulate the charge.
@@ -119,11 +230,57 @@ def payout_driver(driver_id: Any, amount: float) -> Dict[str, Any]:
         raise e
 
 
+async def charge_rider_async(rider_id: Any, amount: float, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Charge the rider without blocking the event loop: through the payment
+    gateway client when one is configured, otherwise by running charge_rider
+    in a worker thread. Calls go through the charges circuit breaker and
+    bulkhead (see payments_resilience).
+
+    :param rider_id: Unique identifier of the rider.
+    :param amount: The amount to be charged.
+    :param idempotency_key: Lets the gateway apply a retried charge only once.
+    :return: Dictionary containing transaction details.
+    :raises GatewayError: If the gateway times out or fails, or the call is
+        rejected by its circuit breaker or bulkhead.
+    """
+    async with get_payment_guard(CHARGES):
+        gateway = get_payment_gateway()
+        if gateway is None:
+            return await asyncio.to_thread(charge_rider, rider_id, amount)
+        logger.info("Charging rider %s an amount of %.2f", rider_id, amount)
+        return await gateway.charge(rider_id, amount, idempotency_key)
+
+
+async def payout_driver_async(driver_id: Any, amount: float, idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Process a payout to the driver without blocking the event loop, like
+    charge_rider_async, through the payouts circuit breaker and bulkhead.
+
+    :param driver_id: Unique identifier of the driver.
+    :param amount: The amount to be paid out.
+    :param idempotency_key: Lets the gateway apply a retried payout only once.
+    :return: Dictionary containing payout details.
+    :raises GatewayError: If the gateway times out or fails, or the call is
+        rejected by its circuit breaker or bulkhead.
+    """
+    async with get_payment_guard(PAYOUTS):
+        gateway = get_payment_gateway()
+        if gateway is None:
+            return await asyncio.to_thread(payout_driver, driver_id, amount)
+        logger.info("Processing payout of %.2f to driver %s", amount, driver_id)
+        return await gateway.payout(driver_id, amount, idempotency_key)
+
+
 __all__ = [
     "PaymentServiceError",
     "calculate_fare",
+    "calculate_fare_batch",
+    "calculate_trip_fare",
     "charge_rider",
+    "charge_rider_async",
     "payout_driver",
+    "payout_driver_async",
     "some_external_payment_api",
     "some_external_payout_api"
-]
\ No newline at end of file
+]
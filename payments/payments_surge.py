@@ -0,0 +1,284 @@
+"""
+Surge multipliers per zone, maintained incrementally from supply and demand events.
+
+Zones are square grid cells. Each zone keeps a time-decayed count of ride
+requests (demand) and the number of available drivers currently in it
+(supply). Every event touches only its own zone: the decayed demand rate is
+divided by supply, mapped to a target multiplier, and the zone's smoothed
+multiplier moves towards it. The published multiplier, the one fares use,
+only follows the smoothed value once it leaves a hysteresis band, so prices
+don't flicker while a zone hovers around a step. Looking a multiplier up is
+one grid-cell computation and one dict read.
+
+Zones with no events decay back towards 1.0 through SurgeRefreshJob, which
+only visits zones that are surging or under pressure; a settled zone's state
+is brought up to date lazily by its next event.
+"""
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from drivers.drivers_availability import driver_availability
+from drivers.drivers_locations import LocationUpdate, location_ingestor
+from utils.geolocation import grid_cell, parse_coordinates
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+Zone = Tuple[int, int]
+
+# Width of a surge zone.
+ZONE_SIZE_KM = 2.0
+# Time constant of the decayed request count; a steady rate of r requests per
+# second settles at a count of r * DEMAND_WINDOW_SECONDS.
+DEMAND_WINDOW_SECONDS = 300.0
+# Time constant of the smoothing applied to the target multiplier.
+SMOOTHING_SECONDS = 60.0
+# Requests per minute per available driver the zone absorbs without surging.
+BALANCED_DEMAND_PER_DRIVER = 0.5
+# Multiplier added per unit of demand per driver above the balanced level.
+SENSITIVITY = 0.5
+MAX_MULTIPLIER = 3.0
+# Published multipliers are multiples of this step.
+MULTIPLIER_STEP = 0.1
+# The smoothed multiplier must move this far past the published one before
+# the published one follows: quickly up, more reluctantly down.
+HYSTERESIS_UP = 0.1
+HYSTERESIS_DOWN = 0.2
+# Settled zones without drivers are forgotten once their decayed demand falls below this.
+IDLE_DEMAND = 0.01
+REFRESH_INTERVAL_SECONDS = 5.0
+
+
+class ZoneState:
+    """
+    Incremental supply and demand state of one zone.
+    """
+    __slots__ = ("demand", "supply", "smoothed", "published", "updated_at")
+
+    def __init__(self, now: float):
+        self.demand = 0.0
+        self.supply = 0
+        self.smoothed = 1.0
+        self.published = 1.0
+        self.updated_at = now
+
+
+def target_multiplier(demand_per_minute: float, supply: int) -> float:
+    """
+    Maps a zone's demand rate and available drivers to the multiplier it should
+    converge to.
+    """
+    pressure = demand_per_minute / max(supply, 1) - BALANCED_DEMAND_PER_DRIVER
+    return min(MAX_MULTIPLIER, 1.0 + SENSITIVITY * max(0.0, pressure))
+
+
+class SurgeEngine:
+    """
+    Maintains a published surge multiplier per zone from request, availability
+    and driver position events. Used from the event loop; multiplier reads are
+    safe from any thread.
+    """
+    def __init__(
+        self,
+        zone_size_km: float = ZONE_SIZE_KM,
+        hysteresis_up: float = HYSTERESIS_UP,
+        hysteresis_down: float = HYSTERESIS_DOWN,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.zone_size_km = zone_size_km
+        self.hysteresis_up = hysteresis_up
+        self.hysteresis_down = hysteresis_down
+        self.clock = clock
+        self._zones: Dict[Zone, ZoneState] = {}
+        # Published multipliers above 1.0; zones missing here are not surging.
+        self._multipliers: Dict[Zone, float] = {}
+        self._active: Set[Zone] = set()
+        self._driver_zones: Dict[str, Zone] = {}
+        self._available: Set[str] = set()
+        self.changes = 0
+
+    def zone_for(self, location: Any) -> Optional[Zone]:
+        """
+        Returns the zone containing a location, or None if it has no coordinates.
+        """
+        coords = parse_coordinates(location)
+        return grid_cell(coords, self.zone_size_km) if coords is not None else None
+
+    def multiplier(self, zone: Optional[Zone]) -> float:
+        """
+        Returns the published multiplier of a zone.
+        """
+        return self._multipliers.get(zone, 1.0)
+
+    def multiplier_at(self, location: Any) -> float:
+        """
+        Returns the published multiplier at a location; 1.0 without coordinates.
+        """
+        return self.multiplier(self.zone_for(location))
+
+    def record_request(self, pickup: Any, now: Optional[float] = None) -> None:
+        """
+        Demand event: a rider requested a ride from this pickup.
+        """
+        zone = self.zone_for(pickup)
+        if zone is None:
+            return
+        now = self.clock() if now is None else now
+        state = self._advance(zone, now)
+        state.demand += 1.0
+        self._active.add(zone)
+        self._update(zone, state)
+
+    def driver_moved(self, driver_id: str, location: Any, now: Optional[float] = None) -> None:
+        """
+        Supply event: a driver's position was updated.
+        """
+        zone = self.zone_for(location)
+        previous = self._driver_zones.get(driver_id)
+        if zone == previous:
+            return
+        now = self.clock() if now is None else now
+        if zone is None:
+            self._driver_zones.pop(driver_id, None)
+        else:
+            self._driver_zones[driver_id] = zone
+        if driver_id in self._available:
+            self._add_supply(previous, -1, now)
+            self._add_supply(zone, 1, now)
+
+    def driver_available(self, driver_id: str, available: bool, now: Optional[float] = None) -> None:
+        """
+        Supply event: a driver became available for rides, or stopped being available.
+        """
+        if available == (driver_id in self._available):
+            return
+        if available:
+            self._available.add(driver_id)
+        else:
+            self._available.discard(driver_id)
+        now = self.clock() if now is None else now
+        self._add_supply(self._driver_zones.get(driver_id), 1 if available else -1, now)
+
+    def driver_removed(self, driver_id: str, now: Optional[float] = None) -> None:
+        """
+        Supply event: a driver went offline.
+        """
+        self.driver_available(driver_id, False, now)
+        self._driver_zones.pop(driver_id, None)
+
+    def on_availability(self, event: str, driver_id: str, ride_id: Any) -> None:
+        """
+        Availability pool listener.
+        """
+        if event == "remove":
+            self.driver_removed(driver_id)
+        else:
+            self.driver_available(driver_id, event in ("add", "release"))
+
+    def on_driver_positions(self, updates: Dict[str, LocationUpdate]) -> None:
+        """
+        Location flush listener.
+        """
+        now = self.clock()
+        for driver_id, (lat, lng, _) in updates.items():
+            self.driver_moved(driver_id, (lat, lng), now)
+
+    def refresh(self, now: Optional[float] = None) -> int:
+        """
+        Decays zones without recent events towards their current target. Zones
+        that have settled at 1.0 with no pressure left stop being refreshed
+        until their next request; settled zones without drivers or demand are
+        forgotten.
+
+        :return: The number of zones refreshed.
+        """
+        now = self.clock() if now is None else now
+        active = list(self._active)
+        for zone in active:
+            state = self._advance(zone, now)
+            self._update(zone, state)
+            if state.published == 1.0 and state.smoothed < 1.0 + MULTIPLIER_STEP / 2 and self._target(state) == 1.0:
+                self._active.discard(zone)
+                if state.supply == 0 and state.demand < IDLE_DEMAND:
+                    del self._zones[zone]
+        return len(active)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "zones": len(self._zones),
+            "active_zones": len(self._active),
+            "surging_zones": len(self._multipliers),
+            "changes": self.changes,
+        }
+
+    def _add_supply(self, zone: Optional[Zone], delta: int, now: float) -> None:
+        if zone is None:
+            return
+        state = self._advance(zone, now)
+        state.supply = max(0, state.supply + delta)
+        self._update(zone, state)
+        if state.supply == 0 and zone not in self._active and state.published == 1.0:
+            del self._zones[zone]
+
+    def _advance(self, zone: Zone, now: float) -> ZoneState:
+        """
+        Decays a zone's demand and moves its smoothed multiplier towards the
+        target over the time since its last update.
+        """
+        state = self._zones.get(zone)
+        if state is None:
+            state = self._zones[zone] = ZoneState(now)
+            return state
+        elapsed = now - state.updated_at
+        if elapsed > 0:
+            target = self._target(state)
+            state.smoothed += (target - state.smoothed) * -math.expm1(-elapsed / SMOOTHING_SECONDS)
+            state.demand *= math.exp(-elapsed / DEMAND_WINDOW_SECONDS)
+            state.updated_at = now
+        return state
+
+    @staticmethod
+    def _target(state: ZoneState) -> float:
+        return target_multiplier(state.demand * 60.0 / DEMAND_WINDOW_SECONDS, state.supply)
+
+    def _update(self, zone: Zone, state: ZoneState) -> None:
+        """
+        Moves the published multiplier to the smoothed one if it left the hysteresis band.
+        """
+        smoothed = state.smoothed
+        published = state.published
+        # A zone that has calmed down always returns to 1.0, even inside the band.
+        lower = max(published - self.hysteresis_down, 1.0 + MULTIPLIER_STEP / 2)
+        if lower < smoothed < published + self.hysteresis_up:
+            return
+        published = max(1.0, round(round(smoothed / MULTIPLIER_STEP) * MULTIPLIER_STEP, 2))
+        if published == state.published:
+            return
+        state.published = published
+        self.changes += 1
+        if published > 1.0:
+            self._multipliers[zone] = published
+        else:
+            self._multipliers.pop(zone, None)
+
+
+class SurgeRefreshJob(AsyncPeriodicJob):
+    """
+    Periodically lets surge decay in zones that stopped receiving events.
+    """
+    name = "surge-refresh-job"
+
+    def __init__(self, engine: SurgeEngine, interval_seconds: float = REFRESH_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.engine = engine
+
+    def run_once(self) -> int:
+        return self.engine.refresh()
+
+
+# Shared surge engine, fed by driver availability and position updates.
+surge_engine = SurgeEngine()
+driver_availability.add_listener(surge_engine.on_availability)
+location_ingestor.add_listener(surge_engine.on_driver_positions)
@@ -0,0 +1,283 @@
+"""
+Per-city, per-vehicle-class pricing rules.
+
+Rules are loaded from a JSON file (TARIFFS_PATH, default payments/tariffs.json):
+
+    {
+      "defaults": {"base_fare": 2.0, "cost_per_km": 1.25, ...},
+      "cities": {
+        "default": {"standard": {}, "xl": {"base_fare": 3.5}},
+        "berlin": {"defaults": {"cost_per_min": 0.3}, "standard": {}}
+      }
+    }
+
+Each vehicle class inherits the top-level defaults, then its city's defaults,
+then its own overrides. Cities without their own rules are priced with the
+"default" city's.
+
+The rules are compiled once into flat structures: dicts mapping city and class
+names to indexes, and a row per (city, class) pair, as a tuple for single fares
+and as a numpy table for batches. A reload compiles a new set and swaps the
+reference in one assignment, so pricing calls never wait on a reload and always
+see either the old rules or the new ones.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+from utils.periodic import PeriodicJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARIFFS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tariffs.json")
+DEFAULT_CITY = "default"
+DEFAULT_VEHICLE_CLASS = "standard"
+# Batches with more distinct cities or classes than this are coded in one dict pass.
+MAX_VECTORIZED_LABELS = 16
+# How often the tariff file is checked for changes.
+RELOAD_INTERVAL_SECONDS = 30.0
+
+
+class TariffError(Exception):
+    """
+    Raised for invalid tariff files and unknown vehicle classes.
+    """
+    pass
+
+
+class Tariff(NamedTuple):
+    """
+    Pricing rules for one vehicle class in one city.
+    """
+    base_fare: float
+    cost_per_km: float
+    cost_per_min: float
+    distance_surcharge_threshold_km: float
+    distance_surcharge: float
+    duration_surcharge_threshold_min: float
+    duration_surcharge: float
+
+
+TARIFF_FIELDS = Tariff._fields
+
+
+class CompiledTariffs:
+    """
+    An immutable, compiled set of tariffs.
+    """
+    def __init__(self, tariffs: Dict[str, Dict[str, Tariff]], version: Any = None):
+        self.version = version
+        self.cities: Dict[str, int] = {city: i for i, city in enumerate(sorted(tariffs))}
+        self.vehicle_classes: Dict[str, int] = {
+            vehicle_class: i
+            for i, vehicle_class in enumerate(sorted({name for classes in tariffs.values() for name in classes}))
+        }
+        if DEFAULT_CITY not in self.cities:
+            raise TariffError(f'Tariffs must define the "{DEFAULT_CITY}" city')
+
+        width = len(self.vehicle_classes)
+        self.rows: List[Optional[Tariff]] = [None] * (len(self.cities) * width)
+        self.table = np.full((len(self.rows), len(TARIFF_FIELDS)), np.nan)
+        for city, classes in tariffs.items():
+            for vehicle_class, tariff in classes.items():
+                row = self.cities[city] * width + self.vehicle_classes[vehicle_class]
+                self.rows[row] = tariff
+                self.table[row] = tariff
+
+    def row(self, city: Optional[str] = None, vehicle_class: Optional[str] = None) -> int:
+        """
+        Returns the row index of a city's tariff for a vehicle class, falling
+        back to the default city's tariff when the city has none.
+
+        :raises TariffError: If no tariff exists for the vehicle class.
+        """
+        vehicle_class = vehicle_class or DEFAULT_VEHICLE_CLASS
+        column = self.vehicle_classes.get(vehicle_class)
+        if column is not None:
+            width = len(self.vehicle_classes)
+            city_index = self.cities.get(city or DEFAULT_CITY)
+            if city_index is not None and self.rows[city_index * width + column] is not None:
+                return city_index * width + column
+            row = self.cities[DEFAULT_CITY] * width + column
+            if self.rows[row] is not None:
+                return row
+        raise TariffError(f"No tariff for vehicle class {vehicle_class!r} in {city or DEFAULT_CITY!r}")
+
+    def tariff(self, city: Optional[str] = None, vehicle_class: Optional[str] = None) -> Tariff:
+        """
+        Returns the tariff for a city and vehicle class.
+        """
+        return self.rows[self.row(city, vehicle_class)]
+
+    def rows_for(
+        self,
+        cities: Union[str, None, Sequence[Optional[str]]],
+        vehicle_classes: Union[str, None, Sequence[Optional[str]]],
+        size: int
+    ) -> np.ndarray:
+        """
+        Returns the row index of every trip in a batch. Each argument is either
+        one value for the whole batch or one value per trip.
+        """
+        city_labels, city_codes = factorize(cities, size)
+        class_labels, class_codes = factorize(vehicle_classes, size)
+        # Resolve each distinct (city, class) pair once, then gather per trip.
+        resolved = np.array(
+            [[self.row(city, vehicle_class) for vehicle_class in class_labels] for city in city_labels],
+            dtype=np.intp
+        )
+        return resolved[city_codes, class_codes]
+
+
+def factorize(values: Union[str, None, Sequence[Optional[str]]], size: int):
+    """
+    Splits a batch argument into its distinct labels and a per-trip code array
+    indexing them. None and empty strings become None labels.
+    """
+    if values is None or isinstance(values, str):
+        return [values or None], np.zeros(size, dtype=np.intp)
+    array = values if isinstance(values, np.ndarray) else np.asarray(values, dtype=object)
+    if array.shape != (size,):
+        raise ValueError("Per-trip cities and vehicle classes must have one value per trip")
+    # Few distinct labels: code them with one vectorized comparison per label.
+    labels: List[Any] = []
+    codes = np.full(size, -1, dtype=np.intp)
+    pending = np.flatnonzero(codes < 0)
+    while pending.size and len(labels) < MAX_VECTORIZED_LABELS:
+        label = array[pending[0]]
+        codes[array == label] = len(labels)
+        labels.append(label)
+        pending = np.flatnonzero(codes < 0)
+    if pending.size:
+        index = {label: i for i, label in enumerate(labels)}
+        codes = np.fromiter((index.setdefault(item, len(index)) for item in array.tolist()), dtype=np.intp, count=size)
+        labels = list(index)
+    return [str(label) if label else None for label in labels], codes
+
+
+def compile_tariffs(config: Dict[str, Any], version: Any = None) -> CompiledTariffs:
+    """
+    Validates a tariff configuration and compiles it.
+
+    :param config: The parsed tariff file.
+    :param version: An identifier of the configuration, e.g. the file's modification time.
+    :raises TariffError: If the configuration is invalid.
+    """
+    defaults = config.get("defaults", {})
+    cities = config.get("cities")
+    if not isinstance(cities, dict) or not cities:
+        raise TariffError('Tariffs must define at least one city under "cities"')
+
+    tariffs: Dict[str, Dict[str, Tariff]] = {}
+    for city, classes in cities.items():
+        if not isinstance(classes, dict):
+            raise TariffError(f"Tariffs for {city!r} must be an object of vehicle classes")
+        city_defaults = {**defaults, **classes.get("defaults", {})}
+        tariffs[city] = {}
+        for vehicle_class, overrides in classes.items():
+            if vehicle_class == "defaults":
+                continue
+            rules = {**city_defaults, **overrides}
+            unknown = set(rules) - set(TARIFF_FIELDS)
+            missing = set(TARIFF_FIELDS) - set(rules)
+            if unknown or missing:
+                raise TariffError(
+                    f"Invalid tariff for {vehicle_class!r} in {city!r}: "
+                    f"unknown {sorted(unknown)}, missing {sorted(missing)}"
+                )
+            try:
+                tariff = Tariff(**{field: float(rules[field]) for field in TARIFF_FIELDS})
+            except (TypeError, ValueError) as e:
+                raise TariffError(f"Invalid tariff for {vehicle_class!r} in {city!r}: {e}") from e
+            if any(value < 0 for value in tariff):
+                raise TariffError(f"Invalid tariff for {vehicle_class!r} in {city!r}: negative value")
+            tariffs[city][vehicle_class] = tariff
+    return CompiledTariffs(tariffs, version)
+
+
+def load_tariffs(path: str) -> CompiledTariffs:
+    """
+    Reads and compiles a tariff file.
+
+    :raises TariffError: If the file cannot be read or is invalid.
+    """
+    try:
+        version = os.stat(path).st_mtime_ns
+        with open(path, "r", encoding="utf-8") as handle:
+            config = json.load(handle)
+    except (OSError, ValueError) as e:
+        raise TariffError(f"Could not load tariffs from {path}: {e}") from e
+    return compile_tariffs(config, version)
+
+
+class TariffEngine:
+    """
+    Serves compiled tariffs and reloads them when the tariff file changes.
+
+    Pricing reads the current compiled set without locking; reloads are
+    serialized among themselves and swap the new set in with one assignment.
+    A file that fails to load or validate leaves the current tariffs in place.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._reload_lock = threading.Lock()
+        self._compiled = load_tariffs(path)
+
+    @property
+    def compiled(self) -> CompiledTariffs:
+        return self._compiled
+
+    def tariff(self, city: Optional[str] = None, vehicle_class: Optional[str] = None) -> Tariff:
+        """
+        Returns the current tariff for a city and vehicle class.
+        """
+        return self._compiled.tariff(city, vehicle_class)
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Recompiles the tariff file if it changed since it was last loaded.
+
+        :return: True if new tariffs were swapped in.
+        """
+        with self._reload_lock:
+            try:
+                if not force and os.stat(self.path).st_mtime_ns == self._compiled.version:
+                    return False
+                compiled = load_tariffs(self.path)
+            except (OSError, TariffError) as e:
+                logger.error("Keeping current tariffs, reload failed: %s", e)
+                return False
+            self._compiled = compiled
+        logger.info("Reloaded tariffs from %s", self.path)
+        return True
+
+
+class TariffReloadJob(PeriodicJob):
+    """
+    Background job that picks up changes to the tariff file.
+    """
+    name = "tariff-reload-job"
+
+    def __init__(self, engine_provider: Any, interval_seconds: float = RELOAD_INTERVAL_SECONDS):
+        super().__init__(interval_seconds)
+        self.engine_provider = engine_provider
+
+    def run_once(self) -> None:
+        self.engine_provider().reload()
+
+
+def get_tariff_engine() -> TariffEngine:
+    """
+    Returns the shared tariff engine, loaded from TARIFFS_PATH.
+    """
+    global _engine
+    if _engine is None:
+        _engine = TariffEngine(os.getenv("TARIFFS_PATH", DEFAULT_TARIFFS_PATH))
+    return _engine
+
+
+_engine: Optional[TariffEngine] = None
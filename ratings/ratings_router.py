@@ -1,4 +1,8 @@
-from fastapi import APIRouter, HTTPException, status, Body
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, status, Body, Header, Response
+
+from utils.etags import etag_matches, make_etag, not_modified
 
 router = APIRouter(
     tags=["Ratings"]
@@ -102,16 +106,27 @@ def rate_rider_endpoint(ride_id: int = Body(...), rating: float = Body(...), rev
 
 # Update to match test expectations
 @router.get("/ratings/rider/{rider_id}")
-def get_rider_rating_endpoint(rider_id: int) -> dict:
+def get_rider_rating_endpoint(
+    rider_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+) -> dict:
     """
     Retrieves the average rating of a rider.
+    Honours If-None-Match against an ETag built from the rating's version counter.
 
     :param rider_id: The ID of the rider
-    :return: A dictionary containing the rider's average rating
+    :param if_none_match: ETag from a previous response, if any
+    :return: A dictionary containing the rider's average rating, or 304 Not Modified
     """
     try:
         # Call the service function
-        from ratings.ratings_service import get_rider_rating
+        from ratings.ratings_service import get_rider_rating, get_rider_rating_version
+        etag = make_etag("rider-rating", rider_id, get_rider_rating_version(rider_id))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+
         try:
             rating = get_rider_rating(rider_id)
             # Convert None to 0 for the tests
@@ -133,16 +148,27 @@ def get_rider_rating_endpoint(rider_id: int) -> dict:
 
 # Update to match test expectations
 @router.get("/ratings/driver/{driver_id}")
-def get_driver_rating_endpoint(driver_id: int) -> dict:
+def get_driver_rating_endpoint(
+    driver_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+) -> dict:
     """
     Retrieves the average rating of a driver.
+    Honours If-None-Match against an ETag built from the rating's version counter.
 
     :param driver_id: The ID of the driver
-    :return: A dictionary containing the driver's average rating
+    :param if_none_match: ETag from a previous response, if any
+    :return: A dictionary containing the driver's average rating, or 304 Not Modified
     """
     try:
         # Call the service function
-        from ratings.ratings_service import get_driver_rating
+        from ratings.ratings_service import get_driver_rating, get_driver_rating_version
+        etag = make_etag("driver-rating", driver_id, get_driver_rating_version(driver_id))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+
         try:
             rating = get_driver_rating(driver_id)
             # Convert None to 0 for the tests
@@ -171,9 +197,17 @@ def rate_rider_original_endpoint(ride_id: int, rating: float = Body(...), review
     return rate_rider_endpoint(ride_id=ride_id, rating=rating, review=review)
 
 @router.get("/rider/{rider_id}")
-def get_rider_rating_original_endpoint(rider_id: int) -> dict:
-    return get_rider_rating_endpoint(rider_id)
+def get_rider_rating_original_endpoint(
+    rider_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+) -> dict:
+    return get_rider_rating_endpoint(rider_id, response, if_none_match)
 
 @router.get("/driver/{driver_id}")
-def get_driver_rating_original_endpoint(driver_id: int) -> dict:
-    return get_driver_rating_endpoint(driver_id)
\ No newline at end of file
+def get_driver_rating_original_endpoint(
+    driver_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+) -> dict:
+    return get_driver_rating_endpoint(driver_id, response, if_none_match)
\ No newline at end of file
@@ -35,7 +35,8 @@ rides_data = {
 #     entity_id: {
 #         "ratings": [<float ratings>],
 #         "reviews": [<string reviews>],
-#         "average_rating": <float>
+#         "average_rating": <float>,
+#         "version": <int, bumped on every new rating>
 #     },
 #     ...
 # }
@@ -88,6 +89,7 @@ def rate_driver(ride_id: int, rating: float, review: Optional[str] = None) -> No
     ratings_list = driver_ratings_data[driver_id]["ratings"]
     new_average = sum(ratings_list) / len(ratings_list)
     driver_ratings_data[driver_id]["average_rating"] = new_average
+    driver_ratings_data[driver_id]["version"] = driver_ratings_data[driver_id].get("version", 0) + 1
 
     # Log the action for audit
     log_info(f"Driver rated successfully for ride {ride_id}")
@@ -139,6 +141,7 @@ def rate_rider(ride_id: int, rating: float, review: Optional[str] = None) -> Non
     ratings_list = rider_ratings_data[rider_id]["ratings"]
     new_average = sum(ratings_list) / len(ratings_list)
     rider_ratings_data[rider_id]["average_rating"] = new_average
+    rider_ratings_data[rider_id]["version"] = rider_ratings_data[rider_id].get("version", 0) + 1
 
     # Log the action for audit
     log_info(f"Rider rated successfully for ride {ride_id}")
@@ -192,4 +195,24 @@ def get_driver_rating(driver_id: int) -> float:
         logger.error("No rating found for driver_id=%d", driver_id)
         raise ValueError(f"No rating found for driver ID {driver_id}")
 
-    return driver_info["average_rating"]
\ No newline at end of file
+    return driver_info["average_rating"]
+
+
+def get_rider_rating_version(rider_id: int) -> int:
+    """
+    Returns the version counter of a rider's rating, bumped on every new rating.
+
+    :param rider_id: The unique ID of the rider.
+    :return: The version, or 0 if the rider has never been rated.
+    """
+    return rider_ratings_data.get(rider_id, {}).get("version", 0)
+
+
+def get_driver_rating_version(driver_id: int) -> int:
+    """
+    Returns the version counter of a driver's rating, bumped on every new rating.
+
+    :param driver_id: The unique ID of the driver.
+    :return: The version, or 0 if the driver has never been rated.
+    """
+    return driver_ratings_data.get(driver_id, {}).get("version", 0)
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Response
 from pydantic import BaseModel
 from typing import Optional
 from riders.riders_service import create_rider, fetch_rider
+from utils.etags import etag_matches, make_etag, not_modified
 
 router = APIRouter()
 
@@ -52,11 +53,19 @@ def create_rider_endpoint(request_data: RiderCreateRequest) -> dict:
 
 
 @router.get("/riders/{rider_id}", status_code=status.HTTP_200_OK)
-def get_rider_profile_endpoint(rider_id: int) -> dict:
+def get_rider_profile_endpoint(
+    rider_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+) -> dict:
     """
     Fetches a rider's profile details.
 
+    The response carries a version-based ETag; a matching If-None-Match
+    header yields an empty 304 response.
+
     :param rider_id: Unique rider ID.
+    :param if_none_match: ETag from a previous response, if any.
     :return: Rider profile information.
 
     Raises:
@@ -69,6 +78,10 @@ def get_rider_profile_endpoint(rider_id: int) -> dict:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Rider with ID {rider_id} not found."
             )
+        etag = make_etag("rider", rider_id, rider.get("version", 0))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
         return rider
     except HTTPException:
         # Propagate HTTPExceptions as they are
@@ -31,7 +31,8 @@ def create_rider(name: str, phone_number: str, payment_method: str) -> dict:
             "id": rider_id,
             "name": name,
             "phone_number": phone_number,
-            "payment_method": payment_method
+            "payment_method": payment_method,
+            "version": 1
         }
         
         # Store in our in-memory database
@@ -0,0 +1,314 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rides.rides_index import RideIndex
+from rides.rides_service import is_terminal_status
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+# Archive defaults. Each block holds up to BLOCK_SIZE rides, stored column by
+# column and zlib-compressed; decoded blocks are kept in a small LRU cache.
+DEFAULT_ARCHIVE_DIR = os.path.join("data", "rides_archive")
+BLOCK_SIZE = 512
+BLOCK_CACHE_SIZE = 16
+
+DATA_FILE = "rides.dat"
+INDEX_FILE = "rides.idx"
+
+
+class RideArchiveError(Exception):
+    """
+    Custom exception for errors related to the ride archive.
+    """
+    pass
+
+
+def encode_block(rides: List[Dict[str, Any]]) -> bytes:
+    """
+    Encodes rides (sorted by ride_id) as one compressed, column-oriented block.
+    """
+    names: List[str] = []
+    for ride in rides:
+        for name in ride:
+            if name not in names:
+                names.append(name)
+
+    columns: Dict[str, List[Any]] = {}
+    datetime_columns = []
+    for name in names:
+        values = [ride.get(name) for ride in rides]
+        if any(isinstance(value, datetime) for value in values):
+            datetime_columns.append(name)
+            values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        columns[name] = values
+
+    payload = {"count": len(rides), "columns": columns, "datetime_columns": datetime_columns}
+    return zlib.compress(json.dumps(payload, separators=(",", ":"), default=str).encode())
+
+
+def decode_block(data: bytes) -> List[Dict[str, Any]]:
+    """
+    Decodes a block produced by encode_block back into ride records.
+    """
+    payload = json.loads(zlib.decompress(data))
+    columns = payload["columns"]
+    for name in payload["datetime_columns"]:
+        columns[name] = [datetime.fromisoformat(value) if value else value for value in columns[name]]
+    return [
+        {name: values[row] for name, values in columns.items()}
+        for row in range(payload["count"])
+    ]
+
+
+class RideArchive:
+    """
+    Append-only, compressed cold storage for finished rides.
+
+    Rides are written in blocks sorted by ride_id. A sparse index keeps one entry
+    per block, in archive order: the lowest and highest ride_id in the block and
+    the block's offset and length. Rides that finish out of order make block
+    ranges overlap, so a lookup reads the blocks whose range covers the ride,
+    newest first, each with a single seek. A ride archived again after it
+    changed is therefore served from its newest copy.
+    """
+    def __init__(self, directory: str, block_size: int = BLOCK_SIZE):
+        self.directory = directory
+        self.block_size = block_size
+        self._data_path = os.path.join(directory, DATA_FILE)
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._blocks: List[Tuple[int, int]] = []
+        self._ranges: List[Tuple[int, int]] = []
+        # Block numbers ordered by their lowest ride_id, and the widest block
+        # range, bound the blocks a lookup has to check.
+        self._min_ids: List[int] = []
+        self._by_min_id: List[int] = []
+        self._max_span = 0
+        self._cache: "OrderedDict[int, List[Dict[str, Any]]]" = OrderedDict()
+        self._writer = None
+        self._reader = None
+        self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self._index_path):
+            return
+        with open(self._index_path, "r", encoding="utf-8") as index_file:
+            for line in index_file:
+                if line.strip():
+                    self._register_block(json.loads(line))
+        logger.info("Loaded ride archive index with %d blocks", len(self._blocks))
+
+    def _register_block(self, entry: Dict[str, Any]) -> None:
+        block_number = len(self._blocks)
+        self._blocks.append((entry["offset"], entry["length"]))
+        self._ranges.append((entry["min_id"], entry["max_id"]))
+        position = bisect.bisect_right(self._min_ids, entry["min_id"])
+        self._min_ids.insert(position, entry["min_id"])
+        self._by_min_id.insert(position, block_number)
+        self._max_span = max(self._max_span, entry["max_id"] - entry["min_id"])
+
+    def append(self, rides: List[Dict[str, Any]]) -> int:
+        """
+        Appends rides to the archive, in blocks of at most block_size rides.
+
+        :param rides: Ride records; each must have an integer ride_id.
+        :return: The number of rides archived.
+        :raises RideArchiveError: If the rides cannot be written.
+        """
+        ordered = sorted(rides, key=lambda ride: ride["ride_id"])
+        try:
+            for start in range(0, len(ordered), self.block_size):
+                self._append_block(ordered[start:start + self.block_size])
+        except OSError as e:
+            logger.error("Failed to append to ride archive: %s", e)
+            raise RideArchiveError("Could not archive rides") from e
+        return len(ordered)
+
+    def _append_block(self, rides: List[Dict[str, Any]]) -> None:
+        data = encode_block(rides)
+        with self._lock:
+            if self._writer is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._writer = open(self._data_path, "ab")
+            offset = self._writer.seek(0, os.SEEK_END)
+            self._writer.write(data)
+            self._writer.flush()
+            os.fsync(self._writer.fileno())
+
+            entry = {
+                "min_id": rides[0]["ride_id"],
+                "max_id": rides[-1]["ride_id"],
+                "offset": offset,
+                "length": len(data),
+            }
+            # The index entry is written last: a crash before this point leaves an
+            # unreferenced block, never an index entry pointing at missing data.
+            with open(self._index_path, "a", encoding="utf-8") as index_file:
+                index_file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            self._register_block(entry)
+
+    def _locate(self, ride_id: int) -> List[int]:
+        """
+        Returns the blocks whose ride_id range covers a ride, newest first.
+        """
+        start = bisect.bisect_left(self._min_ids, ride_id - self._max_span)
+        end = bisect.bisect_right(self._min_ids, ride_id)
+        return sorted(
+            (block_number for block_number in self._by_min_id[start:end] if self._ranges[block_number][1] >= ride_id),
+            reverse=True,
+        )
+
+    def _read_block(self, block_number: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rides = self._cache.get(block_number)
+            if rides is not None:
+                self._cache.move_to_end(block_number)
+                return rides
+            if self._reader is None:
+                self._reader = open(self._data_path, "rb")
+            offset, length = self._blocks[block_number]
+            self._reader.seek(offset)
+            data = self._reader.read(length)
+
+        rides = decode_block(data)
+        with self._lock:
+            self._cache[block_number] = rides
+            if len(self._cache) > BLOCK_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return rides
+
+    def get(self, ride_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Returns the newest archived copy of a ride, or None if it is not in the archive.
+        """
+        for block_number in self._locate(ride_id):
+            rides = self._read_block(block_number)
+            ride_ids = [ride["ride_id"] for ride in rides]
+            position = bisect.bisect_left(ride_ids, ride_id)
+            if position < len(rides) and ride_ids[position] == ride_id:
+                return dict(rides[position])
+        return None
+
+    def close(self) -> None:
+        """
+        Closes the archive's file handles.
+        """
+        with self._lock:
+            for handle in (self._writer, self._reader):
+                if handle is not None:
+                    handle.close()
+            self._writer = None
+            self._reader = None
+
+
+def select_finished_rides(rides_db: Dict[int, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Returns copies of the completed and cancelled rides in the hot store.
+    """
+    return [dict(ride) for ride in rides_db.values() if is_terminal_status(ride.get("status"))]
+
+
+def evict_archived_rides(
+    rides_db: Dict[int, Dict[str, Any]],
+    archived: List[Dict[str, Any]],
+    index: Optional[RideIndex] = None
+) -> int:
+    """
+    Removes archived rides from the hot store and the ride index. A ride that
+    changed after it was copied for archiving stays, to be archived again later;
+    that newer copy then shadows the stale one in the archive.
+
+    :return: The number of rides removed.
+    """
+    evicted = 0
+    for ride in archived:
+        if rides_db.get(ride["ride_id"]) != ride:
+            continue
+        del rides_db[ride["ride_id"]]
+        if index is not None:
+            index.remove_ride(ride["ride_id"])
+        evicted += 1
+    return evicted
+
+
+def tier_finished_rides(
+    rides_db: Dict[int, Dict[str, Any]],
+    archive: RideArchive,
+    index: Optional[RideIndex] = None
+) -> int:
+    """
+    Moves completed and cancelled rides from the hot store into the archive.
+    Rides are only removed from the hot store, and from the index, once they
+    are durably archived.
+
+    :param rides_db: The in-memory ride store.
+    :param archive: The archive to move finished rides into.
+    :param index: The ride index to remove moved rides from.
+    :return: The number of rides moved.
+    """
+    finished = select_finished_rides(rides_db)
+    if not finished:
+        return 0
+    archive.append(finished)
+    moved = evict_archived_rides(rides_db, finished, index)
+    logger.info("Archived %d finished rides", moved)
+    return moved
+
+
+class RideTieringJob(AsyncPeriodicJob):
+    """
+    Background job that periodically moves finished rides to the archive.
+
+    Runs on the event loop, since it removes rides from the hot store and
+    index; only the archive write happens in a worker thread, and rides that
+    change while it is written are left in place.
+    """
+    name = "ride-tiering-job"
+
+    def __init__(
+        self,
+        rides_db: Dict[int, Dict[str, Any]],
+        archive_provider: Callable[[], RideArchive],
+        interval_seconds: float,
+        index: Optional[RideIndex] = None
+    ):
+        super().__init__(interval_seconds)
+        self.rides_db = rides_db
+        self.archive_provider = archive_provider
+        self.index = index
+
+    async def run_once(self) -> int:
+        finished = select_finished_rides(self.rides_db)
+        if not finished:
+            return 0
+        await asyncio.to_thread(self.archive_provider().append, finished)
+        moved = evict_archived_rides(self.rides_db, finished, self.index)
+        logger.info("Archived %d finished rides", moved)
+        return moved
+
+
+_archive: Optional[RideArchive] = None
+
+
+def get_ride_archive() -> RideArchive:
+    """
+    Returns the shared ride archive, stored under RIDES_ARCHIVE_DIR.
+    """
+    global _archive
+    if _archive is None:
+        _archive = RideArchive(os.getenv("RIDES_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR))
+    return _archive
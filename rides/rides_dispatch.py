@@ -0,0 +1,268 @@
+import asyncio
+import importlib
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from drivers.drivers_availability import AvailabilityPool
+from drivers.drivers_locations import SpatialIndex
+from utils.geolocation import estimate_travel_time, parse_coordinates
+
+logger = logging.getLogger(__name__)
+
+Coordinates = Tuple[float, float]
+
+# Number of nearest available drivers shortlisted for ETA scoring.
+DEFAULT_CANDIDATES = 8
+# Drivers further from the pickup than this are never offered the ride.
+MAX_PICKUP_RADIUS_KM = 10.0
+# How long dispatch waits for ETA scores before using straight-line order.
+DEFAULT_SCORING_DEADLINE_MS = 200.0
+# Executor kinds: "inline" scores on the event loop, which is fastest for the
+# built-in straight-line estimate; "process" scales CPU-bound routed estimates
+# and "thread" suits estimators that call a routing service.
+DEFAULT_SCORING_EXECUTOR = "inline"
+# Executor used by default when a routed estimator is configured.
+ROUTED_SCORING_EXECUTOR = "process"
+
+
+def estimate_pickup_eta(driver_position: Coordinates, pickup: Coordinates) -> float:
+    """
+    Estimates the minutes a driver needs to reach a pickup.
+
+    Straight-line distance at an average speed; configure DISPATCH_ETA_ESTIMATOR
+    to use a routed estimate instead.
+    """
+    return estimate_travel_time(driver_position, pickup) * 60.0
+
+
+def rank_candidates(
+    eta_fn: Callable[[Coordinates, Coordinates], float],
+    pickup: Coordinates,
+    candidates: List[Tuple[str, Coordinates]],
+) -> List[Tuple[float, str]]:
+    """
+    Scores every candidate and returns (eta_minutes, driver_id) pairs, fastest first.
+
+    Submitted to the scoring pool as one task per dispatch, so it and eta_fn
+    must be picklable module-level functions.
+    """
+    return sorted((eta_fn(position, pickup), driver_id) for driver_id, position in candidates)
+
+
+def load_eta_estimator(path: str) -> Callable[[Coordinates, Coordinates], float]:
+    """
+    Imports an ETA estimator given as "package.module:function".
+    """
+    module_name, _, function_name = path.partition(":")
+    if not module_name or not function_name:
+        raise ValueError(f"ETA estimator must be given as module:function, got {path!r}")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def shortlist_candidates(
+    pickup: Coordinates,
+    index: SpatialIndex,
+    pool: AvailabilityPool,
+    k: Optional[int] = None,
+) -> List[Tuple[float, str]]:
+    """
+    Returns up to k (default DEFAULT_CANDIDATES) available drivers nearest the
+    pickup as (distance_km, driver_id), nearest first.
+    """
+    return index.nearest(
+        pickup, k=k or DEFAULT_CANDIDATES, max_radius_km=MAX_PICKUP_RADIUS_KM, predicate=pool.is_available
+    )
+
+
+def create_scoring_executor(kind: str, workers: Optional[int] = None) -> Optional[Executor]:
+    """
+    Builds the executor used for ETA scoring; "inline" returns None.
+    """
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eta-scoring")
+    if kind == "inline":
+        return None
+    raise ValueError(f"Unknown scoring executor: {kind}")
+
+
+class CandidateScorer:
+    """
+    Scores dispatch candidates by pickup ETA.
+
+    Inline scoring ranks the candidates directly on the event loop. Otherwise
+    the whole candidate set is sent to a worker pool as one task, and the
+    scorer waits for it until the deadline; if it is late, no ranking is
+    returned and dispatch uses the straight-line order. The executor is
+    created on first use.
+    """
+    def __init__(
+        self,
+        executor_kind: str = DEFAULT_SCORING_EXECUTOR,
+        deadline_ms: float = DEFAULT_SCORING_DEADLINE_MS,
+        workers: Optional[int] = None,
+        eta_fn: Callable[[Coordinates, Coordinates], float] = estimate_pickup_eta,
+    ):
+        self.executor_kind = executor_kind
+        self.deadline_ms = deadline_ms
+        self.workers = workers
+        self.eta_fn = eta_fn
+        self._executor: Optional[Executor] = None
+        self.late = 0
+
+    async def score(self, pickup: Coordinates, candidates: List[Tuple[str, Coordinates]]) -> List[Tuple[float, str]]:
+        """
+        Computes pickup ETAs for the candidates within the deadline.
+
+        :param pickup: The pickup coordinates.
+        :param candidates: (driver_id, position) pairs.
+        :return: (eta_minutes, driver_id) pairs, fastest first; empty if
+            scoring missed the deadline or failed.
+        """
+        if not candidates:
+            return []
+        if self.executor_kind == "inline":
+            return rank_candidates(self.eta_fn, pickup, candidates)
+
+        if self._executor is None:
+            self._executor = create_scoring_executor(self.executor_kind, self.workers)
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self._executor, rank_candidates, self.eta_fn, pickup, candidates)
+        try:
+            return await asyncio.wait_for(task, timeout=self.deadline_ms / 1000.0)
+        except asyncio.TimeoutError:
+            self.late += len(candidates)
+            logger.warning("ETA scoring of %d candidates missed the deadline", len(candidates))
+        except Exception as e:
+            logger.error("ETA scoring failed: %s", e)
+        return []
+
+    def close(self) -> None:
+        """
+        Shuts the worker pool down.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+
+def reserve_first(pool: AvailabilityPool, ranked: List[Tuple[float, str]], ride_id: Any = None) -> Optional[str]:
+    """
+    Reserves the best-ranked driver that is still available.
+    """
+    for _, driver_id in ranked:
+        if pool.reserve(ride_id, driver_id) is not None:
+            return driver_id
+    return None
+
+
+def dispatch_nearest(pickup: Any, index: SpatialIndex, pool: AvailabilityPool, ride_id: Any = None) -> Optional[str]:
+    """
+    Reserves the nearest available driver by straight-line distance, or the
+    longest-waiting driver when the pickup has no coordinates.
+
+    :return: The reserved driver's ID, or None if no driver is available.
+    """
+    coords = parse_coordinates(pickup)
+    if coords is None:
+        return pool.reserve(ride_id)
+    return reserve_first(pool, shortlist_candidates(coords, index, pool), ride_id)
+
+
+async def dispatch_by_eta(
+    pickup: Any,
+    index: SpatialIndex,
+    pool: AvailabilityPool,
+    scorer: CandidateScorer,
+    ride_id: Any = None,
+) -> Optional[str]:
+    """
+    Reserves the available driver with the shortest pickup ETA.
+
+    The k nearest drivers are shortlisted from the spatial index and scored by
+    the worker pool. If no score arrives before the deadline, the shortlist's
+    straight-line order is used instead.
+
+    :return: The reserved driver's ID, or None if no driver is available.
+    """
+    coords = parse_coordinates(pickup)
+    if coords is None:
+        return pool.reserve(ride_id)
+
+    shortlist = shortlist_candidates(coords, index, pool)
+    candidates = [(driver_id, index.position(driver_id)) for _, driver_id in shortlist]
+    ranked = await scorer.score(coords, candidates)
+    # Drivers may have been reserved by other requests while scoring ran; fall
+    # through to the straight-line order if every scored driver is gone.
+    return reserve_first(pool, ranked, ride_id) or reserve_first(pool, shortlist, ride_id)
+
+
+async def dispatch_batch(
+    pickups: List[Any],
+    ride_ids: List[Any],
+    index: SpatialIndex,
+    pool: AvailabilityPool,
+    scorer: CandidateScorer,
+) -> List[Optional[str]]:
+    """
+    Assigns drivers to a batch of rides at once, by pickup ETA.
+
+    Every ride's nearest drivers are shortlisted and scored together; the
+    (ride, driver) pairs are then assigned greedily, shortest ETA first across
+    the whole batch, so a driver near two pickups goes to the one they reach
+    sooner instead of the one listed first. Rides left without a driver (their
+    candidates all went to faster matches) fall back to the nearest driver
+    still available, and rides without coordinates to the longest-waiting one.
+
+    :return: The reserved driver's ID, or None, per ride in order.
+    """
+    coords = [parse_coordinates(pickup) for pickup in pickups]
+    located = [position for position, pickup in enumerate(coords) if pickup is not None]
+    shortlists = [
+        [(driver_id, index.position(driver_id)) for _, driver_id in shortlist_candidates(coords[position], index, pool)]
+        for position in located
+    ]
+    rankings = await asyncio.gather(*(
+        scorer.score(coords[position], candidates) for position, candidates in zip(located, shortlists)
+    ))
+    pairs = sorted(
+        (eta, position, driver_id)
+        for position, ranked in zip(located, rankings)
+        for eta, driver_id in ranked
+    )
+
+    assigned: List[Optional[str]] = [None] * len(pickups)
+    for _, position, driver_id in pairs:
+        if assigned[position] is None and pool.reserve(ride_ids[position], driver_id) is not None:
+            assigned[position] = driver_id
+    for position, ride_id in enumerate(ride_ids):
+        if assigned[position] is None:
+            assigned[position] = dispatch_nearest(pickups[position], index, pool, ride_id)
+    return assigned
+
+
+def get_candidate_scorer() -> CandidateScorer:
+    """
+    Returns the shared candidate scorer, configured from DISPATCH_ETA_ESTIMATOR,
+    DISPATCH_SCORING_EXECUTOR, DISPATCH_SCORING_DEADLINE_MS and
+    DISPATCH_SCORING_WORKERS. Scoring is inline unless a routed estimator is
+    configured, which is scored in a process pool by default.
+    """
+    global _scorer
+    if _scorer is None:
+        workers = os.getenv("DISPATCH_SCORING_WORKERS")
+        estimator = os.getenv("DISPATCH_ETA_ESTIMATOR")
+        default_executor = ROUTED_SCORING_EXECUTOR if estimator else DEFAULT_SCORING_EXECUTOR
+        _scorer = CandidateScorer(
+            executor_kind=os.getenv("DISPATCH_SCORING_EXECUTOR", default_executor),
+            deadline_ms=float(os.getenv("DISPATCH_SCORING_DEADLINE_MS", DEFAULT_SCORING_DEADLINE_MS)),
+            workers=int(workers) if workers else None,
+            eta_fn=load_eta_estimator(estimator) if estimator else estimate_pickup_eta,
+        )
+    return _scorer
+
+
+_scorer: Optional[CandidateScorer] = None
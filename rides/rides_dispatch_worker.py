@@ -0,0 +1,302 @@
+"""
+Ride matching in a dedicated worker process.
+
+With DISPATCH_MODE=worker, the app starts one long-lived dispatch process next to
+the uvicorn event loop. The app mirrors driver positions and availability changes
+to it over a multiprocessing queue and sends match requests the same way; the
+worker drains its queue in batches, applies updates first, matches every request
+in the batch against the freshest state and sends the matches back. HTTP handlers
+await the result, so request parsing never competes with matching for the loop.
+
+The worker only proposes drivers. The app still reserves the driver in its own
+availability pool, so a proposal that races with a reservation made elsewhere is
+rejected and the ride falls back to in-process dispatch. The worker reserves what
+it proposes in its copy of the pool; a proposal the app rejects, or that arrives
+after the match timed out, is released there again, and reservations mirrored
+from the app take precedence over the worker's own.
+
+Running locally:
+    DISPATCH_MODE=worker uvicorn main:create_app --factory --workers 1
+
+The queues are OS pipes between the uvicorn process and its child, so the worker
+never listens on a port and needs no deployment of its own. Run one uvicorn worker
+per dispatch process; each uvicorn worker would otherwise get its own dispatch
+process and fleet state.
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from drivers.drivers_availability import AvailabilityPool
+from drivers.drivers_locations import LocationUpdate, SpatialIndex
+from rides.rides_dispatch import Coordinates, estimate_pickup_eta, reserve_first, shortlist_candidates
+from utils.geolocation import parse_coordinates
+
+logger = logging.getLogger(__name__)
+
+# Messages the worker drains from its queue before matching.
+MAX_BATCH_MESSAGES = 1000
+# How long a request waits for the worker before dispatching in-process.
+DEFAULT_MATCH_TIMEOUT_SECONDS = 2.0
+# How long shutdown waits for the worker process to exit.
+SHUTDOWN_TIMEOUT_SECONDS = 5.0
+
+
+def dispatch_worker_enabled() -> bool:
+    """
+    Returns True if matching should run in the dispatch worker process (DISPATCH_MODE=worker).
+    """
+    return os.getenv("DISPATCH_MODE", "inline").lower() == "worker"
+
+
+def match_ride(
+    coords: Optional[Coordinates],
+    ride_id: Any,
+    index: SpatialIndex,
+    pool: AvailabilityPool,
+    eta_fn: Callable[[Coordinates, Coordinates], float],
+) -> Optional[str]:
+    """
+    Reserves the driver with the shortest pickup ETA among the nearest candidates,
+    or the longest-waiting driver if the pickup has no coordinates.
+    """
+    if coords is None:
+        return pool.reserve(ride_id)
+    shortlist = shortlist_candidates(coords, index, pool)
+    ranked = sorted((eta_fn(index.position(driver_id), coords), driver_id) for _, driver_id in shortlist)
+    return reserve_first(pool, ranked, ride_id)
+
+
+def apply_pool_event(index: SpatialIndex, pool: AvailabilityPool, event: str, driver_id: str, ride_id: Any) -> None:
+    """
+    Replays an availability change from the app on the worker's copy of the fleet.
+    """
+    if event == "add":
+        pool.add(driver_id)
+    elif event == "remove":
+        pool.remove(driver_id)
+        index.remove(driver_id)
+    elif event == "reserve":
+        # The app's reservation wins over one the worker made for a proposal.
+        if pool.reserve(ride_id, driver_id) is None and pool.release(driver_id):
+            pool.reserve(ride_id, driver_id)
+    elif event == "release":
+        pool.release(driver_id, ride_id)
+
+
+def run_dispatch_worker(
+    requests: "multiprocessing.Queue",
+    responses: "multiprocessing.Queue",
+    eta_fn: Callable[[Coordinates, Coordinates], float] = estimate_pickup_eta,
+    max_batch: int = MAX_BATCH_MESSAGES,
+) -> None:
+    """
+    Entry point of the dispatch process. Runs until it receives None.
+    """
+    index = SpatialIndex()
+    pool = AvailabilityPool()
+    running = True
+    while running:
+        batch = [requests.get()]
+        while len(batch) < max_batch:
+            try:
+                batch.append(requests.get_nowait())
+            except queue.Empty:
+                break
+
+        matches = []
+        for message in batch:
+            if message is None:
+                running = False
+                break
+            kind = message[0]
+            if kind == "locations":
+                index.apply(message[1])
+            elif kind == "pool":
+                apply_pool_event(index, pool, *message[1:])
+            elif kind == "match":
+                matches.append(message)
+            elif kind == "sync":
+                _, positions, available, reserved = message
+                index, pool = SpatialIndex(), AvailabilityPool(available)
+                index.apply(positions)
+                for driver_id, ride_id in reserved.items():
+                    pool.add(driver_id)
+                    pool.reserve(ride_id, driver_id)
+
+        results = []
+        for _, request_id, coords, ride_id in matches:
+            try:
+                results.append((request_id, match_ride(coords, ride_id, index, pool, eta_fn)))
+            except Exception as e:
+                logger.error("Dispatch worker failed to match request %s: %s", request_id, e)
+                results.append((request_id, None))
+        if results:
+            responses.put(results)
+    responses.put(None)
+
+
+class DispatchWorkerClient:
+    """
+    App-side handle on the dispatch process.
+
+    Exposes start()/stop() like the background jobs so the app lifespan manages it.
+    start() must run on the event loop; a reader thread resolves match futures on it.
+    """
+    name = "dispatch-worker"
+
+    def __init__(
+        self,
+        index: SpatialIndex,
+        pool: AvailabilityPool,
+        eta_fn: Callable[[Coordinates, Coordinates], float] = estimate_pickup_eta,
+        match_timeout_seconds: float = DEFAULT_MATCH_TIMEOUT_SECONDS,
+    ):
+        self.index = index
+        self.pool = pool
+        self.eta_fn = eta_fn
+        self.match_timeout_seconds = match_timeout_seconds
+        self._context = multiprocessing.get_context("spawn")
+        self._process: Optional[multiprocessing.Process] = None
+        self._reader: Optional[threading.Thread] = None
+        self._requests: Optional["multiprocessing.Queue"] = None
+        self._responses: Optional["multiprocessing.Queue"] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pending: Dict[int, Tuple[asyncio.Future, Any]] = {}
+        self._request_ids = itertools.count(1)
+        self._listening = False
+        self.timeouts = 0
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def start(self) -> None:
+        """
+        Spawns the dispatch process and seeds it with the current fleet state.
+        """
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._requests = self._context.Queue()
+        self._responses = self._context.Queue()
+        self._process = self._context.Process(
+            target=run_dispatch_worker,
+            args=(self._requests, self._responses, self.eta_fn),
+            name=self.name,
+            daemon=True,
+        )
+        self._process.start()
+        self._reader = threading.Thread(target=self._read_responses, name=f"{self.name}-reader", daemon=True)
+        self._reader.start()
+
+        snapshot = (self.index.positions(), self.pool.available_drivers(), self.pool.reserved_drivers())
+        self._requests.put(("sync", *snapshot))
+        if not self._listening:
+            self.pool.add_listener(self.send_pool_event)
+            self._listening = True
+
+    def stop(self) -> None:
+        """
+        Asks the dispatch process to exit and waits for it.
+        """
+        if self._process is None:
+            return
+        self._requests.put(None)
+        self._process.join(SHUTDOWN_TIMEOUT_SECONDS)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._responses.put(None)
+        self._reader.join(SHUTDOWN_TIMEOUT_SECONDS)
+        self._process = self._reader = None
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.set_result(None)
+        self._pending.clear()
+
+    def send_locations(self, updates: Dict[str, LocationUpdate]) -> None:
+        """
+        Location flush listener: mirrors flushed positions to the worker.
+        """
+        if self.running:
+            self._requests.put(("locations", updates))
+
+    def send_pool_event(self, event: str, driver_id: str, ride_id: Any) -> None:
+        """
+        Availability listener: mirrors pool changes to the worker.
+        """
+        if self.running:
+            self._requests.put(("pool", event, driver_id, ride_id))
+
+    async def match(self, pickup: Any, ride_id: Any = None) -> Optional[str]:
+        """
+        Asks the worker for a driver for a ride and reserves the proposed driver
+        in the app's availability pool.
+
+        :return: The reserved driver's ID, or None if the worker found nobody,
+            proposed a driver reserved here in the meantime, or did not answer
+            within the match timeout.
+        """
+        request_id = next(self._request_ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, ride_id)
+        self._requests.put(("match", request_id, parse_coordinates(pickup), ride_id))
+        try:
+            driver_id = await asyncio.wait_for(future, self.match_timeout_seconds)
+        except asyncio.TimeoutError:
+            # Left pending so a late proposal is released when it arrives.
+            self.timeouts += 1
+            logger.warning("Dispatch worker did not answer request %s in time", request_id)
+            return None
+        if driver_id is not None and self.pool.reserve(ride_id, driver_id) is None:
+            self.abandon(driver_id, ride_id)
+            return None
+        return driver_id
+
+    def abandon(self, driver_id: str, ride_id: Any) -> None:
+        """
+        Releases a proposal the app did not take in the worker's copy of the pool.
+        """
+        self.send_pool_event("release", driver_id, ride_id)
+
+    def _read_responses(self) -> None:
+        while True:
+            results = self._responses.get()
+            if results is None:
+                return
+            self._loop.call_soon_threadsafe(self._resolve, results)
+
+    def _resolve(self, results: List[Tuple[int, Optional[str]]]) -> None:
+        for request_id, driver_id in results:
+            pending = self._pending.pop(request_id, None)
+            if pending is None:
+                continue
+            future, ride_id = pending
+            if not future.done():
+                future.set_result(driver_id)
+            elif driver_id is not None:
+                self.abandon(driver_id, ride_id)
+
+
+def get_dispatch_worker() -> Optional[DispatchWorkerClient]:
+    """
+    Returns the shared dispatch worker client, or None if it was never created.
+    """
+    return _worker
+
+
+def create_dispatch_worker(index: SpatialIndex, pool: AvailabilityPool, **kwargs: Any) -> DispatchWorkerClient:
+    """
+    Creates the shared dispatch worker client for the app's fleet state.
+    """
+    global _worker
+    _worker = DispatchWorkerClient(index, pool, **kwargs)
+    return _worker
+
+
+_worker: Optional[DispatchWorkerClient] = None
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.geolocation import cell_center, grid_cell, parse_coordinates
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+# Forecasting defaults. Demand is bucketed per grid cell and per time-of-day bucket,
+# and each (cell, bucket) series is smoothed across the previous HISTORY_DAYS days.
+BUCKET_MINUTES = 60
+HISTORY_DAYS = 14
+SMOOTHING_ALPHA = 0.3
+CELL_SIZE_KM = 1.0
+
+Coordinates = Tuple[float, float]
+Cell = Tuple[int, int]
+
+
+class ForecastError(Exception):
+    """
+    Custom exception for errors raised while building demand forecasts.
+    """
+    pass
+
+
+class DemandForecast:
+    """
+    Expected number of ride requests per grid cell and per time-of-day bucket.
+
+    The demand matrix has one row per bucket of the day and one column per cell,
+    so the forecast for a whole bucket is a single array slice.
+    """
+    def __init__(self, cells: List[Cell], demand: np.ndarray, bucket_minutes: int, cell_size_km: float):
+        self.cells = cells
+        self.demand = demand
+        self.bucket_minutes = bucket_minutes
+        self.cell_size_km = cell_size_km
+        self.cell_index: Dict[Cell, int] = {cell: index for index, cell in enumerate(cells)}
+
+    def bucket_for(self, moment: datetime) -> int:
+        """
+        Returns the time-of-day bucket containing the given moment.
+        """
+        return (moment.hour * 60 + moment.minute) // self.bucket_minutes
+
+    def expected_demand(self, cell: Cell, moment: datetime) -> float:
+        """
+        Returns the forecast number of requests for a cell during the bucket of `moment`.
+        Cells that never saw a request are forecast at zero.
+        """
+        index = self.cell_index.get(cell)
+        if index is None:
+            return 0.0
+        return float(self.demand[self.bucket_for(moment), index])
+
+
+def smooth_demand(counts: np.ndarray, alpha: float = SMOOTHING_ALPHA) -> np.ndarray:
+    """
+    Applies simple exponential smoothing along the first (day) axis of `counts`.
+
+    The recursive form level = alpha * x + (1 - alpha) * level, seeded with the
+    oldest observation, is expanded into one weight per day so that every
+    (bucket, cell) series is smoothed at once with a single tensor product.
+
+    :param counts: Array of shape (days, buckets, cells), oldest day first.
+    :param alpha: Smoothing factor in (0, 1].
+    :return: Array of shape (buckets, cells) holding the smoothed level.
+    :raises ForecastError: If alpha is out of range or counts has no days.
+    """
+    if not 0 < alpha <= 1:
+        raise ForecastError("Smoothing factor must be in (0, 1].")
+    days = counts.shape[0]
+    if days == 0:
+        raise ForecastError("At least one day of history is required.")
+
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=float)
+    weights[0] = (1 - alpha) ** (days - 1)
+    return np.tensordot(weights, counts, axes=(0, 0))
+
+
+def build_demand_forecast(
+    rides: Iterable[Dict[str, Any]],
+    now: Optional[datetime] = None,
+    history_days: int = HISTORY_DAYS,
+    bucket_minutes: int = BUCKET_MINUTES,
+    alpha: float = SMOOTHING_ALPHA,
+    cell_size_km: float = CELL_SIZE_KM,
+) -> DemandForecast:
+    """
+    Builds a per-cell, per-time-bucket demand forecast from the ride history.
+
+    Rides without a parseable pickup location or creation time, or older than
+    `history_days`, are ignored.
+
+    :param rides: Ride records, as stored by the rides router or rides service.
+    :param now: The reference time; defaults to the current UTC time.
+    :param history_days: Number of past days (including today) to learn from.
+    :param bucket_minutes: Width of a time-of-day bucket; must divide a day evenly.
+    :param alpha: Exponential smoothing factor.
+    :param cell_size_km: Width of a grid cell.
+    :return: The demand forecast.
+    :raises ForecastError: If the bucket width does not divide a day.
+    """
+    if bucket_minutes <= 0 or (24 * 60) % bucket_minutes:
+        raise ForecastError("bucket_minutes must evenly divide a day.")
+    now = now or datetime.utcnow()
+    buckets_per_day = (24 * 60) // bucket_minutes
+
+    cell_index: Dict[Cell, int] = {}
+    day_ids: List[int] = []
+    bucket_ids: List[int] = []
+    cell_ids: List[int] = []
+    for ride in rides:
+        created_at = ride.get("created_at")
+        coord = parse_coordinates(ride.get("pickup", ride.get("pickup_location")))
+        if not isinstance(created_at, datetime) or coord is None:
+            continue
+        age_days = (now.date() - created_at.date()).days
+        if age_days < 0 or age_days >= history_days:
+            continue
+        cell = grid_cell(coord, cell_size_km)
+        day_ids.append(history_days - 1 - age_days)
+        bucket_ids.append((created_at.hour * 60 + created_at.minute) // bucket_minutes)
+        cell_ids.append(cell_index.setdefault(cell, len(cell_index)))
+
+    cells = list(cell_index)
+    shape = (history_days, buckets_per_day, len(cells))
+    flat = np.ravel_multi_index(
+        (np.array(day_ids, dtype=np.intp), np.array(bucket_ids, dtype=np.intp), np.array(cell_ids, dtype=np.intp)),
+        shape,
+    ) if cells else np.empty(0, dtype=np.intp)
+    counts = np.bincount(flat, minlength=math.prod(shape)).reshape(shape).astype(float)
+
+    logger.debug("Built demand forecast from %d rides over %d cells", len(cell_ids), len(cells))
+    return DemandForecast(cells, smooth_demand(counts, alpha), bucket_minutes, cell_size_km)
+
+
+def compute_repositioning(
+    forecast: DemandForecast,
+    idle_drivers: Dict[str, Optional[Coordinates]],
+    moment: datetime,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Suggests where idle drivers should move to cover the forecast demand.
+
+    Drivers in cells with more idle supply than forecast demand, and drivers
+    whose position is unknown, are sent to the cells with the largest demand
+    deficit, nearest driver first. Drivers already where they are needed get no
+    suggestion.
+
+    :param forecast: The demand forecast.
+    :param idle_drivers: Idle driver IDs mapped to their current position, if known.
+    :param moment: The time the suggestions are for.
+    :return: Suggestions keyed by driver ID.
+    """
+    if not forecast.cells or not idle_drivers:
+        return {}
+
+    demand = forecast.demand[forecast.bucket_for(moment)]
+    driver_ids = list(idle_drivers)
+    positions = [idle_drivers[driver_id] for driver_id in driver_ids]
+    driver_cells = np.array([
+        forecast.cell_index.get(grid_cell(position, forecast.cell_size_km), -1) if position else -1
+        for position in positions
+    ], dtype=np.intp)
+    located = driver_cells >= 0
+    supply = np.bincount(driver_cells[located], minlength=len(forecast.cells))
+
+    # Drivers above a cell's forecast demand are free to move, as are drivers we cannot place.
+    movable = ~located
+    spare = np.floor(np.maximum(supply - demand, 0)).astype(int)
+    for index in np.flatnonzero(located):
+        cell = driver_cells[index]
+        if spare[cell] > 0:
+            spare[cell] -= 1
+            movable[index] = True
+
+    deficit = demand - supply
+    targets = np.flatnonzero(deficit > 0)
+    targets = targets[np.argsort(-deficit[targets], kind="stable")]
+    slots = np.repeat(targets, np.ceil(deficit[targets]).astype(int))
+
+    coords = np.array([position if position else (np.nan, np.nan) for position in positions], dtype=float)
+    candidates = np.flatnonzero(movable)
+    generated_at = datetime.utcnow().isoformat()
+    suggestions: Dict[str, Dict[str, Any]] = {}
+    for cell in slots:
+        if candidates.size == 0:
+            break
+        center = cell_center(forecast.cells[cell], forecast.cell_size_km)
+        distances = np.nan_to_num(
+            np.hypot(coords[candidates, 0] - center[0], coords[candidates, 1] - center[1]),
+            nan=np.inf,
+        )
+        pick = int(np.argmin(distances))
+        driver_index = candidates[pick]
+        candidates = np.delete(candidates, pick)
+
+        suggestions[driver_ids[driver_index]] = {
+            "driver_id": driver_ids[driver_index],
+            "target_cell": list(forecast.cells[cell]),
+            "target_location": {"lat": center[0], "lng": center[1]},
+            "expected_demand": round(float(demand[cell]), 2),
+            "generated_at": generated_at,
+        }
+    return suggestions
+
+
+# Precomputed suggestions served by the rides router. The whole table is replaced
+# by reference at the end of each batch so readers never see a half-built table.
+_repositioning_table: Dict[str, Dict[str, Any]] = {}
+
+
+def get_repositioning_suggestion(driver_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Returns the latest repositioning suggestion for a driver, if any.
+    """
+    return _repositioning_table.get(driver_id)
+
+
+def run_repositioning_batch(
+    rides: Iterable[Dict[str, Any]],
+    idle_drivers: Dict[str, Optional[Coordinates]],
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Rebuilds the forecast and swaps in a fresh repositioning table.
+
+    Suggestions target the next time bucket, since that is when moving drivers arrive.
+
+    :param rides: Ride history to forecast from.
+    :param idle_drivers: Idle driver IDs mapped to their current position, if known.
+    :param now: The reference time; defaults to the current UTC time.
+    :return: The number of suggestions published.
+    """
+    global _repositioning_table
+    now = now or datetime.utcnow()
+    forecast = build_demand_forecast(rides, now)
+    table = compute_repositioning(forecast, idle_drivers, now + timedelta(minutes=forecast.bucket_minutes))
+    _repositioning_table = table
+    logger.info("Published %d repositioning suggestions", len(table))
+    return len(table)
+
+
+class RepositioningJob(AsyncPeriodicJob):
+    """
+    Background job that periodically recomputes repositioning suggestions,
+    keeping the forecast work off the request path.
+
+    Runs on the event loop, since it reads the ride store and driver pool; the
+    inputs are copied there and only the forecast runs in a worker thread.
+    """
+    name = "repositioning-job"
+
+    def __init__(
+        self,
+        rides_provider: Callable[[], Iterable[Dict[str, Any]]],
+        drivers_provider: Callable[[], Dict[str, Optional[Coordinates]]],
+        interval_seconds: float,
+    ):
+        super().__init__(interval_seconds)
+        self.rides_provider = rides_provider
+        self.drivers_provider = drivers_provider
+
+    async def run_once(self) -> int:
+        rides = [dict(ride) for ride in self.rides_provider()]
+        idle_drivers = dict(self.drivers_provider())
+        return await asyncio.to_thread(run_repositioning_batch, rides, idle_drivers)
@@ -0,0 +1,162 @@
+import base64
+import binascii
+import bisect
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Rides are ordered by (creation timestamp, ride_id); the ride_id breaks ties.
+SortKey = Tuple[float, int]
+
+INDEXED_FIELDS = ("rider_id", "driver_id", "status")
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursorError(ValueError):
+    """
+    Raised when a pagination cursor cannot be decoded.
+    """
+    pass
+
+
+def encode_cursor(key: SortKey) -> str:
+    """
+    Encodes a sort key as an opaque, URL-safe cursor.
+    """
+    raw = json.dumps([key[0], key[1]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> SortKey:
+    """
+    Decodes a cursor produced by encode_cursor.
+
+    :raises InvalidCursorError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, ride_id = json.loads(raw)
+        return (float(timestamp), int(ride_id))
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid pagination cursor.") from e
+
+
+class RideIndex:
+    """
+    Secondary indexes over the in-memory ride store, by rider, driver, status
+    and creation time.
+
+    Each index keeps its ride keys in a sorted list, so a page is located with a
+    binary search on the cursor key and costs O(log n + page size) no matter how
+    deep into the results it is.
+    """
+    def __init__(self):
+        self._keys: Dict[int, SortKey] = {}
+        self._values: Dict[int, Dict[str, Any]] = {}
+        self._by_created: List[SortKey] = []
+        self._by_field: Dict[str, Dict[Any, List[SortKey]]] = {field: {} for field in INDEXED_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def _normalize(field: str, value: Any) -> Any:
+        if field == "status" and value is not None:
+            return str(value).lower()
+        return value
+
+    def index_ride(self, ride: Dict[str, Any]) -> None:
+        """
+        Adds a ride to the indexes, or moves it between index entries if its
+        indexed fields changed. Must be called on every write to the ride store.
+
+        :param ride: The ride record; must contain ride_id and created_at.
+        """
+        ride_id = ride["ride_id"]
+        key = self._keys.get(ride_id)
+        if key is None:
+            created_at = ride.get("created_at") or datetime.utcnow()
+            key = (created_at.timestamp(), ride_id)
+            self._keys[ride_id] = key
+            self._values[ride_id] = {}
+            bisect.insort(self._by_created, key)
+
+        values = self._values[ride_id]
+        for field in INDEXED_FIELDS:
+            new_value = self._normalize(field, ride.get(field))
+            if field in values and values[field] == new_value:
+                continue
+            if field in values:
+                self._discard(field, values[field], key)
+            if new_value is not None:
+                bisect.insort(self._by_field[field].setdefault(new_value, []), key)
+            values[field] = new_value
+
+    def remove_ride(self, ride_id: int) -> None:
+        """
+        Removes a ride from every index. Unknown rides are ignored.
+        """
+        key = self._keys.pop(ride_id, None)
+        if key is None:
+            return
+        for field, value in self._values.pop(ride_id).items():
+            self._discard(field, value, key)
+        self._remove_key(self._by_created, key)
+
+    def _discard(self, field: str, value: Any, key: SortKey) -> None:
+        if value is None:
+            return
+        entries = self._by_field[field].get(value)
+        if entries is None:
+            return
+        self._remove_key(entries, key)
+        if not entries:
+            del self._by_field[field][value]
+
+    @staticmethod
+    def _remove_key(entries: List[SortKey], key: SortKey) -> None:
+        position = bisect.bisect_left(entries, key)
+        if position < len(entries) and entries[position] == key:
+            del entries[position]
+
+    def query(
+        self,
+        field: Optional[str] = None,
+        value: Any = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[int], Optional[str]]:
+        """
+        Returns one page of ride IDs, newest first.
+
+        :param field: The indexed field to filter on, or None for all rides by creation time.
+        :param value: The value of the field to match.
+        :param limit: Maximum number of rides in the page.
+        :param cursor: Cursor returned with the previous page, if any.
+        :return: The ride IDs in the page and the cursor for the next page (None on the last page).
+        :raises InvalidCursorError: If the cursor is malformed.
+        :raises ValueError: If the field is not indexed.
+        """
+        if field is None:
+            entries = self._by_created
+        elif field in self._by_field:
+            entries = self._by_field[field].get(self._normalize(field, value), [])
+        else:
+            raise ValueError(f"Rides are not indexed by {field}.")
+
+        end = len(entries)
+        if cursor:
+            end = bisect.bisect_left(entries, decode_cursor(cursor))
+        start = max(end - limit, 0)
+
+        page = entries[start:end][::-1]
+        next_cursor = encode_cursor(page[-1]) if page and start > 0 else None
+        return [key[1] for key in page], next_cursor
+
+
+# Shared index over the rides router's in-memory store.
+ride_index = RideIndex()
@@ -1,6 +1,31 @@
-from fastapi import APIRouter, HTTPException, status as http_status
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+import asyncio
+import json
+import logging
+from datetime import datetime
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status as http_status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Optional, Dict, Any, AsyncIterator, List, NamedTuple, Tuple
+
+from rides.rides_archive import get_ride_archive
+from rides.rides_forecast import get_repositioning_suggestion
+from rides.rides_index import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursorError, ride_index
+from rides.rides_scheduler import compute_dispatch_time, scheduled_rides, to_naive_utc
+from rides.rides_service import is_terminal_status
+from rides.rides_tracking import Subscription, sse_stream, tracking_hub
+from rides.rides_dispatch import dispatch_batch, dispatch_by_eta, dispatch_nearest, get_candidate_scorer
+from rides.rides_dispatch_worker import get_dispatch_worker
+from drivers.drivers_availability import driver_availability
+from payments.payments_earnings import record_ride_earnings
+from payments.payments_ledger import get_ledger, post_ride_fare
+from payments.payments_quotes import get_quote_service
+from payments.payments_surge import surge_engine
+from drivers.drivers_locations import driver_locations
+from utils.admission import NOT_OVERLOADED_HEADERS
+from utils.etags import etag_matches, make_etag, not_modified
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["rides"])
 
@@ -9,14 +34,19 @@ router = APIRouter(tags=["rides"])
 rides_db: Dict[int, Dict[str, Any]] = {}
 current_ride_id = 0
 
+# Upper bound on the number of rides in one bulk booking request.
+MAX_BULK_RIDES = 1000
+
 
 class RideRequest(BaseModel):
     """
     Data model for ride request containing pickup and drop-off locations.
     """
+    rider_id: Optional[int] = None
     pickup: Optional[str] = None
     dropoff: Optional[str] = None
     additional_info: Optional[str] = None
+    pickup_time: Optional[datetime] = None
 
 
 class RideStatusUpdate(BaseModel):
@@ -36,15 +66,212 @@ def get_next_ride_id() -> int:
     return current_ride_id
 
 
-def find_available_driver() -> Optional[str]:
+def find_available_driver(pickup: Any = None, ride_id: Optional[int] = None) -> Optional[str]:
+    """
+    Reserves the nearest available driver to the pickup by straight-line distance,
+    or the longest-waiting driver if the pickup has no coordinates.
+    Returns the driver ID, or None if no driver is available.
+    """
+    return dispatch_nearest(pickup, driver_locations, driver_availability, ride_id)
+
+
+async def find_best_driver(pickup: Any = None, ride_id: Optional[int] = None) -> Optional[str]:
+    """
+    Reserves the available driver with the shortest pickup ETA. The ETAs of the
+    nearest drivers are computed in a worker pool so the event loop stays free,
+    or by the dispatch worker process when it is running.
+    Returns the driver ID, or None if no driver is available.
+    """
+    worker = get_dispatch_worker()
+    if worker is not None and worker.running:
+        driver_id = await worker.match(pickup, ride_id)
+        # A proposal the worker could not make or that was taken here in the meantime falls through.
+        if driver_id is not None:
+            return driver_id
+    return await dispatch_by_eta(pickup, driver_locations, driver_availability, get_candidate_scorer(), ride_id)
+
+
+async def find_available_drivers(pickups: List[Any], ride_ids: List[int]) -> List[Optional[str]]:
+    """
+    Batch form of find_best_driver used by bulk booking: the whole batch is
+    matched to drivers at once by pickup ETA (see dispatch_batch).
+    Returns one driver ID (or None if no driver is available) per pickup, in order.
+    """
+    return await dispatch_batch(pickups, ride_ids, driver_locations, driver_availability, get_candidate_scorer())
+
+
+def release_driver(ride: Dict[str, Any]) -> None:
+    """
+    Returns the driver reserved for a ride to the availability pool, e.g. once
+    the ride is cancelled or completed.
+    """
+    driver_id = ride.get("driver_id")
+    if driver_id:
+        driver_availability.release(driver_id, ride["ride_id"])
+
+
+def quote_ride(ride: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Prices a ride once, at request time, and returns its fare and signed quote
+    token for the response. The token is pinned on the ride record, so payment
+    charges the quote instead of repricing however long the ride takes.
+    Rides without coordinates, or whose pricing fails, get no quote.
+    """
+    try:
+        issued = get_quote_service().quote_ride(ride["ride_id"], ride["rider_id"], ride["pickup"], ride["dropoff"])
+    except Exception as e:
+        logger.warning("Could not quote ride %s: %s", ride["ride_id"], e)
+        issued = None
+    if issued is None:
+        return {}
+    quote, token = issued
+    ride["fare_quote"] = token
+    return {"fare": quote.amount, "fare_quote": token, "fare_quote_expires_at": quote.expires_at}
+
+
+async def credit_driver(ride: Dict[str, Any]) -> None:
+    """
+    Adds a completed ride's earnings to its driver's next payout batch and
+    books the fare in the ledger. A failure is logged rather than failing the
+    status update.
+    """
+    try:
+        earning = record_ride_earnings(ride)
+        if earning is not None:
+            await post_ride_fare(
+                get_ledger(), ride["ride_id"], ride.get("rider_id"), ride["driver_id"],
+                earning.fare_cents, earning.amount_cents
+            )
+    except Exception as e:
+        logger.error("Could not record earnings for ride %s: %s", ride["ride_id"], e)
+
+
+def store_ride(
+    request_data: RideRequest,
+    driver_id: Optional[str],
+    status: str = "pending",
+    ride_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Creates a ride record for a request and its assigned driver (if any),
+    and adds it to the secondary indexes.
+
+    :param request_data: The validated ride request.
+    :param driver_id: The driver assigned to the ride, or None for scheduled rides.
+    :param status: The initial ride status.
+    :param ride_id: An ID already allocated for the ride, e.g. to reserve its driver.
+    :return: The stored ride record.
+    """
+    if ride_id is None:
+        ride_id = get_next_ride_id()
+    ride = {
+        "ride_id": ride_id,
+        "rider_id": request_data.rider_id,
+        "pickup": request_data.pickup or "Default pickup location",
+        "dropoff": request_data.dropoff or "Default dropoff location",
+        "status": status,
+        "driver_id": driver_id,
+        "additional_info": request_data.additional_info,
+        "pickup_time": to_naive_utc(request_data.pickup_time) if request_data.pickup_time else None,
+        "created_at": datetime.utcnow(),
+        "version": 1
+    }
+    rides_db[ride_id] = ride
+    ride_index.index_ride(ride)
+    return ride
+
+
+def schedule_ride(request_data: RideRequest) -> Optional[Dict[str, Any]]:
     """
-    Placeholder logic to find an available driver.
-    In a real implementation, there would be a more complex search/dispatch system.
-    Returns a driver ID if available, otherwise None.
+    Stores a ride for later dispatch if its pickup is far enough in the future.
+
+    :param request_data: The validated ride request.
+    :return: The scheduled ride record, or None if the ride should be dispatched now.
+    """
+    if request_data.pickup_time is None:
+        return None
+    dispatch_at = compute_dispatch_time(request_data.pickup_time, request_data.pickup)
+    if dispatch_at <= datetime.utcnow():
+        return None
+
+    ride = store_ride(request_data, None, status="scheduled")
+    ride["dispatch_at"] = dispatch_at
+    scheduled_rides.schedule(ride["ride_id"], dispatch_at)
+    return ride
+
+
+def dispatch_scheduled_ride(ride_id: int) -> bool:
+    """
+    Assigns a driver to a scheduled ride that has become due.
+    Rides that were cancelled or already dispatched are dropped.
+
+    :param ride_id: The unique identifier of the scheduled ride.
+    :return: False if no driver is available yet and the ride should be retried.
+    """
+    ride = rides_db.get(ride_id)
+    if ride is None or ride["status"] != "scheduled":
+        return True
+
+    driver_id = find_available_driver(ride["pickup"], ride_id)
+    if not driver_id:
+        return False
+
+    ride["driver_id"] = driver_id
+    ride["status"] = "pending"
+    # Priced at dispatch, when the pickup zone's surge applies
+    quote_ride(ride)
+    ride["version"] = ride.get("version", 0) + 1
+    ride_index.index_ride(ride)
+    publish_ride_status(ride)
+    return True
+
+
+def publish_ride_status(ride: Dict[str, Any]) -> None:
+    """
+    Pushes a ride's current status to live trackers and points position
+    forwarding at its driver, or stops it once the ride is finished.
+    """
+    ride_id = ride["ride_id"]
+    tracked_driver = None if is_terminal_status(ride["status"]) else ride.get("driver_id")
+    tracking_hub.set_driver(ride_id, tracked_driver)
+    tracking_hub.publish_status(ride_id, ride["status"], ride.get("driver_id"))
+
+
+def subscribe_to_ride(ride: Dict[str, Any]) -> Subscription:
+    """
+    Subscribes a connection to a ride's live events, seeded with the ride's
+    current status and its driver's last known position.
+    """
+    ride_id = ride["ride_id"]
+    driver_id = ride.get("driver_id")
+    if is_terminal_status(ride["status"]):
+        driver_id = None
+    subscription = tracking_hub.subscribe(ride_id, driver_id)
+    subscription.offer({"type": "status", "ride_id": ride_id, "status": ride["status"], "driver_id": ride.get("driver_id")})
+    position = driver_locations.position(driver_id) if driver_id else None
+    if position is not None:
+        subscription.offer({"type": "position", "ride_id": ride_id, "lat": position[0], "lng": position[1], "timestamp": None})
+    return subscription
+
+
+async def wait_for_disconnect(websocket: WebSocket) -> None:
+    """
+    Reads a WebSocket, discarding client messages, until the client disconnects.
+    """
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+def find_ride(ride_id: int) -> Optional[Dict[str, Any]]:
     """
-    # In a real scenario, we'd check for the nearest/available driver.
-    # For demonstration, we return a mock driver_id.
-    return "driver_123"
+    Looks a ride up in the in-memory store, falling through to the archive
+    for finished rides that have been tiered out of memory.
+    Returns None if the ride does not exist.
+    """
+    ride = rides_db.get(ride_id)
+    if ride is None:
+        ride = get_ride_archive().get(ride_id)
+    return ride
 
 
 @router.post("/rides/request_ride")
@@ -56,38 +283,47 @@ async def request_ride_endpoint(request_data: RideRequest):
     :return: JSON response containing ride details or an error if creation fails.
     """
     try:
-        # Generate a new ride ID
-        ride_id = get_next_ride_id()
-
-        # Default values if not provided
-        pickup = request_data.pickup or "Default pickup location"
-        dropoff = request_data.dropoff or "Default dropoff location"
+        # Rides booked for a later pickup are queued and dispatched ahead of time
+        ride = schedule_ride(request_data)
+        if ride is not None:
+            return {
+                "message": "Ride scheduled successfully.",
+                "ride_id": ride["ride_id"],
+                "pickup": ride["pickup"],
+                "dropoff": ride["dropoff"],
+                "status": ride["status"],
+                "driver_id": None,
+                "pickup_time": ride["pickup_time"],
+                "dispatch_at": ride["dispatch_at"]
+            }
 
-        # Attempt to find an available driver
-        driver_id = find_available_driver()
+        # Attempt to find an available driver; unmet requests count towards surge too
+        surge_engine.record_request(request_data.pickup)
+        ride_id = get_next_ride_id()
+        driver_id = await find_best_driver(request_data.pickup, ride_id)
         if not driver_id:
+            # A driver shortage, not overload: admission control must not back off
             raise HTTPException(
                 status_code=http_status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="No drivers currently available."
+                detail="No drivers currently available.",
+                headers=NOT_OVERLOADED_HEADERS
             )
 
         # Store ride details in an in-memory database
-        rides_db[ride_id] = {
-            "ride_id": ride_id,
-            "pickup": pickup,
-            "dropoff": dropoff,
-            "status": "pending",
-            "driver_id": driver_id,
-            "additional_info": request_data.additional_info
-        }
+        try:
+            ride = store_ride(request_data, driver_id, ride_id=ride_id)
+        except Exception:
+            driver_availability.release(driver_id, ride_id)
+            raise
 
         return {
             "message": "Ride requested successfully.",
-            "ride_id": ride_id,
-            "pickup": pickup,
-            "dropoff": dropoff,
-            "status": "pending",
-            "driver_id": driver_id
+            "ride_id": ride["ride_id"],
+            "pickup": ride["pickup"],
+            "dropoff": ride["dropoff"],
+            "status": ride["status"],
+            "driver_id": driver_id,
+            **quote_ride(ride)
         }
     except HTTPException:
         # Just re-raise the already created HTTPException
@@ -100,6 +336,150 @@ async def request_ride_endpoint(request_data: RideRequest):
         )
 
 
+class MalformedBulkItem(NamedTuple):
+    """
+    An NDJSON line of a bulk booking that is not valid JSON.
+    """
+    error: str
+
+
+def parse_bulk_ride_requests(body: bytes, content_type: str) -> List[Any]:
+    """
+    Splits a bulk booking body into raw items. Accepts a JSON array, or NDJSON
+    (one JSON object per line) when the content type says so. An NDJSON line
+    that is not valid JSON becomes a MalformedBulkItem, so it is rejected on
+    its own.
+
+    :raises ValueError: If the body is not a JSON array.
+    """
+    text = body.decode("utf-8")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items: List[Any] = []
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as e:
+                items.append(MalformedBulkItem(f"Line {line_number} is not valid JSON: {e}"))
+        return items
+
+    items = json.loads(text)
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of ride requests.")
+    return items
+
+
+def validate_bulk_ride_requests(items: List[Any]) -> List[Tuple[Optional[RideRequest], Optional[str]]]:
+    """
+    Validates every raw item in a single pass.
+    Returns a (request, error) pair per item; exactly one of the two is set.
+    """
+    results: List[Tuple[Optional[RideRequest], Optional[str]]] = []
+    for item in items:
+        if isinstance(item, MalformedBulkItem):
+            results.append((None, item.error))
+            continue
+        if not isinstance(item, dict):
+            results.append((None, "Each ride request must be a JSON object."))
+            continue
+        try:
+            results.append((RideRequest(**item), None))
+        except ValidationError as e:
+            results.append((None, str(e)))
+    return results
+
+
+async def book_rides_in_bulk(
+    validated: List[Tuple[Optional[RideRequest], Optional[str]]]
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Dispatches all valid requests as one batch and yields a result per item, in input order.
+    A failing item yields an error result and never aborts the rest of the batch.
+
+    Runs on the event loop, like the single-ride endpoint, since it updates
+    the ride store, indexes and driver pool.
+    """
+    scheduled: Dict[int, Dict[str, Any]] = {}
+    failed: Dict[int, str] = {}
+    pickups: List[Any] = []
+    ride_ids: List[int] = []
+    for index, (request, _) in enumerate(validated):
+        if request is None:
+            continue
+        try:
+            ride = schedule_ride(request)
+        except Exception as e:
+            logger.error("Could not schedule bulk ride %d: %s", index, e)
+            failed[index] = f"Could not schedule ride: {e}"
+            continue
+        if ride is not None:
+            scheduled[index] = ride
+        else:
+            pickups.append(request.pickup)
+            ride_ids.append(get_next_ride_id())
+            surge_engine.record_request(request.pickup)
+    drivers = iter(zip(ride_ids, await find_available_drivers(pickups, ride_ids)))
+
+    for index, (request, error) in enumerate(validated):
+        if request is None:
+            yield {"index": index, "status": "rejected", "error": error}
+            continue
+        if index in failed:
+            yield {"index": index, "status": "failed", "error": failed[index]}
+            continue
+        if index in scheduled:
+            yield {"index": index, "status": "scheduled", "ride": scheduled[index]}
+            continue
+        ride_id, driver_id = next(drivers)
+        if not driver_id:
+            yield {"index": index, "status": "failed", "error": "No drivers currently available."}
+            continue
+        try:
+            ride = store_ride(request, driver_id, ride_id=ride_id)
+        except Exception as e:
+            driver_availability.release(driver_id, ride_id)
+            yield {"index": index, "status": "failed", "error": str(e)}
+            continue
+        publish_ride_status(ride)
+        yield {"index": index, "status": "booked", "ride": ride, **quote_ride(ride)}
+
+
+@router.post("/rides/bulk_request")
+async def bulk_request_rides_endpoint(request: Request):
+    """
+    Books many rides in one call for enterprise and partner accounts.
+
+    The body is a JSON array of ride requests, or NDJSON when sent with an
+    application/x-ndjson content type. Items are validated in one pass, valid ones
+    are dispatched together, and one NDJSON result line per item is streamed back
+    in input order. Invalid or failed items are reported without aborting the rest.
+
+    :param request: The raw HTTP request.
+    :return: A streaming NDJSON response with a result per item.
+    """
+    try:
+        items = parse_bulk_ride_requests(await request.body(), request.headers.get("content-type", ""))
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid bulk ride request body: {e}"
+        )
+    if len(items) > MAX_BULK_RIDES:
+        raise HTTPException(
+            status_code=http_status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BULK_RIDES} rides can be booked per request."
+        )
+
+    validated = validate_bulk_ride_requests(items)
+
+    async def lines() -> AsyncIterator[str]:
+        async for result in book_rides_in_bulk(validated):
+            yield json.dumps(jsonable_encoder(result)) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @router.put("/rides/{ride_id}/status")
 async def update_ride_status_endpoint(ride_id: int, ride_status: RideStatusUpdate):
     """
@@ -117,8 +497,18 @@ async def update_ride_status_endpoint(ride_id: int, ride_status: RideStatusUpdat
             )
 
         # Update the status of the ride
+        ride = rides_db[ride_id]
+        was_finished = is_terminal_status(ride["status"])
         new_status = ride_status.status
-        rides_db[ride_id]["status"] = new_status
+        ride["status"] = new_status
+        ride["version"] = ride.get("version", 0) + 1
+        ride_index.index_ride(ride)
+        # Cancelled and completed rides hand their driver straight back to dispatch
+        if is_terminal_status(new_status) and not was_finished:
+            release_driver(ride)
+            if new_status.lower() == "completed":
+                await credit_driver(ride)
+        publish_ride_status(ride)
 
         return {
             "message": "Ride status updated successfully.",
@@ -136,22 +526,100 @@ async def update_ride_status_endpoint(ride_id: int, ride_status: RideStatusUpdat
         )
 
 
+@router.get("/rides/scheduled")
+async def list_scheduled_rides_endpoint(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    """
+    Lists the next scheduled rides in dispatch order.
+    Reads only the head of the schedule, never the whole ride table.
+
+    :param limit: Maximum number of rides to return.
+    :return: The upcoming scheduled rides.
+    """
+    upcoming = []
+    for dispatch_at, ride_id in scheduled_rides.upcoming(limit):
+        ride = rides_db.get(ride_id)
+        if ride is not None and ride["status"] == "scheduled":
+            upcoming.append(ride)
+    return {"rides": upcoming}
+
+
+@router.get("/rides")
+async def list_rides_endpoint(
+    rider_id: Optional[int] = None,
+    driver_id: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """
+    Lists rides newest first, optionally filtered by rider, driver or status.
+
+    Pages are served from the secondary ride indexes using keyset cursors, so
+    every page costs the same regardless of how far into the results it is.
+    Only rides in the hot store are listed; archived rides are served by ID.
+
+    :param rider_id: Only list rides requested by this rider.
+    :param driver_id: Only list rides assigned to this driver.
+    :param status: Only list rides currently in this status.
+    :param limit: Maximum number of rides to return.
+    :param cursor: The next_cursor value from the previous page.
+    :return: The rides in the page and the cursor for the next page, if any.
+    """
+    filters = {
+        field: value
+        for field, value in (("rider_id", rider_id), ("driver_id", driver_id), ("status", status))
+        if value is not None
+    }
+    if len(filters) > 1:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="Filter by at most one of rider_id, driver_id or status."
+        )
+    field, value = next(iter(filters.items()), (None, None))
+
+    try:
+        ride_ids, next_cursor = ride_index.query(field, value, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    return {
+        "rides": [ride for ride in map(find_ride, ride_ids) if ride is not None],
+        "next_cursor": next_cursor
+    }
+
+
 @router.get("/rides/{ride_id}")
-async def get_ride_details_endpoint(ride_id: int):
+async def get_ride_details_endpoint(
+    ride_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None)
+):
     """
     Retrieves details of a specific ride.
 
+    The response carries an ETag derived from the ride's version counter; polling
+    clients that send it back in If-None-Match get an empty 304 until the ride changes.
+
     :param ride_id: The unique identifier of the ride.
-    :return: Ride details or an error if not found.
+    :param if_none_match: ETag from a previous response, if any.
+    :return: Ride details, 304 Not Modified, or an error if not found.
     """
     try:
-        if ride_id not in rides_db:
+        ride = find_ride(ride_id)
+        if ride is None:
             raise HTTPException(
                 status_code=http_status.HTTP_404_NOT_FOUND,
                 detail=f"Ride with ID {ride_id} not found."
             )
 
-        return rides_db[ride_id]
+        etag = make_etag("ride", ride_id, ride.get("version", 0))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        response.headers["ETag"] = etag
+        return ride
     except HTTPException:
         # Re-raise to propagate 404 or other HTTP errors
         raise
@@ -160,4 +628,80 @@ async def get_ride_details_endpoint(ride_id: int):
         raise HTTPException(
             status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+
+@router.websocket("/rides/{ride_id}/track")
+async def track_ride_websocket(websocket: WebSocket, ride_id: int):
+    """
+    Streams a ride's status changes and its driver's position over a WebSocket.
+
+    Each message is a JSON object with "type" set to "status" or "position".
+    Slow clients skip intermediate positions rather than holding up other riders.
+
+    :param ride_id: The unique identifier of the ride to track.
+    """
+    ride = find_ride(ride_id)
+    if ride is None:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    subscription = subscribe_to_ride(ride)
+    # The client never sends anything, but its socket is read so a disconnect
+    # is noticed even while the ride is idle.
+    disconnected = asyncio.ensure_future(wait_for_disconnect(websocket))
+    try:
+        while True:
+            message = asyncio.ensure_future(subscription.get())
+            await asyncio.wait({message, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                message.cancel()
+                break
+            await websocket.send_json(message.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        tracking_hub.unsubscribe(subscription)
+
+
+@router.get("/rides/{ride_id}/events")
+async def ride_events_endpoint(ride_id: int):
+    """
+    Streams a ride's status changes and its driver's position as server-sent events.
+
+    :param ride_id: The unique identifier of the ride to track.
+    :return: A text/event-stream response, or an error if the ride is not found.
+    """
+    ride = find_ride(ride_id)
+    if ride is None:
+        raise HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND,
+            detail=f"Ride with ID {ride_id} not found."
+        )
+
+    subscription = subscribe_to_ride(ride)
+    return StreamingResponse(
+        sse_stream(tracking_hub, subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@router.get("/rides/repositioning/{driver_id}")
+async def get_repositioning_suggestion_endpoint(driver_id: str):
+    """
+    Retrieves the latest repositioning suggestion for an idle driver.
+    Suggestions are precomputed by the repositioning job, so this is a table lookup.
+
+    :param driver_id: The unique identifier of the driver.
+    :return: The suggested target cell and location, or an error if there is none.
+    """
+    suggestion = get_repositioning_suggestion(driver_id)
+    if suggestion is None:
+        raise HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND,
+            detail=f"No repositioning suggestion for driver {driver_id}."
+        )
+    return suggestion
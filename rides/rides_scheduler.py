@@ -0,0 +1,186 @@
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+from drivers.drivers_availability import AvailabilityPool, driver_availability
+from drivers.drivers_locations import SpatialIndex, driver_locations
+from rides.rides_dispatch import estimate_pickup_eta as dispatch_eta, shortlist_candidates
+from utils.geolocation import parse_coordinates
+from utils.periodic import AsyncPeriodicJob
+
+logger = logging.getLogger(__name__)
+
+# Dispatch for a scheduled ride starts this long before pickup, plus the pickup ETA.
+DEFAULT_LEAD_MINUTES = 10.0
+# Expected time for an assigned driver to reach the pickup when no better estimate exists.
+DEFAULT_PICKUP_ETA_MINUTES = 5.0
+# How long to wait before retrying a scheduled ride that found no driver.
+RETRY_DELAY_SECONDS = 30.0
+
+# Heap entries are (dispatch_at, ride_id); ride IDs are unique, so ties never compare further.
+ScheduleEntry = Tuple[datetime, int]
+
+
+def to_naive_utc(moment: datetime) -> datetime:
+    """
+    Converts a timezone-aware datetime to naive UTC, matching the rest of the
+    rides data. Naive datetimes are assumed to already be UTC.
+    """
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def get_lead_time() -> timedelta:
+    """
+    Returns the configured dispatch lead time (SCHEDULED_RIDE_LEAD_MINUTES).
+    """
+    return timedelta(minutes=float(os.getenv("SCHEDULED_RIDE_LEAD_MINUTES", DEFAULT_LEAD_MINUTES)))
+
+
+def estimate_pickup_eta(
+    pickup: Any,
+    index: Optional[SpatialIndex] = None,
+    pool: Optional[AvailabilityPool] = None,
+) -> timedelta:
+    """
+    Estimates how long an assigned driver will take to reach the pickup: the
+    median dispatch ETA of the nearest available drivers right now. Falls back
+    to DEFAULT_PICKUP_ETA_MINUTES when the pickup has no coordinates or no
+    driver is near it.
+
+    :param index: Driver positions; the shared location index if omitted.
+    :param pool: Driver availability; the shared pool if omitted.
+    """
+    coords = parse_coordinates(pickup)
+    if coords is None:
+        return timedelta(minutes=DEFAULT_PICKUP_ETA_MINUTES)
+    index = driver_locations if index is None else index
+    pool = driver_availability if pool is None else pool
+    etas = sorted(
+        dispatch_eta(index.position(driver_id), coords)
+        for _, driver_id in shortlist_candidates(coords, index, pool)
+    )
+    if not etas:
+        return timedelta(minutes=DEFAULT_PICKUP_ETA_MINUTES)
+    return timedelta(minutes=etas[len(etas) // 2])
+
+
+def compute_dispatch_time(
+    pickup_time: datetime,
+    pickup: Any = None,
+    lead_time: Optional[timedelta] = None,
+    eta_estimator: Callable[[Any], timedelta] = estimate_pickup_eta,
+) -> datetime:
+    """
+    Returns when dispatch should start for a ride to be picked up at `pickup_time`:
+    the lead time plus the estimated pickup ETA before it.
+    """
+    lead_time = get_lead_time() if lead_time is None else lead_time
+    return to_naive_utc(pickup_time) - lead_time - eta_estimator(pickup)
+
+
+class ScheduledRideQueue:
+    """
+    Min-heap of scheduled rides keyed by dispatch time.
+
+    Popping due rides costs O(log n) per ride and listing the next k rides costs
+    O(k log k); neither ever looks at the rest of the schedule or the ride table.
+    The queue is used from the event loop only, so it needs no locking.
+    """
+    def __init__(self):
+        self._heap: List[ScheduleEntry] = []
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, ride_id: int, dispatch_at: datetime) -> None:
+        """
+        Adds a ride to the schedule.
+        """
+        heapq.heappush(self._heap, (dispatch_at, ride_id))
+
+    def bulk_load(self, entries: Iterable[ScheduleEntry]) -> None:
+        """
+        Adds many (dispatch_at, ride_id) entries at once in linear time,
+        e.g. when restoring the schedule on startup.
+        """
+        self._heap.extend(entries)
+        heapq.heapify(self._heap)
+
+    def next_due(self) -> Optional[datetime]:
+        """
+        Returns the earliest dispatch time in the schedule, if any.
+        """
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> List[int]:
+        """
+        Removes and returns the IDs of all rides due for dispatch at `now`,
+        earliest first.
+        """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def upcoming(self, limit: int) -> List[ScheduleEntry]:
+        """
+        Returns the next `limit` entries in dispatch order without removing them.
+
+        Walks the heap as a tree with a small frontier heap, so only the O(limit)
+        nodes nearest the root are ever visited.
+        """
+        heap = self._heap
+        result: List[ScheduleEntry] = []
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(result) < limit:
+            entry, position = heapq.heappop(frontier)
+            result.append(entry)
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return result
+
+
+class ScheduledRideDispatcher(AsyncPeriodicJob):
+    """
+    Background task on the event loop that pops due scheduled rides and hands
+    them to `dispatch`. Rides `dispatch` cannot serve yet are retried later.
+    """
+    name = "scheduled-ride-dispatcher"
+
+    def __init__(
+        self,
+        queue: ScheduledRideQueue,
+        dispatch: Callable[[int], Optional[bool]],
+        poll_interval_seconds: float = 1.0,
+    ):
+        super().__init__(poll_interval_seconds)
+        self.queue = queue
+        self.dispatch = dispatch
+
+    def run_once(self, now: Optional[datetime] = None) -> int:
+        """
+        Dispatches every due ride.
+
+        :param now: The current time; defaults to the current UTC time.
+        :return: The number of rides popped from the schedule.
+        """
+        now = now or datetime.utcnow()
+        due = self.queue.pop_due(now)
+        for ride_id in due:
+            try:
+                if self.dispatch(ride_id) is False:
+                    self.queue.schedule(ride_id, now + timedelta(seconds=RETRY_DELAY_SECONDS))
+            except Exception as e:
+                logger.error("Failed to dispatch scheduled ride %s: %s", ride_id, e)
+        if due:
+            logger.info("Dispatched %d scheduled rides", len(due))
+        return len(due)
+
+
+# Shared schedule of rides booked for a later pickup.
+scheduled_rides = ScheduledRideQueue()
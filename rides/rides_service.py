@@ -1,6 +1,8 @@
 import logging
 from typing import Dict, Any, Optional
 
+from drivers.drivers_availability import driver_availability
+
 logger = logging.getLogger(__name__)
 
 class RideServiceError(Exception):
@@ -11,9 +13,17 @@ class RideServiceError(Exception):
 
 # In-memory data store simulations
 RIDES_DB = {}
-AVAILABLE_DRIVERS = ["driver123", "driver456", "driver789"]
 CURRENT_RIDE_ID = 0
 
+# Statuses after which a ride never changes again (both spellings are in use).
+TERMINAL_STATUSES = {"completed", "cancelled", "canceled"}
+
+def is_terminal_status(status: Optional[str]) -> bool:
+    """
+    Returns True if the ride status is final, regardless of case.
+    """
+    return status is not None and str(status).lower() in TERMINAL_STATUSES
+
 def create_ride(rider_id: str, pickup_location: Dict[str, Any], dropoff_location: Dict[str, Any]) -> int:
     """
     Creates a new ride record.
@@ -80,12 +90,12 @@ def assign_driver_to_ride(ride_id: int) -> Optional[str]:
             logger.info("Ride %s already has a driver assigned: %s", ride_id, ride_info["driver_id"])
             return ride_info["driver_id"]
 
-        # Find an available driver (if any)
-        if not AVAILABLE_DRIVERS:
+        # Reserve the longest-waiting available driver (if any)
+        driver_id = driver_availability.reserve(ride_id)
+        if driver_id is None:
             logger.info("No drivers available at the moment.")
             return None
 
-        driver_id = AVAILABLE_DRIVERS.pop(0)  # Assign the first available driver
         ride_info["driver_id"] = driver_id
         ride_info["status"] = "driver_assigned"
         logger.info("Assigned driver %s to ride %s", driver_id, ride_id)
@@ -119,7 +129,13 @@ def update_ride_status(ride_id: int, new_status: str) -> None:
         if new_status not in allowed_statuses:
             raise ValueError(f"Invalid status: {new_status}")
 
-        RIDES_DB[ride_id]["status"] = new_status
+        ride_info = RIDES_DB[ride_id]
+        was_finished = is_terminal_status(ride_info["status"])
+        ride_info["status"] = new_status
+
+        # Hand the driver back to dispatch as soon as the ride is over
+        if is_terminal_status(new_status) and not was_finished and ride_info.get("driver_id"):
+            driver_availability.release(ride_info["driver_id"], ride_id)
         logger.info("Ride %s status updated to %s", ride_id, new_status)
     except Exception as e:
         logger.error("Failed to update ride status for ride %s: %s", ride_id, e)
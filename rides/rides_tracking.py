@@ -0,0 +1,196 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+from drivers.drivers_locations import LocationUpdate, location_ingestor
+
+logger = logging.getLogger(__name__)
+
+# Status events buffered per connection before the oldest are dropped.
+SUBSCRIBER_QUEUE_SIZE = 32
+# Idle SSE connections get a comment line this often so proxies keep them open.
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+class Subscription:
+    """
+    One connection's view of a ride's live events.
+
+    Publishing never blocks: status events go into a bounded queue (the oldest is
+    dropped when a slow client falls behind), and driver positions are coalesced
+    into a single slot so a client only ever receives the freshest position.
+    """
+    def __init__(self, ride_id: int, maxsize: int = SUBSCRIBER_QUEUE_SIZE):
+        self.ride_id = ride_id
+        self._events: Deque[Dict[str, Any]] = deque(maxlen=maxsize)
+        self._position: Optional[Dict[str, Any]] = None
+        self._ready = asyncio.Event()
+        self.dropped = 0
+
+    def offer(self, message: Dict[str, Any]) -> None:
+        """
+        Queues a message without blocking.
+        """
+        if message["type"] == "position":
+            if self._position is not None:
+                self.dropped += 1
+            self._position = message
+        else:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(message)
+        self._ready.set()
+
+    def get_nowait(self) -> Optional[Dict[str, Any]]:
+        """
+        Returns the next queued message, status events first, or None if idle.
+        """
+        if self._events:
+            message = self._events.popleft()
+        elif self._position is not None:
+            message, self._position = self._position, None
+        else:
+            return None
+        if not self._events and self._position is None:
+            self._ready.clear()
+        return message
+
+    async def get(self) -> Dict[str, Any]:
+        """
+        Waits for and returns the next message.
+        """
+        while True:
+            message = self.get_nowait()
+            if message is not None:
+                return message
+            await self._ready.wait()
+
+
+class TrackingHub:
+    """
+    In-process pub/sub hub pushing driver positions and ride status changes to
+    the connections tracking each ride.
+
+    All methods run on the event loop. Publishing costs O(subscribers of the ride).
+    """
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._ride_drivers: Dict[int, str] = {}
+        self._driver_rides: Dict[str, Set[int]] = {}
+        self.published = 0
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscribers.values())
+
+    def subscribe(self, ride_id: int, driver_id: Optional[str] = None) -> Subscription:
+        """
+        Registers a new connection for a ride.
+
+        :param ride_id: The ride to track.
+        :param driver_id: The driver currently assigned to the ride, if any.
+        :return: The connection's subscription.
+        """
+        subscription = Subscription(ride_id, self.queue_size)
+        self._subscribers.setdefault(ride_id, set()).add(subscription)
+        if driver_id:
+            self.set_driver(ride_id, driver_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """
+        Removes a connection; the ride stops being watched once nobody tracks it.
+        """
+        ride_id = subscription.ride_id
+        subscriptions = self._subscribers.get(ride_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._subscribers[ride_id]
+            self.set_driver(ride_id, None)
+
+    def set_driver(self, ride_id: int, driver_id: Optional[str]) -> None:
+        """
+        Records which driver's positions should be forwarded to a tracked ride.
+        """
+        previous = self._ride_drivers.pop(ride_id, None)
+        if previous is not None:
+            rides = self._driver_rides.get(previous)
+            if rides is not None:
+                rides.discard(ride_id)
+                if not rides:
+                    del self._driver_rides[previous]
+        if driver_id and ride_id in self._subscribers:
+            self._ride_drivers[ride_id] = driver_id
+            self._driver_rides.setdefault(driver_id, set()).add(ride_id)
+
+    def _publish(self, ride_id: int, message: Dict[str, Any]) -> int:
+        subscriptions = self._subscribers.get(ride_id)
+        if not subscriptions:
+            return 0
+        for subscription in subscriptions:
+            subscription.offer(message)
+        self.published += len(subscriptions)
+        return len(subscriptions)
+
+    def publish_status(self, ride_id: int, status: str, driver_id: Optional[str] = None) -> int:
+        """
+        Pushes a ride status change to the ride's subscribers.
+
+        :return: The number of connections the event was queued for.
+        """
+        return self._publish(ride_id, {"type": "status", "ride_id": ride_id, "status": status, "driver_id": driver_id})
+
+    def publish_position(self, ride_id: int, lat: float, lng: float, timestamp: float) -> int:
+        """
+        Pushes the assigned driver's position to the ride's subscribers.
+
+        :return: The number of connections the position was queued for.
+        """
+        return self._publish(ride_id, {"type": "position", "ride_id": ride_id, "lat": lat, "lng": lng, "timestamp": timestamp})
+
+    def publish_driver_positions(self, updates: Dict[str, LocationUpdate]) -> None:
+        """
+        Location flush listener: forwards the flushed positions of drivers on tracked rides.
+        """
+        if len(self._driver_rides) < len(updates):
+            drivers = [driver_id for driver_id in self._driver_rides if driver_id in updates]
+        else:
+            drivers = [driver_id for driver_id in updates if driver_id in self._driver_rides]
+        for driver_id in drivers:
+            lat, lng, timestamp = updates[driver_id]
+            for ride_id in list(self._driver_rides.get(driver_id, ())):
+                self.publish_position(ride_id, lat, lng, timestamp)
+
+
+def format_sse(message: Dict[str, Any]) -> str:
+    """
+    Formats a message as a server-sent event.
+    """
+    return f"event: {message['type']}\ndata: {json.dumps(message, default=str)}\n\n"
+
+
+async def sse_stream(hub: TrackingHub, subscription: Subscription) -> AsyncIterator[str]:
+    """
+    Yields server-sent events for a subscription until the client disconnects,
+    with keep-alive comments while idle.
+    """
+    try:
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_sse(message)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+# Shared hub, fed by location flushes and ride status changes.
+tracking_hub = TrackingHub()
+location_ingestor.add_listener(tracking_hub.publish_driver_positions)
@@ -15,12 +15,29 @@ from sqlalchemy.orm import sessionmaker
 
 # Import your application factory
 from main import create_app
+from payments import payments_earnings, payments_ledger, payments_retries
+from rides import rides_archive
 
 # Test database setup
 TEST_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(TEST_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@pytest.fixture(autouse=True)
+def storage_dirs(tmp_path, monkeypatch):
+    # Keep the ledger, earnings, charge retries and ride archive out of the
+    # source tree, and drop any shared instances opened over the defaults.
+    monkeypatch.setenv("LEDGER_DIR", str(tmp_path / "ledger"))
+    monkeypatch.setenv("EARNINGS_DIR", str(tmp_path / "earnings"))
+    monkeypatch.setenv("CHARGE_RETRY_DB", str(tmp_path / "charge_retries.db"))
+    monkeypatch.setenv("RIDES_ARCHIVE_DIR", str(tmp_path / "rides_archive"))
+    monkeypatch.setattr(payments_ledger, "_ledger", None)
+    monkeypatch.setattr(payments_earnings, "_ledger", None)
+    monkeypatch.setattr(payments_earnings, "_batcher", None)
+    monkeypatch.setattr(payments_retries, "_queue", None)
+    monkeypatch.setattr(payments_retries, "_retrier", None)
+    monkeypatch.setattr(rides_archive, "_archive", None)
+
 @pytest.fixture
 def app():
     #Create a fresh app instance for each test.
@@ -0,0 +1,146 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers import drivers_router
+from drivers.drivers_availability import AvailabilityPool
+from drivers.drivers_heartbeat import HeartbeatTracker
+from drivers.drivers_locations import LocationIngestor, SpatialIndex
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """
+    Fresh availability pool shared with the drivers router.
+    """
+    availability = AvailabilityPool()
+    monkeypatch.setattr(drivers_router, "driver_availability", availability)
+    return availability
+
+
+@pytest.fixture
+def tracker(monkeypatch, pool):
+    """
+    Heartbeat tracker with a fake clock that evicts drivers from the test pool.
+    """
+    clock = {"now": 0.0}
+    heartbeats = HeartbeatTracker(timeout_seconds=30.0, on_expire=pool.remove, clock=lambda: clock["now"])
+    heartbeats.fake_clock = clock
+    monkeypatch.setattr(drivers_router, "driver_heartbeats", heartbeats)
+    return heartbeats
+
+
+@pytest.fixture
+def client(tracker):
+    """
+    Test client for an app serving only the drivers router.
+    """
+    app = FastAPI()
+    app.include_router(drivers_router.router)
+    return TestClient(app)
+
+
+def test_expire_evicts_only_stale_drivers_oldest_first():
+    """
+    Drivers whose last beat is older than the timeout are evicted; a fresh beat saves a driver.
+    """
+    # Arrange
+    evicted = []
+    tracker = HeartbeatTracker(timeout_seconds=30.0, on_expire=evicted.append)
+    tracker.beat("a", now=0.0)
+    tracker.beat("b", now=5.0)
+    tracker.beat("c", now=10.0)
+    tracker.beat("a", now=20.0)
+
+    # Act
+    expired = tracker.expire(now=40.0)
+
+    # Assert
+    assert expired == ["b", "c"]
+    assert evicted == ["b", "c"]
+    assert "a" in tracker
+    assert tracker.stats() == {"online": 1, "evicted": 2}
+
+
+def test_expire_stops_at_first_live_driver():
+    """
+    Expiry only visits expired drivers plus one, however many are online.
+    """
+    # Arrange
+    tracker = HeartbeatTracker(timeout_seconds=30.0)
+    for n in range(100_000):
+        tracker.beat(f"driver{n}", now=100.0)
+    tracker.beat("stale", now=0.0)
+    tracker._last_seen.move_to_end("stale", last=False)
+    visited = []
+    tracker.on_expire = visited.append
+
+    # Act
+    expired = tracker.expire(now=100.0)
+
+    # Assert
+    assert expired == ["stale"]
+    assert visited == ["stale"]
+    assert len(tracker) == 100_000
+
+
+def test_location_updates_keep_tracked_drivers_alive():
+    """
+    Flushed location updates refresh tracked drivers without bringing new ones online.
+    """
+    # Arrange
+    index = SpatialIndex()
+    tracker = HeartbeatTracker(timeout_seconds=30.0, on_expire=index.remove, clock=lambda: 25.0)
+    ingestor = LocationIngestor(index)
+    ingestor.add_listener(tracker.touch)
+    tracker.beat("driver1", now=0.0)
+    tracker.beat("driver2", now=0.0)
+
+    # Act
+    ingestor.submit("driver1", 40.0, -73.0, timestamp=1.0)
+    ingestor.submit("driver3", 41.0, -74.0, timestamp=1.0)
+    ingestor.flush()
+    expired = tracker.expire(now=40.0)
+
+    # Assert
+    assert expired == ["driver2"]
+    assert "driver3" not in tracker
+    assert "driver1" in index
+
+
+def test_availability_pool_reserves_longest_waiting_driver():
+    """
+    Reservations take the first available driver; releases return them to the back.
+    """
+    # Arrange
+    pool = AvailabilityPool()
+    for driver_id in ("a", "b", "c"):
+        pool.add(driver_id)
+
+    # Act
+    first = pool.reserve(ride_id=1)
+    specific = pool.reserve(ride_id=2, driver_id="c")
+    pool.release(first)
+
+    # Assert
+    assert (first, specific) == ("a", "c")
+    assert pool.available_drivers() == ["b", "a"]
+    assert pool.stats() == {"available": 2, "reserved": 1}
+    assert pool.remove("c") and "c" not in pool
+
+
+def test_heartbeat_endpoint_makes_driver_available_until_evicted(client, tracker, pool):
+    """
+    A heartbeat brings a driver online; silence past the timeout evicts them and counts it.
+    """
+    # Act
+    response = client.post("/drivers/driver7/heartbeat")
+    tracker.fake_clock["now"] = 31.0
+    tracker.expire()
+    stats = client.get("/drivers/heartbeat/stats").json()
+
+    # Assert
+    assert response.status_code == 200
+    assert response.json()["status"] == "available"
+    assert not pool.is_available("driver7")
+    assert stats == {"online": 0, "evicted": 1, "available": 0, "reserved": 0}
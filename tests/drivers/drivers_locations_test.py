@@ -0,0 +1,159 @@
+import math
+import random
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers import drivers_router
+from drivers.drivers_locations import LocationIngestor, SpatialIndex, validate_update
+from utils.geolocation import calculate_distance
+
+CENTER = (40.7580, -73.9855)
+
+
+@pytest.fixture
+def ingestor(monkeypatch):
+    """
+    Fresh ingestor and spatial index shared with the drivers router.
+    """
+    location_ingestor = LocationIngestor(SpatialIndex())
+    monkeypatch.setattr(drivers_router, "location_ingestor", location_ingestor)
+    return location_ingestor
+
+
+@pytest.fixture
+def client(ingestor):
+    """
+    Test client for an app serving only the drivers router.
+    """
+    app = FastAPI()
+    app.include_router(drivers_router.router)
+    return TestClient(app)
+
+
+def test_validate_update_rejects_bad_input():
+    """
+    Only a driver ID plus in-range numeric coordinates pass validation.
+    """
+    assert validate_update("driver1", 40.0, -73.0)
+    assert not validate_update("", 40.0, -73.0)
+    assert not validate_update("driver1", "40.0", -73.0)
+    assert not validate_update("driver1", 91.0, -73.0)
+    assert not validate_update("driver1", math.nan, -73.0)
+    assert not validate_update("driver1", True, -73.0)
+
+
+def test_ingestor_coalesces_to_latest_update_per_driver():
+    """
+    Only the newest update per driver reaches the index, regardless of arrival order.
+    """
+    # Arrange
+    ingestor = LocationIngestor(SpatialIndex())
+
+    # Act
+    ingestor.submit("driver1", 40.0, -73.0, timestamp=1.0)
+    ingestor.submit("driver1", 40.2, -73.2, timestamp=3.0)
+    ingestor.submit("driver1", 40.1, -73.1, timestamp=2.0)
+    ingestor.submit("driver2", 41.0, -74.0, timestamp=1.0)
+    pending_before_flush = ingestor.pending
+    applied = ingestor.flush()
+
+    # Assert
+    assert pending_before_flush == 2
+    assert applied == 2
+    assert ingestor.index.position("driver1") == (40.2, -73.2)
+    assert ingestor.stats()["accepted"] == 4
+
+
+def test_ingestor_flushes_when_pending_limit_reached():
+    """
+    Reaching max_pending applies the batch without waiting for the flush job.
+    """
+    ingestor = LocationIngestor(SpatialIndex(), max_pending=3)
+
+    for n in range(3):
+        ingestor.submit(f"driver{n}", 40.0, -73.0)
+
+    assert ingestor.pending == 0
+    assert len(ingestor.index) == 3
+
+
+def test_index_ignores_stale_updates_and_moves_drivers_between_cells():
+    """
+    Older positions never overwrite newer ones; moves update the cell membership.
+    """
+    # Arrange
+    index = SpatialIndex()
+    index.apply({"driver1": (40.0, -73.0, 5.0)})
+
+    # Act
+    index.apply({"driver1": (41.0, -74.0, 4.0)})
+    stale_position = index.position("driver1")
+    index.apply({"driver1": (40.5, -73.5, 6.0)})
+
+    # Assert
+    assert stale_position == (40.0, -73.0)
+    assert index.nearest((40.5, -73.5), k=1)[0][1] == "driver1"
+    assert index.nearest((40.0, -73.0), k=1, max_radius_km=1.0) == []
+    assert index.remove("driver1")
+    assert not index.remove("driver1")
+
+
+def test_nearest_matches_brute_force():
+    """
+    The ring search returns the same k nearest drivers as a full scan.
+    """
+    # Arrange
+    rng = random.Random(3)
+    index = SpatialIndex()
+    positions = {
+        f"driver{n}": (CENTER[0] + rng.uniform(-0.1, 0.1), CENTER[1] + rng.uniform(-0.1, 0.1))
+        for n in range(2000)
+    }
+    index.apply({driver_id: (lat, lng, 0.0) for driver_id, (lat, lng) in positions.items()})
+
+    # Act
+    nearest = index.nearest(CENTER, k=10, predicate=lambda driver_id: not driver_id.endswith("7"))
+
+    # Assert
+    expected = sorted(
+        (calculate_distance(CENTER, position), driver_id)
+        for driver_id, position in positions.items()
+        if not driver_id.endswith("7")
+    )[:10]
+    assert [driver_id for _, driver_id in nearest] == [driver_id for _, driver_id in expected]
+
+
+def test_post_locations_endpoint_accepts_batches(client, ingestor):
+    """
+    The batched endpoint queues valid updates and counts rejected ones.
+    """
+    # Act
+    response = client.post("/drivers/locations", json={"updates": [
+        {"driver_id": "driver1", "lat": 40.0, "lng": -73.0},
+        {"driver_id": "driver2", "lat": 400.0, "lng": -73.0},
+        "not an update",
+    ]})
+    ingestor.flush()
+
+    # Assert
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 1, "rejected": 2}
+    assert ingestor.index.position("driver1") == (40.0, -73.0)
+    assert client.post("/drivers/locations", json=[]).status_code == 400
+
+
+def test_websocket_streams_updates(client, ingestor):
+    """
+    Updates sent over the WebSocket are ingested; malformed messages get an error.
+    """
+    with client.websocket_connect("/drivers/locations/ws") as websocket:
+        websocket.send_text('{"driver_id": "driver1", "lat": 40.0, "lng": -73.0}')
+        websocket.send_text('[{"driver_id": "driver2", "lat": 41.0, "lng": -74.0}]')
+        websocket.send_text("not json")
+        error = websocket.receive_json()
+
+    ingestor.flush()
+    assert error == {"error": "Message must be valid JSON"}
+    assert len(ingestor.index) == 2
+    assert client.get("/drivers/locations/stats").json()["indexed_drivers"] == 2
@@ -0,0 +1,166 @@
+import asyncio
+
+import pytest
+
+from payments import payments_earnings
+from payments.payments_earnings import EarningsLedger, PayoutBatcher, record_ride_earnings
+from payments.payments_gateway import GatewayError
+from payments.payments_quotes import QuoteCache, QuoteService, QuoteSigner
+
+
+class FakePayouts:
+    """
+    Records payouts; optionally crashes on the nth call or declines/fails given drivers.
+    """
+    def __init__(self, crash_on=None, declined=(), failing=()):
+        self.calls = []
+        self.crash_on = crash_on
+        self.declined = set(declined)
+        self.failing = set(failing)
+
+    async def __call__(self, driver_id, amount, idempotency_key=None):
+        self.calls.append((driver_id, amount, idempotency_key))
+        if self.crash_on is not None and len(self.calls) == self.crash_on:
+            raise RuntimeError("process crashed")
+        if driver_id in self.failing:
+            raise GatewayError("gateway timed out")
+        return {"status": "declined" if driver_id in self.declined else "success"}
+
+
+def make_batcher(directory, payouts, chunk_size=100):
+    ledger = EarningsLedger(str(directory / "earnings.log"))
+    return ledger, PayoutBatcher(ledger, str(directory), payout=payouts, chunk_size=chunk_size)
+
+
+def test_batch_pays_each_driver_once_for_all_their_rides(tmp_path):
+    """
+    Per-ride earnings are summed per driver and paid in one payout each; paid earnings are compacted away.
+    """
+    # Arrange
+    payouts = FakePayouts()
+    ledger, batcher = make_batcher(tmp_path, payouts)
+    for ride_id, (driver_id, amount) in enumerate([("d1", 7.5), ("d2", 3.0), ("d1", 2.25), ("d1", 1.0)]):
+        ledger.record(driver_id, ride_id, amount)
+
+    # Act
+    summary = asyncio.run(batcher.run_batch())
+    ledger.record("d2", 99, 4.0)
+    next_summary = asyncio.run(batcher.run_batch())
+
+    # Assert
+    assert summary["drivers"] == 2 and summary["paid"] == 2
+    assert sorted(call[:2] for call in payouts.calls[:2]) == [("d1", 10.75), ("d2", 3.0)]
+    assert next_summary["drivers"] == 1
+    assert payouts.calls[2][:2] == ("d2", 4.0)
+    assert len(EarningsLedger(ledger.path)) == 1
+
+
+def test_crashed_batch_resumes_without_repaying_settled_drivers(tmp_path):
+    """
+    After a crash mid-batch, a restarted batcher pays only unsettled drivers, with the same idempotency keys.
+    """
+    # Arrange
+    crashing = FakePayouts(crash_on=5)
+    ledger, batcher = make_batcher(tmp_path, crashing, chunk_size=3)
+    for i in range(10):
+        ledger.record(f"d{i}", i, 10.0)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(batcher.run_batch())
+    ledger.close()
+
+    # Act
+    resumed = FakePayouts()
+    _, restarted = make_batcher(tmp_path, resumed, chunk_size=3)
+    summary = asyncio.run(restarted.run_batch())
+
+    # Assert
+    first_chunk = {driver_id for driver_id, _, _ in crashing.calls[:3]}
+    retried = {driver_id for driver_id, _, _ in resumed.calls}
+    assert summary["paid"] == 10
+    assert not first_chunk & retried
+    assert len(retried) == 7 == len(resumed.calls)
+    keys = {driver_id: key for driver_id, _, key in crashing.calls}
+    assert all(keys[driver_id] == key for driver_id, _, key in resumed.calls if driver_id in keys)
+
+
+def test_declines_carry_over_and_gateway_failures_keep_batch_open(tmp_path):
+    """
+    Declined payouts move to the next batch; failed ones are retried in the same batch.
+    """
+    payouts = FakePayouts(declined={"d1"}, failing={"d2"})
+    ledger, batcher = make_batcher(tmp_path, payouts)
+    for ride_id, driver_id in enumerate(["d1", "d2", "d3"]):
+        ledger.record(driver_id, ride_id, 5.0)
+
+    first = asyncio.run(batcher.run_batch())
+    payouts.failing.clear()
+    payouts.declined.clear()
+    retried = asyncio.run(batcher.run_batch())
+    ledger.record("d1", 10, 1.0)
+    carried = asyncio.run(batcher.run_batch())
+
+    assert (first["paid"], first["declined"], first["pending"]) == (1, 1, 1)
+    assert retried["batch"] == first["batch"] and retried["pending"] == 0
+    assert [call[0] for call in payouts.calls] == ["d1", "d2", "d3", "d2", "d1"]
+    assert payouts.calls[-1][1] == 6.0
+    assert carried["paid"] == 1
+
+
+def test_ride_earnings_are_recorded_once(tmp_path, monkeypatch):
+    """
+    A completed ride credits its driver's share of the fare exactly once.
+    """
+    monkeypatch.setattr(payments_earnings, "calculate_trip_fare", lambda pickup, dropoff: 20.0)
+    ledger = EarningsLedger(str(tmp_path / "earnings.log"))
+    ride = {"ride_id": 4242, "driver_id": "d1", "pickup": "40.75,-73.98", "dropoff": "40.70,-74.01"}
+
+    earning = record_ride_earnings(ride, ledger)
+    again = record_ride_earnings(ride, ledger)
+
+    assert earning.amount_cents == 1500
+    assert again is None
+    assert len(ledger) == 1
+
+
+def test_ride_earnings_use_the_pinned_quote_once_the_cached_one_expires(tmp_path, monkeypatch):
+    """
+    Earnings are priced from the quote pinned on the ride, not repriced at the current surge.
+    """
+    # Arrange
+    service = QuoteService(QuoteSigner("secret"), QuoteCache(10))
+    monkeypatch.setattr(payments_earnings, "get_quote_service", lambda: service)
+    monkeypatch.setattr(payments_earnings, "calculate_trip_fare", lambda pickup, dropoff: 99.0)
+    _, token = service.issue(4242, 7, 20.0, 1.0)
+    service.cache = QuoteCache(10)
+    ledger = EarningsLedger(str(tmp_path / "earnings.log"))
+    ride = {"ride_id": 4242, "driver_id": "d1", "pickup": "40.75,-73.98", "dropoff": "40.70,-74.01", "fare_quote": token}
+
+    # Act
+    earning = record_ride_earnings(ride, ledger)
+
+    # Assert
+    assert (earning.amount_cents, earning.fare_cents) == (1500, 2000)
+
+
+def test_ride_earnings_are_not_recorded_again_after_being_paid(tmp_path, monkeypatch):
+    """
+    Copies of a ride (e.g. read back from the archive) never credit its driver again, even once paid and compacted.
+    """
+    # Arrange
+    monkeypatch.setattr(payments_earnings, "calculate_trip_fare", lambda pickup, dropoff: 20.0)
+    payouts = FakePayouts()
+    ledger, batcher = make_batcher(tmp_path, payouts)
+    ride = {"ride_id": 4242, "driver_id": "d1", "pickup": "40.75,-73.98", "dropoff": "40.70,-74.01"}
+    record_ride_earnings(dict(ride), ledger)
+    record_ride_earnings({**ride, "ride_id": 4243}, ledger)
+    asyncio.run(batcher.run_batch())
+    ledger.close()
+
+    # Act
+    restarted = EarningsLedger(ledger.path)
+    again = record_ride_earnings(dict(ride), restarted)
+
+    # Assert
+    assert again is None
+    assert len(restarted) == 1
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from payments.payments_service import calculate_fare, calculate_fare_batch
+
+
+def scalar_fares(distances, durations, surges):
+    return [
+        calculate_fare(None, None, duration, distance, surge)
+        for distance, duration, surge in zip(distances, durations, surges)
+    ]
+
+
+def test_batch_matches_scalar_on_random_trips():
+    """
+    Every batch fare is identical to the scalar fare for the same trip.
+    """
+    # Arrange
+    rng = np.random.default_rng(3)
+    distances = rng.gamma(2.0, 6.0, 50_000)
+    durations = rng.uniform(0.0, 90.0, 50_000)
+    surges = rng.uniform(1.0, 3.0, 50_000)
+
+    # Act
+    batch = calculate_fare_batch(distances, durations, surges)
+
+    # Assert
+    assert batch.tolist() == scalar_fares(distances.tolist(), durations.tolist(), surges.tolist())
+
+
+def test_batch_matches_scalar_at_half_cents_and_thresholds():
+    """
+    Trips on round distances, durations and multipliers land on half cents and
+    on the surcharge thresholds, where rounding and comparisons are most fragile.
+    """
+    # Arrange
+    grid = np.array(np.meshgrid(
+        np.arange(0, 25.01, 0.1), np.arange(0, 35, 0.5), [1.0, 1.1, 1.25, 1.3, 1.5, 1.75, 2.0]
+    )).reshape(3, -1)
+    distances, durations, surges = grid
+
+    # Act
+    batch = calculate_fare_batch(distances, durations, surges)
+
+    # Assert
+    assert batch.tolist() == scalar_fares(distances.tolist(), durations.tolist(), surges.tolist())
+
+
+def test_batch_defaults_to_no_surge_and_validates_input():
+    """
+    Surge defaults to 1.0; negative distances and mismatched arrays are rejected.
+    """
+    assert calculate_fare_batch([3.0, 21.0], [15.0, 31.0]).tolist() == [
+        calculate_fare(None, None, 15.0, 3.0),
+        calculate_fare(None, None, 31.0, 21.0),
+    ]
+    with pytest.raises(ValueError):
+        calculate_fare_batch([1.0, -5.0], [10.0, 10.0])
+    with pytest.raises(ValueError):
+        calculate_fare_batch([1.0, 2.0], [10.0])
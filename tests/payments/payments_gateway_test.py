@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+from payments import payments_gateway, payments_service
+from payments.payments_gateway import GatewayError, PaymentGatewayClient
+from payments.payments_gateway_stub import StubGateway
+
+
+def test_charges_and_payouts_reuse_pooled_connections():
+    """
+    Sequential calls share one keep-alive connection; declines come back as results.
+    """
+    async def scenario():
+        async with StubGateway(latency_seconds=0.0, decline_above=100.0) as stub:
+            client = PaymentGatewayClient(stub.base_url)
+            try:
+                results = [await client.charge(1, 20.0) for _ in range(5)]
+                payout = await client.payout("d1", 15.0)
+                declined = await client.charge(1, 500.0)
+            finally:
+                await client.aclose()
+            return stub, results, payout, declined
+
+    # Act
+    stub, results, payout, declined = asyncio.run(scenario())
+
+    # Assert
+    assert all(result["status"] == "success" for result in results)
+    assert payout["status"] == "success"
+    assert declined["status"] == "declined"
+    assert stub.calls == 7
+    assert stub.connections == 1
+
+
+def test_concurrency_cap_bounds_calls_in_flight():
+    """
+    No more than max_concurrency calls reach the gateway at once; the rest wait their turn.
+    """
+    async def scenario():
+        async with StubGateway(latency_seconds=0.05) as stub:
+            client = PaymentGatewayClient(stub.base_url, max_connections=10, max_concurrency=4)
+            try:
+                results = await asyncio.gather(*(client.charge(i, 10.0) for i in range(20)))
+            finally:
+                await client.aclose()
+            return stub, results
+
+    stub, results = asyncio.run(scenario())
+
+    assert len(results) == 20
+    assert stub.peak_in_flight == 4
+    assert stub.connections <= 4
+
+
+def test_slow_gateway_times_out():
+    """
+    A call exceeding its deadline raises GatewayError instead of hanging.
+    """
+    async def scenario():
+        async with StubGateway(latency_seconds=1.0) as stub:
+            client = PaymentGatewayClient(stub.base_url, timeout_seconds=0.1)
+            try:
+                await client.charge(1, 10.0)
+            finally:
+                await client.aclose()
+
+    with pytest.raises(GatewayError):
+        asyncio.run(scenario())
+
+
+def test_charge_without_gateway_does_not_block_event_loop(monkeypatch):
+    """
+    Without a configured gateway, the blocking mock API runs in a worker thread.
+    """
+    # Arrange
+    def slow_charge(rider_id, amount):
+        time.sleep(0.2)
+        return {"status": "success", "transaction_id": "t1"}
+
+    monkeypatch.setattr(payments_gateway, "_gateway", None)
+    monkeypatch.delenv("PAYMENT_GATEWAY_URL", raising=False)
+    monkeypatch.setattr(payments_service.some_external_payment_api, "charge", slow_charge)
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        result = await payments_service.charge_rider_async(1, 10.0)
+        task.cancel()
+        return result, ticks
+
+    # Act
+    result, ticks = asyncio.run(scenario())
+
+    # Assert
+    assert result["status"] == "success"
+    assert ticks >= 10
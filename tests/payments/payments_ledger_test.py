@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from payments.payments_ledger import (
+    JOURNAL_FILE,
+    PLATFORM_CASH,
+    PLATFORM_REVENUE,
+    Ledger,
+    LedgerError,
+    driver_account,
+    post_charge,
+    post_payout,
+    post_ride_fare,
+    replay_journal,
+    rider_account,
+)
+
+
+def test_balances_follow_fares_charges_and_payouts(tmp_path):
+    """
+    A ride's fare, its charge and the driver's payout settle every account, and balances are O(1) reads.
+    """
+    # Arrange
+    ledger = Ledger(str(tmp_path))
+
+    async def scenario():
+        await post_ride_fare(ledger, 1, 7, "d1", fare_cents=2000, driver_cents=1500)
+        owed = ledger.balance(rider_account(7))
+        await post_charge(ledger, 1, 7, 2000)
+        earned = -ledger.balance(driver_account("d1"))
+        await post_payout(ledger, "payout-1-d1", "d1", 1500)
+        return owed, earned
+
+    # Act
+    owed, earned = asyncio.run(scenario())
+
+    # Assert
+    assert (owed, earned) == (2000, 1500)
+    assert ledger.balance(rider_account(7)) == 0
+    assert ledger.balance(driver_account("d1")) == 0
+    assert ledger.balance(PLATFORM_CASH) == 500
+    assert ledger.balance(PLATFORM_REVENUE) == -500
+    assert sum(ledger.balances().values()) == 0
+
+
+def test_unbalanced_transactions_are_rejected(tmp_path):
+    """
+    Postings that do not sum to zero raise LedgerError and leave no trace.
+    """
+    ledger = Ledger(str(tmp_path))
+
+    with pytest.raises(LedgerError):
+        asyncio.run(ledger.post("fare", "ride:1", {rider_account(1): 100, PLATFORM_REVENUE: -90}))
+
+    assert ledger.balances() == {}
+
+
+def test_concurrent_posts_share_group_commits(tmp_path):
+    """
+    Transactions posted together are committed in far fewer fsyncs, and survive a reopen.
+    """
+    # Arrange
+    ledger = Ledger(str(tmp_path))
+
+    async def scenario():
+        await asyncio.gather(*(post_charge(ledger, ride_id, ride_id % 10, 100) for ride_id in range(300)))
+
+    # Act
+    asyncio.run(scenario())
+    ledger.close()
+    reopened = Ledger(str(tmp_path))
+
+    # Assert
+    assert ledger.transactions == 300
+    assert ledger.commits < 30
+    assert reopened.balance(PLATFORM_CASH) == 30000
+    assert reopened.balance(rider_account(3)) == -3000
+    assert reopened.last_seq == 300
+
+
+def test_snapshot_and_tail_replay_match_full_rebuild(tmp_path):
+    """
+    Reopening from a snapshot plus the journal tail gives the same balances as
+    replaying the whole journal; a torn last line is dropped.
+    """
+    # Arrange
+    ledger = Ledger(str(tmp_path))
+
+    async def post(ride_ids):
+        for ride_id in ride_ids:
+            await post_ride_fare(ledger, ride_id, ride_id % 3, f"d{ride_id % 4}", 1000 + ride_id, 750)
+
+    asyncio.run(post(range(50)))
+    ledger.snapshot()
+    asyncio.run(post(range(50, 80)))
+    ledger.close()
+    with open(tmp_path / JOURNAL_FILE, "ab") as journal:
+        journal.write(b"81\t0.000\tfare\tride:81\trider:1\t5")
+
+    # Act
+    reopened = Ledger(str(tmp_path))
+    rebuilt, last_seq, _ = replay_journal(str(tmp_path / JOURNAL_FILE))
+
+    # Assert
+    assert reopened.balances() == rebuilt == reopened.rebuild()
+    assert last_seq == reopened.last_seq == 80
+    assert (tmp_path / JOURNAL_FILE).read_bytes().endswith(b"\n")
+
+
+def test_charges_are_booked_once_per_ride_across_restarts(tmp_path):
+    """
+    A ride charged twice, concurrently or after a restart from a snapshot or
+    the journal, is booked once; other kinds of transaction are not deduplicated.
+    """
+    # Arrange
+    ledger = Ledger(str(tmp_path))
+
+    async def scenario():
+        return await asyncio.gather(post_charge(ledger, 1, 7, 2000), post_charge(ledger, 1, 7, 2000))
+
+    # Act
+    first, duplicate = asyncio.run(scenario())
+    asyncio.run(post_payout(ledger, "payout-1", "d1", 500))
+    asyncio.run(post_payout(ledger, "payout-1", "d1", 500))
+    ledger.snapshot()
+    asyncio.run(post_charge(ledger, 2, 7, 1000))
+    ledger.close()
+    restarted = Ledger(str(tmp_path))
+    replayed = [asyncio.run(post_charge(restarted, ride_id, 7, 2000)) for ride_id in (1, 2)]
+
+    # Assert
+    assert first is not None and duplicate is None
+    assert replayed == [None, None]
+    assert restarted.balance(rider_account(7)) == -3000
+    assert restarted.balance(driver_account("d1")) == 1000
@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from payments import payments_router
+from payments.payments_quotes import QuoteCache, QuoteError, QuoteService, QuoteSigner
+from payments.payments_service import calculate_fare
+from utils.geolocation import calculate_distance, estimate_travel_time
+
+PICKUP = "40.7580,-73.9855"
+DROPOFF = "40.7061,-74.0087"
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_service(clock, ttl_seconds=600.0, max_entries=100, secret="test-secret"):
+    return QuoteService(
+        QuoteSigner(secret, clock=clock),
+        QuoteCache(max_entries, clock=clock),
+        ttl_seconds=ttl_seconds,
+        clock=clock,
+    )
+
+
+def test_quote_prices_the_trip_once_and_resolves_from_cache():
+    """
+    A ride is priced from its coordinates at request time, and payment
+    resolves the same quote from the cache without a token.
+    """
+    # Arrange
+    service = make_service(FakeClock())
+    pickup, dropoff = (40.7580, -73.9855), (40.7061, -74.0087)
+    expected = calculate_fare(
+        pickup, dropoff, estimate_travel_time(pickup, dropoff) * 60, calculate_distance(pickup, dropoff),
+        surge_multiplier=1.0,
+    )
+
+    # Act
+    quote, token = service.quote_ride(7, 42, PICKUP, DROPOFF)
+    resolved = service.resolve(7)
+
+    # Assert
+    assert quote.amount == round(expected, 2)
+    assert quote.rider_id == 42
+    assert resolved == quote
+    assert len(token) < 120
+    assert service.quote_ride(8, 42, "Main St", DROPOFF) is None
+
+
+def test_token_verifies_statelessly():
+    """
+    Another service sharing only the signing key accepts the token without any cached state.
+    """
+    clock = FakeClock()
+    quote, token = make_service(clock).issue(7, None, 18.25, 1.3)
+
+    resolved = make_service(clock).resolve(7, token)
+
+    assert resolved == quote
+    assert resolved.amount == 18.25
+    assert resolved.surge_multiplier == 1.3
+
+
+@pytest.mark.parametrize("tamper", ["signature", "ride", "expiry", "key", "garbage"])
+def test_invalid_tokens_are_rejected(tamper):
+    """
+    Forged, foreign, expired and malformed tokens raise QuoteError.
+    """
+    # Arrange
+    clock = FakeClock()
+    service = make_service(clock)
+    _, token = service.issue(7, 42, 18.25, 1.0)
+    ride_id = 7
+    if tamper == "signature":
+        payload, tag = token.split(".")
+        token = f"{payload}.{'A' if tag[0] != 'A' else 'B'}{tag[1:]}"
+    elif tamper == "ride":
+        ride_id = 8
+    elif tamper == "expiry":
+        clock.now += 601
+    elif tamper == "key":
+        service = make_service(clock, secret="other-secret")
+    else:
+        token = "not-a-token"
+
+    # Act / Assert
+    with pytest.raises(QuoteError):
+        service.resolve(ride_id, token)
+
+
+def test_cache_expires_and_bounds_quotes():
+    """
+    Cached quotes disappear after their TTL, and the oldest are evicted past the size limit.
+    """
+    clock = FakeClock()
+    service = make_service(clock, ttl_seconds=60.0, max_entries=2)
+
+    for ride_id in (1, 2, 3):
+        service.issue(ride_id, None, 10.0, 1.0)
+    evicted = service.resolve(1)
+    kept = service.resolve(3)
+    clock.now += 61
+    expired = service.resolve(3)
+
+    assert evicted is None
+    assert kept is not None
+    assert expired is None
+    assert len(service.cache) == 0
+
+
+def test_quote_pinned_on_the_ride_outlives_its_ttl():
+    """
+    A ride outlasting the quote TTL is still charged its quote: the pinned
+    token resolves after the cache entry is gone, and so does the same token
+    sent by the client, while an expired token that is not pinned is rejected.
+    """
+    # Arrange
+    clock = FakeClock()
+    service = make_service(clock, ttl_seconds=60.0)
+    quote, pinned = service.issue(7, 42, 18.25, 1.0)
+    _, other = service.issue(7, 42, 20.0, 1.0)
+    clock.now += 3600
+
+    # Act
+    from_ride = service.resolve(7, pinned=pinned)
+    from_client = service.resolve(7, pinned, pinned=pinned)
+
+    # Assert
+    assert from_ride == from_client == quote
+    with pytest.raises(QuoteError):
+        service.resolve(7, other, pinned=pinned)
+
+
+class FakeCharges:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, rider_id, amount, idempotency_key=None):
+        self.calls.append((rider_id, amount, idempotency_key))
+        return {"status": "success", "transaction_id": "tx-1"}
+
+
+def test_payment_reprices_and_charges_a_ride_without_a_quote(monkeypatch):
+    """
+    A ride whose quote was never issued is priced at payment and charged,
+    and a ride that cannot be priced is refused rather than reported paid.
+    """
+    # Arrange
+    service = make_service(FakeClock())
+    charges = FakeCharges()
+    rides = {
+        7: {"ride_id": 7, "rider_id": 42, "pickup": PICKUP, "dropoff": DROPOFF},
+        8: {"ride_id": 8, "rider_id": 42, "pickup": "Main St", "dropoff": DROPOFF},
+    }
+    monkeypatch.setattr(payments_router, "get_quote_service", lambda: service)
+    monkeypatch.setattr(payments_router, "find_ride", rides.get)
+    monkeypatch.setattr("rides.rides_router.get_quote_service", lambda: service)
+    monkeypatch.setattr(payments_router, "service_charge_rider_async", charges)
+
+    async def noop(*args):
+        return None
+
+    monkeypatch.setattr(payments_router, "post_charge", noop)
+
+    # Act
+    paid = asyncio.run(payments_router.process_payment_endpoint(7, fare_quote=None))
+    with pytest.raises(HTTPException) as unpriced:
+        asyncio.run(payments_router.process_payment_endpoint(8, fare_quote=None))
+
+    # Assert
+    quote = service.resolve(7, pinned=rides[7]["fare_quote"])
+    assert paid["status"] == "success" and paid["quote_id"] == quote.quote_id
+    assert charges.calls == [(42, quote.amount, f"charge-{quote.quote_id}")]
+    assert unpriced.value.status_code == 422
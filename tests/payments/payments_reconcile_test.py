@@ -0,0 +1,99 @@
+import csv
+import io
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from payments.payments_reconcile import ReconciliationError, main, merge_join, reconcile, stream_settlement
+
+
+def make_database(path, payments, payouts):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE payment_records (id INTEGER PRIMARY KEY, user_id INTEGER, amount FLOAT, "
+            "status VARCHAR(50), created_at DATETIME)"
+        ))
+        connection.execute(text(
+            "CREATE TABLE payout_details (id INTEGER PRIMARY KEY, payee_id INTEGER, payout_amount FLOAT, "
+            "payout_method VARCHAR(50), processed_at DATETIME)"
+        ))
+        for row_id, amount, status in payments:
+            connection.execute(
+                text("INSERT INTO payment_records (id, user_id, amount, status) VALUES (:id, 1, :amount, :status)"),
+                {"id": row_id, "amount": amount, "status": status},
+            )
+        for row_id, amount in payouts:
+            connection.execute(
+                text("INSERT INTO payout_details (id, payee_id, payout_amount, payout_method) VALUES (:id, 1, :amount, 'bank')"),
+                {"id": row_id, "amount": amount},
+            )
+    engine.dispose()
+    return f"sqlite:///{path}"
+
+
+def write_settlement(path, rows):
+    path.write_text("reference,amount\n" + "".join(f"{reference},{amount}\n" for reference, amount in rows))
+    return str(path)
+
+
+def test_reconciliation_reports_every_kind_of_mismatch(tmp_path):
+    """
+    Completed charges and payouts are merge-joined against the settlement files and only mismatches are written.
+    """
+    # Arrange
+    database_url = make_database(
+        tmp_path / "payments.db",
+        payments=[(1, 10.0, "completed"), (2, 12.5, "completed"), (3, 7.0, "failed"), (4, 9.99, "completed")],
+        payouts=[(1, 30.0), (2, 15.25)],
+    )
+    charges = write_settlement(tmp_path / "charges.csv", [(1, "10.00"), (2, "12.00"), (5, "4.00")])
+    payouts = write_settlement(tmp_path / "payouts.csv", [(1, "30.00"), (2, "15.25")])
+    output = tmp_path / "mismatches.csv"
+
+    # Act
+    status = main([
+        "--database-url", database_url, "--charges", charges, "--payouts", payouts,
+        "--output", str(output), "--chunk-size", "2",
+    ])
+
+    # Assert
+    with open(output, newline="") as handle:
+        rows = list(csv.DictReader(handle))
+    assert status == 2
+    assert [(row["source"], row["reference"], row["kind"]) for row in rows] == [
+        ("charges", "2", "amount_mismatch"),
+        ("charges", "4", "missing_at_gateway"),
+        ("charges", "5", "missing_in_records"),
+    ]
+    assert rows[0]["our_amount"] == "12.50" and rows[0]["gateway_amount"] == "12.00"
+
+
+def test_merge_join_consumes_streams_lazily():
+    """
+    The join pulls rows one at a time from generators and flags duplicates.
+    """
+    pulled = []
+
+    def ours():
+        for key in range(1, 1_000_000):
+            pulled.append(key)
+            yield key, 100
+
+    theirs = [(1, 100), (2, 100), (2, 100)]
+    joined = merge_join(ours(), theirs)
+
+    first = [next(joined) for _ in range(3)]
+
+    assert [row[0] for row in first] == ["match", "match", "duplicate_at_gateway"]
+    assert len(pulled) <= 3
+
+
+def test_unsorted_settlement_file_is_rejected():
+    """
+    A settlement file out of reference order cannot be merged.
+    """
+    settlement = stream_settlement(io.StringIO("reference,amount\n2,1.00\n1,1.00\n"))
+
+    with pytest.raises(ReconciliationError):
+        reconcile("charges", iter([(1, 100), (2, 100)]), settlement, csv.writer(io.StringIO()))
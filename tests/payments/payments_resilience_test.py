@@ -0,0 +1,169 @@
+import asyncio
+
+import pytest
+
+from payments import payments_resilience, payments_service
+from payments.payments_gateway import GatewayError
+from payments.payments_resilience import (
+    CHARGES,
+    PAYOUTS,
+    Bulkhead,
+    BulkheadFullError,
+    CircuitBreaker,
+    CircuitOpenError,
+    PaymentGuard,
+    payment_guard_stats,
+)
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeGateway:
+    """
+    Charges succeed at once; payouts hang until released.
+    """
+    def __init__(self):
+        self.release_payouts = asyncio.Event()
+
+    async def charge(self, rider_id, amount, idempotency_key=None):
+        return {"status": "success"}
+
+    async def payout(self, driver_id, amount, idempotency_key=None):
+        await self.release_payouts.wait()
+        return {"status": "success"}
+
+
+def make_guard(clock, threshold=3, reset=30.0, size=10, wait=0.0):
+    return PaymentGuard(CircuitBreaker("charges", threshold, reset, clock=clock), Bulkhead("charges", size, wait))
+
+
+async def guarded(guard, outcome):
+    async with guard:
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def test_breaker_opens_after_consecutive_failures_and_closes_after_a_good_trial():
+    """
+    Consecutive failures open the circuit, which then rejects without calling;
+    after the reset timeout one trial call is let through and closes it.
+    """
+    # Arrange
+    clock = FakeClock()
+    guard = make_guard(clock)
+
+    async def scenario():
+        await guarded(guard, "ok")
+        for _ in range(3):
+            with pytest.raises(GatewayError):
+                await guarded(guard, GatewayError("timeout"))
+        with pytest.raises(CircuitOpenError):
+            await guarded(guard, "never called")
+        clock.now += 30.0
+        return await guarded(guard, "trial")
+
+    # Act
+    trial = asyncio.run(scenario())
+
+    # Assert
+    assert trial == "trial"
+    stats = guard.stats()
+    assert stats["state"] == "closed"
+    assert stats["transitions"] == {"open": 1, "half_open": 1, "closed": 1}
+    assert stats["rejected"] == 1
+
+
+def test_failed_trial_reopens_and_only_one_trial_runs_at_a_time():
+    """
+    While a half-open trial is in flight other calls are rejected; a failed trial reopens the circuit.
+    """
+    # Arrange
+    clock = FakeClock()
+    guard = make_guard(clock, threshold=1, reset=10.0)
+
+    async def scenario():
+        with pytest.raises(GatewayError):
+            await guarded(guard, GatewayError("down"))
+        clock.now += 10.0
+        release = asyncio.Event()
+
+        async def slow_trial():
+            async with guard:
+                await release.wait()
+                raise GatewayError("still down")
+
+        trial = asyncio.ensure_future(slow_trial())
+        await asyncio.sleep(0)
+        with pytest.raises(CircuitOpenError):
+            await guarded(guard, "concurrent call")
+        release.set()
+        with pytest.raises(GatewayError):
+            await trial
+
+    # Act
+    asyncio.run(scenario())
+
+    # Assert
+    assert guard.breaker.state == "open"
+    assert guard.breaker.transitions == {"open": 2, "half_open": 1, "closed": 0}
+    assert guard.breaker.rejected == 1
+
+
+def test_payout_outage_does_not_take_capacity_from_charges(monkeypatch):
+    """
+    Hung payouts fill only the payout bulkhead: further payouts are rejected
+    while rider charges keep going through.
+    """
+    # Arrange
+    gateway = FakeGateway()
+    monkeypatch.setattr(payments_resilience, "_guards", {
+        CHARGES: make_guard(FakeClock(), size=2),
+        PAYOUTS: PaymentGuard(CircuitBreaker(PAYOUTS), Bulkhead(PAYOUTS, 2, 0.01)),
+    })
+    monkeypatch.setattr(payments_service, "get_payment_gateway", lambda: gateway)
+
+    async def scenario():
+        hung = [asyncio.ensure_future(payments_service.payout_driver_async(f"d{i}", 10.0)) for i in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(BulkheadFullError):
+            await payments_service.payout_driver_async("d3", 10.0)
+        charges = await asyncio.gather(*(payments_service.charge_rider_async(rider, 5.0) for rider in range(20)))
+        gateway.release_payouts.set()
+        await asyncio.gather(*hung)
+        return charges
+
+    # Act
+    charges = asyncio.run(scenario())
+
+    # Assert
+    assert all(result["status"] == "success" for result in charges)
+    stats = payment_guard_stats()
+    assert stats[PAYOUTS]["bulkhead"]["rejected"] == 1
+    assert stats[CHARGES]["bulkhead"]["rejected"] == 0
+    assert stats[PAYOUTS]["bulkhead"]["in_flight"] == stats[CHARGES]["bulkhead"]["in_flight"] == 0
+
+
+def test_declines_do_not_trip_the_breaker():
+    """
+    A declined charge is a result, not a gateway failure.
+    """
+    # Arrange
+    guard = make_guard(FakeClock(), threshold=2)
+
+    async def scenario():
+        for _ in range(5):
+            await guarded(guard, {"status": "declined"})
+
+    # Act
+    asyncio.run(scenario())
+
+    # Assert
+    assert guard.breaker.state == "closed"
+    assert guard.breaker.rejected == 0
@@ -0,0 +1,213 @@
+import asyncio
+import random
+import time
+
+from payments import payments_router
+from payments.payments_gateway import GatewayError
+from payments.payments_quotes import QuoteCache, QuoteService, QuoteSigner
+from payments.payments_resilience import Bulkhead, CircuitBreaker, CircuitOpenError, PaymentGuard
+from payments.payments_retries import ChargeRetrier, ChargeRetryQueue
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeCharges:
+    """
+    Records charges; fails the first `failures` calls, then succeeds or declines.
+    """
+    def __init__(self, failures=0, declined=False):
+        self.calls = []
+        self.failures = failures
+        self.declined = declined
+
+    async def __call__(self, rider_id, amount, idempotency_key=None):
+        self.calls.append((rider_id, amount, idempotency_key))
+        if len(self.calls) <= self.failures:
+            raise GatewayError("gateway timed out")
+        return {"status": "declined" if self.declined else "success", "transaction_id": "tx-1"}
+
+
+def make_queue(tmp_path, clock, max_attempts=4):
+    return ChargeRetryQueue(str(tmp_path / "retries.db"), max_attempts=max_attempts, clock=clock, rng=random.Random(1))
+
+
+def test_backoff_doubles_with_jitter_up_to_the_cap(tmp_path):
+    """
+    Each failure doubles the delay ceiling; the jittered delay stays in its upper half, and never above the cap.
+    """
+    queue = make_queue(tmp_path, FakeClock())
+
+    for attempts in range(1, 15):
+        ceiling = min(queue.max_delay_seconds, queue.base_delay_seconds * 2 ** (attempts - 1))
+        delays = [queue.backoff(attempts) for _ in range(50)]
+        assert all(ceiling / 2 <= delay <= ceiling for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_failed_charge_survives_restart_and_is_retried_with_its_key(tmp_path):
+    """
+    A queued charge persists across a reopen, is not attempted before it is
+    due, and is retried with the original idempotency key until it succeeds.
+    """
+    # Arrange
+    clock = FakeClock()
+    queue = make_queue(tmp_path, clock)
+    retry_id = queue.enqueue(7, 3, 1850, "charge-q1", "gateway timed out")
+    assert queue.enqueue(7, 3, 1850, "charge-q1", "gateway timed out") == retry_id
+    queue.close()
+    queue = make_queue(tmp_path, clock)
+    charges = FakeCharges(failures=1)
+    retrier = ChargeRetrier(queue, charge=charges)
+
+    # Act
+    early = asyncio.run(retrier.drain())
+    clock.now += queue.max_delay_seconds
+    first = asyncio.run(retrier.drain())
+    clock.now += queue.max_delay_seconds
+    second = asyncio.run(retrier.drain())
+
+    # Assert
+    assert early == {"charged": 0, "retrying": 0, "deferred": 0, "dead_lettered": 0}
+    assert first["retrying"] == 1 and second["charged"] == 1
+    assert charges.calls == [(3, 18.5, "charge-q1")] * 2
+    assert queue.counts() == {"queued": 0, "dead_lettered": 0}
+
+
+def test_charges_are_dead_lettered_when_out_of_attempts_or_declined(tmp_path):
+    """
+    A charge that keeps failing is dead-lettered after max attempts; a declined one at once.
+    """
+    # Arrange
+    clock = FakeClock()
+    queue = make_queue(tmp_path, clock, max_attempts=3)
+    queue.enqueue(1, 1, 1000, "charge-a", "timeout")
+    failing = ChargeRetrier(queue, charge=FakeCharges(failures=100))
+
+    # Act
+    for _ in range(5):
+        clock.now += queue.max_delay_seconds
+        asyncio.run(failing.drain())
+    queue.enqueue(2, 2, 2000, "charge-b", "timeout")
+    clock.now += queue.max_delay_seconds
+    declined = asyncio.run(ChargeRetrier(queue, charge=FakeCharges(declined=True)).drain())
+
+    # Assert
+    assert declined["dead_lettered"] == 1
+    letters = {letter["idempotency_key"]: letter for letter in queue.dead_letters()}
+    assert letters["charge-a"]["attempts"] == 3 and letters["charge-a"]["last_error"] == "gateway timed out"
+    assert letters["charge-b"]["attempts"] == 2 and letters["charge-b"]["last_error"] == "declined"
+    assert queue.counts() == {"queued": 0, "dead_lettered": 2}
+
+
+def test_rejected_charges_outlast_an_outage_and_expire_by_age(tmp_path):
+    """
+    Charges the breaker rejects are rescheduled without using up attempts,
+    so an outage of any length does not dead-letter them; a charge that keeps
+    failing at the gateway is dead-lettered once it is older than the max age.
+    """
+    # Arrange
+    clock = FakeClock()
+    queue = ChargeRetryQueue(str(tmp_path / "retries.db"), max_age_seconds=3600.0, clock=clock)
+    queue.enqueue(1, 1, 1000, "charge-a", "circuit open", attempts=0)
+
+    async def circuit_open(rider_id, amount, idempotency_key=None):
+        raise CircuitOpenError("Circuit breaker for charges is open")
+
+    rejected = ChargeRetrier(queue, charge=circuit_open)
+    failing = ChargeRetrier(queue, charge=FakeCharges(failures=1_000))
+
+    # Act
+    for _ in range(2 * 3600 // 5):
+        clock.now += 5
+        asyncio.run(rejected.drain())
+    clock.now += 5
+    (survivor,) = queue.claim()
+    queue.complete(survivor)
+    queue.enqueue(2, 2, 2000, "charge-b", "gateway timed out")
+    summaries = []
+    while queue.counts()["queued"]:
+        clock.now += queue.max_delay_seconds
+        summaries.append(asyncio.run(failing.drain()))
+
+    # Assert
+    assert survivor.attempts == 0
+    (letter,) = queue.dead_letters()
+    assert letter["idempotency_key"] == "charge-b"
+    assert 3600.0 <= letter["failed_at"] - letter["created_at"] < 3600.0 + queue.max_delay_seconds
+    assert letter["attempts"] == len(summaries) + 1 > 4
+
+
+def test_open_breaker_holds_retries_until_its_trial_succeeds(tmp_path):
+    """
+    While the charges breaker is open no retry is attempted; once half-open,
+    one retry is sent as the trial, and only after it succeeds are the rest drained.
+    """
+    # Arrange
+    clock = FakeClock()
+    queue = make_queue(tmp_path, clock)
+    for ride_id in range(5):
+        queue.enqueue(ride_id, ride_id, 1000, f"charge-{ride_id}", "gateway timed out")
+    breaker = CircuitBreaker("charges", failure_threshold=1, reset_timeout_seconds=3600.0, clock=clock)
+    guard = PaymentGuard(breaker, Bulkhead("charges", 10))
+    charges = FakeCharges(failures=2)
+
+    async def guarded_charge(rider_id, amount, idempotency_key=None):
+        async with guard:
+            return await charges(rider_id, amount, idempotency_key)
+
+    async def trip():
+        try:
+            await guarded_charge(9, 1.0)
+        except Exception:
+            pass
+
+    asyncio.run(trip())
+    retrier = ChargeRetrier(queue, charge=guarded_charge, breaker=breaker)
+    clock.now += queue.max_delay_seconds
+
+    # Act
+    held = asyncio.run(retrier.drain())
+    clock.now += breaker.reset_timeout_seconds
+    failed_trial = asyncio.run(retrier.drain())
+    clock.now += breaker.reset_timeout_seconds
+    drained = asyncio.run(retrier.drain())
+
+    # Assert
+    assert held == {"charged": 0, "retrying": 0, "deferred": 0, "dead_lettered": 0}
+    assert failed_trial == {"charged": 0, "retrying": 1, "deferred": 0, "dead_lettered": 0}
+    assert drained == {"charged": 5, "retrying": 0, "deferred": 0, "dead_lettered": 0}
+    assert len(charges.calls) == 1 + 1 + 5
+    assert breaker.transitions == {"open": 2, "half_open": 2, "closed": 1}
+
+
+def test_payment_is_accepted_at_once_when_the_charge_fails(tmp_path, monkeypatch):
+    """
+    A charge that fails on the request path is queued and the endpoint answers 202 without retrying inline.
+    """
+    # Arrange
+    clock = FakeClock(time.time())
+    quotes = QuoteService(QuoteSigner("secret", clock=clock), QuoteCache(10, clock=clock), 600.0, clock=clock)
+    quote, token = quotes.issue(41, 5, 12.4, 1.0)
+    queue = make_queue(tmp_path, clock)
+    charges = FakeCharges(failures=1)
+    monkeypatch.setattr(payments_router, "get_quote_service", lambda: quotes)
+    monkeypatch.setattr(payments_router, "find_ride", lambda ride_id: {"ride_id": ride_id, "fare_quote": token})
+    monkeypatch.setattr(payments_router, "get_charge_retry_queue", lambda: queue)
+    monkeypatch.setattr(payments_router, "service_charge_rider_async", charges)
+
+    # Act
+    response = asyncio.run(payments_router.process_payment_endpoint(41, fare_quote=token))
+
+    # Assert
+    assert response.status_code == 202
+    assert len(charges.calls) == 1
+    clock.now += queue.max_delay_seconds
+    (retry,) = queue.claim()
+    assert (retry.ride_id, retry.rider_id, retry.amount_cents) == (41, 5, 1240)
+    assert retry.idempotency_key == charges.calls[0][2] == f"charge-{quote.quote_id}"
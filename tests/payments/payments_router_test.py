@@ -1,11 +1,14 @@
+import asyncio
+
 import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
-from unittest.mock import patch
 
 # Project-level imports
 from main import create_app
-from config import load_config
+from payments import payments_router
+from rides import rides_router
 # Import the router module if needed, though typically we test via the actual app routes:
 # from payments.payments_router import calculate_fare_endpoint, process_payment_endpoint, disburse_driver_payment_endpoint
 
@@ -29,6 +32,58 @@ def test_db():
     yield db
     # TEARDOWN: e.g., drop tables, close connection, etc.
 
+def make_ride(ride_id, version=1):
+    return {
+        "ride_id": ride_id,
+        "rider_id": 1,
+        "pickup": "40.7580,-73.9855",
+        "dropoff": "40.7061,-74.0087",
+        "status": "pending",
+        "version": version,
+    }
+
+
+def test_calculate_fare_is_memoized_per_ride_version(monkeypatch):
+    """
+    Polling an unchanged ride reuses its priced fare; a new ride version is repriced.
+    """
+    # Arrange
+    ride = make_ride(501)
+    calls = []
+
+    def fake_trip_fare(pickup, dropoff):
+        calls.append((pickup, dropoff))
+        return 10.0 + len(calls)
+
+    monkeypatch.setitem(rides_router.rides_db, 501, ride)
+    monkeypatch.setattr(payments_router, "fare_memo", {})
+    monkeypatch.setattr(payments_router, "service_calculate_trip_fare", fake_trip_fare)
+
+    # Act
+    first = asyncio.run(payments_router.calculate_fare_endpoint(501))
+    polled = asyncio.run(payments_router.calculate_fare_endpoint(501))
+    ride["version"] = 2
+    updated = asyncio.run(payments_router.calculate_fare_endpoint(501))
+
+    # Assert
+    assert first == polled == {"ride_id": 501, "fare": 11.0}
+    assert updated["fare"] == 12.0
+    assert calls == [(ride["pickup"], ride["dropoff"])] * 2
+
+
+def test_calculate_fare_rejects_rides_without_coordinates(monkeypatch):
+    """
+    Rides whose locations are not coordinates cannot be priced.
+    """
+    ride = {**make_ride(502), "pickup": "Default pickup location"}
+    monkeypatch.setitem(rides_router.rides_db, 502, ride)
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(payments_router.calculate_fare_endpoint(502))
+
+    assert excinfo.value.status_code == 422
+
+
 @pytest.mark.describe("Payments Router - calculate_fare_endpoint")
 class TestCalculateFareEndpoint:
     @pytest.mark.it("Should return a final or estimated fare (success case)")
@@ -36,11 +91,12 @@ class TestCalculateFareEndpoint:
         """
         Test that calculate_fare_endpoint returns a valid fare when the ride is found and all conditions are met.
         """
-        # Mock the payments_service.calculate_fare to return a test fare value
-        mocker.patch("payments.payments_service.calculate_fare", return_value=25.0)
+        # Mock the trip pricing to return a test fare value for a stored ride
+        mocker.patch("payments.payments_router.service_calculate_trip_fare", return_value=25.0)
+        ride_id = 123
+        mocker.patch.dict(rides_router.rides_db, {ride_id: make_ride(ride_id)})
 
         # Assuming the API is something like GET /payments/calculate_fare/{ride_id}
-        ride_id = 123
         response = client.get(f"/payments/calculate_fare/{ride_id}")
 
         assert response.status_code == 200
@@ -104,16 +160,17 @@ class TestDisburseDriverPaymentEndpoint:
         """
         Test that disburse_driver_payment_endpoint pays the driver successfully under normal conditions.
         """
-        # Patch the service to simulate a successful driver payout
-        mocker.patch("payments.payments_service.payout_driver", return_value=True)
+        # Payouts are batched: a completed ride's earnings are scheduled, not paid at once
+        ride_id = 101
+        mocker.patch.dict(rides_router.rides_db, {ride_id: {**make_ride(ride_id), "driver_id": "d1", "status": "completed"}})
+        mocker.patch("payments.payments_router.record_ride_earnings", return_value=None)
 
         # Assuming the API is something like POST /payments/disburse_driver_payment/{ride_id}
-        ride_id = 101
         response = client.post(f"/payments/disburse_driver_payment/{ride_id}")
 
         assert response.status_code == 200
         data = response.json()
-        assert data.get("message") == "Driver payment disbursed successfully"
+        assert data.get("status") == "scheduled"
 
     @pytest.mark.it("Should return an error if the ride isn't completed or doesn't exist")
     def test_disburse_driver_payment_failure(self, client, test_db, mocker):
@@ -0,0 +1,108 @@
+from payments import payments_service
+from payments.payments_surge import SurgeEngine
+
+PICKUP = "40.7580,-73.9855"
+ELSEWHERE = "40.6413,-73.7781"
+
+
+def drive_demand(engine, per_minute, minutes, start=0.0, pickup=PICKUP):
+    """
+    Feeds evenly spaced ride requests for a pickup and returns the time reached.
+    """
+    now = start
+    for _ in range(int(per_minute * minutes)):
+        now += 60.0 / per_minute
+        engine.record_request(pickup, now=now)
+    return now
+
+
+def test_multiplier_rises_with_demand_per_driver():
+    """
+    A zone surges when requests outpace its available drivers, and only that zone.
+    """
+    # Arrange
+    engine = SurgeEngine()
+    for i in range(2):
+        engine.driver_moved(f"d{i}", PICKUP, now=0.0)
+        engine.driver_available(f"d{i}", True, now=0.0)
+
+    # Act
+    drive_demand(engine, per_minute=1, minutes=10)
+    balanced = engine.multiplier_at(PICKUP)
+    drive_demand(engine, per_minute=10, minutes=15, start=600.0)
+
+    # Assert
+    assert balanced == 1.0
+    assert engine.multiplier_at(PICKUP) > 2.0
+    assert engine.multiplier_at(ELSEWHERE) == 1.0
+
+
+def test_supply_follows_driver_moves_and_availability():
+    """
+    Drivers count as supply in the zone they are in, only while available.
+    """
+    engine = SurgeEngine()
+
+    engine.driver_moved("d1", PICKUP, now=0.0)
+    engine.driver_available("d1", True, now=0.0)
+    engine.driver_moved("d1", ELSEWHERE, now=1.0)
+    engine.on_availability("reserve", "d1", 7)
+    engine.on_availability("release", "d1", None)
+    engine.driver_moved("d2", ELSEWHERE, now=2.0)
+    engine.on_availability("add", "d2", None)
+
+    zones = engine._zones
+    assert engine.zone_for(PICKUP) not in zones
+    assert zones[engine.zone_for(ELSEWHERE)].supply == 2
+
+
+def test_hysteresis_holds_published_multiplier_near_a_step():
+    """
+    Demand hovering around a step changes the published multiplier far less often
+    than it would without a hysteresis band.
+    """
+    # Arrange
+    damped = SurgeEngine()
+    undamped = SurgeEngine(hysteresis_up=0.0, hysteresis_down=0.0)
+
+    # Act
+    for engine in (damped, undamped):
+        now = 0.0
+        for minute in range(120):
+            per_minute = 3 if minute % 4 < 2 else 2
+            now = drive_demand(engine, per_minute, 1, start=now)
+
+    # Assert
+    assert damped.multiplier_at(PICKUP) > 1.0
+    assert damped.changes < undamped.changes / 2
+
+
+def test_refresh_decays_surge_and_forgets_idle_zones():
+    """
+    Zones that stop receiving requests fall back to 1.0 and stop being refreshed.
+    """
+    engine = SurgeEngine()
+    now = drive_demand(engine, per_minute=10, minutes=10)
+    surging = engine.multiplier_at(PICKUP)
+
+    for step in range(1, 120):
+        engine.refresh(now=now + step * 30.0)
+
+    assert surging > 1.0
+    assert engine.multiplier_at(PICKUP) == 1.0
+    assert engine.stats()["active_zones"] == 0
+
+
+def test_calculate_fare_reads_pickup_zone_multiplier(monkeypatch):
+    """
+    Fares without an explicit multiplier use the current surge at the pickup.
+    """
+    engine = SurgeEngine()
+    drive_demand(engine, per_minute=10, minutes=15)
+    monkeypatch.setattr(payments_service, "surge_engine", engine)
+    surge = engine.multiplier_at(PICKUP)
+
+    fare = payments_service.calculate_fare(PICKUP, ELSEWHERE, 15.0, 3.0)
+
+    assert fare == payments_service.calculate_fare(PICKUP, ELSEWHERE, 15.0, 3.0, surge_multiplier=surge)
+    assert fare > payments_service.calculate_fare(ELSEWHERE, PICKUP, 15.0, 3.0)
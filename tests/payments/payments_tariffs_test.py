@@ -0,0 +1,108 @@
+import json
+import os
+import pytest
+
+from payments import payments_tariffs
+from payments.payments_service import calculate_fare, calculate_fare_batch
+from payments.payments_tariffs import TariffEngine, TariffError, compile_tariffs
+
+DEFAULTS = {
+    "base_fare": 2.0,
+    "cost_per_km": 1.25,
+    "cost_per_min": 0.25,
+    "distance_surcharge_threshold_km": 20,
+    "distance_surcharge": 2.0,
+    "duration_surcharge_threshold_min": 30,
+    "duration_surcharge": 1.0,
+}
+CONFIG = {
+    "defaults": DEFAULTS,
+    "cities": {
+        "default": {"standard": {}, "xl": {"base_fare": 3.5}},
+        "berlin": {"defaults": {"cost_per_min": 0.5}, "standard": {}},
+    },
+}
+
+
+@pytest.fixture
+def tariff_file(tmp_path, monkeypatch):
+    """
+    Writes CONFIG to a tariff file and points the shared engine at it.
+    """
+    path = tmp_path / "tariffs.json"
+    path.write_text(json.dumps(CONFIG))
+    monkeypatch.setattr(payments_tariffs, "_engine", TariffEngine(str(path)))
+    return path
+
+
+def test_classes_inherit_defaults_and_cities_fall_back_to_default():
+    """
+    Overrides layer over city and global defaults; unknown cities use the default city's tariffs.
+    """
+    compiled = compile_tariffs(CONFIG)
+
+    assert compiled.tariff("berlin", "standard").cost_per_min == 0.5
+    assert compiled.tariff("berlin", "xl").base_fare == 3.5
+    assert compiled.tariff("paris").cost_per_min == 0.25
+    with pytest.raises(TariffError):
+        compiled.tariff("berlin", "limousine")
+
+
+def test_invalid_configurations_are_rejected():
+    """
+    Missing or unknown fields and a missing default city fail compilation.
+    """
+    with pytest.raises(TariffError):
+        compile_tariffs({"defaults": DEFAULTS, "cities": {"default": {"standard": {"base_fee": 1.0}}}})
+    with pytest.raises(TariffError):
+        compile_tariffs({"cities": {"default": {"standard": {"base_fare": 1.0}}}})
+    with pytest.raises(TariffError):
+        compile_tariffs({"defaults": DEFAULTS, "cities": {"berlin": {"standard": {}}}})
+
+
+def test_fares_are_priced_with_city_and_class_tariffs(tariff_file):
+    """
+    Scalar and batch pricing read the same compiled tariffs and agree trip by trip.
+    """
+    # Arrange
+    cities = ["berlin", None, "paris", "berlin"]
+    classes = ["standard", "xl", None, "xl"]
+    distances = [3.0, 3.0, 25.0, 10.0]
+    durations = [15.0, 15.0, 40.0, 20.0]
+
+    # Act
+    scalar = [
+        calculate_fare(None, None, duration, distance, city=city, vehicle_class=vehicle_class)
+        for city, vehicle_class, distance, duration in zip(cities, classes, distances, durations)
+    ]
+    batch = calculate_fare_batch(distances, durations, cities=cities, vehicle_classes=classes)
+
+    # Assert
+    assert scalar == [13.25, 11.0, 46.25, 21.0]
+    assert batch.tolist() == scalar
+
+
+def test_reload_swaps_in_new_tariffs_and_keeps_old_ones_on_error(tariff_file):
+    """
+    A changed file is picked up by reload; a broken file leaves the current tariffs in place.
+    """
+    # Arrange
+    engine = payments_tariffs.get_tariff_engine()
+    before = engine.compiled
+    updated = json.loads(json.dumps(CONFIG))
+    updated["cities"]["default"]["standard"] = {"base_fare": 5.0}
+
+    # Act
+    tariff_file.write_text(json.dumps(updated))
+    os.utime(tariff_file, ns=(1, 1))
+    reloaded = engine.reload()
+    unchanged = engine.reload()
+    tariff_file.write_text("{not json")
+    os.utime(tariff_file, ns=(2, 2))
+    broken = engine.reload()
+
+    # Assert
+    assert (reloaded, unchanged, broken) == (True, False, False)
+    assert before.tariff().base_fare == 2.0
+    assert engine.tariff().base_fare == 5.0
+    assert calculate_fare(None, None, 15.0, 3.0) == 12.5
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import pytest
+from datetime import datetime, timedelta
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers.drivers_availability import AvailabilityPool
+from rides import rides_archive, rides_router
+from rides.rides_archive import RideArchive, RideTieringJob, decode_block, encode_block, tier_finished_rides
+from rides.rides_index import RideIndex
+
+START = datetime(2025, 3, 14, 8, 0)
+
+
+def make_ride(ride_id, status="completed"):
+    return {
+        "ride_id": ride_id,
+        "rider_id": ride_id % 5,
+        "pickup": "40.75,-73.98",
+        "dropoff": "40.64,-73.77",
+        "status": status,
+        "driver_id": "driver_123",
+        "additional_info": None,
+        "created_at": START + timedelta(minutes=ride_id),
+    }
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """
+    Ride archive in a temporary directory, with small blocks.
+    """
+    ride_archive = RideArchive(str(tmp_path), block_size=4)
+    yield ride_archive
+    ride_archive.close()
+
+
+def test_block_round_trip_preserves_rides():
+    """
+    Column-oriented blocks decode back to the original records, datetimes included.
+    """
+    rides = [make_ride(1), make_ride(2, status="cancelled")]
+    rides[1]["extra"] = "only on one ride"
+
+    decoded = decode_block(encode_block(rides))
+
+    assert decoded[0] == dict(make_ride(1), extra=None)
+    assert decoded[1] == rides[1]
+
+
+def test_get_finds_rides_across_blocks_and_out_of_order_rides(archive):
+    """
+    Every archived ride is found, including rides archived after higher IDs.
+    """
+    # Arrange
+    archive.append([make_ride(ride_id) for ride_id in range(10, 20)])
+    archive.append([make_ride(3), make_ride(25), make_ride(15 + 100)])
+
+    # Act & Assert
+    for ride_id in list(range(10, 20)) + [3, 25, 115]:
+        assert archive.get(ride_id)["ride_id"] == ride_id
+    assert archive.get(1) is None
+    assert archive.get(20) is None
+    assert archive.get(1000) is None
+
+
+def test_index_stays_one_entry_per_block_when_rides_finish_out_of_order(archive, tmp_path):
+    """
+    Interleaved ride IDs across batches only widen block ranges; the index never grows per ride.
+    """
+    # Arrange
+    batches = [[make_ride(ride_id) for ride_id in range(start, 400, 7)] for start in range(7)]
+
+    # Act
+    for batch in batches:
+        archive.append(batch)
+    with open(tmp_path / rides_archive.INDEX_FILE, encoding="utf-8") as index_file:
+        entries = [json.loads(line) for line in index_file]
+
+    # Assert
+    assert len(entries) == len(archive)
+    assert all(set(entry) == {"min_id", "max_id", "offset", "length"} for entry in entries)
+    assert all(archive.get(ride_id)["ride_id"] == ride_id for ride_id in range(400))
+
+
+def test_newest_archived_copy_of_a_ride_wins(archive):
+    """
+    A ride archived again after it changed is served from its newest copy.
+    """
+    # Arrange
+    archive.append([make_ride(ride_id) for ride_id in range(1, 9)])
+    changed = dict(make_ride(5), rating=4)
+
+    # Act
+    archive.append([changed, make_ride(12)])
+
+    # Assert
+    assert archive.get(5)["rating"] == 4
+    assert archive.get(6).get("rating") is None
+
+
+def test_sparse_index_is_reloaded_from_disk(archive, tmp_path):
+    """
+    A new archive over the same directory sees the previously written blocks.
+    """
+    # Arrange
+    archive.append([make_ride(ride_id) for ride_id in range(1, 10)])
+    archive.append([make_ride(0)])
+    archive.close()
+
+    # Act
+    reopened = RideArchive(str(tmp_path))
+
+    # Assert
+    assert len(reopened) == 4
+    assert reopened.get(0)["status"] == "completed"
+    assert reopened.get(7)["created_at"] == START + timedelta(minutes=7)
+    reopened.close()
+
+
+def test_tier_finished_rides_moves_only_terminal_rides(archive):
+    """
+    Completed and cancelled rides leave the hot store; active rides stay.
+    """
+    # Arrange
+    rides_db = {
+        1: make_ride(1, status="completed"),
+        2: make_ride(2, status="pending"),
+        3: make_ride(3, status="CANCELLED"),
+        4: make_ride(4, status="canceled"),
+    }
+
+    # Act
+    moved = tier_finished_rides(rides_db, archive)
+
+    # Assert
+    assert moved == 3
+    assert list(rides_db) == [2]
+    assert archive.get(3)["status"] == "CANCELLED"
+
+
+def test_get_ride_details_falls_through_to_archive(archive, monkeypatch):
+    """
+    The ride details endpoint serves archived rides transparently.
+    """
+    # Arrange
+    monkeypatch.setattr(rides_router, "rides_db", {})
+    monkeypatch.setattr(rides_router, "ride_index", RideIndex())
+    monkeypatch.setattr(rides_router, "current_ride_id", 0)
+    monkeypatch.setattr(rides_router, "driver_availability", AvailabilityPool(["driver_1"]))
+    monkeypatch.setattr(rides_archive, "_archive", archive)
+    app = FastAPI()
+    app.include_router(rides_router.router)
+    client = TestClient(app)
+    ride_id = client.post("/rides/request_ride", json={"pickup": "A", "dropoff": "B"}).json()["ride_id"]
+    client.put(f"/rides/{ride_id}/status", json={"status": "completed"})
+
+    # Act
+    tier_finished_rides(rides_router.rides_db, archive, rides_router.ride_index)
+    response = client.get(f"/rides/{ride_id}")
+    listing = client.get("/rides")
+
+    # Assert
+    assert ride_id not in rides_router.rides_db
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert listing.json()["rides"] == []
+    assert len(rides_router.ride_index) == 0
+    assert client.get("/rides/999").status_code == 404
+
+
+def test_tiering_job_keeps_rides_changed_while_archiving(archive):
+    """
+    The job evicts archived rides from the store and index, except one whose
+    record changed while the archive was being written.
+    """
+    # Arrange
+    rides_db = {ride_id: make_ride(ride_id, status="completed") for ride_id in (1, 2)}
+    index = RideIndex()
+    for ride in rides_db.values():
+        index.index_ride(ride)
+
+    class ChangingArchive:
+        def append(self, rides):
+            archive.append(rides)
+            rides_db[2]["rating"] = 5
+
+    job = RideTieringJob(rides_db, ChangingArchive, interval_seconds=60, index=index)
+
+    # Act
+    moved = asyncio.run(job.run_once())
+
+    # Assert
+    assert moved == 1
+    assert list(rides_db) == [2] and rides_db[2]["rating"] == 5
+    assert len(index) == 1
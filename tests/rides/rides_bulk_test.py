@@ -0,0 +1,121 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers.drivers_availability import AvailabilityPool
+from rides import rides_router
+from rides.rides_index import RideIndex
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Test client for an app serving only the rides router, with empty ride storage.
+    """
+    monkeypatch.setattr(rides_router, "rides_db", {})
+    monkeypatch.setattr(rides_router, "ride_index", RideIndex())
+    monkeypatch.setattr(rides_router, "current_ride_id", 0)
+    monkeypatch.setattr(rides_router, "driver_availability", AvailabilityPool(f"driver_{n}" for n in range(10)))
+    app = FastAPI()
+    app.include_router(rides_router.router)
+    return TestClient(app)
+
+
+def read_results(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_bulk_request_books_json_array(client):
+    """
+    Every valid item in a JSON array is booked and reported in input order.
+    """
+    # Arrange
+    items = [{"rider_id": 1, "pickup": f"Gate {n}", "dropoff": "Arena"} for n in range(5)]
+
+    # Act
+    response = client.post("/rides/bulk_request", json=items)
+
+    # Assert
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = read_results(response)
+    assert [result["index"] for result in results] == list(range(5))
+    assert all(result["status"] == "booked" for result in results)
+    assert [result["ride"]["pickup"] for result in results] == [f"Gate {n}" for n in range(5)]
+    assert len(rides_router.rides_db) == 5
+
+
+def test_bulk_request_accepts_ndjson_and_reports_invalid_items(client):
+    """
+    Invalid items are rejected individually without aborting the rest.
+    """
+    # Arrange
+    body = "\n".join([
+        json.dumps({"pickup": "A", "dropoff": "B"}),
+        json.dumps({"rider_id": "not-a-number"}),
+        json.dumps(["not", "an", "object"]),
+        '{"pickup": "truncated',
+        json.dumps({"pickup": "C", "dropoff": "D"}),
+    ])
+
+    # Act
+    response = client.post("/rides/bulk_request", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    # Assert
+    results = read_results(response)
+    assert [result["status"] for result in results] == ["booked", "rejected", "rejected", "rejected", "booked"]
+    assert results[3]["error"].startswith("Line 4 is not valid JSON")
+    assert sorted(rides_router.rides_db) == [1, 2]
+
+
+def test_bulk_request_reports_items_without_drivers(client, monkeypatch):
+    """
+    Items the dispatcher cannot serve fail on their own.
+    """
+    # Arrange
+    async def fake_drivers(pickups, ride_ids):
+        return ["driver_1", None][:len(pickups)]
+
+    monkeypatch.setattr(rides_router, "find_available_drivers", fake_drivers)
+
+    # Act
+    response = client.post("/rides/bulk_request", json=[{"pickup": "A"}, {"pickup": "B"}])
+
+    # Assert
+    results = read_results(response)
+    assert results[0]["ride"]["driver_id"] == "driver_1"
+    assert results[1] == {"index": 1, "status": "failed", "error": "No drivers currently available."}
+
+
+def test_bulk_request_rejects_malformed_or_oversized_bodies(client, monkeypatch):
+    """
+    Bodies that are not an array, or exceed the batch limit, are rejected up front.
+    """
+    monkeypatch.setattr(rides_router, "MAX_BULK_RIDES", 2)
+
+    assert client.post("/rides/bulk_request", json={"pickup": "A"}).status_code == 400
+    assert client.post("/rides/bulk_request", content="{not json", headers={"Content-Type": "application/json"}).status_code == 400
+    assert client.post("/rides/bulk_request", json=[{}, {}, {}]).status_code == 413
+
+
+def test_bulk_request_fails_items_that_cannot_be_scheduled(client, monkeypatch):
+    """
+    A future ride whose scheduling fails is reported as failed, not dispatched now.
+    """
+    # Arrange
+    def broken_schedule(request):
+        if request.pickup_time is not None:
+            raise RuntimeError("schedule unavailable")
+        return None
+
+    monkeypatch.setattr(rides_router, "schedule_ride", broken_schedule)
+    items = [{"pickup": "A", "pickup_time": "2999-01-01T10:00:00"}, {"pickup": "B"}]
+
+    # Act
+    results = read_results(client.post("/rides/bulk_request", json=items))
+
+    # Assert
+    assert results[0]["status"] == "failed" and "schedule unavailable" in results[0]["error"]
+    assert results[1]["status"] == "booked"
+    assert [ride["pickup"] for ride in rides_router.rides_db.values()] == ["B"]
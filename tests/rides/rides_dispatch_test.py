@@ -0,0 +1,242 @@
+import asyncio
+import sys
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers.drivers_availability import AvailabilityPool
+from drivers.drivers_locations import SpatialIndex
+from rides import rides_dispatch, rides_router
+from rides.rides_archive import RideArchive, tier_finished_rides
+from rides.rides_dispatch import CandidateScorer, dispatch_batch, dispatch_by_eta, dispatch_nearest, estimate_pickup_eta
+from rides.rides_index import RideIndex
+from utils.geolocation import calculate_distance
+
+PICKUP = (40.7580, -73.9855)
+
+
+def make_fleet(positions):
+    """
+    Builds a spatial index and availability pool holding the given drivers.
+    """
+    index = SpatialIndex()
+    index.apply({driver_id: (lat, lng, 0.0) for driver_id, (lat, lng) in positions.items()})
+    return index, AvailabilityPool(positions)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Test client for an app serving only the rides router, with an empty ride store
+    and inline ETA scoring.
+    """
+    monkeypatch.setattr(rides_router, "rides_db", {})
+    monkeypatch.setattr(rides_router, "ride_index", RideIndex())
+    monkeypatch.setattr(rides_router, "current_ride_id", 0)
+    monkeypatch.setattr(rides_router, "get_candidate_scorer", lambda: CandidateScorer(executor_kind="inline"))
+    app = FastAPI()
+    app.include_router(rides_router.router)
+    return TestClient(app)
+
+
+def test_scorer_ranks_candidates_by_eta_in_worker_pool():
+    """
+    Candidates come back fastest first when every score finishes in time.
+    """
+    # Arrange
+    scorer = CandidateScorer(executor_kind="thread", workers=4)
+    candidates = [("far", (40.80, -73.98)), ("near", (40.76, -73.98)), ("mid", (40.78, -73.98))]
+
+    # Act
+    ranked = asyncio.run(scorer.score(PICKUP, candidates))
+    scorer.close()
+
+    # Assert
+    assert [driver_id for _, driver_id in ranked] == ["near", "mid", "far"]
+
+
+def test_late_scoring_falls_back_to_straight_line_order():
+    """
+    A candidate set still being scored at the deadline is dropped instead of
+    delaying dispatch, which then reserves the nearest driver.
+    """
+    # Arrange
+    def eta_fn(position, pickup):
+        time.sleep(0.5)
+        return 1.0
+
+    index, pool = make_fleet({"near": (40.759, -73.985), "far": (40.80, -73.95)})
+    scorer = CandidateScorer(executor_kind="thread", deadline_ms=50, workers=2, eta_fn=eta_fn)
+
+    # Act
+    started = time.perf_counter()
+    driver_id = asyncio.run(dispatch_by_eta("40.7580,-73.9855", index, pool, scorer, ride_id=1))
+    elapsed = time.perf_counter() - started
+    scorer.close()
+
+    # Assert
+    assert driver_id == "near"
+    assert scorer.late == 2
+    assert elapsed < 0.4
+
+
+def test_scorer_is_inline_unless_a_routed_estimator_is_configured(monkeypatch):
+    """
+    The built-in estimate is scored on the event loop; a configured routed
+    estimator is loaded and scored in a process pool.
+    """
+    monkeypatch.setattr(rides_dispatch, "_scorer", None)
+    monkeypatch.delenv("DISPATCH_SCORING_EXECUTOR", raising=False)
+    monkeypatch.delenv("DISPATCH_ETA_ESTIMATOR", raising=False)
+    default = rides_dispatch.get_candidate_scorer()
+
+    monkeypatch.setattr(rides_dispatch, "_scorer", None)
+    monkeypatch.setenv("DISPATCH_ETA_ESTIMATOR", "utils.geolocation:calculate_distance")
+    routed = rides_dispatch.get_candidate_scorer()
+
+    assert (default.executor_kind, default.eta_fn) == ("inline", estimate_pickup_eta)
+    assert (routed.executor_kind, routed.eta_fn) == ("process", calculate_distance)
+
+
+def test_dispatch_by_eta_reserves_fastest_available_driver():
+    """
+    The best-scored driver is reserved and leaves the available set.
+    """
+    # Arrange
+    index, pool = make_fleet({"a": (40.80, -73.98), "b": (40.759, -73.985), "c": (40.77, -73.98)})
+    pool.reserve(ride_id=99, driver_id="b")
+    scorer = CandidateScorer(executor_kind="inline")
+
+    # Act
+    driver_id = asyncio.run(dispatch_by_eta("40.7580,-73.9855", index, pool, scorer, ride_id=1))
+
+    # Assert
+    assert driver_id == "c"
+    assert pool.available_drivers() == ["a"]
+
+
+def test_dispatch_without_coordinates_uses_longest_waiting_driver():
+    """
+    Pickups without coordinates fall back to the longest-waiting driver; no drivers means None.
+    """
+    index, pool = make_fleet({"first": (40.0, -73.0), "second": (40.0, -73.0)})
+
+    assert dispatch_nearest("Main Street", index, pool) == "first"
+    assert dispatch_nearest("Main Street", index, pool) == "second"
+    assert dispatch_nearest("Main Street", index, pool) is None
+
+
+def test_request_ride_assigns_nearest_driver_or_returns_503(client, monkeypatch):
+    """
+    Immediate ride requests reserve the driver with the best ETA, and get 503 once none are left.
+    """
+    # Arrange
+    index, pool = make_fleet({"near": (40.759, -73.985), "far": (40.80, -73.95)})
+    monkeypatch.setattr(rides_router, "driver_locations", index)
+    monkeypatch.setattr(rides_router, "driver_availability", pool)
+    body = {"pickup": "40.7580,-73.9855", "dropoff": "B"}
+
+    # Act
+    first = client.post("/rides/request_ride", json=body)
+    second = client.post("/rides/request_ride", json=body)
+    third = client.post("/rides/request_ride", json=body)
+
+    # Assert
+    assert first.json()["driver_id"] == "near"
+    assert second.json()["driver_id"] == "far"
+    assert third.status_code == 503
+
+
+def test_cancel_and_complete_release_driver(client, monkeypatch):
+    """
+    A cancelled or completed ride hands its driver straight back to the pool.
+    """
+    # Arrange
+    index, pool = make_fleet({"only": (40.759, -73.985)})
+    monkeypatch.setattr(rides_router, "driver_locations", index)
+    monkeypatch.setattr(rides_router, "driver_availability", pool)
+    body = {"pickup": "40.7580,-73.9855", "dropoff": "B"}
+
+    # Act
+    first = client.post("/rides/request_ride", json=body).json()
+    client.put(f"/rides/{first['ride_id']}/status", json={"status": "cancelled"})
+    second = client.post("/rides/request_ride", json=body).json()
+    client.put(f"/rides/{second['ride_id']}/status", json={"status": "completed"})
+    # A repeated cancellation of the first ride must not touch the driver again
+    client.put(f"/rides/{first['ride_id']}/status", json={"status": "cancelled"})
+
+    # Assert
+    assert first["driver_id"] == second["driver_id"] == "only"
+    assert pool.available_drivers() == ["only"]
+    assert pool.reserved_drivers() == {}
+
+
+def test_late_release_does_not_free_driver_on_another_ride():
+    """
+    Releasing a driver for a ride they no longer serve is a no-op.
+    """
+    pool = AvailabilityPool(["a"])
+    pool.reserve(ride_id=1)
+    pool.release("a", ride_id=1)
+    pool.reserve(ride_id=2)
+
+    assert pool.release("a", ride_id=1) is False
+    assert pool.reserved_drivers() == {"a": 2}
+
+
+def test_request_cancel_soak_keeps_supply_and_memory_constant(monkeypatch, tmp_path):
+    """
+    Many request/cancel cycles, with finished rides tiered to the archive,
+    leave the pool as they found it, empty the hot store and ride index, and
+    do not grow memory. benchmarks/dispatch_soak.py runs the same loop for
+    millions of cycles.
+    """
+    # Arrange
+    fleet = {f"driver_{i}": (40.75 + i * 0.001, -73.98) for i in range(20)}
+    index, pool = make_fleet(fleet)
+    monkeypatch.setattr(rides_router, "rides_db", {})
+    monkeypatch.setattr(rides_router, "ride_index", RideIndex())
+    monkeypatch.setattr(rides_router, "driver_locations", index)
+    monkeypatch.setattr(rides_router, "driver_availability", pool)
+    monkeypatch.setattr(rides_router, "get_candidate_scorer", lambda: CandidateScorer(executor_kind="inline"))
+    request = rides_router.RideRequest(pickup="40.7580,-73.9855", dropoff="B")
+    cancel = rides_router.RideStatusUpdate(status="cancelled")
+    archive = RideArchive(str(tmp_path))
+
+    async def cycles(count):
+        for cycle in range(1, count + 1):
+            ride = await rides_router.request_ride_endpoint(request)
+            await rides_router.update_ride_status_endpoint(ride["ride_id"], cancel)
+            if cycle % 500 == 0:
+                tier_finished_rides(rides_router.rides_db, archive, rides_router.ride_index)
+
+    # Act
+    asyncio.run(cycles(500))
+    baseline = sys.getallocatedblocks()
+    asyncio.run(cycles(10_000))
+    current = sys.getallocatedblocks()
+    archive.close()
+
+    # Assert
+    assert pool.stats() == {"available": 20, "reserved": 0}
+    assert len(rides_router.rides_db) == len(rides_router.ride_index) == 0
+    assert current - baseline < 500
+
+
+
+def test_batch_dispatch_assigns_by_shortest_eta_across_the_batch():
+    """
+    A driver close to two pickups goes to the one they reach sooner, even if
+    it is listed second; the other ride gets the next best driver.
+    """
+    # Arrange
+    index, pool = make_fleet({"shared": (40.7600, -73.9855), "other": (40.7300, -73.9855)})
+    pickups = ["40.7500,-73.9855", "40.7590,-73.9855", "somewhere"]
+
+    # Act
+    drivers = asyncio.run(dispatch_batch(pickups, [1, 2, 3], index, pool, CandidateScorer(executor_kind="inline")))
+
+    # Assert
+    assert drivers == ["other", "shared", None]
+    assert pool.reserved_drivers() == {"shared": 2, "other": 1}
@@ -0,0 +1,121 @@
+import asyncio
+import queue
+
+from drivers.drivers_availability import AvailabilityPool
+from drivers.drivers_locations import SpatialIndex
+from rides.rides_dispatch import estimate_pickup_eta
+from rides.rides_dispatch_worker import DispatchWorkerClient, apply_pool_event, match_ride, run_dispatch_worker
+
+PICKUP = (40.7580, -73.9855)
+
+
+def test_worker_applies_updates_before_matching_the_batch():
+    """
+    Updates queued ahead of a match in the same batch are visible to it, and
+    drivers matched once are not offered again.
+    """
+    # Arrange
+    requests, responses = queue.Queue(), queue.Queue()
+    requests.put(("sync", {"far": (40.80, -73.95, 0.0)}, ["far"], {}))
+    requests.put(("locations", {"near": (40.759, -73.985, 1.0)}))
+    requests.put(("pool", "add", "near", None))
+    requests.put(("match", 1, PICKUP, 10))
+    requests.put(("match", 2, PICKUP, 11))
+    requests.put(("match", 3, PICKUP, 12))
+    requests.put(None)
+
+    # Act
+    run_dispatch_worker(requests, responses, estimate_pickup_eta)
+
+    # Assert
+    assert responses.get_nowait() == [(1, "near"), (2, "far"), (3, None)]
+    assert responses.get_nowait() is None
+
+
+def test_worker_drops_removed_drivers():
+    """
+    Availability removals mirrored from the app take drivers out of matching.
+    """
+    requests, responses = queue.Queue(), queue.Queue()
+    requests.put(("sync", {"driver1": (40.759, -73.985, 0.0)}, ["driver1"], {}))
+    requests.put(("pool", "remove", "driver1", None))
+    requests.put(("match", 1, PICKUP, 10))
+    requests.put(None)
+
+    run_dispatch_worker(requests, responses, estimate_pickup_eta)
+
+    assert responses.get_nowait() == [(1, None)]
+
+
+def test_client_matches_through_worker_process():
+    """
+    The client seeds a real worker process with the fleet, mirrors pool changes
+    and resolves matches asynchronously.
+    """
+    async def scenario():
+        index = SpatialIndex()
+        index.apply({"near": (40.759, -73.985, 0.0), "far": (40.80, -73.95, 0.0)})
+        pool = AvailabilityPool(["near", "far"])
+        client = DispatchWorkerClient(index, pool, match_timeout_seconds=30.0)
+        client.start()
+        try:
+            pool.remove("near")
+            return await client.match("40.7580,-73.9855", ride_id=1), client.running
+        finally:
+            client.stop()
+
+    driver_id, running = asyncio.run(scenario())
+
+    assert driver_id == "far"
+    assert running
+
+
+def test_worker_release_only_frees_the_drivers_current_ride():
+    """
+    A release mirrored for an earlier ride does not free a driver the worker
+    has since proposed for another one.
+    """
+    # Arrange
+    index = SpatialIndex()
+    index.apply({"driver1": (40.759, -73.985, 0.0)})
+    pool = AvailabilityPool(["driver1"])
+    proposed = match_ride(PICKUP, 10, index, pool, estimate_pickup_eta)
+
+    # Act
+    apply_pool_event(index, pool, "release", "driver1", 9)
+    stale = pool.is_available("driver1")
+    apply_pool_event(index, pool, "release", "driver1", 10)
+
+    # Assert
+    assert proposed == "driver1"
+    assert not stale
+    assert pool.is_available("driver1")
+
+
+def test_client_releases_proposals_that_arrive_after_the_timeout():
+    """
+    A match that timed out does not leave its driver reserved in the worker:
+    the late proposal is released, so the driver is offered again.
+    """
+    async def scenario():
+        index = SpatialIndex()
+        index.apply({"driver1": (40.759, -73.985, 0.0)})
+        pool = AvailabilityPool(["driver1"])
+        client = DispatchWorkerClient(index, pool, match_timeout_seconds=0.0)
+        client.start()
+        try:
+            abandoned = await client.match("40.7580,-73.9855", ride_id=1)
+            client.match_timeout_seconds = 30.0
+            for _ in range(100):
+                await asyncio.sleep(0.05)
+                if not client._pending:
+                    break
+            return abandoned, await client.match("40.7580,-73.9855", ride_id=2), pool.reserved_drivers()
+        finally:
+            client.stop()
+
+    abandoned, driver_id, reserved = asyncio.run(scenario())
+
+    assert abandoned is None
+    assert driver_id == "driver1"
+    assert reserved == {"driver1": 2}
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+
+import pytest
+import numpy as np
+from datetime import datetime, timedelta
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rides import rides_forecast
+from rides.rides_forecast import (
+    ForecastError,
+    RepositioningJob,
+    build_demand_forecast,
+    compute_repositioning,
+    run_repositioning_batch,
+    smooth_demand,
+)
+from rides.rides_router import router
+from utils.geolocation import cell_center, grid_cell
+
+NOW = datetime(2025, 3, 14, 17, 30)
+HOTSPOT = (40.7580, -73.9855)
+QUIET = (40.6413, -73.7781)
+
+
+@pytest.fixture
+def client():
+    """
+    Test client for an app serving only the rides router.
+    """
+    app = FastAPI()
+    app.include_router(router)
+    return TestClient(app)
+
+
+def make_rides(coord, count, created_at):
+    return [{"pickup": f"{coord[0]},{coord[1]}", "created_at": created_at} for _ in range(count)]
+
+
+def test_smooth_demand_matches_recursive_form():
+    """
+    The vectorized smoothing must equal the textbook recursive exponential smoothing.
+    """
+    # Arrange
+    rng = np.random.default_rng(7)
+    counts = rng.integers(0, 10, size=(9, 4, 3)).astype(float)
+    alpha = 0.4
+
+    # Act
+    smoothed = smooth_demand(counts, alpha)
+
+    # Assert
+    level = counts[0]
+    for day in counts[1:]:
+        level = alpha * day + (1 - alpha) * level
+    np.testing.assert_allclose(smoothed, level)
+
+
+def test_smooth_demand_rejects_invalid_alpha():
+    """
+    Alpha outside (0, 1] is rejected.
+    """
+    with pytest.raises(ForecastError):
+        smooth_demand(np.zeros((3, 1, 1)), alpha=0)
+
+
+def test_build_demand_forecast_buckets_by_cell_and_hour():
+    """
+    Rides are counted in their pickup cell and hour-of-day bucket, and old rides are ignored.
+    """
+    # Arrange
+    rides = []
+    for days_ago in range(3):
+        rides += make_rides(HOTSPOT, 6, NOW.replace(hour=18) - timedelta(days=days_ago))
+    rides += make_rides(QUIET, 1, NOW.replace(hour=9))
+    rides += make_rides(QUIET, 50, NOW - timedelta(days=60))
+    rides.append({"pickup": "Default pickup location", "created_at": NOW})
+
+    # Act
+    forecast = build_demand_forecast(rides, NOW, history_days=3, alpha=0.5)
+
+    # Assert
+    evening = NOW.replace(hour=18)
+    assert forecast.expected_demand(grid_cell(HOTSPOT), evening) == pytest.approx(6.0)
+    assert forecast.expected_demand(grid_cell(QUIET), evening) == 0.0
+    assert forecast.expected_demand(grid_cell(QUIET), NOW.replace(hour=9)) == pytest.approx(0.5)
+    assert forecast.expected_demand((0, 0), evening) == 0.0
+
+
+def test_build_demand_forecast_rejects_uneven_buckets():
+    """
+    Bucket widths must evenly divide a day.
+    """
+    with pytest.raises(ForecastError):
+        build_demand_forecast([], NOW, bucket_minutes=7)
+
+
+def test_compute_repositioning_moves_surplus_drivers_to_deficit_cells():
+    """
+    Surplus and unplaced drivers are sent to the hotspot; needed drivers stay put.
+    """
+    # Arrange
+    evening = NOW.replace(hour=18)
+    rides = make_rides(HOTSPOT, 3, evening) + make_rides(QUIET, 1, evening)
+    forecast = build_demand_forecast(rides, NOW, history_days=1)
+    idle_drivers = {
+        "at_quiet_1": QUIET,
+        "at_quiet_2": QUIET,
+        "unknown": None,
+        "at_hotspot": HOTSPOT,
+    }
+
+    # Act
+    suggestions = compute_repositioning(forecast, idle_drivers, evening)
+
+    # Assert
+    assert set(suggestions) == {"unknown", "at_quiet_1"} or set(suggestions) == {"unknown", "at_quiet_2"}
+    hotspot_center = cell_center(grid_cell(HOTSPOT))
+    for suggestion in suggestions.values():
+        assert suggestion["target_cell"] == list(grid_cell(HOTSPOT))
+        assert suggestion["target_location"] == {"lat": hotspot_center[0], "lng": hotspot_center[1]}
+
+
+def test_repositioning_endpoint_serves_precomputed_table(client, monkeypatch):
+    """
+    The endpoint reads from the table published by the batch job.
+    """
+    # Arrange
+    monkeypatch.setattr(rides_forecast, "_repositioning_table", {})
+    rides = make_rides(HOTSPOT, 4, NOW + timedelta(hours=1))
+
+    # Act
+    published = run_repositioning_batch(rides, {"driver123": QUIET}, NOW)
+    found = client.get("/rides/repositioning/driver123")
+    missing = client.get("/rides/repositioning/driver999")
+
+    # Assert
+    assert published == 1
+    assert found.status_code == 200
+    assert found.json()["target_cell"] == list(grid_cell(HOTSPOT))
+    assert missing.status_code == 404
+
+
+def test_repositioning_job_copies_inputs_on_the_loop_and_forecasts_off_it(monkeypatch):
+    """
+    The job reads the ride store and driver pool on the event loop and hands copies to a worker thread.
+    """
+    # Arrange
+    loop_thread = threading.get_ident()
+    stored = make_rides(HOTSPOT, 2, NOW)
+    reads = []
+    batches = []
+
+    def rides_provider():
+        reads.append(threading.get_ident())
+        return stored
+
+    def drivers_provider():
+        reads.append(threading.get_ident())
+        return {"driver123": QUIET}
+
+    def fake_batch(rides, idle_drivers):
+        batches.append((threading.get_ident(), rides, idle_drivers))
+        return len(idle_drivers)
+
+    monkeypatch.setattr(rides_forecast, "run_repositioning_batch", fake_batch)
+    job = RepositioningJob(rides_provider, drivers_provider, interval_seconds=60)
+
+    # Act
+    published = asyncio.run(job.run_once())
+
+    # Assert
+    batch_thread, rides, idle_drivers = batches[0]
+    assert published == 1
+    assert reads == [loop_thread, loop_thread]
+    assert batch_thread != loop_thread
+    assert rides == stored and all(copy is not ride for copy, ride in zip(rides, stored))
+    assert idle_drivers == {"driver123": QUIET}
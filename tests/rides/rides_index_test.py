@@ -0,0 +1,149 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers.drivers_availability import AvailabilityPool
+from rides import rides_router
+from rides.rides_index import InvalidCursorError, RideIndex
+
+START = datetime(2025, 3, 14, 8, 0)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Test client for an app serving only the rides router, with empty ride storage.
+    """
+    monkeypatch.setattr(rides_router, "rides_db", {})
+    monkeypatch.setattr(rides_router, "ride_index", RideIndex())
+    monkeypatch.setattr(rides_router, "current_ride_id", 0)
+    monkeypatch.setattr(rides_router, "driver_availability", AvailabilityPool(f"driver_{n}" for n in range(10)))
+    app = FastAPI()
+    app.include_router(rides_router.router)
+    return TestClient(app)
+
+
+def make_ride(ride_id, rider_id=1, driver_id="driver_123", status="pending"):
+    return {
+        "ride_id": ride_id,
+        "rider_id": rider_id,
+        "driver_id": driver_id,
+        "status": status,
+        "created_at": START + timedelta(minutes=ride_id),
+    }
+
+
+def collect_pages(index, field=None, value=None, limit=3):
+    ride_ids, cursor = index.query(field, value, limit=limit)
+    pages = [ride_ids]
+    while cursor:
+        ride_ids, cursor = index.query(field, value, limit=limit, cursor=cursor)
+        pages.append(ride_ids)
+    return pages
+
+
+def test_query_pages_newest_first_by_created_time():
+    """
+    Walking the cursors visits every ride exactly once, newest first.
+    """
+    # Arrange
+    index = RideIndex()
+    for ride_id in range(1, 11):
+        index.index_ride(make_ride(ride_id))
+
+    # Act
+    pages = collect_pages(index)
+
+    # Assert
+    assert pages == [[10, 9, 8], [7, 6, 5], [4, 3, 2], [1]]
+
+
+def test_query_filters_by_rider_and_driver():
+    """
+    Rider and driver indexes only return the matching rides.
+    """
+    # Arrange
+    index = RideIndex()
+    for ride_id in range(1, 7):
+        index.index_ride(make_ride(ride_id, rider_id=ride_id % 2, driver_id=f"driver_{ride_id % 3}"))
+
+    # Act & Assert
+    assert sum(collect_pages(index, "rider_id", 1), []) == [5, 3, 1]
+    assert sum(collect_pages(index, "driver_id", "driver_0"), []) == [6, 3]
+    assert index.query("rider_id", 42) == ([], None)
+
+
+def test_status_index_follows_updates():
+    """
+    Re-indexing a ride after a status change moves it between status entries.
+    """
+    # Arrange
+    index = RideIndex()
+    rides = [make_ride(ride_id) for ride_id in range(1, 5)]
+    for ride in rides:
+        index.index_ride(ride)
+
+    # Act
+    rides[1]["status"] = "COMPLETED"
+    index.index_ride(rides[1])
+    index.remove_ride(4)
+
+    # Assert
+    assert index.query("status", "pending") == ([3, 1], None)
+    assert index.query("status", "completed") == ([2], None)
+    assert index.query() == ([3, 2, 1], None)
+    assert len(index) == 3
+
+
+def test_query_rejects_bad_cursor_and_field():
+    """
+    Malformed cursors and unindexed fields are rejected.
+    """
+    index = RideIndex()
+    with pytest.raises(InvalidCursorError):
+        index.query(cursor="not-a-cursor")
+    with pytest.raises(ValueError):
+        index.query("pickup", "Point A")
+
+
+def test_list_rides_endpoint_paginates_rider_trips(client):
+    """
+    The list endpoint pages through a rider's rides using opaque cursors.
+    """
+    # Arrange
+    for rider_id in (7, 8, 7, 7):
+        client.post("/rides/request_ride", json={"rider_id": rider_id, "pickup": "A", "dropoff": "B"})
+
+    # Act
+    first = client.get("/rides", params={"rider_id": 7, "limit": 2}).json()
+    second = client.get("/rides", params={"rider_id": 7, "limit": 2, "cursor": first["next_cursor"]}).json()
+
+    # Assert
+    assert [ride["ride_id"] for ride in first["rides"]] == [4, 3]
+    assert [ride["ride_id"] for ride in second["rides"]] == [1]
+    assert second["next_cursor"] is None
+
+
+def test_list_rides_endpoint_tracks_status_changes(client):
+    """
+    Status updates are reflected in the status listing.
+    """
+    # Arrange
+    for _ in range(3):
+        client.post("/rides/request_ride", json={"pickup": "A", "dropoff": "B"})
+
+    # Act
+    client.put("/rides/2/status", json={"status": "completed"})
+    pending = client.get("/rides", params={"status": "PENDING"}).json()
+
+    # Assert
+    assert [ride["ride_id"] for ride in pending["rides"]] == [3, 1]
+
+
+def test_list_rides_endpoint_rejects_invalid_requests(client):
+    """
+    Combining filters or sending a malformed cursor is a bad request.
+    """
+    assert client.get("/rides", params={"rider_id": 1, "status": "pending"}).status_code == 400
+    assert client.get("/rides", params={"cursor": "%%%"}).status_code == 400
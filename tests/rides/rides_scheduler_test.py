@@ -0,0 +1,197 @@
+import random
+import time
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers.drivers_availability import AvailabilityPool
+from drivers.drivers_locations import SpatialIndex
+from rides import rides_router
+from rides.rides_index import RideIndex
+from rides.rides_scheduler import (
+    ScheduledRideDispatcher,
+    ScheduledRideQueue,
+    compute_dispatch_time,
+    estimate_pickup_eta,
+)
+from utils.geolocation import estimate_travel_time
+
+NOW = datetime(2025, 3, 14, 8, 0)
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    """
+    Fresh schedule shared with the rides router.
+    """
+    scheduled = ScheduledRideQueue()
+    monkeypatch.setattr(rides_router, "scheduled_rides", scheduled)
+    return scheduled
+
+
+@pytest.fixture
+def client(monkeypatch, queue):
+    """
+    Test client for an app serving only the rides router, with empty ride storage.
+    """
+    monkeypatch.setattr(rides_router, "rides_db", {})
+    monkeypatch.setattr(rides_router, "ride_index", RideIndex())
+    monkeypatch.setattr(rides_router, "current_ride_id", 0)
+    monkeypatch.setattr(rides_router, "driver_availability", AvailabilityPool(["driver_123"]))
+    app = FastAPI()
+    app.include_router(rides_router.router)
+    return TestClient(app)
+
+
+def test_compute_dispatch_time_subtracts_lead_time_and_eta():
+    """
+    Dispatch starts the lead time plus the pickup ETA before pickup, in naive UTC.
+    """
+    pickup_time = datetime(2025, 3, 14, 10, 0, tzinfo=timezone(timedelta(hours=2)))
+
+    dispatch_at = compute_dispatch_time(
+        pickup_time,
+        lead_time=timedelta(minutes=10),
+        eta_estimator=lambda pickup: timedelta(minutes=7),
+    )
+
+    assert dispatch_at == datetime(2025, 3, 14, 7, 43)
+
+
+def test_pickup_eta_comes_from_the_nearest_available_drivers():
+    """
+    The pickup ETA is the median ETA of the nearest available drivers; without
+    coordinates or nearby drivers it falls back to the default.
+    """
+    # Arrange
+    pickup = (40.7580, -73.9855)
+    positions = {"near": (40.7600, -73.9855), "mid": (40.7700, -73.9855), "far": (40.7900, -73.9855)}
+    index = SpatialIndex()
+    index.apply({driver_id: (lat, lng, 0.0) for driver_id, (lat, lng) in positions.items()})
+    pool = AvailabilityPool(positions)
+
+    # Act
+    eta = estimate_pickup_eta("40.7580,-73.9855", index, pool)
+    no_coordinates = estimate_pickup_eta("Main Street", index, pool)
+    no_drivers = estimate_pickup_eta("40.7580,-73.9855", index, AvailabilityPool())
+
+    # Assert
+    assert eta == timedelta(minutes=estimate_travel_time(positions["mid"], pickup) * 60)
+    assert no_coordinates == no_drivers == timedelta(minutes=5)
+
+
+def test_queue_pops_only_due_rides_in_order():
+    """
+    pop_due returns due rides earliest first and leaves the rest scheduled.
+    """
+    # Arrange
+    queue = ScheduledRideQueue()
+    for ride_id, minutes in ((1, 30), (2, 5), (3, 15), (4, 60)):
+        queue.schedule(ride_id, NOW + timedelta(minutes=minutes))
+
+    # Act
+    due = queue.pop_due(NOW + timedelta(minutes=20))
+
+    # Assert
+    assert due == [2, 3]
+    assert len(queue) == 2
+    assert queue.next_due() == NOW + timedelta(minutes=30)
+
+
+def test_queue_handles_one_million_scheduled_rides():
+    """
+    With 1M rides scheduled, listing and popping the head stays cheap and correct.
+    """
+    # Arrange
+    count = 1_000_000
+    offsets = list(range(count))
+    random.Random(42).shuffle(offsets)
+    queue = ScheduledRideQueue()
+    queue.bulk_load((NOW + timedelta(seconds=offset), offset) for offset in offsets)
+
+    # Act
+    started = time.perf_counter()
+    upcoming = queue.upcoming(50)
+    due = queue.pop_due(NOW + timedelta(seconds=999))
+    elapsed = time.perf_counter() - started
+
+    # Assert
+    assert [ride_id for _, ride_id in upcoming] == list(range(50))
+    assert due == list(range(1000))
+    assert len(queue) == count - 1000
+    assert elapsed < 0.5
+
+
+def test_dispatcher_retries_rides_without_drivers():
+    """
+    Rides the dispatch callback cannot serve are put back on the schedule.
+    """
+    # Arrange
+    queue = ScheduledRideQueue()
+    queue.schedule(1, NOW)
+    queue.schedule(2, NOW)
+    dispatcher = ScheduledRideDispatcher(queue, dispatch=lambda ride_id: ride_id == 1)
+
+    # Act
+    popped = dispatcher.run_once(NOW)
+
+    # Assert
+    assert popped == 2
+    assert queue.upcoming(5) == [(NOW + timedelta(seconds=30), 2)]
+
+
+def test_scheduled_ride_is_dispatched_when_due(client, queue):
+    """
+    A future pickup is stored as scheduled, listed, and assigned a driver once due.
+    """
+    # Arrange
+    pickup_time = datetime.utcnow() + timedelta(hours=2)
+    response = client.post("/rides/request_ride", json={
+        "pickup": "A",
+        "dropoff": "B",
+        "pickup_time": pickup_time.isoformat(),
+    })
+    ride_id = response.json()["ride_id"]
+
+    # Act
+    listed = client.get("/rides/scheduled").json()["rides"]
+    ScheduledRideDispatcher(queue, rides_router.dispatch_scheduled_ride).run_once(pickup_time)
+    ride = client.get(f"/rides/{ride_id}").json()
+
+    # Assert
+    assert response.json()["status"] == "scheduled"
+    assert response.json()["driver_id"] is None
+    assert [item["ride_id"] for item in listed] == [ride_id]
+    assert ride["status"] == "pending"
+    assert ride["driver_id"] == "driver_123"
+    assert client.get("/rides/scheduled").json()["rides"] == []
+
+
+def test_cancelled_scheduled_ride_is_not_dispatched(client, queue):
+    """
+    Cancelling a scheduled ride before it is due prevents dispatch.
+    """
+    # Arrange
+    pickup_time = datetime.utcnow() + timedelta(hours=2)
+    ride_id = client.post("/rides/request_ride", json={"pickup_time": pickup_time.isoformat()}).json()["ride_id"]
+    client.put(f"/rides/{ride_id}/status", json={"status": "cancelled"})
+
+    # Act
+    ScheduledRideDispatcher(queue, rides_router.dispatch_scheduled_ride).run_once(pickup_time)
+
+    # Assert
+    assert rides_router.rides_db[ride_id]["driver_id"] is None
+    assert len(queue) == 0
+
+
+def test_near_term_pickup_is_dispatched_immediately(client, queue):
+    """
+    A pickup time inside the lead window is dispatched right away.
+    """
+    response = client.post("/rides/request_ride", json={
+        "pickup_time": (datetime.utcnow() + timedelta(minutes=1)).isoformat(),
+    })
+
+    assert response.json()["status"] == "pending"
+    assert len(queue) == 0
@@ -0,0 +1,166 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers.drivers_locations import LocationIngestor, SpatialIndex
+from drivers.drivers_availability import AvailabilityPool
+from rides import rides_router
+from rides.rides_index import RideIndex
+from rides.rides_tracking import Subscription, TrackingHub, format_sse, sse_stream
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    """
+    Fresh tracking hub shared with the rides router.
+    """
+    tracking_hub = TrackingHub(queue_size=4)
+    monkeypatch.setattr(rides_router, "tracking_hub", tracking_hub)
+    return tracking_hub
+
+
+@pytest.fixture
+def client(monkeypatch, hub):
+    """
+    Test client for an app serving only the rides router, with empty ride storage.
+    """
+    monkeypatch.setattr(rides_router, "rides_db", {})
+    monkeypatch.setattr(rides_router, "ride_index", RideIndex())
+    monkeypatch.setattr(rides_router, "current_ride_id", 0)
+    monkeypatch.setattr(rides_router, "driver_availability", AvailabilityPool(["driver_1"]))
+    app = FastAPI()
+    app.include_router(rides_router.router)
+    return TestClient(app)
+
+
+def test_subscription_coalesces_positions_and_bounds_status_events():
+    """
+    A slow subscriber keeps only the latest position and the newest status events.
+    """
+    async def scenario():
+        # Arrange
+        subscription = Subscription(ride_id=1, maxsize=2)
+
+        # Act
+        for step in range(5):
+            subscription.offer({"type": "position", "lat": float(step), "lng": 0.0})
+        for status in ("accepted", "started", "completed"):
+            subscription.offer({"type": "status", "status": status})
+        received = [await subscription.get() for _ in range(3)]
+        return subscription, received
+
+    subscription, received = asyncio.run(scenario())
+
+    # Assert
+    assert [message.get("status") for message in received[:2]] == ["started", "completed"]
+    assert received[2]["lat"] == 4.0
+    assert subscription.get_nowait() is None
+    assert subscription.dropped == 5
+
+
+def test_hub_forwards_flushed_positions_of_tracked_drivers_only():
+    """
+    Flushed locations reach subscribers of rides assigned to the driver, and stop
+    once the last subscriber leaves.
+    """
+    # Arrange
+    hub = TrackingHub()
+    ingestor = LocationIngestor(SpatialIndex())
+    ingestor.add_listener(hub.publish_driver_positions)
+    subscription = hub.subscribe(7, driver_id="driver_1")
+
+    # Act
+    ingestor.submit("driver_1", 40.0, -73.0, timestamp=1.0)
+    ingestor.submit("driver_2", 41.0, -74.0, timestamp=1.0)
+    ingestor.flush()
+    first = subscription.get_nowait()
+    hub.unsubscribe(subscription)
+    ingestor.submit("driver_1", 40.5, -73.5, timestamp=2.0)
+    ingestor.flush()
+
+    # Assert
+    assert first == {"type": "position", "ride_id": 7, "lat": 40.0, "lng": -73.0, "timestamp": 1.0}
+    assert subscription.get_nowait() is None
+    assert hub.subscriber_count == 0
+
+
+def test_websocket_receives_snapshot_and_status_changes(client, hub):
+    """
+    A tracking WebSocket gets the current status first, then live status updates.
+    """
+    # Arrange
+    ride_id = client.post("/rides/request_ride", json={"pickup": "A", "dropoff": "B"}).json()["ride_id"]
+
+    # Act
+    with client.websocket_connect(f"/rides/{ride_id}/track") as websocket:
+        snapshot = websocket.receive_json()
+        client.put(f"/rides/{ride_id}/status", json={"status": "completed"})
+        update = websocket.receive_json()
+
+    # Assert
+    assert snapshot["type"] == "status"
+    assert snapshot["status"] == "pending"
+    assert update["status"] == "completed"
+    assert hub.subscriber_count == 0
+
+
+def test_idle_websocket_disconnect_unsubscribes(client, hub):
+    """
+    A client that disconnects while no events are pending is unsubscribed.
+    """
+    # Arrange
+    ride_id = client.post("/rides/request_ride", json={"pickup": "A", "dropoff": "B"}).json()["ride_id"]
+    scope = {
+        "type": "websocket", "path": f"/rides/{ride_id}/track", "raw_path": b"", "root_path": "",
+        "query_string": b"", "headers": [], "scheme": "ws", "subprotocols": [],
+    }
+    sent = []
+
+    async def scenario():
+        incoming = asyncio.Queue()
+        await incoming.put({"type": "websocket.connect"})
+
+        async def send(message):
+            sent.append(message)
+            # Hang up once the snapshot arrives, with nothing else queued.
+            if message["type"] == "websocket.send":
+                await incoming.put({"type": "websocket.disconnect", "code": 1000})
+
+        await asyncio.wait_for(client.app(scope, incoming.get, send), timeout=5)
+
+    # Act
+    asyncio.run(scenario())
+
+    # Assert
+    assert [message["type"] for message in sent] == ["websocket.accept", "websocket.send"]
+    assert hub.subscriber_count == 0
+
+
+def test_sse_stream_formats_events_and_unsubscribes():
+    """
+    The SSE stream emits one event per message and releases its subscription when closed.
+    """
+    async def scenario():
+        hub = TrackingHub()
+        subscription = hub.subscribe(3)
+        hub.publish_status(3, "started")
+        stream = sse_stream(hub, subscription)
+        event = await stream.__anext__()
+        await stream.aclose()
+        return hub, event
+
+    hub, event = asyncio.run(scenario())
+
+    assert event == format_sse({"type": "status", "ride_id": 3, "status": "started", "driver_id": None})
+    assert event.startswith("event: status\ndata: ")
+    assert hub.subscriber_count == 0
+
+
+def test_tracking_unknown_ride_returns_not_found(client):
+    """
+    The SSE endpoint returns 404 for rides that do not exist.
+    """
+    response = client.get("/rides/999/events")
+
+    assert response.status_code == 404
@@ -0,0 +1,192 @@
+import asyncio
+import httpx
+from fastapi import FastAPI, HTTPException
+
+from utils.admission import (
+    PRIORITY_NEW,
+    PRIORITY_UPDATE,
+    AdmissionController,
+    NOT_OVERLOADED_HEADERS,
+    AdmissionMiddleware,
+    GradientLimit,
+)
+
+
+def make_app(controller, release):
+    """
+    App with a slow ride request endpoint and a ride status update endpoint.
+    """
+    app = FastAPI()
+
+    @app.post("/rides/request_ride")
+    async def request_ride():
+        await release.wait()
+        return {"status": "pending"}
+
+    @app.put("/rides/{ride_id}/status")
+    async def update_status(ride_id: int):
+        return {"ride_id": ride_id}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    return app
+
+
+def test_limit_shrinks_when_latency_rises_and_grows_when_it_recovers():
+    """
+    The limit follows the latency gradient: congestion lowers it, a healthy baseline raises it.
+    """
+    # Arrange
+    limit = GradientLimit(initial_limit=20, min_limit=4, max_limit=100)
+    for _ in range(50):
+        limit.on_sample(0.01, inflight=20)
+    healthy = limit.limit
+
+    # Act
+    for _ in range(50):
+        limit.on_sample(0.2, inflight=limit.limit)
+    congested = limit.limit
+    for _ in range(200):
+        limit.on_sample(0.01, inflight=limit.limit)
+
+    # Assert
+    assert healthy > 20
+    assert congested < healthy
+    assert congested >= 4
+    assert limit.limit > congested
+
+
+def test_limit_does_not_grow_while_idle_and_backs_off_on_errors():
+    """
+    Samples from a mostly idle app leave the limit alone; server errors cut it.
+    """
+    limit = GradientLimit(initial_limit=20)
+
+    for _ in range(50):
+        limit.on_sample(0.01, inflight=1)
+    idle = limit.limit
+    limit.on_drop()
+
+    assert idle == 20
+    assert limit.limit == 18
+
+
+def test_new_requests_leave_headroom_for_updates():
+    """
+    New ride requests are shed before ride updates.
+    """
+    # Arrange
+    controller = AdmissionController(GradientLimit(initial_limit=10), new_request_share=0.8)
+
+    # Act
+    new = [controller.try_acquire(PRIORITY_NEW) for _ in range(10)]
+    updates = [controller.try_acquire(PRIORITY_UPDATE) for _ in range(3)]
+
+    # Assert
+    assert sum(started is not None for started in new) == 8
+    assert sum(started is not None for started in updates) == 2
+    assert controller.stats()["shed"] == {PRIORITY_NEW: 2, PRIORITY_UPDATE: 1}
+
+
+def test_middleware_sheds_new_requests_with_retry_after_but_admits_updates():
+    """
+    Over the limit, ride requests get 503 with Retry-After while status updates still go through.
+    """
+    controller = AdmissionController(GradientLimit(initial_limit=4, min_limit=1), new_request_share=0.5)
+
+    async def scenario():
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(app=make_app(controller, release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            pending = [asyncio.create_task(client.post("/rides/request_ride")) for _ in range(2)]
+            while controller.inflight < 2:
+                await asyncio.sleep(0)
+            shed = await client.post("/rides/request_ride")
+            update = await client.put("/rides/1/status")
+            release.set()
+            admitted = await asyncio.gather(*pending)
+        return shed, update, admitted
+
+    shed, update, admitted = asyncio.run(scenario())
+
+    assert shed.status_code == 503
+    assert int(shed.headers["retry-after"]) >= 1
+    assert update.status_code == 200
+    assert [response.status_code for response in admitted] == [200, 200]
+    assert controller.inflight == 0
+
+
+def test_business_503s_do_not_back_the_limit_off():
+    """
+    A 503 the handler marks as a business outcome (no drivers) counts as a
+    latency sample; an unmarked server error backs the limit off.
+    """
+    # Arrange
+    controller = AdmissionController(GradientLimit(initial_limit=20), new_request_share=0.8)
+    app = FastAPI()
+
+    @app.post("/rides/request_ride")
+    async def request_ride():
+        raise HTTPException(status_code=503, detail="No drivers currently available.", headers=NOT_OVERLOADED_HEADERS)
+
+    @app.put("/rides/{ride_id}/status")
+    async def update_status(ride_id: int):
+        raise HTTPException(status_code=500, detail="Database unavailable")
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            no_drivers = [await client.post("/rides/request_ride") for _ in range(20)]
+            limit = controller.limit.limit
+            await client.put("/rides/1/status")
+        return no_drivers, limit
+
+    # Act
+    no_drivers, limit = asyncio.run(scenario())
+
+    # Assert
+    assert [response.status_code for response in no_drivers] == [503] * 20
+    assert "x-not-overloaded" not in no_drivers[0].headers
+    assert limit == 20
+    assert controller.limit.limit == 18
+
+
+def test_driver_heartbeats_are_never_shed():
+    """
+    With the limit saturated, ride updates are shed but driver heartbeats and locations still get through.
+    """
+    # Arrange
+    controller = AdmissionController(GradientLimit(initial_limit=1, min_limit=1), new_request_share=1.0)
+    release = asyncio.Event()
+    app = make_app(controller, release)
+
+    @app.post("/drivers/{driver_id}/heartbeat")
+    async def heartbeat(driver_id: str):
+        return {"driver_id": driver_id}
+
+    @app.post("/drivers/locations")
+    async def locations():
+        return {"updated": 1}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            pending = asyncio.create_task(client.post("/rides/request_ride"))
+            while controller.inflight < 1:
+                await asyncio.sleep(0)
+            update = await client.put("/rides/1/status")
+            heartbeat = await client.post("/drivers/driver_1/heartbeat")
+            location = await client.post("/drivers/locations")
+            release.set()
+            await pending
+        return update, heartbeat, location
+
+    # Act
+    update, heartbeat, location = asyncio.run(scenario())
+
+    # Assert
+    assert update.status_code == 503
+    assert heartbeat.status_code == 200
+    assert location.status_code == 200
+    assert controller.stats()["shed"] == {PRIORITY_NEW: 0, PRIORITY_UPDATE: 1}
@@ -0,0 +1,99 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from drivers.drivers_availability import AvailabilityPool
+from rides import rides_router
+from rides.rides_index import RideIndex
+from riders.riders_router import router as riders_router
+from ratings import ratings_service
+from ratings.ratings_router import router as ratings_router
+from utils.etags import etag_matches, make_etag
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    Test client for an app serving the rides, riders and ratings routers.
+    """
+    monkeypatch.setattr(rides_router, "rides_db", {})
+    monkeypatch.setattr(rides_router, "ride_index", RideIndex())
+    monkeypatch.setattr(rides_router, "driver_availability", AvailabilityPool(["driver_1"]))
+    monkeypatch.setattr(ratings_service, "driver_ratings_data", {})
+    app = FastAPI()
+    app.include_router(rides_router.router)
+    app.include_router(riders_router)
+    app.include_router(ratings_router)
+    return TestClient(app)
+
+
+def test_etag_matches_handles_lists_wildcards_and_weak_tags():
+    """
+    If-None-Match parsing follows RFC 9110 weak comparison.
+    """
+    etag = make_etag("ride", 7, 3)
+
+    assert etag == '"ride-7-v3"'
+    assert etag_matches('"ride-7-v2", "ride-7-v3"', etag)
+    assert etag_matches('W/"ride-7-v3"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"ride-7-v2"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_ride_details_return_304_until_status_changes(client):
+    """
+    Polling with the last ETag gets 304 until the ride is updated.
+    """
+    # Arrange
+    ride_id = client.post("/rides/request_ride", json={"pickup": "A", "dropoff": "B"}).json()["ride_id"]
+    first = client.get(f"/rides/{ride_id}")
+    etag = first.headers["ETag"]
+
+    # Act
+    unchanged = client.get(f"/rides/{ride_id}", headers={"If-None-Match": etag})
+    client.put(f"/rides/{ride_id}/status", json={"status": "accepted"})
+    changed = client.get(f"/rides/{ride_id}", headers={"If-None-Match": etag})
+
+    # Assert
+    assert first.status_code == 200
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert changed.status_code == 200
+    assert changed.json()["status"] == "accepted"
+    assert changed.headers["ETag"] != etag
+
+
+def test_rider_profile_supports_conditional_get(client):
+    """
+    Rider profiles carry an ETag and honour If-None-Match.
+    """
+    # Arrange
+    rider = client.post("/riders", json={"name": "Ada", "phone_number": "555-0100", "payment_method": "card"}).json()
+    first = client.get(f"/riders/{rider['id']}")
+
+    # Act
+    second = client.get(f"/riders/{rider['id']}", headers={"If-None-Match": first.headers["ETag"]})
+
+    # Assert
+    assert first.status_code == 200
+    assert second.status_code == 304
+
+
+def test_driver_rating_etag_changes_after_new_rating(client):
+    """
+    A new rating bumps the version, invalidating the previous ETag.
+    """
+    # Arrange
+    first = client.get("/ratings/driver/501")
+    etag = first.headers["ETag"]
+
+    # Act
+    unchanged = client.get("/ratings/driver/501", headers={"If-None-Match": etag})
+    ratings_service.rate_driver(1001, 4, "Smooth ride")
+    changed = client.get("/driver/501", headers={"If-None-Match": etag})
+
+    # Assert
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert changed.json() == {"driver_id": 501, "rating": 4.0}
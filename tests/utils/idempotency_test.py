@@ -0,0 +1,138 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from utils.idempotency import IdempotencyMiddleware, IdempotencyStore
+
+
+def make_app(store, calls, delay=0.0, fail_first=False):
+    """
+    App with one counting endpoint behind the idempotency middleware.
+    """
+    app = FastAPI()
+
+    @app.post("/payments/process_payment/{ride_id}")
+    async def process_payment(ride_id: int, body: dict):
+        calls.append(ride_id)
+        if fail_first and len(calls) == 1:
+            raise HTTPException(status_code=503, detail="Gateway unavailable")
+        await asyncio.sleep(delay)
+        return {"ride_id": ride_id, "charge": len(calls)}
+
+    app.add_middleware(IdempotencyMiddleware, store=store)
+    return app
+
+
+async def post(app, headers, json, count=1):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(
+            client.post("/payments/process_payment/7", headers=headers, json=json) for _ in range(count)
+        ))
+
+
+@pytest.fixture
+def clock():
+    return {"now": 0.0}
+
+
+@pytest.fixture
+def store(clock):
+    return IdempotencyStore(max_entries=2, ttl_seconds=60.0, clock=lambda: clock["now"])
+
+
+def test_replay_returns_stored_response_without_rerunning_handler(store):
+    """
+    A retry with the same key gets the first response back and the handler runs once.
+    """
+    # Arrange
+    calls = []
+    app = make_app(store, calls)
+    headers = {"Idempotency-Key": "charge-7"}
+
+    # Act
+    first, = asyncio.run(post(app, headers, {"amount": 10}))
+    second, = asyncio.run(post(app, headers, {"amount": 10}))
+
+    # Assert
+    assert calls == [7]
+    assert second.json() == first.json() == {"ride_id": 7, "charge": 1}
+    assert second.headers["idempotent-replayed"] == "true"
+    assert store.replayed == 1
+
+
+def test_concurrent_duplicates_wait_for_first_execution(store):
+    """
+    Duplicates sent while the first request is running share its response.
+    """
+    calls = []
+    app = make_app(store, calls, delay=0.05)
+
+    responses = asyncio.run(post(app, {"Idempotency-Key": "k"}, {"amount": 10}, count=5))
+
+    assert calls == [7]
+    assert {response.json()["charge"] for response in responses} == {1}
+
+
+def test_key_reused_with_different_body_is_rejected(store):
+    """
+    A key can only be replayed for an identical request.
+    """
+    calls = []
+    app = make_app(store, calls)
+
+    asyncio.run(post(app, {"Idempotency-Key": "k"}, {"amount": 10}))
+    conflict, = asyncio.run(post(app, {"Idempotency-Key": "k"}, {"amount": 99}))
+
+    assert conflict.status_code == 422
+    assert calls == [7]
+
+
+def test_server_errors_are_not_stored(store):
+    """
+    A retry after a 5xx runs the handler again.
+    """
+    calls = []
+    app = make_app(store, calls, fail_first=True)
+
+    failed, = asyncio.run(post(app, {"Idempotency-Key": "k"}, {"amount": 10}))
+    retried, = asyncio.run(post(app, {"Idempotency-Key": "k"}, {"amount": 10}))
+
+    assert failed.status_code == 503
+    assert retried.status_code == 200
+    assert calls == [7, 7]
+
+
+def test_store_expires_and_bounds_entries(store, clock):
+    """
+    Keys expire after the TTL, and the oldest keys are evicted beyond the size bound.
+    """
+    # Arrange
+    calls = []
+    app = make_app(store, calls)
+    for key in ("a", "b", "c"):
+        asyncio.run(post(app, {"Idempotency-Key": key}, {"amount": 10}))
+
+    # Act
+    evicted = asyncio.run(post(app, {"Idempotency-Key": "a"}, {"amount": 10}))
+    clock["now"] = 61.0
+    expired = asyncio.run(post(app, {"Idempotency-Key": "c"}, {"amount": 10}))
+
+    # Assert
+    assert "idempotent-replayed" not in evicted[0].headers
+    assert "idempotent-replayed" not in expired[0].headers
+    assert len(calls) == 5
+    assert len(store) <= 2
+
+
+def test_requests_without_key_are_not_deduplicated(store):
+    """
+    Without an Idempotency-Key the middleware stays out of the way.
+    """
+    calls = []
+    app = make_app(store, calls)
+
+    asyncio.run(post(app, {}, {"amount": 10}, count=2))
+
+    assert calls == [7, 7]
@@ -0,0 +1,268 @@
+import logging
+import math
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Pattern, Tuple
+
+from utils.idempotency import send_json
+
+logger = logging.getLogger(__name__)
+
+# Request classes, in the order they are shed under load.
+PRIORITY_NEW = "new"
+PRIORITY_UPDATE = "update"
+
+# Bounds and starting point of the adaptive concurrency limit.
+DEFAULT_INITIAL_LIMIT = 50
+DEFAULT_MIN_LIMIT = 4
+DEFAULT_MAX_LIMIT = 1000
+# Share of the limit new ride requests may use; the rest is kept for updates
+# to rides already in progress.
+DEFAULT_NEW_REQUEST_SHARE = 0.8
+# Latency above this multiple of the baseline counts as congestion.
+LATENCY_TOLERANCE = 1.5
+# Weight of each new limit estimate in the smoothed limit.
+LIMIT_SMOOTHING = 0.2
+# Multiplicative decrease applied when a request fails with a server error.
+BACKOFF_RATIO = 0.9
+# Sample counts of the short- and long-term latency averages.
+SHORT_WINDOW = 10
+LONG_WINDOW = 600
+MAX_RETRY_AFTER_SECONDS = 30
+# Response header a handler sets on a 5xx that reports a business outcome, such
+# as no drivers being available, rather than overload. The middleware does not
+# back the limit off for such responses and strips the header.
+NOT_OVERLOADED_HEADER = "x-not-overloaded"
+NOT_OVERLOADED_HEADERS = {NOT_OVERLOADED_HEADER: "1"}
+
+# Requests under admission control, matched as (method, path pattern, priority).
+# Driver heartbeats and location posts are deliberately left out: they are
+# cheap, and shedding them would get drivers evicted as stale while overloaded.
+ADMISSION_ROUTES = (
+    ("POST", re.compile(r"^/rides/request_ride$"), PRIORITY_NEW),
+    ("POST", re.compile(r"^/rides/bulk_request$"), PRIORITY_NEW),
+    ("PUT", re.compile(r"^/rides/[^/]+/status$"), PRIORITY_UPDATE),
+)
+
+
+class GradientLimit:
+    """
+    Adaptive concurrency limit driven by request latency.
+
+    Keeps a short- and a long-term average of latency. While the short-term
+    average stays near the long-term baseline the limit grows by a queue
+    allowance of sqrt(limit) per sample; when latency rises, the limit shrinks
+    in proportion to the ratio between the two (the gradient), so queues drain
+    before latency balloons. Server errors back the limit off multiplicatively.
+    """
+    def __init__(
+        self,
+        initial_limit: int = DEFAULT_INITIAL_LIMIT,
+        min_limit: int = DEFAULT_MIN_LIMIT,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.estimate = float(initial_limit)
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        return int(self.estimate)
+
+    def on_sample(self, latency: float, inflight: int) -> None:
+        """
+        Updates the limit with the latency of a finished request.
+
+        :param latency: The request's latency in seconds.
+        :param inflight: Requests in flight when it finished, including itself.
+        """
+        if self.short_latency is None:
+            self.short_latency = self.long_latency = latency
+            return
+        self.short_latency += (latency - self.short_latency) * 2 / (SHORT_WINDOW + 1)
+        self.long_latency += (latency - self.long_latency) * 2 / (LONG_WINDOW + 1)
+        # Recover the baseline quickly once a congested period is over.
+        if self.long_latency > 2 * self.short_latency:
+            self.long_latency = 2 * self.short_latency
+
+        # Don't grow the limit while the app isn't using it.
+        if inflight < self.estimate / 2:
+            return
+        gradient = max(0.5, min(1.0, LATENCY_TOLERANCE * self.long_latency / self.short_latency))
+        target = self.estimate * gradient + math.sqrt(self.estimate)
+        self._set(self.estimate * (1 - LIMIT_SMOOTHING) + target * LIMIT_SMOOTHING)
+
+    def on_drop(self) -> None:
+        """
+        Backs the limit off after a request failed with a server error.
+        """
+        self._set(self.estimate * BACKOFF_RATIO)
+
+    def _set(self, estimate: float) -> None:
+        self.estimate = max(float(self.min_limit), min(float(self.max_limit), estimate))
+
+
+class AdmissionController:
+    """
+    Admits or sheds requests against an adaptive concurrency limit.
+
+    New ride requests may only fill part of the limit, so updates to rides in
+    progress are still admitted when new requests are being shed. Used from
+    the event loop only.
+    """
+    def __init__(
+        self,
+        limit: Optional[GradientLimit] = None,
+        new_request_share: float = DEFAULT_NEW_REQUEST_SHARE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.limit = limit if limit is not None else GradientLimit()
+        self.new_request_share = new_request_share
+        self.clock = clock
+        self.inflight = 0
+        self.admitted = 0
+        self.shed: Dict[str, int] = {PRIORITY_NEW: 0, PRIORITY_UPDATE: 0}
+
+    def capacity(self, priority: str) -> int:
+        """
+        Returns how many requests may be in flight when one of this priority arrives.
+        """
+        limit = self.limit.limit
+        if priority == PRIORITY_NEW:
+            return max(1, int(limit * self.new_request_share))
+        return limit
+
+    def try_acquire(self, priority: str) -> Optional[float]:
+        """
+        Admits a request if there is room for its priority.
+
+        :return: The admission time to pass to release(), or None if the request is shed.
+        """
+        if self.inflight >= self.capacity(priority):
+            self.shed[priority] += 1
+            return None
+        self.inflight += 1
+        self.admitted += 1
+        return self.clock()
+
+    def release(self, started: float, failed: bool = False) -> None:
+        """
+        Records the end of an admitted request and adapts the limit.
+
+        :param started: The value returned by try_acquire().
+        :param failed: True if the request failed with a server error.
+        """
+        if failed:
+            self.limit.on_drop()
+        else:
+            self.limit.on_sample(self.clock() - started, self.inflight)
+        self.inflight -= 1
+
+    def retry_after(self) -> int:
+        """
+        Returns the seconds a shed client should wait: roughly the time the
+        requests in flight need to drain at the current latency.
+        """
+        latency = self.limit.short_latency or 0.0
+        waves = self.inflight / max(1, self.limit.limit)
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(latency * waves)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit.limit,
+            "inflight": self.inflight,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying admission control to ride requests and ride updates.
+
+    Requests over the limit for their priority are rejected before the handler
+    runs, with 503 and a Retry-After header. Other routes pass through untracked.
+    Unhandled errors and server errors back the limit off, except responses a
+    handler marked with NOT_OVERLOADED_HEADERS, which count as latency samples.
+    """
+    def __init__(
+        self,
+        app: Any,
+        controller: Optional[AdmissionController] = None,
+        routes: Iterable[Tuple[str, Pattern[str], str]] = ADMISSION_ROUTES,
+    ):
+        self.app = app
+        self.controller = controller if controller is not None else get_admission_controller()
+        self.routes = tuple(routes)
+
+    def classify(self, method: str, path: str) -> Optional[str]:
+        """
+        Returns the priority of a request, or None if it is not under admission control.
+        """
+        for route_method, pattern, priority in self.routes:
+            if method == route_method and pattern.match(path):
+                return priority
+        return None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        priority = self.classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if priority is None:
+            await self.app(scope, receive, send)
+            return
+
+        started = self.controller.try_acquire(priority)
+        if started is None:
+            retry_after = self.controller.retry_after()
+            logger.warning("Shedding %s %s: %d requests in flight", scope["method"], scope["path"], self.controller.inflight)
+            await send_json(
+                send,
+                503,
+                {"detail": "Server is busy, please retry later."},
+                headers=[(b"retry-after", str(retry_after).encode())],
+            )
+            return
+
+        status: Optional[int] = None
+        overloaded = True
+
+        async def capture_send(message: Dict[str, Any]) -> None:
+            nonlocal status, overloaded
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = message.get("headers", [])
+                marker = NOT_OVERLOADED_HEADER.encode()
+                if any(name.lower() == marker for name, _ in headers):
+                    overloaded = False
+                    message = {**message, "headers": [(name, value) for name, value in headers if name.lower() != marker]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture_send)
+        except BaseException:
+            self.controller.release(started, failed=True)
+            raise
+        self.controller.release(started, failed=status is None or (status >= 500 and overloaded))
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Returns the shared admission controller, configured from ADMISSION_INITIAL_LIMIT,
+    ADMISSION_MIN_LIMIT, ADMISSION_MAX_LIMIT and ADMISSION_NEW_REQUEST_SHARE.
+    """
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            limit=GradientLimit(
+                initial_limit=int(os.getenv("ADMISSION_INITIAL_LIMIT", DEFAULT_INITIAL_LIMIT)),
+                min_limit=int(os.getenv("ADMISSION_MIN_LIMIT", DEFAULT_MIN_LIMIT)),
+                max_limit=int(os.getenv("ADMISSION_MAX_LIMIT", DEFAULT_MAX_LIMIT)),
+            ),
+            new_request_share=float(os.getenv("ADMISSION_NEW_REQUEST_SHARE", DEFAULT_NEW_REQUEST_SHARE)),
+        )
+    return _controller
+
+
+_controller: Optional[AdmissionController] = None
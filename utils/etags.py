@@ -0,0 +1,42 @@
+from typing import Any, Optional
+
+from fastapi import Response, status
+
+
+def make_etag(kind: str, key: Any, version: int) -> str:
+    """
+    Builds a strong ETag from a record's kind, key and version counter.
+    Computing it is O(1): the body is never hashed.
+
+    :param kind: The kind of record, e.g. "ride".
+    :param key: The record's identifier.
+    :param version: The record's version counter, bumped on every write.
+    :return: The quoted ETag value.
+    """
+    return f'"{kind}-{key}-v{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Returns True if an If-None-Match header value matches the ETag.
+    Handles lists of tags, the "*" wildcard and weak validators.
+
+    :param if_none_match: The raw If-None-Match header value, if any.
+    :param etag: The current ETag of the record.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Returns an empty 304 Not Modified response carrying the ETag.
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -1,4 +1,9 @@
 import math
+from typing import Any, Optional
+
+# Approximate length of one degree of latitude, used for grid bucketing.
+KM_PER_DEGREE = 111.0
+
 
 def calculate_distance(coord1: tuple[float, float], coord2: tuple[float, float]) -> float:
     """
@@ -69,4 +74,69 @@ def estimate_travel_time(coord1: tuple[float, float], coord2: tuple[float, float
         raise ValueError("Average speed must be greater than zero.")
 
     travel_time_hours = distance_km / average_speed_kmh
-    return travel_time_hours
\ No newline at end of file
+    return travel_time_hours
+
+def parse_coordinates(value: Any) -> Optional[tuple[float, float]]:
+    """
+    Returns a (latitude, longitude) tuple parsed from a location value, if possible.
+    Accepts tuples/lists of two numbers, "lat,lng" strings as sent by the apps
+    and {"lat": ..., "lng": ...} dictionaries as stored by the rides service.
+
+    Args:
+        value: A location as a tuple, list, dictionary or "lat,lng" string.
+
+    Returns:
+        The parsed coordinates, or None if the value is not a valid coordinate pair.
+    """
+    if isinstance(value, dict):
+        parts = [value.get("lat"), value.get("lng")]
+    elif isinstance(value, str):
+        parts = value.split(",")
+    elif isinstance(value, (tuple, list)):
+        parts = list(value)
+    else:
+        return None
+
+    if len(parts) != 2:
+        return None
+
+    try:
+        lat, lng = float(parts[0]), float(parts[1])
+    except (TypeError, ValueError):
+        return None
+
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+        return None
+    return (lat, lng)
+
+
+def grid_cell(coord: tuple[float, float], cell_size_km: float = 1.0) -> tuple[int, int]:
+    """
+    Returns the id of the square grid cell containing the coordinates.
+    Cells are roughly cell_size_km wide; this is accurate enough for bucketing
+    demand and supply within a city.
+
+    Args:
+        coord: A tuple (latitude, longitude) in decimal degrees.
+        cell_size_km: The approximate width of a cell in kilometers.
+
+    Returns:
+        A (row, column) tuple identifying the cell.
+    """
+    cell_size_deg = cell_size_km / KM_PER_DEGREE
+    return (math.floor(coord[0] / cell_size_deg), math.floor(coord[1] / cell_size_deg))
+
+
+def cell_center(cell: tuple[int, int], cell_size_km: float = 1.0) -> tuple[float, float]:
+    """
+    Returns the coordinates of the center of a grid cell produced by grid_cell.
+
+    Args:
+        cell: A (row, column) tuple identifying the cell.
+        cell_size_km: The approximate width of a cell in kilometers.
+
+    Returns:
+        A tuple (latitude, longitude) in decimal degrees.
+    """
+    cell_size_deg = cell_size_km / KM_PER_DEGREE
+    return ((cell[0] + 0.5) * cell_size_deg, (cell[1] + 0.5) * cell_size_deg)
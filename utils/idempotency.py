@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+# Completed responses are replayed for this long after they were stored.
+DEFAULT_TTL_SECONDS = 24 * 60 * 60.0
+# Upper bound on stored responses; the oldest are evicted first.
+DEFAULT_MAX_ENTRIES = 10_000
+# How long a duplicate waits for the first request with its key to finish.
+DEFAULT_WAIT_SECONDS = 30.0
+MAX_KEY_LENGTH = 255
+# Endpoints that create rides or move money.
+IDEMPOTENT_PATH_PREFIXES = (
+    "/rides/request_ride",
+    "/payments/process_payment/",
+    "/payments/disburse_driver_payment/",
+)
+
+StoreKey = Tuple[str, str]
+
+
+class IdempotencyEntry:
+    """
+    One idempotency key: in flight until the first execution finishes, then
+    holding the response to replay.
+    """
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.done = asyncio.Event()
+        self.status: Optional[int] = None
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.body = b""
+        self.expires_at = float("inf")
+
+    @property
+    def completed(self) -> bool:
+        return self.status is not None
+
+
+class IdempotencyStore:
+    """
+    Bounded in-memory store of idempotency keys with a TTL.
+
+    Entries are kept in creation order, so expired and excess entries are always
+    at the front and eviction never scans the whole store. Used from the event loop only.
+    """
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: "OrderedDict[StoreKey, IdempotencyEntry]" = OrderedDict()
+        self.replayed = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: StoreKey) -> Optional[IdempotencyEntry]:
+        """
+        Returns the live entry for a key, if any.
+        """
+        self._evict()
+        return self._entries.get(key)
+
+    def begin(self, key: StoreKey, fingerprint: str) -> IdempotencyEntry:
+        """
+        Registers a key as in flight.
+        """
+        entry = IdempotencyEntry(fingerprint)
+        self._entries[key] = entry
+        self._evict()
+        return entry
+
+    def complete(self, entry: IdempotencyEntry, status: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> None:
+        """
+        Stores the response of a finished execution and wakes waiting duplicates.
+        """
+        entry.status, entry.headers, entry.body = status, headers, body
+        entry.expires_at = self.clock() + self.ttl_seconds
+        entry.done.set()
+
+    def abandon(self, key: StoreKey, entry: IdempotencyEntry) -> None:
+        """
+        Forgets a key whose execution failed, so the next retry runs the handler
+        again, and wakes waiting duplicates.
+        """
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+        entry.done.set()
+
+    def _evict(self) -> None:
+        now = self.clock()
+        entries = self._entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if entry.completed and entry.expires_at <= now:
+                del entries[key]
+            elif len(entries) > self.max_entries and entry.completed:
+                del entries[key]
+            else:
+                break
+
+
+def request_fingerprint(method: str, path: str, body: bytes) -> str:
+    """
+    Hashes the parts of a request that must match for a key to be replayed.
+    """
+    digest = hashlib.sha256()
+    for part in (method.encode(), path.encode(), body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware honouring the Idempotency-Key header on unsafe requests to
+    the configured paths.
+
+    The first request with a key runs the handler and its response is stored.
+    Retries with the same key get the stored response (marked with an
+    Idempotent-Replayed header) without re-running the handler, and duplicates
+    arriving while the first is still running wait for it. Server errors are not
+    stored, so a retry after a 5xx runs the handler again. Reusing a key with a
+    different body is rejected with 422.
+    """
+    def __init__(
+        self,
+        app: Any,
+        store: Optional[IdempotencyStore] = None,
+        path_prefixes: Iterable[str] = IDEMPOTENT_PATH_PREFIXES,
+        wait_seconds: float = DEFAULT_WAIT_SECONDS,
+    ):
+        self.app = app
+        self.store = store if store is not None else get_idempotency_store()
+        self.path_prefixes = tuple(path_prefixes)
+        self.wait_seconds = wait_seconds
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("POST", "PUT", "PATCH", "DELETE")
+            or not scope["path"].startswith(self.path_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        key = None
+        for name, value in scope["headers"]:
+            if name == IDEMPOTENCY_HEADER.encode():
+                key = value.decode("latin-1").strip()
+        if not key:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await send_json(send, 400, {"detail": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters."})
+            return
+
+        body = await read_body(receive)
+        fingerprint = request_fingerprint(scope["method"], scope["path"], body)
+        store_key = (scope["path"], key)
+
+        while True:
+            entry = self.store.get(store_key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                await send_json(send, 422, {"detail": "Idempotency-Key was already used with a different request."})
+                return
+            if entry.completed:
+                self.store.replayed += 1
+                await replay(send, entry)
+                return
+            try:
+                await asyncio.wait_for(entry.done.wait(), self.wait_seconds)
+            except asyncio.TimeoutError:
+                await send_json(send, 409, {"detail": "A request with this Idempotency-Key is still in progress."})
+                return
+
+        entry = self.store.begin(store_key, fingerprint)
+        status: Optional[int] = None
+        headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        body_sent = False
+
+        async def replay_receive() -> Dict[str, Any]:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def capture_send(message: Dict[str, Any]) -> None:
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status, headers = message["status"], list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            self.store.abandon(store_key, entry)
+            raise
+        if status is None or status >= 500:
+            self.store.abandon(store_key, entry)
+        else:
+            self.store.complete(entry, status, headers, b"".join(chunks))
+
+
+async def read_body(receive: Callable) -> bytes:
+    """
+    Reads the full request body from an ASGI receive channel.
+    """
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+async def replay(send: Callable, entry: IdempotencyEntry) -> None:
+    """
+    Sends a stored response again.
+    """
+    await send({
+        "type": "http.response.start",
+        "status": entry.status,
+        "headers": entry.headers + [(b"idempotent-replayed", b"true")],
+    })
+    await send({"type": "http.response.body", "body": entry.body})
+
+
+async def send_json(
+    send: Callable, status: int, content: Dict[str, Any], headers: Optional[List[Tuple[bytes, bytes]]] = None
+) -> None:
+    """
+    Sends a small JSON error response directly from a middleware.
+    """
+    body = json.dumps(content).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        + (headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """
+    Returns the shared idempotency store, configured from IDEMPOTENCY_TTL_SECONDS
+    and IDEMPOTENCY_MAX_ENTRIES.
+    """
+    global _store
+    if _store is None:
+        _store = IdempotencyStore(
+            max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+        )
+    return _store
+
+
+_store: Optional[IdempotencyStore] = None
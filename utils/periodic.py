@@ -0,0 +1,100 @@
+import asyncio
+import inspect
+import logging
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """
+    Runs `run_once` on a daemon thread every `interval_seconds`, off the request path.
+
+    Subclasses implement run_once. Exceptions are logged and the job keeps running.
+    """
+    name = "periodic-job"
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self) -> None:
+        """
+        Performs one iteration of the job.
+        """
+        raise NotImplementedError
+
+    def start(self) -> None:
+        """
+        Starts the background thread if it is not already running.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Signals the background thread to stop and waits for it to finish.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("%s iteration failed: %s", self.name, e)
+            self._stop_event.wait(self.interval_seconds)
+
+
+class AsyncPeriodicJob:
+    """
+    Runs `run_once` as a task on the application's event loop every `interval_seconds`.
+
+    Use this instead of PeriodicJob for jobs that touch state owned by the event
+    loop (the in-memory stores and indexes), so they never race with request handlers.
+    run_once may be a coroutine function; each iteration is awaited before the next.
+    """
+    name = "async-periodic-job"
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> Any:
+        """
+        Performs one iteration of the job.
+        """
+        raise NotImplementedError
+
+    def start(self) -> None:
+        """
+        Starts the job task on the running event loop.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run(), name=self.name)
+
+    def stop(self) -> None:
+        """
+        Cancels the job task.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                result = self.run_once()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error("%s iteration failed: %s", self.name, e)
+            await asyncio.sleep(self.interval_seconds)